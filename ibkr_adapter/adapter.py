@@ -1,10 +1,30 @@
-from ibkr_adapter.tws_client import TWSClient
+from ibkr_adapter.tws_client import TWSClient, IBKRError, HIST_MAX_CONCURRENCY
 from ibkr_adapter.mapping import resolve_contract
+from ibkr_adapter.contracts import ContractIndex, ContractResolver
+from ibkr_adapter.pool import ConnectionPool, ORDERS, HISTORY, MARKET_DATA
+from ibkr_adapter.supervisor import ConnectionSupervisor
+from ibkr_adapter.bars import BarBuffer, bars_to_frame
+from ibkr_adapter.bar_store import BarStore
+from ibkr_adapter.aggregator import BarAggregator, LiveBarSink, RT_BAR_SECONDS
+from ibkr_adapter.order_book import OrderBook, OrderRecord
+from ibkr_adapter.bracket import BracketSubmitter
+from ibkr_adapter.portfolio import PortfolioCache
+from ibkr_adapter.pnl import PnLEngine, PnLFeed
+from ibkr_adapter.dispatch import RTBARS, LIVE_BARS, ORDER_EVENTS, CONNECTION_EVENTS
+from risk.limits import RiskLimits
+from risk.pretrade_checks import ExposureBook, PreTradeChecker, CheckResult
+from risk.kill_switch import KillSwitch
+from risk.pdt import PDTTracker, PdtDecision
 from mcp_server.tools.utils import load_config
 from mcp_server.tools.market_data import store_realtime_market_data, RealtimeMarketData
 import pandas as pd
 from loguru import logger
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from typing import Callable, Iterator
+import threading
+import time
+import math
 import random
 
 TF_MAP = {
@@ -14,43 +34,216 @@ TF_MAP = {
     "1d":  ("1 day",  "1 M"),      # 1 mes (ajusta si quieres)
 }
 
-def _ib_duration_from_range(start_iso, end_iso):
-    import pandas as pd
-    delta = pd.to_datetime(end_iso) - pd.to_datetime(start_iso)
-    secs = int(delta.total_seconds())
-    if secs <= 3600*24:
-        return f"{secs} S"
-    elif secs <= 3600*24*7:
-        return f"{secs//86400} D"
-    elif secs <= 3600*24*28:
-        return f"{secs//(86400*7)} W"
+BAR_SECONDS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1d": 86400,
+}
+
+def _expected_bar_count(tf, start_iso, end_iso, limit=1_000_000):
+    """Upper-bound estimate of bars in a range, used to presize decode buffers."""
+    secs = (pd.to_datetime(end_iso) - pd.to_datetime(start_iso)).total_seconds()
+    return int(min(limit, max(1, secs // BAR_SECONDS.get(tf, 60) + 1)))
+
+def _ib_duration_covering(start, end, bar_size: str = ""):
+    """
+    Smallest IB duration string reaching back from `end` to at least `start`.
+    IB rejects durations in seconds for daily and longer bars, so those get
+    at least "1 D".
+    """
+    secs = math.ceil((pd.Timestamp(end) - pd.Timestamp(start)).total_seconds())
+    if secs <= 86400 and not bar_size.endswith(("day", "week", "month")):
+        return f"{max(1, secs)} S"
+    return f"{max(1, math.ceil(secs / 86400))} D"
+
+# Longest duration IB serves in one request for each bar size
+# (see the "Historical Data Limitations" step-size table).
+HIST_CHUNK_LIMITS = {
+    "1m":  pd.Timedelta(days=1),
+    "5m":  pd.Timedelta(weeks=1),
+    "15m": pd.Timedelta(weeks=1),
+    "1d":  pd.Timedelta(days=365),
+}
+
+def plan_hist_chunks(tf, start, end) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    Splits [start, end) into consecutive chunks no longer than IB serves for
+    the bar size of `tf`. Chunks are returned newest first and do not depend
+    on each other, so they can be requested in any order.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    step = HIST_CHUNK_LIMITS.get(tf, HIST_CHUNK_LIMITS["1m"])
+    chunks = []
+    chunk_end = end
+    while chunk_end > start:
+        chunk_start = max(start, chunk_end - step)
+        chunks.append((chunk_start, chunk_end))
+        chunk_end = chunk_start
+    return chunks
+
+def _stitch_bars(frames: list[pd.DataFrame], start=None, end=None) -> pd.DataFrame:
+    """
+    Concatenates chunk results into one frame sorted by ts without duplicate
+    bars, trimmed to [start, end): IB durations are rounded up to whole days,
+    so chunks can reach past the range.
+    """
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return bars_to_frame([])
+    if len(frames) == 1:
+        df = frames[0]
     else:
-        return f"{max(1, secs//(86400*30))} M"
+        df = pd.concat(frames, ignore_index=True)
+        df = df.drop_duplicates(subset="ts", keep="first").sort_values("ts", kind="stable").reset_index(drop=True)
+    if start is None or df.empty:
+        return df
+    first, last = df["ts"].searchsorted([pd.Timestamp(start), pd.Timestamp(end)], side="left")
+    if first == 0 and last == len(df):
+        return df
+    return df.iloc[first:last].reset_index(drop=True)
+
+def _is_no_data(error: IBKRError) -> bool:
+    """IB error 162 for a window without bars (a weekend or holiday); pacing violations share the code."""
+    return error.code == 162 and "pacing" not in (error.original_error or "").lower()
 
-def ib_hist_params(tf, start_iso, end_iso):
-    bar_size, _ = TF_MAP.get(tf, ("1 min", "1800 S")) # Default to 1m
-    duration = _ib_duration_from_range(start_iso, end_iso)
-    return bar_size, duration
+def _naive_ts(value) -> pd.Timestamp:
+    """Parses an ISO timestamp keeping its wall-clock time, as IB expects it."""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize(None) if ts.tzinfo is not None else ts
 
 class TWSAdapter:
+    # Seconds each historical request may take once it has been sent to IB
+    hist_timeout = 20.0
+
     def __init__(self, config_path="config.example.yaml"):
         self.config = load_config()
         self.dry_run = bool(self.config.get("dry_run", True))
 
+        cache_config = self.config.get("ibkr", {}).get("market_data", {}).get("bar_cache", {})
+        self.bar_store = BarStore(cache_config.get("path", "./data/bars")) if cache_config.get("enabled", False) else None
+
+        live_config = self.config.get("ibkr", {}).get("market_data", {}).get("live_bars", {})
+        self.live_bars = None
+        self._live_req_ids: dict[tuple, int] = {}
+        self._live_lock = threading.Lock()
+        # Zone of the naive bar times IB sends (the TWS login zone)
+        self.ib_tz = live_config.get("tz", "UTC")
+        if live_config.get("enabled", False):
+            self.live_bars = BarAggregator(
+                timeframes=tuple(live_config.get("timeframes", ("1m", "5m", "15m"))),
+                capacity=int(live_config.get("capacity", 2000)),
+                tz=self.ib_tz,
+                on_close=self._publish_live_bar,
+            )
+
+        self.contracts = None
+        self.orders = None
+        self.portfolio = None
+        self.pnl = None
+        self.pnl_feed = None
+        self.risk = None
+        self.kill_switch = None
+        self.pdt = None
+        self.pool = None
+        self.brackets = BracketSubmitter(self._order_contract, lambda: self.client_for(ORDERS))
+        self.supervisor = None
         if not self.dry_run:
-            self.client = TWSClient()
             ib_config = self.config.get("ibkr", {})
             host = ib_config.get("host", "127.0.0.1")
             port = int(ib_config.get("port", 4002))
             client_id = int(ib_config.get("client_id", 101))
-            self.client.connect_and_run(host, port, client_id)
+            reconnect = ib_config.get("reconnect", {})
+            connect_timeout = float(reconnect.get("connect_timeout_sec", 10))
+            supervisor_options = {
+                "backoff_initial": float(reconnect.get("backoff_initial_sec", 0.5)),
+                "backoff_max": float(reconnect.get("backoff_max_sec", 30)),
+                "resubscribe_batch": int(reconnect.get("resubscribe_batch", 40)),
+                "resubscribe_interval": float(reconnect.get("resubscribe_interval_sec", 1.0)),
+            }
+            connections = ib_config.get("connections")
+            if connections:
+                self.pool = ConnectionPool(host, port, client_id, sizes=connections,
+                                           health_interval=float(ib_config.get("health_interval_sec", 10)),
+                                           supervisor_options=supervisor_options, connect_timeout=connect_timeout)
+                self.pool.start()
+                # Live data, positions and anything not routed by class
+                self.client = self.pool.client(MARKET_DATA)
+            else:
+                self.client = TWSClient()
+                self.supervisor = ConnectionSupervisor(self.client, host, port, client_id,
+                                                       connect_timeout=connect_timeout, **supervisor_options)
+                if not self.supervisor.start(wait=connect_timeout):
+                    self.supervisor.stop()
+                    raise ConnectionError("Could not connect to IBKR.")
+            orders_config = ib_config.get("orders", {})
+            self.orders = OrderBook(orders_config.get("journal", "./data/orders.jsonl"))
+            if self.config.get("pdt_enabled", True):
+                pdt_config = self.config.get("pdt", {})
+                self.pdt = PDTTracker(pdt_config.get("state_path", "./data/pdt_state.json"),
+                                      max_day_trades=int(pdt_config.get("max_day_trades", 3)),
+                                      min_equity=float(pdt_config.get("min_equity", 25000)),
+                                      holidays=pdt_config.get("holidays", []))
+                if not self.pdt.loaded:
+                    self.pdt.replay_journal(self.orders.journal_path)
+                self.orders.subscribe_fills(self.pdt.on_fill)
+            # Order callbacks arrive on whichever connection placed the order
+            order_events = self.pool or self.client.router
+            order_events.subscribe(ORDER_EVENTS, self.orders.on_event)
+            order_events.subscribe(ORDER_EVENTS, self.brackets.on_event)
+            contracts_config = ib_config.get("contracts", {})
+            if contracts_config.get("qualify", True):
+                self.contracts = ContractResolver(
+                    self.pool or self.client,
+                    ContractIndex(contracts_config.get("path", "./data/contracts.json")),
+                    ttl=float(contracts_config.get("ttl_sec", 86400)),
+                    roll_days=int(contracts_config.get("roll_days", 5)),
+                    use_crypto_sec_type=ib_config.get("use_crypto_sec_type", True),
+                )
+            portfolio_config = ib_config.get("portfolio", {})
+            if portfolio_config.get("stream", True):
+                client = self.client_for(MARKET_DATA)
+                self.portfolio = PortfolioCache(client, account=portfolio_config.get("account", ""),
+                                                pnl=portfolio_config.get("pnl", True))
+                if portfolio_config.get("live_marks", True):
+                    # Started first so it sees every position the initial download delivers
+                    self.pnl = PnLEngine(portfolio_config.get("base_currency", "USD"))
+                    self.pnl_feed = PnLFeed(self.pnl, self.portfolio, client, contracts=self.contracts)
+                    self.pnl_feed.start()
+                exposure = ExposureBook(portfolio_config.get("base_currency", "USD"), marks=self.pnl)
+                self.portfolio.subscribe(exposure.on_portfolio_event)
+                order_events.subscribe(ORDER_EVENTS, exposure.on_order_event)
+                self.risk = PreTradeChecker(RiskLimits.from_config(self.config.get("risk_limits")), exposure)
+            kill_config = (self.config.get("risk_limits") or {}).get("kill_switch", {})
+            if kill_config.get("enabled", True):
+                self.kill_switch = KillSwitch(
+                    lambda: self.client_for(ORDERS), self.portfolio,
+                    equity=self.risk.exposure.equity if self.risk is not None else None,
+                    max_drawdown_pct=kill_config.get("max_drawdown_pct"),
+                    max_errors=kill_config.get("max_errors_per_minute"),
+                    max_rejections=kill_config.get("max_rejections_per_minute"),
+                    disconnect_grace=kill_config.get("disconnect_grace_sec"),
+                    flatten=kill_config.get("flatten", True),
+                    is_order=lambda order_id: self.orders.get(order_id) is not None,
+                    contracts=self.contracts,
+                )
+                order_events.subscribe(ORDER_EVENTS, self.kill_switch.on_order_event)
+                self.client_for(ORDERS).router.subscribe(CONNECTION_EVENTS, self.kill_switch.on_connection_event)
+                self.kill_switch.start()
+            if self.portfolio is not None:
+                self.portfolio.start()
+            for entry in ib_config.get("orders", {}).get("prepare", []):
+                self.brackets.prepare(entry["symbol"], entry.get("asset_type", "STK"))
+            for entry in live_config.get("track", []) if self.live_bars is not None else []:
+                self.track_live_bars(entry["symbol"], entry.get("asset_type", "STK"),
+                                     entry.get("what_to_show", "TRADES"))
 
     def on_order_data(self, symbol: str, price: float, timestamp: datetime, order_id: int | None = None):
         """
         This function is a placeholder for an IBKR API callback that provides order data.
         It should be registered with the IBKR client to receive real-time order updates.
         """
-        logger.info(f"Received order data: Symbol={symbol}, Price={price}, Timestamp={timestamp}, OrderID={order_id}")
+        logger.debug(f"Received order data: Symbol={symbol}, Price={price}, Timestamp={timestamp}, OrderID={order_id}")
         market_data_entry = RealtimeMarketData(
             symbol=symbol,
             price=price,
@@ -59,7 +252,13 @@ class TWSAdapter:
         )
         store_realtime_market_data(market_data_entry)
 
-    def get_bars(self, symbol: str, tf: str, start: str, end: str, use_rth: int | None = None, what_to_show: str = "TRADES") -> pd.DataFrame:
+    def get_bars(self, symbol: str, tf: str, start: str, end: str, use_rth: int | None = None, what_to_show: str = "TRADES",
+                 asset_type: str = "STK", progress: Callable[[int, int], None] | None = None) -> pd.DataFrame:
+        """
+        Returns OHLCV bars for [start, end). Long ranges are split into chunks
+        sized to IB's per-bar-size limits and fetched in parallel; `progress`
+        is called with (chunks_done, chunks_total) as each chunk completes.
+        """
         if self.dry_run:
             logger.info("Dry run mode: returning mock data for get_bars")
             seed = f"{symbol}-{tf}-{start}"
@@ -73,67 +272,212 @@ class TWSAdapter:
                 "volume": pd.Series([random.randint(500, 1500), random.randint(500, 1500)], dtype="Int64"),
             })
 
-        # asset_type = self._infer_asset_type(symbol) # Optional, assuming STK for now
-        contract = resolve_contract(symbol, "STK")
+        use_rth_val = self._use_rth(use_rth)
+        start_ts, end_ts = _naive_ts(start), _naive_ts(end)
 
-        bar_size, duration = ib_hist_params(tf, start, end)
-        
-        # Format end datetime for IBKR
-        end_dt_str = end.replace("T", " ").replace("Z", "")
+        live = self.live_window(symbol, asset_type, tf, what_to_show, use_rth_val, start_ts, end_ts)
+        if live is not None:
+            return live
+        contract = self.contract(symbol, asset_type)
 
-        # Determine useRTH from config or method parameter
-        if use_rth is None:
-            outside_rth = self.config.get("ibkr", {}).get("market_data", {}).get("hist_defaults", {}).get("outside_rth", False)
-            use_rth_val = 0 if outside_rth else 1
-        else:
-            use_rth_val = use_rth
-
-        bars = self.client.get_historical_data(
-            contract=contract,
-            endDateTime=end_dt_str,
-            durationStr=duration,
-            barSizeSetting=bar_size,
+        if self.bar_store is None:
+            chunks = plan_hist_chunks(tf, start_ts, end_ts)
+            frames = self._fetch_chunks(contract, tf, chunks, what_to_show, use_rth_val, progress)
+            return _stitch_bars(frames, start_ts, end_ts)
+
+        # Serve what the store already covers and only ask IB for the gaps.
+        key = (symbol, asset_type, tf, what_to_show, use_rth_val)
+        chunks = [
+            chunk
+            for gap_start, gap_end in self.bar_store.missing(key, start_ts, end_ts)
+            for chunk in plan_hist_chunks(tf, gap_start, gap_end)
+        ]
+        frames = self._fetch_chunks(contract, tf, chunks, what_to_show, use_rth_val, progress)
+        # The bar in progress is not final yet, so coverage stops one bar before now.
+        last_final = self.ib_now() - pd.Timedelta(seconds=BAR_SECONDS.get(tf, 60))
+        for (chunk_start, chunk_end), df in zip(chunks, frames):
+            self.bar_store.write(key, df, chunk_start, max(chunk_start, min(chunk_end, last_final)))
+        return self.bar_store.read(key, start_ts, end_ts)
+
+    def ib_now(self) -> pd.Timestamp:
+        """The current wall-clock time in the TWS zone, comparable with IB's naive bar times."""
+        return pd.Timestamp.now(tz=self.ib_tz).tz_localize(None)
+
+    def track_live_bars(self, symbol: str, asset_type: str = "STK", what_to_show: str = "TRADES",
+                        use_rth: int | None = None) -> tuple:
+        """
+        Subscribes to 5-second real-time bars for `symbol` and aggregates them
+        into `live_bars`; returns the aggregator key. Closed bars are published
+        on the client router's LIVE_BARS topic.
+        """
+        if self.live_bars is None or self.dry_run:
+            raise RuntimeError("Live bar aggregation needs ibkr.market_data.live_bars.enabled and dry_run off")
+        key = (symbol, asset_type, what_to_show, self._use_rth(use_rth))
+        with self._live_lock:
+            if key in self._live_req_ids:
+                return key
+            req_id = self.client._next_req_id()
+            self._live_req_ids[key] = req_id
+        sink = LiveBarSink(self.live_bars, key, self.client, req_id,
+                           on_error=lambda: self._forget_live_bars(key, req_id))
+        self.client.router.register(RTBARS, req_id, sink, keep_after_end=True)
+        self.client.reqRealTimeBars(req_id, self.contract(symbol, asset_type), RT_BAR_SECONDS,
+                                    what_to_show, key[3], [])
+        logger.info(f"Tracking live bars for {symbol} ({asset_type}), reqId={req_id}")
+        return key
+
+    def untrack_live_bars(self, key: tuple):
+        with self._live_lock:
+            req_id = self._live_req_ids.pop(key, None)
+        if req_id is None:
+            return
+        self.client.router.unregister(RTBARS, req_id)
+        self.client.cancelRealTimeBars(req_id)
+        self.live_bars.remove(key)
+
+    def _forget_live_bars(self, key: tuple, req_id: int):
+        with self._live_lock:
+            if self._live_req_ids.get(key) == req_id:
+                del self._live_req_ids[key]
+
+    def _publish_live_bar(self, event: dict):
+        if not self.dry_run:
+            self.client.router.publish(LIVE_BARS, event)
+
+    def live_window(self, symbol: str, asset_type: str, tf: str, what_to_show: str, use_rth: int,
+                    start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame | None:
+        """Bars for [start, end) from the live aggregator, or None if it does not cover the range."""
+        if self.live_bars is None:
+            return None
+        return self.live_bars.window((symbol, asset_type, what_to_show, use_rth), tf, start, end)
+
+    def _fetch_chunks(self, contract, tf: str, chunks: list, what_to_show: str, use_rth: int,
+                      progress: Callable[[int, int], None] | None = None) -> list[pd.DataFrame]:
+        """
+        Fetches planned chunks in parallel. Workers are capped at the client's
+        historical concurrency, so each one goes straight through the semaphore
+        and the pacing gate decides when its request is sent.
+        """
+        frames = [None] * len(chunks)
+        if len(chunks) <= 1:
+            for i, (chunk_start, chunk_end) in enumerate(chunks):
+                frames[i] = self._fetch_bars(contract, tf, chunk_start, chunk_end, what_to_show, use_rth)
+                if progress:
+                    progress(i + 1, len(chunks))
+            return frames
+
+        pool = ThreadPoolExecutor(max_workers=min(HIST_MAX_CONCURRENCY, len(chunks)), thread_name_prefix="hist-chunk")
+        try:
+            futures = {
+                pool.submit(self._fetch_bars, contract, tf, chunk_start, chunk_end, what_to_show, use_rth): i
+                for i, (chunk_start, chunk_end) in enumerate(chunks)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                frames[futures[future]] = future.result()
+                if progress:
+                    progress(done, len(chunks))
+        finally:
+            # On error, drop the chunks that have not started yet
+            pool.shutdown(wait=True, cancel_futures=True)
+        return frames
+
+    def stream_bars(self, symbol: str, tf: str, start: str, end: str | None = None, use_rth: int | None = None,
+                    what_to_show: str = "TRADES", asset_type: str = "STK", keep_up_to_date: bool = False,
+                    batch_size: int = 500, update_timeout: float | None = None) -> Iterator[pd.DataFrame]:
+        """
+        Yields bars as DataFrame batches (same dtypes as `get_bars`) while IB
+        delivers them, so consumers can start on the first batch.
+
+        With `keep_up_to_date=True` the backfill runs up to now (`end` must be
+        None) and the stream continues with live updates; the forming bar is
+        re-sent with the same ts on every update, so consumers should keep the
+        last row per ts.
+        """
+        if self.dry_run:
+            yield self.get_bars(symbol, tf, start, end or str(self.ib_now()), use_rth, what_to_show, asset_type)
+            return
+        if keep_up_to_date and end is not None:
+            raise ValueError("keep_up_to_date streams always end at the current time; pass end=None")
+
+        contract = self.contract(symbol, asset_type)
+        start_ts = _naive_ts(start)
+        end_ts = _naive_ts(end) if end is not None else self.ib_now()
+        bar_size, _ = TF_MAP.get(tf, ("1 min", "1800 S"))
+
+        batches = self.client_for(HISTORY).iter_historical_data(
+            contract,
+            "" if end is None else end_ts.strftime("%Y%m%d %H:%M:%S"),
+            _ib_duration_covering(start_ts, end_ts, bar_size),
+            bar_size,
             whatToShow=what_to_show,
-            useRTH=use_rth_val, 
-            timeout=20
+            useRTH=self._use_rth(use_rth),
+            timeout=self.hist_timeout,
+            keep_up_to_date=keep_up_to_date,
+            batch_size=batch_size,
+            update_timeout=update_timeout,
         )
+        try:
+            for batch in batches:
+                yield bars_to_frame(batch)
+        finally:
+            batches.close()
 
-        rows = []
-        for b in bars:
-            # b.date can be "YYYYMMDD  HH:MM:SS" or "YYYYMMDD"
-            ts = pd.to_datetime(b.date, format="%Y%m%d  %H:%M:%S", errors="coerce")
-            if pd.isna(ts):
-                ts = pd.to_datetime(b.date, format="%Y%m%d", errors="coerce")
-            rows.append({
-                "ts": ts, 
-                "open": b.open, 
-                "high": b.high,
-                "low": b.low, 
-                "close": b.close, 
-                "volume": getattr(b, "volume", 0)
-            })
+    def client_for(self, traffic_class: str) -> TWSClient:
+        """The client for ORDERS, HISTORY or MARKET_DATA traffic: pooled when configured, else the only one."""
+        if self.pool is not None:
+            return self.pool.client(traffic_class)
+        return self.client
 
-        df = pd.DataFrame(rows).dropna(subset=["ts"]).sort_values("ts").reset_index(drop=True)
-        
-        # Ensure correct dtypes
-        numeric_cols = ["open", "high", "low", "close"]
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Ensure volume is int64, coercing errors
-        if 'volume' in df.columns:
-            df["volume"] = pd.to_numeric(df["volume"], errors='coerce').astype("Int64") # Use Int64 for nullable integer
+    def contract(self, symbol: str, asset_type: str, contract_month: str | None = None):
+        """
+        A new Contract for the symbol: qualified through `contracts` (conId,
+        front-month futures) when enabled, otherwise built by `resolve_contract`.
+        """
+        if self.contracts is not None:
+            return self.contracts.resolve(symbol, asset_type, contract_month)
+        use_crypto_sec_type = self.config.get("ibkr", {}).get("use_crypto_sec_type", True)
+        return resolve_contract(symbol, asset_type, contract_month, use_crypto_sec_type=use_crypto_sec_type)
 
-        # Ensure timestamp is tz-naive datetime64
-        if 'ts' in df.columns:
-            df['ts'] = pd.to_datetime(df['ts']).dt.tz_localize(None) # Ensure tz-naive
-            df['ts'] = df['ts'].astype("datetime64[ns]")
+    def _order_contract(self, symbol: str, asset_type: str) -> tuple:
+        """(Contract, expires_at) for bracket templates; unqualified contracts are rebuilt hourly."""
+        if self.contracts is not None:
+            info = self.contracts.qualify(symbol, asset_type)
+            return info.to_contract(), info.expires_at
+        return self.contract(symbol, asset_type), time.time() + 3600
 
-        return df
+    def _use_rth(self, use_rth: int | None) -> int:
+        # Determine useRTH from config or method parameter
+        if use_rth is None:
+            outside_rth = self.config.get("ibkr", {}).get("market_data", {}).get("hist_defaults", {}).get("outside_rth", False)
+            return 0 if outside_rth else 1
+        return use_rth
+
+    def _fetch_bars(self, contract, tf: str, start: pd.Timestamp, end: pd.Timestamp,
+                    what_to_show: str, use_rth: int) -> pd.DataFrame:
+        bar_size, _ = TF_MAP.get(tf, ("1 min", "1800 S"))
+        try:
+            bars = self.client_for(HISTORY).get_historical_data(
+                contract=contract,
+                endDateTime=end.strftime("%Y%m%d %H:%M:%S"),
+                durationStr=_ib_duration_covering(start, end, bar_size),
+                barSizeSetting=bar_size,
+                whatToShow=what_to_show,
+                useRTH=use_rth,
+                timeout=self.hist_timeout,
+                sink=BarBuffer(_expected_bar_count(tf, start, end)),
+            )
+        except IBKRError as e:
+            if not _is_no_data(e):
+                raise
+            bars = []  # the chunk has no bars (a weekend or holiday); the rest of the range still counts
+
+        # Columns are decoded in one vectorized pass with the final dtypes:
+        # ts datetime64[ns] (tz-naive), open/high/low/close float64, volume Int64.
+        return bars_to_frame(bars)
 
     def place_bracket_order(self, symbol: str, asset_type: str, qty: int, side: str,
-                            entry: float, stop: float, take: float, tif: str) -> dict:
+                            entry: float | None, stop: float, take: float, tif: str, plan_id: str | None = None,
+                            entry_type: str = "LMT") -> dict:
         if self.dry_run:
             logger.info("Dry run mode: returning mock data for place_bracket_order")
             seed = f"{symbol}-{qty}-{entry}-{stop}-{take}"
@@ -141,39 +485,79 @@ class TWSAdapter:
             parent_id = random.randint(1000, 9999)
             return {"parent_id": f"dry_run_parent_{parent_id}", "children_ids": [f"dry_run_tp_{parent_id+1}", f"dry_run_sl_{parent_id+2}"]}
 
-        ib_config = self.config.get("ibkr", {})
-        use_crypto_sec_type = ib_config.get("use_crypto_sec_type", True)
+        if self.kill_switch is not None:
+            self.kill_switch.check()
 
-        contract = resolve_contract(
-            symbol,
-            asset_type,
-            # contract_month should be passed as an argument if needed for FUT orders
-            use_crypto_sec_type=use_crypto_sec_type
-        )
-        parent_order_id = self.client._next_order_id()
-        
-        orders = self.client.make_bracket_order(
-            parentId=parent_order_id,
-            action=side,
-            quantity=qty,
-            limitPrice=entry,
-            takeProfitPrice=take,
-            stopLossPrice=stop
-        )
+        # Tracked before the write, so the first orderStatus finds the legs
+        def track(orders):
+            if self.orders is not None:
+                self.orders.track_bracket(orders, symbol, asset_type, plan_id)
+            if self.risk is not None:
+                self.risk.on_submit(orders, symbol, asset_type,
+                                    self.brackets.cached(symbol, asset_type, side, tif, entry_type).contract)
+        parent, take_profit, stop_loss = self.brackets.submit(symbol, asset_type, qty, side, entry, stop, take, tif,
+                                                              before_send=track, entry_type=entry_type)
+        return {"parent_id": parent.orderId,
+                "children_ids": [take_profit.orderId, stop_loss.orderId]}
+
+    def pre_trade_check(self, symbol: str, asset_type: str, side: str, qty: int,
+                        entry: float | None, stop: float) -> CheckResult:
+        """
+        Checks an order against `risk_limits` using the streamed exposure; no
+        IB round trip once the symbol's bracket template is built. A market
+        entry is valued at the position's last market price.
+        """
+        if self.kill_switch is not None and self.kill_switch.tripped:
+            return CheckResult(False, [f"kill switch tripped: {self.kill_switch.reason}"], 0)
+        if self.risk is None:
+            return CheckResult(False, ["pre-trade checks need ibkr.portfolio.stream"], 0)
+        contract = self.brackets.template(symbol, asset_type, side).contract
+        multiplier, currency = float(contract.multiplier or 1), contract.currency or None
+        known = self.risk.exposure.instrument(symbol)
+        if known is not None:
+            if multiplier == 1:
+                multiplier = known[0]
+            if entry is None:
+                entry = known[2]
+        return self.risk.check(symbol, asset_type, side, qty, entry, stop, multiplier, currency)
+
+    def pdt_validate(self, symbol: str, asset_type: str, side: str, is_intraday: bool) -> PdtDecision:
+        """Day-trade check from the in-memory PDT counter and the streamed equity."""
+        if self.pdt is None:
+            return PdtDecision(True, None, "PDT guard disabled")
+        equity = self.risk.exposure.equity() if self.risk is not None else None
+        return self.pdt.validate(symbol, asset_type, side, is_intraday, equity)
 
-        for o in orders:
-            self.client.placeOrder(o.orderId, contract, o)
+    def order_status(self, order_id: int) -> OrderRecord | None:
+        """The tracked state of an order, from the order book; no IB round trip."""
+        return self.orders.get(order_id) if self.orders is not None else None
 
-        return {"parent_id": parent_order_id,
-                "children_ids": [parent_order_id + 1, parent_order_id + 2]}
+    def open_orders(self, symbol: str | None = None) -> list[OrderRecord]:
+        return self.orders.open_orders(symbol) if self.orders is not None else []
 
-    def get_positions(self) -> list[dict]:
+    def get_positions(self, timeout: float = 5.0) -> list[dict]:
         if self.dry_run:
             logger.info("Dry run mode: returning mock data for get_positions")
             return [{"symbol": "DRY", "asset_type":"STK", "qty":100, "avg_price":100.0, "unrealized_pnl":10.0}]
         
-        return self.client.get_positions_blocking()
+        if self.portfolio is not None:
+            # The cache owns the positions stream: wait for its download instead of racing it
+            if not self.portfolio.wait_positions(timeout):
+                raise TimeoutError("Timeout waiting for position data.")
+            return self.portfolio.position_rows(self.pnl)
+        return self.client_for(MARKET_DATA).get_positions_blocking(timeout)
 
     def __del__(self):
         if not self.dry_run:
-            self.client.disconnect()
+            if getattr(self, "kill_switch", None) is not None:
+                self.kill_switch.stop()
+            if getattr(self, "pnl_feed", None) is not None:
+                self.pnl_feed.stop()
+            if getattr(self, "portfolio", None) is not None:
+                self.portfolio.stop()
+            if getattr(self, "pool", None) is not None:
+                self.pool.stop()
+            else:
+                if getattr(self, "supervisor", None) is not None:
+                    self.supervisor.stop()
+                self.client.stop()
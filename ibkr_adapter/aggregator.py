@@ -0,0 +1,260 @@
+import threading
+import numpy as np
+import pandas as pd
+from loguru import logger
+from ibkr_adapter.dispatch import RTBARS
+
+# reqRealTimeBars only supports 5-second bars
+RT_BAR_SECONDS = 5
+
+# Timeframes that can be built from 5-second bars, in seconds
+LIVE_BAR_SECONDS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+}
+
+
+class BarRing:
+    """
+    Fixed-capacity columnar ring of closed bars: bar start times (epoch
+    seconds) and OHLCV in preallocated NumPy arrays. Appends are O(1) and
+    overwrite the oldest bar once full; windows are found with binary search.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._t = np.empty(self.capacity, dtype=np.int64)
+        self._ohlcv = np.empty((self.capacity, 5), dtype=np.float64)
+        self._count = 0  # bars ever appended
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, t: int, o: float, h: float, l: float, c: float, v: float):
+        i = self._count % self.capacity
+        self._t[i] = t
+        self._ohlcv[i] = (o, h, l, c, v)
+        self._count += 1
+
+    @property
+    def oldest(self) -> int | None:
+        if not self._count:
+            return None
+        return int(self._t[self._count % self.capacity if self._count > self.capacity else 0])
+
+    def _segments(self):
+        # Physical slices holding the bars in time order
+        if self._count <= self.capacity:
+            return [(0, self._count)]
+        head = self._count % self.capacity
+        return [(head, self.capacity), (0, head)]
+
+    def window(self, start: int, end: int) -> tuple[np.ndarray, np.ndarray]:
+        """Start times and OHLCV rows of the bars starting in [start, end)."""
+        times, rows = [], []
+        for lo, hi in self._segments():
+            seg = self._t[lo:hi]
+            a, b = np.searchsorted(seg, [start, end], side="left")
+            if a < b:
+                times.append(seg[a:b])
+                rows.append(self._ohlcv[lo + a:lo + b])
+        if not times:
+            return np.empty(0, dtype=np.int64), np.empty((0, 5), dtype=np.float64)
+        return np.concatenate(times), np.concatenate(rows)
+
+
+class _Series:
+    """Forming bar and closed-bar ring for one (key, timeframe)."""
+
+    __slots__ = ("seconds", "ring", "t", "o", "h", "l", "c", "v", "partial", "covered_from")
+
+    def __init__(self, seconds: int, capacity: int):
+        self.seconds = seconds
+        self.ring = BarRing(capacity)
+        self.t = None  # start of the forming bar
+        self.o = self.h = self.l = self.c = self.v = 0.0
+        self.partial = False
+        self.covered_from = None  # first complete bar since the feed became continuous
+
+    def update(self, t: int, o: float, h: float, l: float, c: float, v: float) -> tuple | None:
+        """Adds a 5-second bar; returns the bar it completes, if any."""
+        closed = None
+        bucket = t - t % self.seconds
+        if self.t is not None and bucket != self.t:
+            closed = self._close()  # the rest of the old bucket never arrived
+        if self.t is None:
+            self.t, self.o, self.h, self.l, self.c, self.v = bucket, o, h, l, c, v
+            # Joining mid-bucket: the bar is missing its start and is never published
+            self.partial = t != bucket
+            if self.covered_from is None:
+                self.covered_from = bucket + self.seconds if self.partial else bucket
+        else:
+            self.h = max(self.h, h)
+            self.l = min(self.l, l)
+            self.c = c
+            self.v += v
+        if t + RT_BAR_SECONDS >= bucket + self.seconds:
+            closed = self._close() or closed
+        return closed
+
+    def _close(self) -> tuple | None:
+        bar = None if self.partial else (self.t, self.o, self.h, self.l, self.c, self.v)
+        if bar is not None:
+            self.ring.append(*bar)
+        self.t = None
+        self.partial = False
+        return bar
+
+    def reset(self):
+        self.t = None
+        self.partial = False
+        self.covered_from = None
+
+
+class BarAggregator:
+    """
+    Builds 1m/5m/15m OHLCV bars incrementally from IB's 5-second real-time
+    bars and keeps the most recent closed bars per (key, timeframe) in
+    `BarRing`s, so recent windows can be answered without a historical request.
+
+    A key is (symbol, asset_type, what_to_show, use_rth). A bar closes as soon
+    as the 5-second bar ending its bucket arrives, and `on_close(event)` is
+    called with it. Buckets the feed joined halfway through are dropped, and
+    coverage restarts after a gap (`reset`), so windows are only served from
+    memory when every bar in them was built from a continuous feed.
+
+    Naive timestamps are wall-clock times in `tz`, like the ones IB uses for
+    historical bars.
+    """
+
+    def __init__(self, timeframes=("1m", "5m", "15m"), capacity: int = 2000, tz: str = "UTC", on_close=None):
+        unknown = [tf for tf in timeframes if tf not in LIVE_BAR_SECONDS]
+        if unknown:
+            raise ValueError(f"Cannot aggregate 5-second bars into {unknown}; supported: {list(LIVE_BAR_SECONDS)}")
+        self.timeframes = {tf: LIVE_BAR_SECONDS[tf] for tf in timeframes}
+        self.capacity = capacity
+        self.tz = tz
+        self.on_close = on_close
+        self._lock = threading.Lock()
+        self._series: dict[tuple, dict[str, _Series]] = {}
+        self._last_time: dict[tuple, int] = {}
+        self.bars_in = 0
+        self.bars_closed = 0
+        self.hits = 0
+        self.misses = 0
+
+    def on_bar(self, key: tuple, bar: dict):
+        """Feeds one `TWSClient.realtimeBar` item; called on the reader thread."""
+        t = int(bar["time"])
+        o, h, l, c = float(bar["open"]), float(bar["high"]), float(bar["low"]), float(bar["close"])
+        v = float(bar["volume"])
+        with self._lock:
+            if t <= self._last_time.get(key, -1):
+                return  # replayed after a resubscribe
+            self._last_time[key] = t
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {tf: _Series(s, self.capacity) for tf, s in self.timeframes.items()}
+            self.bars_in += 1
+            closed = [(tf, bar) for tf, s in series.items() if (bar := s.update(t, o, h, l, c, v)) is not None]
+            self.bars_closed += len(closed)
+        if self.on_close is not None:
+            for tf, (bt, bo, bh, bl, bc, bv) in closed:
+                self.on_close({"symbol": key[0], "asset_type": key[1], "what_to_show": key[2], "use_rth": key[3],
+                               "tf": tf, "time": bt, "open": bo, "high": bh, "low": bl, "close": bc, "volume": bv})
+
+    def reset(self, key: tuple):
+        """Marks a gap in the feed for `key` (e.g. a disconnect); closed bars are kept."""
+        with self._lock:
+            for s in self._series.get(key, {}).values():
+                s.reset()
+
+    def remove(self, key: tuple):
+        with self._lock:
+            self._series.pop(key, None)
+            self._last_time.pop(key, None)
+
+    def _epoch(self, ts) -> int:
+        ts = pd.Timestamp(ts)
+        ts = ts.tz_convert("UTC") if ts.tzinfo is not None else ts.tz_localize(self.tz)
+        return int(ts.value // 1_000_000_000)
+
+    def window(self, key: tuple, tf: str, start, end) -> pd.DataFrame | None:
+        """
+        Bars starting in [start, end) as a `get_bars` DataFrame (including the
+        forming bar), or None when memory does not cover the whole range.
+        """
+        if tf not in self.timeframes:
+            return None
+        start_s, end_s = self._epoch(start), self._epoch(end)
+        with self._lock:
+            s = self._series.get(key, {}).get(tf)
+            last = self._last_time.get(key)
+            oldest = s.ring.oldest if s is not None else None
+            covered_from = None
+            if s is not None and s.covered_from is not None:
+                covered_from = s.covered_from if oldest is None else max(s.covered_from, oldest)
+            # The newest 5-second bar must reach the end of the range, give or take one bar
+            if covered_from is None or start_s < covered_from or end_s > last + 2 * RT_BAR_SECONDS:
+                self.misses += 1
+                return None
+            times, rows = s.ring.window(start_s, end_s)
+            if s.t is not None and not s.partial and start_s <= s.t < end_s:
+                times = np.append(times, s.t)
+                rows = np.vstack([rows, (s.o, s.h, s.l, s.c, s.v)])
+            self.hits += 1
+
+        ts = pd.to_datetime(times, unit="s", utc=True).tz_convert(self.tz).tz_localize(None)
+        return pd.DataFrame({
+            "ts": ts.as_unit("ns"),
+            "open": rows[:, 0].copy(),
+            "high": rows[:, 1].copy(),
+            "low": rows[:, 2].copy(),
+            "close": rows[:, 3].copy(),
+            "volume": pd.array(rows[:, 4].astype(np.int64), dtype="Int64"),
+        })
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "bars_in": self.bars_in,
+                "bars_closed": self.bars_closed,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class LiveBarSink:
+    """
+    Router sink feeding a reqRealTimeBars stream into a `BarAggregator`.
+    It stays registered across reconnects (the client resubscribes with the
+    same reqId); other errors end the stream and call `on_error`.
+    """
+
+    def __init__(self, aggregator: BarAggregator, key: tuple, client, req_id: int, on_error=None):
+        self.aggregator = aggregator
+        self.key = key
+        self.client = client
+        self.req_id = req_id
+        self.on_error = on_error
+
+    def push(self, item):
+        self.aggregator.on_bar(self.key, item)
+
+    def end(self):
+        pass
+
+    def fail(self, exc: Exception):
+        self.aggregator.reset(self.key)
+        if isinstance(exc, ConnectionError):
+            self.client.router.register(RTBARS, self.req_id, self, keep_after_end=True)
+            return
+        logger.warning(f"Live bars for {self.key[0]} stopped: {exc}")
+        try:
+            self.client.cancelRealTimeBars(self.req_id)
+        except Exception as e:
+            logger.warning(f"Failed to cancel real-time bars reqId={self.req_id}: {e}")
+        if self.on_error:
+            self.on_error()
@@ -0,0 +1,333 @@
+import asyncio
+import time
+import pandas as pd
+from loguru import logger
+from ibkr_adapter.adapter import (
+    TWSAdapter, TF_MAP, BAR_SECONDS, plan_hist_chunks, _stitch_bars, _naive_ts,
+    _ib_duration_covering, _expected_bar_count, _is_no_data,
+)
+from ibkr_adapter.bars import BarBuffer
+from ibkr_adapter.dispatch import HISTORICAL, ACCOUNT_SUMMARY
+from ibkr_adapter.pacing import contract_key
+from ibkr_adapter.pool import HISTORY, MARKET_DATA
+from ibkr_adapter.tws_client import IBKRError, HIST_MAX_CONCURRENCY, position_rows
+
+_STREAM_END = object()
+
+
+class AsyncFutureSink:
+    """One-shot reply resolved on the event loop from the ibapi reader thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.items = []
+
+    def push(self, item):
+        self.items.append(item)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(self.items)
+
+    def _reject(self, exc: Exception):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+    def end(self):
+        self.loop.call_soon_threadsafe(self._resolve)
+
+    def fail(self, exc: Exception):
+        self.loop.call_soon_threadsafe(self._reject, exc)
+
+
+class AsyncStreamSink:
+    """Stream sink that hands items from the reader thread to an asyncio.Queue."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def push(self, item):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    def end(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, _STREAM_END)
+
+    def fail(self, exc: Exception):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, exc)
+
+
+class AsyncTWSAdapter:
+    """
+    Awaitable facade over `TWSAdapter` for the FastAPI tools.
+
+    Replies are delivered from the ibapi reader thread to asyncio futures and
+    queues with `loop.call_soon_threadsafe`. Historical requests take turns
+    on an `asyncio.Semaphore` sized to the client's concurrency slots and
+    wait out the pacer with `asyncio.sleep`, so no coroutine ever blocks the
+    event loop while an IB request is in flight.
+    """
+
+    def __init__(self, adapter: TWSAdapter | None = None, poll_interval: float = 0.01):
+        self.adapter = adapter or TWSAdapter()
+        self.poll_interval = poll_interval
+        self._hist_queue_loop = None
+        self._hist_queue_sem: asyncio.Semaphore | None = None
+
+    @property
+    def dry_run(self) -> bool:
+        return self.adapter.dry_run
+
+    @property
+    def client(self):
+        return self.adapter.client
+
+    @property
+    def portfolio(self):
+        """The adapter's `PortfolioCache`, or None; snapshots are read from memory."""
+        return self.adapter.portfolio
+
+    @property
+    def pnl(self):
+        """The adapter's `PnLEngine`, or None."""
+        return self.adapter.pnl
+
+    @property
+    def risk(self):
+        """The adapter's `PreTradeChecker`, or None."""
+        return self.adapter.risk
+
+    @property
+    def kill_switch(self):
+        """The adapter's `KillSwitch`, or None."""
+        return self.adapter.kill_switch
+
+    @property
+    def orders(self):
+        """The adapter's `OrderBook`; its lookups never touch IB, so they are safe on the loop."""
+        return self.adapter.orders
+
+    def _hist_queue(self) -> asyncio.Semaphore:
+        """Turns for historical requests on the running loop, one per concurrency slot."""
+        loop = asyncio.get_running_loop()
+        if self._hist_queue_loop is not loop:
+            self._hist_queue_loop, self._hist_queue_sem = loop, asyncio.Semaphore(HIST_MAX_CONCURRENCY)
+        return self._hist_queue_sem
+
+    async def _acquire_hist_slot(self, client, timeout: float):
+        # Only contended by synchronous callers: coroutines wait for a turn first
+        deadline = time.monotonic() + timeout
+        while not client._hist_sem.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Historical semaphore acquire timeout")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _admit_hist(self, client, request_key, contract_key, timeout: float) -> asyncio.Semaphore:
+        """
+        Waits for a turn, then the client's slot, then IB's pacing rules, and
+        returns the queue whose turn is held. Waiting for a turn does not count
+        against `timeout`; while paced, the turn and the slot are given up so
+        requests for other contracts go ahead.
+        """
+        queue = self._hist_queue()
+        while True:
+            await queue.acquire()
+            try:
+                await self._acquire_hist_slot(client, timeout)
+            except BaseException:
+                queue.release()
+                raise
+            delay = client._hist_pacer.try_acquire(request_key, contract_key)
+            if delay <= 0:
+                return queue
+            client._hist_sem.release()
+            queue.release()
+            await asyncio.sleep(delay)
+
+    async def iter_historical_data(self, contract, endDateTime, durationStr, barSizeSetting,
+                                   whatToShow="TRADES", useRTH: int = 1, timeout=15.0,
+                                   keep_up_to_date: bool = False, update_timeout: float | None = None):
+        """Async counterpart of `TWSClient.iter_historical_data`, yielding one bar at a time."""
+        client = self.adapter.client_for(HISTORY)
+        loop = asyncio.get_running_loop()
+        reqId = client._next_req_id()
+        sink = client.router.register(HISTORICAL, reqId, AsyncStreamSink(loop), keep_after_end=keep_up_to_date)
+
+        queue = None  # held with the client's slot until the backfill is done
+        sent = finished = False
+        try:
+            queue = await self._admit_hist(
+                client,
+                (contract_key(contract), endDateTime, durationStr, barSizeSetting, whatToShow, useRTH),
+                (contract_key(contract), whatToShow),
+                timeout,
+            )
+            client.reqHistoricalData(reqId, contract, endDateTime, durationStr,
+                                     barSizeSetting, whatToShow, useRTH, 1, keep_up_to_date, [])
+            sent = True
+
+            deadline = loop.time() + timeout
+            ended = False
+            while True:
+                wait = update_timeout if ended else deadline - loop.time()
+                if wait is not None and wait <= 0:
+                    raise TimeoutError(f"historicalData timeout for reqId={reqId}")
+                try:
+                    item = await asyncio.wait_for(sink.queue.get(), wait)
+                except asyncio.TimeoutError:
+                    if ended:
+                        return  # no update within update_timeout
+                    raise TimeoutError(f"historicalData timeout for reqId={reqId}")
+
+                if isinstance(item, Exception):
+                    finished = True
+                    raise item
+                if item is _STREAM_END:
+                    ended = True
+                    client._hist_sem.release()
+                    queue.release()
+                    queue = None
+                    if not keep_up_to_date:
+                        finished = True
+                        return
+                    continue
+                yield item
+        finally:
+            if queue is not None:
+                client._hist_sem.release()
+                queue.release()
+            if sent and not finished:
+                try:
+                    client.cancelHistoricalData(reqId)
+                except Exception as e:
+                    logger.warning(f"Failed to cancel historical data reqId={reqId}: {e}")
+            client.router.unregister(HISTORICAL, reqId)
+
+    async def _fetch_bars(self, contract, tf: str, start: pd.Timestamp, end: pd.Timestamp,
+                          what_to_show: str, use_rth: int) -> pd.DataFrame:
+        bar_size, _ = TF_MAP.get(tf, ("1 min", "1800 S"))
+        buffer = BarBuffer(_expected_bar_count(tf, start, end))
+        try:
+            async for bar in self.iter_historical_data(contract, end.strftime("%Y%m%d %H:%M:%S"),
+                                                       _ib_duration_covering(start, end, bar_size), bar_size,
+                                                       what_to_show, use_rth, timeout=self.adapter.hist_timeout):
+                buffer.append(bar)
+        except IBKRError as e:
+            if not _is_no_data(e):
+                raise  # otherwise the chunk has no bars; the rest of the range still counts
+        return buffer.to_frame()
+
+    async def get_bars(self, symbol: str, tf: str, start: str, end: str, use_rth: int | None = None,
+                       what_to_show: str = "TRADES", asset_type: str = "STK") -> pd.DataFrame:
+        if self.dry_run:
+            return self.adapter.get_bars(symbol, tf, start, end, use_rth, what_to_show, asset_type)
+
+        adapter = self.adapter
+        use_rth_val = adapter._use_rth(use_rth)
+        start_ts, end_ts = _naive_ts(start), _naive_ts(end)
+        live = adapter.live_window(symbol, asset_type, tf, what_to_show, use_rth_val, start_ts, end_ts)
+        if live is not None:
+            return live
+        contract = await self.contract(symbol, asset_type)
+        store = adapter.bar_store
+
+        if store is None:
+            chunks = plan_hist_chunks(tf, start_ts, end_ts)
+        else:
+            key = (symbol, asset_type, tf, what_to_show, use_rth_val)
+            gaps = await asyncio.to_thread(store.missing, key, start_ts, end_ts)
+            chunks = [chunk for gap_start, gap_end in gaps for chunk in plan_hist_chunks(tf, gap_start, gap_end)]
+
+        # Chunks wait for a turn in order; only the time after each is sent counts against its timeout
+        tasks = [
+            asyncio.ensure_future(self._fetch_bars(contract, tf, chunk_start, chunk_end, what_to_show, use_rth_val))
+            for chunk_start, chunk_end in chunks
+        ]
+        try:
+            frames = await asyncio.gather(*tasks)
+        except BaseException:
+            # One chunk failed (or the caller gave up): cancel the rest so they free their slots and requests
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        if store is None:
+            return _stitch_bars(list(frames), start_ts, end_ts)
+
+        last_final = adapter.ib_now() - pd.Timedelta(seconds=BAR_SECONDS.get(tf, 60))
+        for (chunk_start, chunk_end), df in zip(chunks, frames):
+            await asyncio.to_thread(store.write, key, df, chunk_start, max(chunk_start, min(chunk_end, last_final)))
+        return await asyncio.to_thread(store.read, key, start_ts, end_ts)
+
+    async def contract(self, symbol: str, asset_type: str, contract_month: str | None = None):
+        """`TWSAdapter.contract` without blocking the loop: only a cache miss goes to a thread."""
+        contracts = self.adapter.contracts
+        if contracts is None:
+            return self.adapter.contract(symbol, asset_type, contract_month)
+        info = contracts.cached(symbol, asset_type, contract_month)
+        if info is None:
+            info = await asyncio.to_thread(contracts.qualify, symbol, asset_type, contract_month)
+        return info.to_contract()
+
+    async def place_bracket_order(self, symbol: str, asset_type: str, qty: int, side: str,
+                                  entry: float | None, stop: float, take: float, tif: str, plan_id: str | None = None,
+                                  entry_type: str = "LMT") -> dict:
+        if not self.dry_run and self.adapter.brackets.cached(symbol, asset_type, side, tif, entry_type) is None:
+            # Qualify and build the template off the loop; the submission then only fills in prices
+            await asyncio.to_thread(self.adapter.brackets.template, symbol, asset_type, side, tif, entry_type)
+        # placeOrder only writes to the socket; there is no reply to wait for here
+        return self.adapter.place_bracket_order(symbol, asset_type, qty, side, entry, stop, take, tif, plan_id,
+                                                entry_type)
+
+    async def pre_trade_check(self, symbol: str, asset_type: str, side: str, qty: int,
+                              entry: float | None, stop: float):
+        if not self.dry_run and self.adapter.brackets.cached(symbol, asset_type, side) is None:
+            # Qualifying the contract (for its multiplier) is the only IB round trip; keep it off the loop
+            await asyncio.to_thread(self.adapter.brackets.template, symbol, asset_type, side)
+        return self.adapter.pre_trade_check(symbol, asset_type, side, qty, entry, stop)
+
+    def pdt_validate(self, symbol: str, asset_type: str, side: str, is_intraday: bool):
+        """Answered from memory, so it runs on the loop."""
+        return self.adapter.pdt_validate(symbol, asset_type, side, is_intraday)
+
+    async def get_positions(self, timeout: float = 5.0) -> list[dict]:
+        if self.dry_run:
+            return self.adapter.get_positions()
+        portfolio = self.adapter.portfolio
+        if portfolio is not None:
+            # The cache owns the positions stream: wait for its download instead of racing it
+            if not portfolio.wait_positions(0) and not await asyncio.to_thread(portfolio.wait_positions, timeout):
+                raise TimeoutError("Timeout waiting for position data.")
+            return portfolio.position_rows(self.adapter.pnl)
+
+        client = self.adapter.client_for(MARKET_DATA)
+        # Shares an in-flight reqPositions with sync and async callers alike
+        sink, owner = client._positions_request()
+        try:
+            if owner:
+                client.reqPositions()
+            items = await asyncio.wait_for(asyncio.wrap_future(sink.future), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timeout waiting for position data.")
+        finally:
+            if owner:
+                client._end_positions_request(sink)
+
+        return position_rows(items)
+
+    async def get_account_summary(self, group: str = "All", tags: str = "NetLiquidation,TotalCashValue,BuyingPower",
+                                  timeout: float = 5.0) -> list[dict]:
+        client = self.adapter.client_for(MARKET_DATA)
+        reqId = client._next_req_id()
+        sink = client.router.register(ACCOUNT_SUMMARY, reqId, AsyncFutureSink(asyncio.get_running_loop()))
+        client.reqAccountSummary(reqId, group, tags)
+        try:
+            return await asyncio.wait_for(sink.future, timeout)
+        except asyncio.TimeoutError:
+            logger.error("Timeout waiting for account summary")
+            return list(sink.items)
+        finally:
+            client.router.unregister(ACCOUNT_SUMMARY, reqId)
+            client.cancelAccountSummary(reqId)
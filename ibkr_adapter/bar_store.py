@@ -0,0 +1,189 @@
+import json
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+# One row per bar; ts is epoch nanoseconds (tz-naive wall clock as sent by IB)
+# and a NaN volume encodes a missing value.
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+_NS_PER_DAY = 86400 * 10**9
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _to_ns(ts) -> int:
+    return int(pd.Timestamp(ts).value)
+
+
+def _merge_intervals(intervals: list[list[int]]) -> list[list[int]]:
+    merged = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def frame_to_records(df: pd.DataFrame) -> np.ndarray:
+    records = np.empty(len(df), dtype=BAR_DTYPE)
+    records["ts"] = df["ts"].to_numpy(dtype="datetime64[ns]").view("i8")
+    for col in ("open", "high", "low", "close"):
+        records[col] = df[col].to_numpy(dtype=np.float64)
+    records["volume"] = df["volume"].astype("Float64").to_numpy(dtype=np.float64, na_value=np.nan)
+    return records
+
+
+def records_to_frame(records: np.ndarray) -> pd.DataFrame:
+    volume = records["volume"]
+    missing = np.isnan(volume)
+    return pd.DataFrame({
+        "ts": records["ts"].view("datetime64[ns]"),
+        "open": records["open"].copy(),
+        "high": records["high"].copy(),
+        "low": records["low"].copy(),
+        "close": records["close"].copy(),
+        "volume": pd.arrays.IntegerArray(np.where(missing, 0, volume).astype(np.int64), missing),
+    })
+
+
+class BarStore:
+    """
+    Persistent on-disk historical bar cache.
+
+    Bars are kept as memory-mappable NumPy partitions, one ``.npy`` file per
+    day, under a directory per (symbol, asset_type, tf, what_to_show, useRTH)
+    key. Each key also records which time ranges have already been fetched
+    from IB, so that ranges without bars (nights, weekends) are not requested
+    again.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.RLock()
+        self._coverage: dict[tuple, list[list[int]]] = {}
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.gap_fills = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _key_dir(self, key: tuple) -> str:
+        name = "__".join(_UNSAFE_CHARS.sub("_", str(part)) for part in key)
+        return os.path.join(self.root, name)
+
+    def _load_coverage(self, key: tuple) -> list[list[int]]:
+        if key not in self._coverage:
+            path = os.path.join(self._key_dir(key), "coverage.json")
+            intervals = []
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    intervals = json.load(f)
+            self._coverage[key] = _merge_intervals(intervals)
+        return self._coverage[key]
+
+    def _save_coverage(self, key: tuple):
+        key_dir = self._key_dir(key)
+        os.makedirs(key_dir, exist_ok=True)
+        path = os.path.join(key_dir, "coverage.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._coverage[key], f)
+        os.replace(tmp, path)
+
+    def _partition_path(self, key: tuple, day_ns: int) -> str:
+        day = pd.Timestamp(day_ns).strftime("%Y%m%d")
+        return os.path.join(self._key_dir(key), f"{day}.npy")
+
+    def missing(self, key: tuple, start, end) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
+        """Returns the sub-ranges of [start, end) not yet covered by the store."""
+        start_ns, end_ns = _to_ns(start), _to_ns(end)
+        gaps = []
+        with self._lock:
+            cursor = start_ns
+            for cov_start, cov_end in self._load_coverage(key):
+                if cov_end <= cursor:
+                    continue
+                if cov_start >= end_ns:
+                    break
+                if cov_start > cursor:
+                    gaps.append((cursor, cov_start))
+                cursor = max(cursor, cov_end)
+                if cursor >= end_ns:
+                    break
+            if cursor < end_ns:
+                gaps.append((cursor, end_ns))
+
+            if not gaps:
+                self.hits += 1
+            elif gaps == [(start_ns, end_ns)]:
+                self.misses += 1
+            else:
+                self.partial_hits += 1
+        return [(pd.Timestamp(s), pd.Timestamp(e)) for s, e in gaps]
+
+    def read(self, key: tuple, start, end) -> pd.DataFrame:
+        """Returns the cached bars with start <= ts < end."""
+        start_ns, end_ns = _to_ns(start), _to_ns(end)
+        chunks = []
+        with self._lock:
+            day_ns = start_ns - start_ns % _NS_PER_DAY
+            while day_ns < end_ns:
+                path = self._partition_path(key, day_ns)
+                if os.path.exists(path):
+                    part = np.load(path, mmap_mode="r")
+                    lo, hi = np.searchsorted(part["ts"], [start_ns, end_ns])
+                    if hi > lo:
+                        chunks.append(np.array(part[lo:hi]))
+                day_ns += _NS_PER_DAY
+        records = np.concatenate(chunks) if chunks else np.empty(0, dtype=BAR_DTYPE)
+        return records_to_frame(records)
+
+    def write(self, key: tuple, df: pd.DataFrame, start, end):
+        """
+        Merges fetched bars into the day partitions (new bars win on duplicate
+        timestamps) and marks [start, end) as covered.
+        """
+        records = frame_to_records(df)
+        with self._lock:
+            key_dir = self._key_dir(key)
+            os.makedirs(key_dir, exist_ok=True)
+            days = records["ts"] - records["ts"] % _NS_PER_DAY
+            for day_ns in np.unique(days):
+                new = records[days == day_ns]
+                path = self._partition_path(key, int(day_ns))
+                if os.path.exists(path):
+                    new = np.concatenate([new, np.load(path)])
+                # np.unique keeps the first occurrence, i.e. the freshly fetched bar
+                _, first = np.unique(new["ts"], return_index=True)
+                merged = new[first]
+                tmp = path + ".tmp.npy"
+                np.save(tmp, merged)
+                os.replace(tmp, path)
+
+            coverage = self._load_coverage(key)
+            coverage.append([_to_ns(start), _to_ns(end)])
+            self._coverage[key] = _merge_intervals(coverage)
+            self._save_coverage(key)
+            self.gap_fills += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses,
+                "gap_fills": self.gap_fills,
+            }
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+# IB sends bar dates as "YYYYMMDD  HH:MM:SS" (intraday) or "YYYYMMDD" (daily).
+# Anything past the seconds field (e.g. a trailing timezone name) is ignored.
+_DATE_WIDTH = 18
+_ASCII_ZERO = 48
+_ASCII_SPACE = 32
+_ASCII_COLON = 58
+
+
+def parse_ib_dates(raw: np.ndarray) -> np.ndarray:
+    """
+    Parses an array of IB bar date strings (bytes, dtype ``S18``) into
+    ``datetime64[ns]`` in a single vectorized pass. Unparseable entries become NaT.
+    """
+    raw = np.ascontiguousarray(raw, dtype=f"S{_DATE_WIDTH}")
+    n = raw.shape[0]
+    if n == 0:
+        return np.empty(0, dtype="datetime64[ns]")
+
+    chars = raw.view(np.uint8).reshape(n, _DATE_WIDTH)
+    digits = chars.astype(np.int64) - _ASCII_ZERO
+
+    date_digits = digits[:, :8]
+    valid = ((date_digits >= 0) & (date_digits <= 9)).all(axis=1)
+
+    year = date_digits[:, 0] * 1000 + date_digits[:, 1] * 100 + date_digits[:, 2] * 10 + date_digits[:, 3]
+    month = date_digits[:, 4] * 10 + date_digits[:, 5]
+    day = date_digits[:, 6] * 10 + date_digits[:, 7]
+    valid &= (month >= 1) & (month <= 12) & (day >= 1)
+
+    # Daily bars end right after the date; intraday bars have one or two spaces
+    # before the time of day.
+    is_daily = chars[:, 8] == 0
+    time_start = np.where(chars[:, 9] == _ASCII_SPACE, 10, 9)
+    rows = np.arange(n)[:, None]
+    time_chars = chars[rows, time_start[:, None] + np.arange(8)]
+    time_digits = time_chars.astype(np.int64) - _ASCII_ZERO
+
+    hms = time_digits[:, [0, 1, 3, 4, 6, 7]]
+    time_ok = (
+        (chars[:, 8] == _ASCII_SPACE)
+        & ((hms >= 0) & (hms <= 9)).all(axis=1)
+        & (time_chars[:, 2] == _ASCII_COLON)
+        & (time_chars[:, 5] == _ASCII_COLON)
+    )
+    hours = hms[:, 0] * 10 + hms[:, 1]
+    minutes = hms[:, 2] * 10 + hms[:, 3]
+    seconds = hms[:, 4] * 10 + hms[:, 5]
+    time_ok &= (hours < 24) & (minutes < 60) & (seconds < 60)
+    valid &= is_daily | time_ok
+
+    seconds_of_day = np.where(is_daily, 0, hours * 3600 + minutes * 60 + seconds)
+
+    month_start = ((year - 1970) * 12 + (month - 1)).astype("datetime64[M]")
+    days_in_month = ((month_start + 1).astype("datetime64[D]") - month_start.astype("datetime64[D]")).astype(np.int64)
+    valid &= day <= days_in_month
+
+    ts = (
+        month_start.astype("datetime64[D]").astype("datetime64[ns]")
+        + ((day - 1) * 86400 + seconds_of_day).astype("timedelta64[s]")
+    )
+    ts[~valid] = np.datetime64("NaT")
+    return ts
+
+
+class BarBuffer:
+    """
+    Columnar accumulator for IB ``BarData`` callbacks.
+
+    Bar fields are written into preallocated NumPy arrays as they arrive (the
+    buffer doubles its capacity when full), and ``to_frame`` builds the final
+    DataFrame once with the dtypes documented for ``TWSAdapter.get_bars``.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        capacity = max(1, int(capacity))
+        self._size = 0
+        self._dates = np.empty(capacity, dtype=f"S{_DATE_WIDTH}")
+        self._prices = np.empty((capacity, 4), dtype=np.float64)
+        self._volume = np.empty(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self):
+        capacity = self._dates.shape[0] * 2
+        self._dates = np.resize(self._dates, capacity)
+        self._prices = np.resize(self._prices, (capacity, 4))
+        self._volume = np.resize(self._volume, capacity)
+
+    def append(self, bar):
+        i = self._size
+        if i == self._dates.shape[0]:
+            self._grow()
+        self._dates[i] = bar.date.encode()
+        self._prices[i] = (bar.open, bar.high, bar.low, bar.close)
+        volume = getattr(bar, "volume", 0)
+        self._volume[i] = np.nan if volume is None else float(volume)
+        self._size = i + 1
+
+    def extend(self, bars):
+        for bar in bars:
+            self.append(bar)
+
+    def to_frame(self) -> pd.DataFrame:
+        n = self._size
+        ts = parse_ib_dates(self._dates[:n])
+        prices = self._prices[:n]
+        volume = self._volume[:n]
+
+        keep = ~np.isnat(ts)
+        order = np.argsort(ts[keep], kind="stable")
+        ts = ts[keep][order]
+        prices = prices[keep][order]
+        volume = volume[keep][order]
+
+        volume_missing = np.isnan(volume)
+        volume_values = np.where(volume_missing, 0, volume).astype(np.int64)
+
+        return pd.DataFrame({
+            "ts": ts,
+            "open": prices[:, 0].copy(),
+            "high": prices[:, 1].copy(),
+            "low": prices[:, 2].copy(),
+            "close": prices[:, 3].copy(),
+            "volume": pd.arrays.IntegerArray(volume_values, volume_missing),
+        })
+
+
+def bars_to_frame(bars, capacity: int | None = None) -> pd.DataFrame:
+    """Decodes an iterable of ``BarData`` into the ``get_bars`` DataFrame layout."""
+    if isinstance(bars, BarBuffer):
+        return bars.to_frame()
+    buffer = BarBuffer(capacity or (len(bars) if hasattr(bars, "__len__") else 1024))
+    buffer.extend(bars)
+    return buffer.to_frame()
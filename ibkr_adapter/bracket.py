@@ -0,0 +1,201 @@
+import copy
+import threading
+import time
+from typing import Callable
+from ibapi.order import Order
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, float("inf"))
+
+# Statuses after which an entry order can no longer fill
+_DONE_STATUSES = ("Filled", "Cancelled", "ApiCancelled", "Inactive")
+
+
+class LatencyHistogram:
+    """Per-bucket counts plus count, mean and max of observed latencies (seconds)."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self._counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else None,
+            "max_ms": self.max * 1000,
+            "histogram": {
+                ("+Inf" if bound == float("inf") else f"{bound:g}"): count
+                for bound, count in zip(self.buckets, self._counts)
+            },
+        }
+
+
+def _order(action: str, order_type: str, transmit: bool, tif: str) -> Order:
+    order = Order()
+    order.action = action
+    order.orderType = order_type
+    order.transmit = transmit
+    if tif:
+        order.tif = tif
+    return order
+
+
+class BracketTemplate:
+    """
+    Parent (limit or market, per `entry_type`), take-profit limit and
+    stop-loss for one contract, side and TIF with every field except ids,
+    quantity and prices filled in. `build` copies the three templates, so a
+    submission costs three shallow copies. Only the stop-loss transmits: IB
+    holds the first two legs until it arrives.
+    """
+
+    __slots__ = ("contract", "expires_at", "_parent", "_take_profit", "_stop_loss")
+
+    def __init__(self, contract, action: str, tif: str = "", expires_at: float = float("inf"),
+                 entry_type: str = "LMT"):
+        exit_action = "SELL" if action == "BUY" else "BUY"
+        self.contract = contract
+        self.expires_at = expires_at
+        self._parent = _order(action, entry_type, False, tif)
+        self._take_profit = _order(exit_action, "LMT", False, tif)
+        self._stop_loss = _order(exit_action, "STP", True, tif)
+
+    def build(self, parent_id: int, quantity, limit_price: float | None, take_profit_price: float,
+              stop_loss_price: float) -> list[Order]:
+        parent = copy.copy(self._parent)
+        parent.orderId = parent_id
+        parent.totalQuantity = quantity
+        if parent.orderType == "LMT":
+            parent.lmtPrice = limit_price
+
+        take_profit = copy.copy(self._take_profit)
+        take_profit.orderId = parent_id + 1
+        take_profit.parentId = parent_id
+        take_profit.totalQuantity = quantity
+        take_profit.lmtPrice = take_profit_price
+
+        stop_loss = copy.copy(self._stop_loss)
+        stop_loss.orderId = parent_id + 2
+        stop_loss.parentId = parent_id
+        stop_loss.totalQuantity = quantity
+        stop_loss.auxPrice = stop_loss_price
+        return [parent, take_profit, stop_loss]
+
+
+class BracketSubmitter:
+    """
+    Hot path for bracket orders.
+
+    Templates are cached per (symbol, asset_type, side, tif, entry_type) with
+    their qualified contract; `prepare` builds them ahead of the first order, and
+    a template is rebuilt once its contract expires (e.g. a futures roll).
+    A submission reserves three order ids, fills in quantity and prices and
+    sends the three legs with one socket write (`TWSClient.place_orders`).
+
+    `on_event` subscribes to ORDER_EVENTS and records submit-to-ack (first
+    openOrder or orderStatus for the parent) and submit-to-fill (parent
+    Filled) latencies in histograms.
+
+    `contract_for(symbol, asset_type)` returns (contract, expires_at);
+    `client_for()` returns the client that places orders.
+    """
+
+    def __init__(self, contract_for: Callable, client_for: Callable, clock=time.perf_counter, wall_clock=time.time):
+        self.contract_for = contract_for
+        self.client_for = client_for
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._lock = threading.Lock()
+        self._templates: dict[tuple, BracketTemplate] = {}
+        # parent orderId -> submit time, until acknowledged / filled or done
+        self._awaiting_ack: dict[int, float] = {}
+        self._awaiting_fill: dict[int, float] = {}
+        self.submitted = 0
+        self.ack_latency = LatencyHistogram()
+        self.fill_latency = LatencyHistogram()
+
+    def cached(self, symbol: str, asset_type: str, side: str, tif: str = "DAY",
+               entry_type: str = "LMT") -> BracketTemplate | None:
+        """The template if it is built and its contract has not expired; never qualifies."""
+        template = self._templates.get((symbol, asset_type, side, tif, entry_type))
+        if template is None or template.expires_at <= self._wall_clock():
+            return None
+        return template
+
+    def template(self, symbol: str, asset_type: str, side: str, tif: str = "DAY",
+                 entry_type: str = "LMT") -> BracketTemplate:
+        template = self.cached(symbol, asset_type, side, tif, entry_type)
+        if template is None:
+            contract, expires_at = self.contract_for(symbol, asset_type)
+            template = self._templates[(symbol, asset_type, side, tif, entry_type)] = BracketTemplate(
+                contract, side, tif, expires_at, entry_type)
+        return template
+
+    def prepare(self, symbol: str, asset_type: str, sides=("BUY", "SELL"), tifs=("DAY",), entry_types=("LMT",)):
+        """Qualifies the contract and builds the templates before the first order."""
+        for side in sides:
+            for tif in tifs:
+                for entry_type in entry_types:
+                    self.template(symbol, asset_type, side, tif, entry_type)
+
+    def submit(self, symbol: str, asset_type: str, qty, side: str, entry: float | None, stop: float, take: float,
+               tif: str = "DAY", before_send: Callable | None = None, entry_type: str = "LMT") -> list[Order]:
+        """
+        Places a bracket and returns its three Orders; `before_send(orders)`
+        runs just before the write. A "MKT" `entry_type` ignores `entry`.
+        """
+        template = self.template(symbol, asset_type, side, tif, entry_type)
+        client = self.client_for()
+        orders = template.build(client._next_order_ids(3), qty, entry, take, stop)
+        if before_send is not None:
+            before_send(orders)
+        parent_id = orders[0].orderId
+        started = self._clock()
+        self._awaiting_ack[parent_id] = started
+        self._awaiting_fill[parent_id] = started
+        client.place_orders(template.contract, orders)
+        self.submitted += 1
+        return orders
+
+    def on_event(self, event: dict):
+        """ORDER_EVENTS subscriber; runs on the reader thread."""
+        kind = event["event"]
+        order_id = event["orderId"]
+        now = self._clock()
+        if kind in ("openOrder", "orderStatus"):
+            started = self._awaiting_ack.pop(order_id, None)
+            if started is not None:
+                with self._lock:
+                    self.ack_latency.observe(now - started)
+        if kind == "orderStatus" and event["status"] in _DONE_STATUSES:
+            started = self._awaiting_fill.pop(order_id, None)
+            if started is not None and event["status"] == "Filled":
+                with self._lock:
+                    self.fill_latency.observe(now - started)
+        elif kind == "error" and order_id in self._awaiting_ack:
+            # Rejected before IB acknowledged it: there will be no ack or fill to time
+            self._awaiting_ack.pop(order_id, None)
+            self._awaiting_fill.pop(order_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "templates": len(self._templates),
+                "awaiting_ack": len(self._awaiting_ack),
+                "awaiting_fill": len(self._awaiting_fill),
+                "submit_to_ack": self.ack_latency.stats(),
+                "submit_to_fill": self.fill_latency.stats(),
+            }
@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import NamedTuple
+from ibapi.contract import Contract
+from loguru import logger
+from ibkr_adapter.mapping import resolve_contract
+
+
+class ContractInfo(NamedTuple):
+    """A contract qualified through reqContractDetails. Immutable; `to_contract` builds a fresh Contract."""
+    con_id: int
+    symbol: str
+    sec_type: str
+    exchange: str
+    primary_exchange: str
+    currency: str
+    local_symbol: str
+    trading_class: str
+    last_trade_date: str
+    multiplier: float
+    min_tick: float
+    time_zone: str
+    trading_hours: str
+    liquid_hours: str
+    # Epoch seconds after which the entry is qualified again (the roll date for futures)
+    expires_at: float
+
+    @classmethod
+    def from_details(cls, details, expires_at: float) -> "ContractInfo":
+        c = details.contract
+        return cls(
+            con_id=int(c.conId),
+            symbol=c.symbol,
+            sec_type=c.secType,
+            exchange=c.exchange,
+            primary_exchange=c.primaryExchange,
+            currency=c.currency,
+            local_symbol=c.localSymbol,
+            trading_class=c.tradingClass,
+            last_trade_date=c.lastTradeDateOrContractMonth,
+            multiplier=float(c.multiplier or 1),
+            min_tick=float(details.minTick or 0.0),
+            time_zone=details.timeZoneId,
+            trading_hours=details.tradingHours,
+            liquid_hours=details.liquidHours,
+            expires_at=expires_at,
+        )
+
+    def to_contract(self) -> Contract:
+        contract = Contract()
+        contract.conId = self.con_id
+        contract.symbol = self.symbol
+        contract.secType = self.sec_type
+        contract.exchange = self.exchange
+        contract.primaryExchange = self.primary_exchange
+        contract.currency = self.currency
+        contract.localSymbol = self.local_symbol
+        contract.tradingClass = self.trading_class
+        contract.lastTradeDateOrContractMonth = self.last_trade_date
+        if self.multiplier != 1:
+            contract.multiplier = f"{self.multiplier:g}"
+        return contract
+
+
+def _last_trade_epoch(last_trade_date: str) -> float:
+    # "YYYYMMDD" or "YYYYMMDD HH:MM:SS ..."; only the date matters for rolling
+    return datetime.strptime(last_trade_date[:8], "%Y%m%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+class ContractIndex:
+    """
+    Persistent index of qualified contracts, one JSON file keyed by
+    "symbol|asset_type|contract_month". Written atomically on every change;
+    with `path=None` it only lives in memory.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, ContractInfo] = {}
+        self._by_con_id: dict[int, ContractInfo] = {}
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                for key, fields in json.load(f).items():
+                    self._add(key, ContractInfo(**fields))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, key: str, info: ContractInfo):
+        self._entries[key] = info
+        self._by_con_id[info.con_id] = info
+
+    def get(self, key: str) -> ContractInfo | None:
+        return self._entries.get(key)
+
+    def by_con_id(self, con_id: int) -> ContractInfo | None:
+        return self._by_con_id.get(con_id)
+
+    def put(self, key: str, info: ContractInfo):
+        with self._lock:
+            self._add(key, info)
+            if not self.path:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({k: v._asdict() for k, v in self._entries.items()}, f)
+            os.replace(tmp, self.path)
+
+
+class ContractResolver:
+    """
+    Qualifies contracts once through reqContractDetails and serves them from a
+    `ContractIndex` afterwards, so orders and history requests skip the round
+    trip and carry a conId.
+
+    Futures without an explicit month resolve to the front month: the earliest
+    expiry whose roll date (`roll_days` before the last trade date) is still
+    ahead. The entry expires at that roll date, and the next call qualifies
+    the following contract. Other entries are refreshed after `ttl` seconds,
+    which keeps trading hours current. Concurrent callers for the same key
+    share one request.
+    """
+
+    def __init__(self, client, index: ContractIndex | None = None, ttl: float = 86400.0, roll_days: int = 5,
+                 timeout: float = 5.0, use_crypto_sec_type: bool = True, clock=time.time):
+        self.client = client
+        self.index = index if index is not None else ContractIndex()
+        self.ttl = ttl
+        self.roll_days = roll_days
+        self.timeout = timeout
+        self.use_crypto_sec_type = use_crypto_sec_type
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future] = {}
+        self.hits = 0
+        self.qualified = 0
+
+    @staticmethod
+    def _key(symbol: str, asset_type: str, contract_month: str | None) -> str:
+        return f"{symbol}|{asset_type}|{contract_month or ''}"
+
+    def cached(self, symbol: str, asset_type: str, contract_month: str | None = None) -> ContractInfo | None:
+        """The indexed entry if it has not expired; never contacts IB."""
+        info = self.index.get(self._key(symbol, asset_type, contract_month))
+        if info is None or info.expires_at <= self._clock():
+            return None
+        self.hits += 1
+        return info
+
+    def qualify(self, symbol: str, asset_type: str, contract_month: str | None = None) -> ContractInfo:
+        info = self.cached(symbol, asset_type, contract_month)
+        if info is not None:
+            return info
+
+        key = self._key(symbol, asset_type, contract_month)
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result(timeout=self.timeout)
+
+        try:
+            info = self._fetch(symbol, asset_type, contract_month)
+            self.index.put(key, info)
+            self.qualified += 1
+            future.set_result(info)
+            return info
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def resolve(self, symbol: str, asset_type: str, contract_month: str | None = None) -> Contract:
+        """A fresh, qualified Contract (conId set) for the symbol."""
+        return self.qualify(symbol, asset_type, contract_month).to_contract()
+
+    def by_con_id(self, con_id: int) -> ContractInfo | None:
+        return self.index.by_con_id(con_id)
+
+    def _fetch(self, symbol: str, asset_type: str, contract_month: str | None) -> ContractInfo:
+        template = resolve_contract(symbol, asset_type, contract_month, use_crypto_sec_type=self.use_crypto_sec_type)
+        if asset_type == "FUT" and not contract_month:
+            template.lastTradeDateOrContractMonth = ""  # ask for every listed expiry
+        details = self.client.get_contract_details(template, timeout=self.timeout)
+        if not details:
+            raise ValueError(f"No contract found for {symbol} ({asset_type})")
+        now = self._clock()
+
+        if asset_type != "FUT":
+            if len(details) > 1:
+                logger.warning(f"{len(details)} contracts match {symbol} ({asset_type}); using conId {details[0].contract.conId}")
+            return ContractInfo.from_details(details[0], now + self.ttl)
+
+        roll = self.roll_days * 86400
+        expiries = sorted(
+            ((_last_trade_epoch(d.contract.lastTradeDateOrContractMonth), d) for d in details),
+            key=lambda item: item[0],
+        )
+        if contract_month:
+            last_trade, chosen = expiries[0]
+            return ContractInfo.from_details(chosen, min(now + self.ttl, last_trade + 86400))
+        for last_trade, chosen in expiries:
+            if last_trade - roll > now:
+                return ContractInfo.from_details(chosen, last_trade - roll)
+        raise ValueError(f"No {symbol} future expires after the next {self.roll_days} days")
+
+    def stats(self) -> dict:
+        return {"entries": len(self.index), "hits": self.hits, "qualified": self.qualified}
@@ -0,0 +1,223 @@
+import threading
+from collections import deque, defaultdict
+from concurrent.futures import Future
+from loguru import logger
+
+# Message types used as the first half of a routing key
+HISTORICAL = "historical"
+ACCOUNT_SUMMARY = "account_summary"
+POSITIONS = "positions"  # the long-lived stream (PortfolioCache); reqPositions has no reqId: routed under 0
+POSITIONS_REQUEST = "positions_request"  # one-shot get_positions downloads, also under 0
+CONTRACT_DETAILS = "contract_details"
+MKTDATA = "mktdata"
+RTBARS = "rtbars"
+CURRENT_TIME = "current_time"
+ACCOUNT_UPDATES = "account_updates"  # reqAccountUpdates has no reqId; routed under 0
+PNL = "pnl"
+
+# Pub/sub topics
+ORDER_EVENTS = "order"
+LIVE_BARS = "live_bars"  # bars closed by ibkr_adapter.aggregator.BarAggregator
+CONNECTION_EVENTS = "connection"  # {"state": "connected" | "disconnected"} from TWSClient
+CONNECTION_STATE = "connection_state"  # metrics from ibkr_adapter.supervisor.ConnectionSupervisor
+
+
+class FutureSink:
+    """One-shot reply: collects items until the End message, then resolves `future` with them."""
+
+    def __init__(self):
+        self.future = Future()
+        self.items = []
+
+    def push(self, item):
+        self.items.append(item)
+
+    def end(self):
+        if not self.future.done():
+            self.future.set_result(self.items)
+
+    def fail(self, exc: Exception):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class StreamSink:
+    """
+    Buffer for streamed replies that never blocks the producer. With `maxlen`
+    it is a ring buffer: when full the oldest item is dropped and counted.
+
+    `ended` is set by the End message. With `keep_after_end` (keepUpToDate
+    streams, where End only marks the end of the backfill) items keep
+    arriving afterwards, so the stream is only `closed` by a failure.
+    """
+
+    def __init__(self, maxlen: int | None = None, keep_after_end: bool = False):
+        self._buf = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.keep_after_end = keep_after_end
+        self.dropped = 0
+        self.ended = False
+        self.closed = False
+        self.error: Exception | None = None
+
+    def __len__(self):
+        return len(self._buf)
+
+    def push(self, item):
+        with self._cond:
+            if self._buf.maxlen is not None and len(self._buf) == self._buf.maxlen:
+                self.dropped += 1
+            self._buf.append(item)
+            self._cond.notify()
+
+    def end(self):
+        with self._cond:
+            self.ended = True
+            self.closed = not self.keep_after_end
+            self._cond.notify_all()
+
+    def fail(self, exc: Exception):
+        with self._cond:
+            self.error = exc
+            self.ended = self.closed = True
+            self._cond.notify_all()
+
+    def take(self, max_items: int = 1, timeout: float | None = None) -> list:
+        """
+        Returns up to `max_items` buffered items, waiting up to `timeout` for the
+        first one. Returns an empty list on timeout, when the sink is closed or
+        fails, or when the End message arrives while waiting.
+        """
+        with self._cond:
+            if not self._buf and not self.closed:
+                ended = self.ended
+                self._cond.wait_for(lambda: self._buf or self.closed or self.ended != ended, timeout)
+            n = min(max_items, len(self._buf))
+            return [self._buf.popleft() for _ in range(n)]
+
+
+class CallbackSink:
+    """Forwards each item to `callback` on the reader thread; the callback must not block."""
+
+    def __init__(self, callback, on_end=None):
+        self.callback = callback
+        self.on_end = on_end
+
+    def push(self, item):
+        self.callback(item)
+
+    def end(self):
+        if self.on_end:
+            self.on_end()
+
+    def fail(self, exc: Exception):
+        logger.warning(f"Stream failed: {exc}")
+        self.end()
+
+
+class EventRouter:
+    """
+    Routes ibapi callbacks to registered sinks keyed by (message type, reqId),
+    and fans out events without a reqId (order updates) to subscribers.
+
+    Sinks are dropped automatically on their End message unless registered
+    with `keep_after_end` (e.g. keepUpToDate streams). Callbacks for keys with
+    no sink are counted and discarded, so the reader thread never blocks and
+    nothing accumulates for requests nobody waits on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sinks: dict[tuple, tuple] = {}
+        self._subscribers: dict[str, list] = defaultdict(list)
+        self.unrouted = 0
+
+    def __len__(self):
+        """Registered sinks, i.e. requests and streams in flight; used as a load measure."""
+        return len(self._sinks)
+
+    def register(self, msg_type: str, req_id, sink, keep_after_end: bool = False):
+        with self._lock:
+            self._sinks[(msg_type, req_id)] = (sink, keep_after_end)
+        return sink
+
+    def unregister(self, msg_type: str, req_id):
+        with self._lock:
+            entry = self._sinks.pop((msg_type, req_id), None)
+        return entry[0] if entry else None
+
+    def get(self, msg_type: str, req_id):
+        entry = self._sinks.get((msg_type, req_id))
+        return entry[0] if entry else None
+
+    def dispatch(self, msg_type: str, req_id, item) -> bool:
+        entry = self._sinks.get((msg_type, req_id))
+        if entry is None:
+            self.unrouted += 1
+            return False
+        entry[0].push(item)
+        return True
+
+    def end(self, msg_type: str, req_id):
+        with self._lock:
+            entry = self._sinks.get((msg_type, req_id))
+            if entry is not None and not entry[1]:
+                del self._sinks[(msg_type, req_id)]
+        if entry is not None:
+            entry[0].end()
+
+    def fail(self, req_id, exc: Exception) -> int:
+        """Fails and removes every sink registered under `req_id`; returns how many."""
+        with self._lock:
+            keys = [k for k in self._sinks if k[1] == req_id]
+            entries = [self._sinks.pop(k) for k in keys]
+        for sink, _ in entries:
+            sink.fail(exc)
+        return len(entries)
+
+    def fail_all(self, exc: Exception) -> int:
+        """Fails and removes every registered sink, e.g. when the connection drops."""
+        with self._lock:
+            entries = list(self._sinks.values())
+            self._sinks.clear()
+        for sink, _ in entries:
+            sink.fail(exc)
+        return len(entries)
+
+    def subscribe(self, topic: str, callback):
+        """Registers `callback(event)` for `topic` and returns a function that removes it."""
+        with self._lock:
+            self._subscribers[topic] = self._subscribers[topic] + [callback]
+
+        def unsubscribe():
+            with self._lock:
+                self._subscribers[topic] = [cb for cb in self._subscribers[topic] if cb is not callback]
+        return unsubscribe
+
+    def publish(self, topic: str, event):
+        # Copy-on-write subscriber lists: reading needs no lock on the reader thread
+        for callback in self._subscribers.get(topic, ()):
+            try:
+                callback(event)
+            except Exception as e:
+                logger.exception(f"Subscriber for '{topic}' failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_type = defaultdict(int)
+            for msg_type, _ in self._sinks:
+                by_type[msg_type] += 1
+            return {
+                "sinks": len(self._sinks),
+                "sinks_by_type": dict(by_type),
+                "subscribers": {topic: len(cbs) for topic, cbs in self._subscribers.items() if cbs},
+                "unrouted": self.unrouted,
+            }
+
+
+def wait_future(future: Future, timeout: float, what: str):
+    """Waits on a one-shot reply, raising TimeoutError like the rest of the client."""
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        raise TimeoutError(f"Timeout waiting for {what}")
@@ -0,0 +1,222 @@
+import asyncio
+import time
+from collections import deque
+from loguru import logger
+from ibapi.ticktype import TickTypeEnum
+from ibkr_adapter.dispatch import MKTDATA, RTBARS
+from ibkr_adapter.mapping import resolve_contract
+
+TICKS = "ticks"
+BARS = "bars"
+
+
+class ClientQueue:
+    """
+    Bounded per-client event queue living on the event loop. When the client
+    falls behind, the oldest events are dropped and counted; past `max_dropped`
+    drops the client is closed as a slow consumer.
+    """
+
+    def __init__(self, maxsize: int = 1000, max_dropped: int | None = None):
+        self.maxsize = maxsize
+        self.max_dropped = max_dropped
+        self.dropped = 0
+        self.delivered = 0
+        self.closed = False
+        self.close_reason: str | None = None
+        self._buf = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._buf)
+
+    def put(self, event: dict):
+        if self.closed:
+            return
+        if len(self._buf) >= self.maxsize:
+            self.dropped += 1
+            if self.max_dropped is not None and self.dropped > self.max_dropped:
+                self.close("slow consumer")
+                return
+            self._buf.popleft()
+        self._buf.append(event)
+        self._ready.set()
+
+    def close(self, reason: str | None = None):
+        self.closed = True
+        self.close_reason = self.close_reason or reason
+        self._ready.set()
+
+    async def get(self, timeout: float | None = None) -> dict | None:
+        """Next event; None on timeout. Raises EOFError once closed and drained."""
+        while not self._buf:
+            if self.closed:
+                raise EOFError(self.close_reason or "closed")
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        self.delivered += 1
+        return self._buf.popleft()
+
+
+class _Subscription:
+    def __init__(self, hub: "StreamHub", key: tuple, msg_type: str, req_id: int):
+        self.hub = hub
+        self.key = key
+        self.msg_type = msg_type
+        self.req_id = req_id
+        self.clients: tuple[ClientQueue, ...] = ()  # copy-on-write: read from the reader thread
+        self.events = 0
+
+    # Sink interface, called on the ibapi reader thread
+    def push(self, item):
+        self.events += 1
+        self.hub._post(self, self.hub._event(self, item))
+
+    def end(self):
+        pass
+
+    def fail(self, exc: Exception):
+        self.hub._on_fail(self, exc)
+
+
+class StreamHub:
+    """
+    Fans out live ticks (reqMktData) and 5-second bars (reqRealTimeBars) from
+    one IB subscription per (kind, symbol, asset_type) to any number of clients.
+
+    Subscriptions are reference counted: the first client opens the IB line and
+    the last one to leave cancels it. Each event crosses from the reader thread
+    to the event loop once and is then copied into every client's bounded
+    queue, so a slow client only loses its own oldest events.
+
+    Streams survive reconnects (`TWSClient` resubscribes with the same reqId);
+    clients get a `status` event when the connection drops. Any other IB error
+    for a subscription ends it, with an `error` event to its clients.
+    """
+
+    def __init__(self, client, loop: asyncio.AbstractEventLoop | None = None, queue_size: int = 1000,
+                 max_dropped: int | None = None, what_to_show: str = "TRADES", use_rth: int = 0,
+                 resolve=resolve_contract):
+        self.client = client
+        self.resolve = resolve  # (symbol, asset_type) -> Contract; may block on IB, so call it off the loop
+        self.loop = loop
+        self.queue_size = queue_size
+        self.max_dropped = max_dropped
+        self.what_to_show = what_to_show
+        self.use_rth = use_rth
+        self._subs: dict[tuple, _Subscription] = {}
+
+    def new_client(self) -> ClientQueue:
+        return ClientQueue(self.queue_size, self.max_dropped)
+
+    def subscribe(self, kind: str, symbol: str, asset_type: str, queue: ClientQueue, contract=None) -> tuple:
+        """
+        Adds `queue` to the stream for (kind, symbol, asset_type); must be called
+        on the event loop. `contract` is used if a new IB line is opened, and is
+        resolved here (possibly blocking) when not given.
+        """
+        if kind not in (TICKS, BARS):
+            raise ValueError(f"Unknown stream kind: {kind}")
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        key = (kind, symbol, asset_type)
+        sub = self._subs.get(key)
+        if sub is None:
+            if contract is None:
+                contract = self.resolve(symbol, asset_type)
+            req_id = self.client._next_req_id()
+            sub = _Subscription(self, key, MKTDATA if kind == TICKS else RTBARS, req_id)
+            self._subs[key] = sub
+            self.client.router.register(sub.msg_type, req_id, sub, keep_after_end=True)
+            try:
+                if kind == TICKS:
+                    self.client.reqMktData(req_id, contract, "", False, False, [])
+                else:
+                    self.client.reqRealTimeBars(req_id, contract, 5, self.what_to_show, self.use_rth, [])
+            except BaseException:
+                self._close_subscription(sub, cancel=False)  # nothing was opened at IB
+                raise
+            logger.info(f"Opened {kind} stream for {symbol} ({asset_type}), reqId={req_id}")
+        if queue not in sub.clients:
+            sub.clients = sub.clients + (queue,)
+        return key
+
+    def unsubscribe(self, key: tuple, queue: ClientQueue):
+        sub = self._subs.get(key)
+        if sub is None:
+            return
+        sub.clients = tuple(q for q in sub.clients if q is not queue)
+        if not sub.clients:
+            self._close_subscription(sub)
+
+    def unsubscribe_all(self, queue: ClientQueue):
+        for key in [k for k, sub in self._subs.items() if queue in sub.clients]:
+            self.unsubscribe(key, queue)
+
+    def _close_subscription(self, sub: _Subscription, cancel: bool = True):
+        if self._subs.get(sub.key) is not sub:
+            return
+        del self._subs[sub.key]
+        self.client.router.unregister(sub.msg_type, sub.req_id)
+        if cancel:
+            try:
+                if sub.msg_type == MKTDATA:
+                    self.client.cancelMktData(sub.req_id)
+                else:
+                    self.client.cancelRealTimeBars(sub.req_id)
+            except Exception as e:
+                logger.warning(f"Failed to cancel stream reqId={sub.req_id}: {e}")
+        logger.info(f"Closed {sub.key[0]} stream for {sub.key[1]}, reqId={sub.req_id}")
+
+    def _event(self, sub: _Subscription, item) -> dict:
+        kind, symbol, _ = sub.key
+        if kind == TICKS:
+            field, tick_type, value = item
+            return {"type": "tick", "symbol": symbol, "field": field, "tick": TickTypeEnum.to_str(tick_type),
+                    "value": value, "ts": time.time()}
+        return {"type": "bar", "symbol": symbol, **item}
+
+    def _post(self, sub: _Subscription, event: dict):
+        # One hop to the loop per event, whatever the number of clients
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, sub, event)
+        except RuntimeError:
+            pass  # loop closed during shutdown
+
+    @staticmethod
+    def _deliver(sub: _Subscription, event: dict):
+        for queue in sub.clients:
+            queue.put(event)
+
+    def _on_fail(self, sub: _Subscription, exc: Exception):
+        if isinstance(exc, ConnectionError):
+            # The client replays the request on reconnect; keep routing to this sink
+            self.client.router.register(sub.msg_type, sub.req_id, sub, keep_after_end=True)
+            self._post(sub, {"type": "status", "symbol": sub.key[1], "state": "disconnected", "message": str(exc)})
+            return
+        self._post(sub, {"type": "error", "symbol": sub.key[1], "message": str(exc)})
+        self.loop.call_soon_threadsafe(self._end_subscription, sub, str(exc))
+
+    def _end_subscription(self, sub: _Subscription, reason: str):
+        clients = sub.clients
+        self._close_subscription(sub)
+        for queue in clients:
+            # A client with other live streams keeps its connection
+            if not any(queue in other.clients for other in self._subs.values()):
+                queue.close(reason)
+
+    def stats(self) -> dict:
+        return {
+            "subscriptions": {
+                f"{kind}:{symbol}:{asset_type}": {
+                    "req_id": sub.req_id,
+                    "clients": len(sub.clients),
+                    "events": sub.events,
+                }
+                for (kind, symbol, asset_type), sub in self._subs.items()
+            },
+            "ib_lines": len(self._subs),
+        }
@@ -1,55 +1,53 @@
 from ibapi.contract import Contract
 from functools import lru_cache
-from datetime import datetime
+from datetime import date
 
-@lru_cache(maxsize=None)
-def resolve_contract(symbol: str, asset_type: str, contract_month: str = None, use_crypto_sec_type: bool = True) -> Contract:
-    """
-    Resolves a symbol and asset type to an IBKR contract.
-    """
-    contract = Contract()
-    contract.currency = "USD"
+# Exchange `resolve_contract` routes each IB secType to, for contracts built without one
+SEC_TYPE_EXCHANGES = {"STK": "SMART", "CASH": "IDEALPRO", "FUT": "CME", "CRYPTO": "PAXOS"}
+
+def _next_month(today: date | None = None) -> str:
+    today = today or date.today()
+    year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+    return f"{year}{month:02d}"
+
+@lru_cache(maxsize=4096)
+def _contract_fields(symbol: str, asset_type: str, contract_month: str | None, use_crypto_sec_type: bool) -> tuple:
+    """Contract attributes for a symbol as immutable (name, value) pairs."""
+    fields = {"currency": "USD"}
 
     if asset_type == "STK":
-        contract.secType = "STK"
-        contract.exchange = "SMART"
-        contract.symbol = symbol
+        fields.update(secType="STK", exchange="SMART", symbol=symbol)
     elif asset_type == "FX":
-        contract.secType = "CASH"
-        contract.exchange = "IDEALPRO"
-        contract.symbol = symbol.split('.')[0]
-        contract.currency = symbol.split('.')[1]
+        fields.update(secType="CASH", exchange="IDEALPRO", symbol=symbol.split('.')[0], currency=symbol.split('.')[1])
     elif asset_type == "FUT":
-        contract.secType = "FUT"
-        contract.exchange = "CME"
-        contract.symbol = symbol
-        if contract_month:
-            contract.lastTradeDateOrContractMonth = contract_month
-        else:
-            # Default to next month if not provided
-            now = datetime.now()
-            year = now.year
-            month = now.month + 1
-            if month > 12:
-                month = 1
-                year += 1
-            contract.lastTradeDateOrContractMonth = f"{year}{month:02d}"
+        fields.update(secType="FUT", exchange="CME", symbol=symbol)
+        if contract_month is not None:
+            fields["lastTradeDateOrContractMonth"] = contract_month
     elif asset_type == "CRYPTO":
         if use_crypto_sec_type:
-            contract.secType = "CRYPTO"
-            contract.exchange = "PAXOS"
-            contract.symbol = symbol
+            fields.update(secType="CRYPTO", exchange="PAXOS", symbol=symbol)
+        elif '.' in symbol:
+            parts = symbol.split('.')
+            fields.update(secType="CASH", exchange="PAXOS", symbol=parts[0], currency=parts[1])
         else:
-            contract.secType = "CASH"
-            contract.exchange = "PAXOS"
-            if '.' in symbol:
-                parts = symbol.split('.')
-                contract.symbol = parts[0]
-                contract.currency = parts[1]
-            else:
-                contract.symbol = symbol
-                contract.currency = "USD"
+            fields.update(secType="CASH", exchange="PAXOS", symbol=symbol)
     else:
         raise ValueError(f"Unsupported asset type: {asset_type}")
 
+    return tuple(fields.items())
+
+def resolve_contract(symbol: str, asset_type: str, contract_month: str = None, use_crypto_sec_type: bool = True) -> Contract:
+    """
+    Resolves a symbol and asset type to an IBKR contract.
+
+    Every call returns a new Contract, so callers may modify it. Futures
+    without `contract_month` default to next month, computed on each call;
+    `ContractResolver` (ibkr_adapter/contracts.py) picks the actual front
+    month from IB.
+    """
+    if asset_type == "FUT" and not contract_month:
+        contract_month = _next_month()
+    contract = Contract()
+    for name, value in _contract_fields(symbol, asset_type, contract_month, use_crypto_sec_type):
+        setattr(contract, name, value)
     return contract
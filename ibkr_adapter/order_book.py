@@ -0,0 +1,379 @@
+import json
+import os
+import threading
+import time
+from loguru import logger
+from ibapi.common import UNSET_DOUBLE
+
+# Order states. IB statuses map onto these; NEW, PARTIALLY_FILLED and REJECTED are ours.
+NEW = "New"                          # tracked locally, not yet acknowledged by IB
+PENDING_SUBMIT = "PendingSubmit"
+PRE_SUBMITTED = "PreSubmitted"
+SUBMITTED = "Submitted"
+PARTIALLY_FILLED = "PartiallyFilled"
+PENDING_CANCEL = "PendingCancel"
+INACTIVE = "Inactive"
+FILLED = "Filled"
+CANCELLED = "Cancelled"
+REJECTED = "Rejected"
+
+TERMINAL_STATES = frozenset((FILLED, CANCELLED, REJECTED))
+
+IB_STATUS = {
+    "ApiPending": PENDING_SUBMIT,
+    "PendingSubmit": PENDING_SUBMIT,
+    "PreSubmitted": PRE_SUBMITTED,
+    "Submitted": SUBMITTED,
+    "ApiCancelled": CANCELLED,
+    "PendingCancel": PENDING_CANCEL,
+    "Cancelled": CANCELLED,
+    "Filled": FILLED,
+    "Inactive": INACTIVE,
+}
+
+# Error 202: "Order Canceled - reason: ..."
+ORDER_CANCELLED_CODE = 202
+# Order errors that mean IB refused an order (202, a confirmed cancel, is not one)
+REJECTION_CODES = frozenset({103, 104, 105, 110, 135, 161, 201, 203, 382, 383})
+# IB statuses that show an order working or done; they overrule a rejection inferred from an error
+ACCEPTED_STATES = frozenset((PRE_SUBMITTED, SUBMITTED, PARTIALLY_FILLED, FILLED))
+
+
+def _price(value) -> float | None:
+    return None if value is None or value == UNSET_DOUBLE else float(value)
+
+
+class OrderRecord:
+    """Current state of one order. Mutated only by `OrderBook`, under its lock."""
+
+    __slots__ = ("order_id", "perm_id", "plan_id", "symbol", "asset_type", "side", "qty", "order_type",
+                 "limit_price", "stop_price", "parent_id", "children", "state", "filled", "remaining",
+                 "avg_fill_price", "last_fill_price", "exec_ids", "last_error", "created_at", "updated_at")
+
+    def __init__(self, order_id: int, ts: float):
+        self.order_id = order_id
+        self.perm_id: int | None = None
+        self.plan_id: str | None = None
+        self.symbol: str | None = None
+        self.asset_type: str | None = None
+        self.side: str | None = None
+        self.qty = 0.0
+        self.order_type: str | None = None
+        self.limit_price: float | None = None
+        self.stop_price: float | None = None
+        self.parent_id: int | None = None
+        self.children: list[int] = []
+        self.state = NEW
+        self.filled = 0.0
+        self.remaining: float | None = None
+        self.avg_fill_price: float | None = None
+        self.last_fill_price: float | None = None
+        self.exec_ids: set[str] = set()
+        self.last_error: str | None = None
+        self.created_at = ts
+        self.updated_at = ts
+
+    @property
+    def is_open(self) -> bool:
+        return self.state not in TERMINAL_STATES
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if name != "exec_ids"} | {
+            "children": list(self.children),
+        }
+
+
+class OrderBook:
+    """
+    In-memory book of orders fed by the ORDER_EVENTS topic (`openOrder`,
+    `orderStatus`, `execDetails` and order errors from `TWSClient`).
+
+    Each order runs a small state machine: terminal states (Filled,
+    Cancelled, Rejected) are final, except that IB working or filling an
+    order overrules a rejection inferred from one of the REJECTION_CODES
+    errors. A status reporting fewer filled shares than already seen is
+    stale and ignored, since IB does not guarantee the order of status
+    messages. Submitted with a partial fill
+    becomes PartiallyFilled. Orders are indexed by orderId, permId, plan_id
+    and symbol, and bracket children are linked to their parent, so status
+    and open-order queries are dictionary lookups instead of IB round trips.
+
+    Every change is appended to a JSONL journal (`journal_path`) as a
+    normalized record; a new book replays it to recover its state after a
+    restart. With `journal_path=None` the book only lives in memory.
+    """
+
+    def __init__(self, journal_path: str | None = None, clock=time.time):
+        self.journal_path = journal_path
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._by_id: dict[int, OrderRecord] = {}
+        self._by_perm_id: dict[int, OrderRecord] = {}
+        self._by_plan: dict[str, list[int]] = {}
+        self._by_symbol: dict[str, set[int]] = {}
+        self._open: set[int] = set()
+        self.events = 0
+        self.stale = 0
+        self._fill_listeners: tuple = ()
+        self._journal = None
+        if journal_path:
+            if os.path.exists(journal_path):
+                self._replay(journal_path)
+            os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+            self._journal = open(journal_path, "a", encoding="utf-8")
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    # --- Writes -----------------------------------------------------------
+
+    def track(self, order, symbol: str, asset_type: str, plan_id: str | None = None) -> OrderRecord:
+        """Records an `ibapi.order.Order` before it is placed, so its first status finds it."""
+        return self._record({
+            "type": "track",
+            "order_id": int(order.orderId),
+            "plan_id": plan_id,
+            "symbol": symbol,
+            "asset_type": asset_type,
+            "side": order.action,
+            "qty": float(order.totalQuantity),
+            "order_type": order.orderType,
+            "limit_price": _price(order.lmtPrice),
+            "stop_price": _price(order.auxPrice),
+            "parent_id": order.parentId or None,
+        })
+
+    def track_bracket(self, orders: list, symbol: str, asset_type: str, plan_id: str | None = None) -> list[OrderRecord]:
+        """Tracks the parent, take-profit and stop-loss from `TWSClient.make_bracket_order`."""
+        return [self.track(o, symbol, asset_type, plan_id) for o in orders]
+
+    def on_event(self, event: dict):
+        """ORDER_EVENTS subscriber; runs on the reader thread."""
+        kind = event["event"]
+        if kind == "orderStatus":
+            record = {
+                "type": "status",
+                "order_id": int(event["orderId"]),
+                "status": event["status"],
+                "filled": float(event["filled"]),
+                "remaining": float(event["remaining"]),
+                "avg_fill_price": float(event["avgFillPrice"]),
+                "last_fill_price": float(event["lastFillPrice"]),
+                "perm_id": int(event["permId"]) or None,
+                "parent_id": int(event["parentId"]) or None,
+            }
+        elif kind == "openOrder":
+            contract, order = event["contract"], event["order"]
+            record = {
+                "type": "open",
+                "order_id": int(event["orderId"]),
+                "perm_id": int(order.permId) or None,
+                "symbol": contract.symbol,
+                "asset_type": contract.secType,
+                "side": order.action,
+                "qty": float(order.totalQuantity),
+                "order_type": order.orderType,
+                "limit_price": _price(order.lmtPrice),
+                "stop_price": _price(order.auxPrice),
+                "parent_id": order.parentId or None,
+                "status": event["orderState"].status,
+            }
+        elif kind == "execDetails":
+            execution, contract = event["execution"], event["contract"]
+            record = {
+                "type": "exec",
+                "order_id": int(execution.orderId),
+                "exec_id": execution.execId,
+                "perm_id": int(execution.permId) or None,
+                "cum_qty": float(execution.cumQty),
+                "avg_price": float(execution.avgPrice),
+                "price": float(execution.price),
+                "symbol": contract.symbol,
+                "asset_type": contract.secType,
+                "side": execution.side,
+                "shares": float(execution.shares),
+                "time": execution.time,
+            }
+        elif kind == "error":
+            with self._lock:
+                if event["orderId"] not in self._by_id:
+                    return  # request errors share the topic; only orders we know matter
+            record = {"type": "error", "order_id": int(event["orderId"]), "code": event["code"], "message": event["message"]}
+        else:
+            return
+        self._record(record)
+
+    def subscribe_fills(self, callback):
+        """
+        Calls `callback(record)` with each execution record the first time it
+        is journaled (redeliveries are skipped). Returns a function that removes it.
+        """
+        self._fill_listeners = self._fill_listeners + (callback,)
+
+        def unsubscribe():
+            self._fill_listeners = tuple(cb for cb in self._fill_listeners if cb is not callback)
+        return unsubscribe
+
+    def _record(self, record: dict) -> OrderRecord:
+        record["ts"] = self._clock()
+        with self._lock:
+            self.events += 1
+            fill = record["type"] == "exec" and record["exec_id"] not in getattr(
+                self._by_id.get(record["order_id"]), "exec_ids", ())
+            order = self._apply(record)
+            if self._journal is not None:
+                self._journal.write(json.dumps(record) + "\n")
+                self._journal.flush()
+        if fill:
+            for callback in self._fill_listeners:
+                try:
+                    callback(record)
+                except Exception as e:
+                    logger.exception(f"Fill listener failed: {e}")
+        return order
+
+    def _replay(self, path: str):
+        replayed = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping a truncated line in order journal {path}")
+                    continue
+                self._apply(record)
+                replayed += 1
+        logger.info(f"Replayed {replayed} order journal records: {len(self._by_id)} orders, {len(self._open)} open")
+
+    # --- State machine ----------------------------------------------------
+
+    def _apply(self, record: dict) -> OrderRecord:
+        order_id, ts = record["order_id"], record["ts"]
+        order = self._by_id.get(order_id)
+        if order is None:
+            order = self._by_id[order_id] = OrderRecord(order_id, ts)
+            self._open.add(order_id)
+        order.updated_at = ts
+        kind = record["type"]
+
+        if kind in ("track", "open"):
+            # Keep the caller's symbol ("EUR.USD") over IB's contract symbol ("EUR")
+            if order.symbol is None:
+                order.symbol, order.asset_type = record["symbol"], record["asset_type"]
+                self._by_symbol.setdefault(order.symbol, set()).add(order_id)
+            for name in ("side", "qty", "order_type", "limit_price", "stop_price"):
+                setattr(order, name, record[name])
+            if kind == "track" and record["plan_id"]:
+                self._set_plan_id(order, record["plan_id"])
+            self._link_parent(order, record["parent_id"])
+            if kind == "open":
+                self._set_perm_id(order, record["perm_id"])
+                self._transition(order, record["status"])
+        elif kind == "status":
+            if record["filled"] < order.filled:
+                self.stale += 1
+                return order
+            self._set_perm_id(order, record["perm_id"])
+            self._link_parent(order, record["parent_id"])
+            order.filled = record["filled"]
+            order.remaining = record["remaining"]
+            if order.filled:
+                order.avg_fill_price = record["avg_fill_price"]
+                order.last_fill_price = record["last_fill_price"]
+            self._transition(order, record["status"])
+        elif kind == "exec":
+            # Executions can be redelivered (reqExecutions, reconnects); count each once
+            if record["exec_id"] not in order.exec_ids:
+                order.exec_ids.add(record["exec_id"])
+                self._set_perm_id(order, record["perm_id"])
+                if record["cum_qty"] > order.filled:
+                    order.filled = record["cum_qty"]
+                    order.avg_fill_price = record["avg_price"]
+                    order.last_fill_price = record["price"]
+                    if order.qty:
+                        order.remaining = max(0.0, order.qty - order.filled)
+                        self._transition(order, FILLED if order.remaining == 0 else SUBMITTED)
+        elif kind == "error":
+            order.last_error = f"{record['code']}: {record['message']}"
+            if record["code"] == ORDER_CANCELLED_CODE:
+                self._transition(order, CANCELLED)
+            elif record["code"] in REJECTION_CODES and order.state in (NEW, PENDING_SUBMIT):
+                self._transition(order, REJECTED)
+        return order
+
+    def _transition(self, order: OrderRecord, status: str):
+        if not status:
+            return
+        state = IB_STATUS.get(status, status)
+        if state == SUBMITTED and order.filled and order.remaining:
+            state = PARTIALLY_FILLED
+        if order.state in TERMINAL_STATES and not (order.state == REJECTED and state in ACCEPTED_STATES):
+            if state != order.state:
+                self.stale += 1
+            return
+        order.state = state
+        if state in TERMINAL_STATES:
+            self._open.discard(order.order_id)
+        else:
+            self._open.add(order.order_id)
+
+    def _set_perm_id(self, order: OrderRecord, perm_id: int | None):
+        if perm_id and order.perm_id != perm_id:
+            order.perm_id = perm_id
+            self._by_perm_id[perm_id] = order
+
+    def _link_parent(self, order: OrderRecord, parent_id: int | None):
+        if not parent_id or order.parent_id == parent_id:
+            return
+        order.parent_id = parent_id
+        parent = self._by_id.get(parent_id)
+        if parent is not None and order.order_id not in parent.children:
+            parent.children.append(order.order_id)
+            if order.plan_id is None and parent.plan_id is not None:
+                self._set_plan_id(order, parent.plan_id)
+
+    def _set_plan_id(self, order: OrderRecord, plan_id: str):
+        if order.plan_id != plan_id:
+            order.plan_id = plan_id
+            self._by_plan.setdefault(plan_id, []).append(order.order_id)
+
+    # --- Queries ----------------------------------------------------------
+
+    def get(self, order_id: int) -> OrderRecord | None:
+        return self._by_id.get(order_id)
+
+    def by_perm_id(self, perm_id: int) -> OrderRecord | None:
+        return self._by_perm_id.get(perm_id)
+
+    def by_plan(self, plan_id: str) -> list[OrderRecord]:
+        with self._lock:
+            return [self._by_id[i] for i in self._by_plan.get(plan_id, ())]
+
+    def by_symbol(self, symbol: str) -> list[OrderRecord]:
+        with self._lock:
+            return [self._by_id[i] for i in self._by_symbol.get(symbol, ())]
+
+    def bracket(self, order_id: int) -> list[OrderRecord]:
+        """The parent of `order_id`'s bracket followed by its children."""
+        with self._lock:
+            order = self._by_id.get(order_id)
+            if order is None:
+                return []
+            if order.parent_id in self._by_id:
+                order = self._by_id[order.parent_id]
+            return [order] + [self._by_id[i] for i in order.children]
+
+    def open_orders(self, symbol: str | None = None) -> list[OrderRecord]:
+        with self._lock:
+            ids = self._open if symbol is None else self._open & self._by_symbol.get(symbol, set())
+            return [self._by_id[i] for i in ids]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"orders": len(self._by_id), "open": len(self._open), "events": self.events, "stale": self.stale}
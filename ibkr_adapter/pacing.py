@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import deque
+from loguru import logger
+
+# Upper bounds (seconds) of the wait-time histogram buckets
+WAIT_BUCKETS = (0.0, 0.1, 0.5, 1.0, 2.0, 5.0, 15.0, 60.0, 300.0, float("inf"))
+
+
+class HistPacer:
+    """
+    Admission gate for reqHistoricalData modelling IB's historical pacing rules:
+
+    * at most `max_requests` requests in any `window` seconds (60 per 10 min),
+    * no identical request within `identical_window` seconds (15 s),
+    * fewer than six requests for the same contract, exchange and tick type
+      within `contract_window` seconds (`contract_max` = 5 per 2 s).
+
+    A request is admitted as soon as all three rules allow it. Waiting threads
+    sleep without holding the pacer lock, so requests for other contracts are
+    not queued behind them.
+    """
+
+    def __init__(self, max_requests: int = 60, window: float = 600.0,
+                 identical_window: float = 15.0,
+                 contract_max: int = 5, contract_window: float = 2.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.max_requests = max_requests
+        self.window = window
+        self.identical_window = identical_window
+        self.contract_max = contract_max
+        self.contract_window = contract_window
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=max_requests)
+        self._last_identical: dict = {}
+        self._by_contract: dict = {}
+        self._admitted = 0
+        self._delayed = 0
+        self._total_wait = 0.0
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._wait_hist = [0] * len(WAIT_BUCKETS)
+
+    def _delay(self, request_key, contract_key, now: float) -> float:
+        delay = 0.0
+        if len(self._recent) >= self.max_requests:
+            delay = max(delay, self._recent[0] + self.window - now)
+        last = self._last_identical.get(request_key)
+        if last is not None:
+            delay = max(delay, last + self.identical_window - now)
+        burst = self._by_contract.get(contract_key)
+        if burst is not None and len(burst) >= self.contract_max:
+            delay = max(delay, burst[0] + self.contract_window - now)
+        return delay
+
+    def _record(self, request_key, contract_key, now: float):
+        self._recent.append(now)
+        self._last_identical[request_key] = now
+        burst = self._by_contract.get(contract_key)
+        if burst is None:
+            burst = self._by_contract[contract_key] = deque(maxlen=self.contract_max)
+        burst.append(now)
+        self._admitted += 1
+        if self._admitted % 256 == 0:
+            self._prune(now)
+
+    def _prune(self, now: float):
+        horizon = now - self.identical_window
+        self._last_identical = {k: t for k, t in self._last_identical.items() if t > horizon}
+        horizon = now - self.contract_window
+        self._by_contract = {k: d for k, d in self._by_contract.items() if d[-1] > horizon}
+
+    def _observe_wait(self, waited: float):
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if waited <= bound:
+                self._wait_hist[i] += 1
+                break
+        self._total_wait += waited
+        if waited > 0:
+            self._delayed += 1
+
+    def try_acquire(self, request_key, contract_key) -> float:
+        """
+        Admits the request and returns 0.0 if it is legal now; otherwise returns
+        the number of seconds until it may become legal, without recording it.
+        """
+        with self._lock:
+            now = self._clock()
+            delay = self._delay(request_key, contract_key, now)
+            if delay <= 0:
+                self._record(request_key, contract_key, now)
+                self._observe_wait(0.0)
+            return max(0.0, delay)
+
+    def acquire(self, request_key, contract_key, timeout: float | None = None, slot=None) -> float:
+        """
+        Blocks until the request is legal, records it and returns the time waited.
+        Raises TimeoutError if it cannot be admitted within `timeout` seconds.
+
+        `slot` is a semaphore the caller already holds (the historical
+        concurrency slot): it is released while the request waits and taken
+        again before admission, so a paced request does not hold up others and
+        is recorded when it is actually sent. On error the slot is not held.
+        """
+        start = self._clock()
+        queued = False
+        held = slot is not None
+        try:
+            while True:
+                with self._lock:
+                    now = self._clock()
+                    delay = self._delay(request_key, contract_key, now)
+                    if delay <= 0:
+                        self._record(request_key, contract_key, now)
+                        waited = now - start if queued else 0.0
+                        self._observe_wait(waited)
+                        return waited
+                    if timeout is not None and now + delay - start > timeout:
+                        raise TimeoutError(f"Historical pacing wait of {delay:.1f}s exceeds timeout")
+                    if not queued:
+                        queued = True
+                        self._queue_depth += 1
+                        self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+                logger.debug(f"Historical request paced, waiting {delay:.2f}s")
+                if held:
+                    slot.release()
+                    held = False
+                self._sleep(delay)
+                if slot is not None:
+                    remaining = None if timeout is None else max(0.0, timeout - (self._clock() - start))
+                    if not slot.acquire(timeout=remaining):
+                        raise TimeoutError("Historical semaphore acquire timeout")
+                    held = True
+        except BaseException:
+            if held:
+                slot.release()
+            raise
+        finally:
+            if queued:
+                with self._lock:
+                    self._queue_depth -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            return {
+                "admitted": self._admitted,
+                "delayed": self._delayed,
+                "total_wait_sec": self._total_wait,
+                "queue_depth": self._queue_depth,
+                "max_queue_depth": self._max_queue_depth,
+                "requests_in_window": sum(1 for t in self._recent if t > now - self.window),
+                "wait_histogram": {
+                    ("+Inf" if bound == float("inf") else f"{bound:g}"): count
+                    for bound, count in zip(WAIT_BUCKETS, self._wait_hist)
+                },
+            }
+
+
+def contract_key(contract) -> tuple:
+    """Identity of a contract as IB sees it for pacing purposes."""
+    con_id = getattr(contract, "conId", 0)
+    if con_id:
+        return (con_id, getattr(contract, "exchange", ""))
+    return (
+        getattr(contract, "symbol", ""),
+        getattr(contract, "secType", ""),
+        getattr(contract, "exchange", ""),
+        getattr(contract, "currency", ""),
+        getattr(contract, "lastTradeDateOrContractMonth", ""),
+    )
@@ -0,0 +1,409 @@
+import threading
+from loguru import logger
+from ibapi.ticktype import TickTypeEnum
+from ibkr_adapter.dispatch import MKTDATA
+from ibkr_adapter.mapping import resolve_contract
+
+_BID = (TickTypeEnum.BID, TickTypeEnum.DELAYED_BID)
+_ASK = (TickTypeEnum.ASK, TickTypeEnum.DELAYED_ASK)
+_LAST = (TickTypeEnum.LAST, TickTypeEnum.DELAYED_LAST)
+_CLOSE = (TickTypeEnum.CLOSE, TickTypeEnum.DELAYED_CLOSE)
+
+# The currency listed first is the base of an IDEALPRO pair (EUR.USD, USD.JPY);
+# unlisted currencies are quoted against any listed one (USD.HKD).
+FX_PAIR_ORDER = ("EUR", "GBP", "AUD", "NZD", "USD", "CAD", "CHF", "JPY")
+
+
+def fx_pair(currency: str, base_currency: str) -> tuple[str, bool]:
+    """The IDEALPRO pair quoting `currency` against `base_currency`, and whether its mid must be inverted."""
+    def rank(c):
+        return FX_PAIR_ORDER.index(c) if c in FX_PAIR_ORDER else len(FX_PAIR_ORDER)
+    if rank(currency) <= rank(base_currency):
+        return f"{currency}.{base_currency}", False
+    return f"{base_currency}.{currency}", True
+
+
+class _Quote:
+    """Latest bid/ask/last/close of one instrument and the positions marked with it."""
+
+    __slots__ = ("bid", "ask", "last", "close", "mark", "live", "multiplier", "currency", "positions")
+
+    def __init__(self, multiplier: float, currency: str):
+        self.bid = self.ask = self.last = self.close = None
+        self.mark: float | None = None
+        self.live = False  # ticks are arriving; marks passed to set_position are ignored
+        self.multiplier = multiplier
+        self.currency = currency
+        self.positions: dict = {}  # key -> _Position
+
+    def update(self, tick_type: int, price: float) -> bool:
+        """Applies a price tick; returns True when the mark changed."""
+        if price <= 0:
+            return False  # IB sends -1 when a side is empty
+        if tick_type in _BID:
+            self.bid = price
+        elif tick_type in _ASK:
+            self.ask = price
+        elif tick_type in _LAST:
+            self.last = price
+        elif tick_type in _CLOSE:
+            self.close = price
+        else:
+            return False
+        if self.bid is not None and self.ask is not None and self.ask >= self.bid:
+            mark = (self.bid + self.ask) / 2
+        else:
+            mark = self.last if self.last is not None else self.close
+        if mark is None or mark == self.mark:
+            return False
+        self.mark = mark
+        return True
+
+
+class _Position:
+    __slots__ = ("qty", "avg_cost", "upnl")
+
+    def __init__(self, qty: float, avg_cost: float):
+        self.qty = qty
+        self.avg_cost = avg_cost
+        self.upnl = 0.0  # in the instrument's currency
+
+
+class PnLEngine:
+    """
+    Incremental mark-to-market unrealized PnL.
+
+    A position's PnL is qty * (mark * multiplier - avg_cost) in the
+    contract's currency; IB's avgCost already includes the multiplier for
+    futures. Totals are kept per currency, and the base-currency total is
+    adjusted by each change, so a price tick costs O(positions in that
+    instrument), normally one, and an FX tick costs O(1). A currency without
+    a rate is left out of the base total and listed in `stats()`.
+
+    `equity()` is the last NetLiquidation from IB (`set_net_liquidation`)
+    moved by the change in unrealized PnL since it was received. IB's figure
+    already values positions the engine had not yet marked (or currencies it
+    had no rate for), so their first contribution moves the anchor instead.
+    """
+
+    def __init__(self, base_currency: str = "USD"):
+        self.base_currency = base_currency
+        self._lock = threading.Lock()
+        self._quotes: dict[int, _Quote] = {}
+        self._index: dict = {}  # position key -> con_id
+        self._local: dict[str, float] = {}  # currency -> unrealized PnL in that currency
+        self._fx: dict[str, float] = {base_currency: 1.0}
+        self._total = 0.0  # base currency, currencies with a rate only
+        self._equity_anchor: float | None = None
+        self.ticks = 0
+
+    def _apply(self, currency: str, delta: float):
+        self._local[currency] = self._local.get(currency, 0.0) + delta
+        rate = self._fx.get(currency)
+        if rate is not None:
+            self._total += delta * rate
+
+    def _mark(self, quote: _Quote, position: _Position):
+        upnl = position.qty * (quote.mark * quote.multiplier - position.avg_cost) if quote.mark is not None else 0.0
+        self._apply(quote.currency, upnl - position.upnl)
+        position.upnl = upnl
+
+    def set_position(self, key, con_id, currency: str, qty: float, avg_cost: float,
+                     multiplier: float = 1.0, mark: float | None = None):
+        """
+        Adds or updates a position held in instrument `con_id`; `mark` (IB's
+        market price) sets the price while no tick stream is live.
+        """
+        with self._lock:
+            if key in self._index and self._index[key] != con_id:
+                self._remove(key)
+            quote = self._quotes.get(con_id)
+            if quote is None:
+                quote = self._quotes[con_id] = _Quote(multiplier, currency)
+            unmarked = quote.mark is None
+            remarked = bool(mark) and not quote.live and mark != quote.mark
+            if remarked:
+                quote.mark = mark
+            position = quote.positions.get(key)
+            if position is None:
+                position = quote.positions[key] = _Position(qty, avg_cost)
+                self._index[key] = con_id
+            position.qty, position.avg_cost = qty, avg_cost
+            if unmarked and quote.mark is not None:
+                self._mark_first(quote)
+            elif remarked:
+                for other in quote.positions.values():
+                    self._mark(quote, other)
+            else:
+                self._mark(quote, position)
+
+    def stream_stopped(self, con_id):
+        """The instrument's tick stream failed: marks passed to `set_position` apply again."""
+        with self._lock:
+            quote = self._quotes.get(con_id)
+            if quote is not None:
+                quote.live = False
+
+    def remove_position(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        con_id = self._index.pop(key, None)
+        if con_id is None:
+            return
+        quote = self._quotes[con_id]
+        position = quote.positions.pop(key)
+        self._apply(quote.currency, -position.upnl)
+        if not quote.positions:
+            del self._quotes[con_id]
+
+    def instruments(self) -> set[int]:
+        with self._lock:
+            return set(self._quotes)
+
+    def currencies(self) -> set[str]:
+        with self._lock:
+            return {quote.currency for quote in self._quotes.values()}
+
+    def on_price(self, con_id: int, tick_type: int, price: float):
+        """Price tick for an instrument; runs on the reader thread."""
+        with self._lock:
+            self.ticks += 1
+            quote = self._quotes.get(con_id)
+            if quote is None:
+                return
+            unmarked = quote.mark is None
+            changed = quote.update(tick_type, price)
+            quote.live = quote.live or price > 0
+            if not changed:
+                return
+            if unmarked:
+                self._mark_first(quote)
+                return
+            for position in quote.positions.values():
+                self._mark(quote, position)
+
+    def _mark_first(self, quote: _Quote):
+        total = self._total
+        for position in quote.positions.values():
+            self._mark(quote, position)
+        if self._equity_anchor is not None:
+            self._equity_anchor -= self._total - total
+
+    def set_fx_rate(self, currency: str, rate: float):
+        """Value of one unit of `currency` in the base currency."""
+        if currency == self.base_currency or not rate or rate <= 0:
+            return
+        with self._lock:
+            old = self._fx.get(currency)
+            self._fx[currency] = rate
+            delta = self._local.get(currency, 0.0) * (rate - (old or 0.0))
+            self._total += delta
+            if old is None and self._equity_anchor is not None:
+                self._equity_anchor -= delta
+
+    def set_net_liquidation(self, value: float):
+        """Anchors `equity()` to IB's NetLiquidation (base currency) at the current marks."""
+        with self._lock:
+            self._equity_anchor = value - self._total
+
+    def unrealized(self) -> float:
+        """Total unrealized PnL in the base currency."""
+        return self._total
+
+    def equity(self) -> float | None:
+        anchor = self._equity_anchor
+        return None if anchor is None else anchor + self._total
+
+    def position_pnl(self, key, base: bool = True) -> float | None:
+        """
+        A position's unrealized PnL in the base currency, or in the contract's
+        currency with `base=False`; None without a mark (or FX rate).
+        """
+        with self._lock:
+            con_id = self._index.get(key)
+            if con_id is None:
+                return None
+            quote = self._quotes[con_id]
+            rate = self._fx.get(quote.currency) if base else 1.0
+            if quote.mark is None or rate is None:
+                return None
+            return quote.positions[key].upnl * rate
+
+    def recompute(self) -> float:
+        """Full recomputation of the base total from scratch, e.g. to check for drift."""
+        with self._lock:
+            local: dict[str, float] = {}
+            for quote in self._quotes.values():
+                for position in quote.positions.values():
+                    self._mark(quote, position)
+                    local[quote.currency] = local.get(quote.currency, 0.0) + position.upnl
+            self._local = local
+            self._total = sum(v * self._fx[c] for c, v in local.items() if c in self._fx)
+            return self._total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "unrealized": self._total,
+                "equity": self.equity(),
+                "positions": len(self._index),
+                "unmarked": sum(len(q.positions) for q in self._quotes.values() if q.mark is None),
+                "missing_fx": sorted(c for c in self._local if c not in self._fx),
+                "ticks": self.ticks,
+            }
+
+
+class _QuoteSink:
+    """MKTDATA sink feeding one instrument's price ticks into the engine."""
+
+    def __init__(self, on_price, client, req_id: int, on_fail=None):
+        self.on_price = on_price
+        self.client = client
+        self.req_id = req_id
+        self.on_fail = on_fail
+
+    def push(self, item):
+        kind, tick_type, value = item
+        if kind == "price":
+            self.on_price(tick_type, value)
+
+    def end(self):
+        pass
+
+    def fail(self, exc: Exception):
+        # reqMktData is replayed with the same reqId after a reconnect
+        if isinstance(exc, ConnectionError):
+            self.client.router.register(MKTDATA, self.req_id, self, keep_after_end=True)
+        else:
+            logger.warning(f"Market data for PnL marks stopped (reqId={self.req_id}): {exc}")
+            if self.on_fail is not None:
+                self.on_fail(self.req_id)
+
+
+class PnLFeed:
+    """
+    Keeps a `PnLEngine` in step with a `PortfolioCache`: positions are
+    mirrored from its change events, each held instrument gets one
+    reqMktData stream for marks, and each foreign currency one IDEALPRO
+    stream for its rate (seeded from the account's ExchangeRate values).
+    Streams are cancelled when the last position using them closes. A
+    stream IB fails is forgotten, so the next position event requests it
+    again; until then IB's portfolio prices mark the position.
+    `contracts` (a `ContractResolver`) supplies the exchange of qualified
+    contracts, which futures marks need.
+    """
+
+    def __init__(self, engine: PnLEngine, portfolio, client, contracts=None):
+        self.engine = engine
+        self.portfolio = portfolio
+        self.client = client
+        self.contracts = contracts
+        self._lock = threading.Lock()
+        self._mark_req_ids: dict[int, int] = {}  # con_id -> reqId
+        self._fx_req_ids: dict[str, int] = {}    # currency -> reqId
+        self._unsubscribe = None
+
+    def start(self):
+        self._unsubscribe = self.portfolio.subscribe(self._on_portfolio_event)
+        snapshot = self.portfolio.snapshot()
+        for currency, rate in snapshot.account_values.get("ExchangeRate", {}).items():
+            self._on_fx_value(currency, rate)
+        net_liquidation = snapshot.value("NetLiquidation", self.engine.base_currency)
+        for position in snapshot.positions:
+            self._set_position(position.key, position)
+        if isinstance(net_liquidation, float):
+            self.engine.set_net_liquidation(net_liquidation)
+
+    def stop(self):
+        if self._unsubscribe:
+            self._unsubscribe()
+        with self._lock:
+            req_ids = list(self._mark_req_ids.values()) + list(self._fx_req_ids.values())
+            self._mark_req_ids.clear()
+            self._fx_req_ids.clear()
+        for req_id in req_ids:
+            self._cancel(req_id)
+
+    def _on_portfolio_event(self, event: dict):
+        kind = event["kind"]
+        if kind == "position":
+            if event["position"] is None:
+                self.engine.remove_position(event["key"])
+                self._release_unused()
+            else:
+                self._set_position(event["key"], event["position"])
+        elif kind == "account_value":
+            if event["tag"] == "ExchangeRate":
+                self._on_fx_value(event["currency"], event["value"])
+            elif event["tag"] == "NetLiquidation" and event["currency"] == self.engine.base_currency:
+                self.engine.set_net_liquidation(event["value"])
+
+    def _on_fx_value(self, currency: str, rate):
+        if isinstance(rate, float) and currency not in ("", "BASE"):
+            self.engine.set_fx_rate(currency, rate)
+
+    def _set_position(self, key, position):
+        # key[1] is the conId, or "symbol|secType" when IB sent none
+        self.engine.set_position(key, key[1], position.currency, position.qty, position.avg_cost,
+                                 position.multiplier, position.market_price)
+        if position.con_id:
+            self._ensure_marks(position)
+        if position.currency != self.engine.base_currency:
+            self._ensure_fx(position.currency)
+
+    def _ensure_marks(self, position):
+        with self._lock:
+            if position.con_id in self._mark_req_ids:
+                return
+            req_id = self._mark_req_ids[position.con_id] = self.client._next_req_id()
+        contract = position.to_contract(self.contracts)
+        on_price = lambda tick_type, price, con_id=position.con_id: self.engine.on_price(con_id, tick_type, price)
+        self._stream(req_id, contract, on_price)
+
+    def _ensure_fx(self, currency: str):
+        with self._lock:
+            if currency in self._fx_req_ids:
+                return
+            req_id = self._fx_req_ids[currency] = self.client._next_req_id()
+        pair, inverted = fx_pair(currency, self.engine.base_currency)
+        quote = _Quote(1.0, currency)
+
+        def on_price(tick_type, price):
+            if quote.update(tick_type, price):
+                self.engine.set_fx_rate(currency, 1 / quote.mark if inverted else quote.mark)
+        self._stream(req_id, resolve_contract(pair, "FX"), on_price)
+
+    def _stream(self, req_id: int, contract, on_price):
+        sink = _QuoteSink(on_price, self.client, req_id, self._on_stream_failed)
+        self.client.router.register(MKTDATA, req_id, sink, keep_after_end=True)
+        self.client.reqMktData(req_id, contract, "", False, False, [])
+
+    def _on_stream_failed(self, req_id: int):
+        with self._lock:
+            con_ids = [con_id for con_id, r in self._mark_req_ids.items() if r == req_id]
+            for con_id in con_ids:
+                del self._mark_req_ids[con_id]
+            for currency in [c for c, r in self._fx_req_ids.items() if r == req_id]:
+                del self._fx_req_ids[currency]
+        for con_id in con_ids:
+            self.engine.stream_stopped(con_id)
+
+    def _release_unused(self):
+        held, currencies = self.engine.instruments(), self.engine.currencies()
+        with self._lock:
+            req_ids = [self._mark_req_ids.pop(con_id) for con_id in list(self._mark_req_ids) if con_id not in held]
+            req_ids += [self._fx_req_ids.pop(c) for c in list(self._fx_req_ids) if c not in currencies]
+        for req_id in req_ids:
+            self._cancel(req_id)
+
+    def _cancel(self, req_id: int):
+        self.client.router.unregister(MKTDATA, req_id)
+        try:
+            self.client.cancelMktData(req_id)
+        except Exception as e:
+            logger.warning(f"Failed to cancel market data reqId={req_id}: {e}")
+
+    def stats(self) -> dict:
+        return {**self.engine.stats(), "mark_streams": len(self._mark_req_ids), "fx_streams": len(self._fx_req_ids)}
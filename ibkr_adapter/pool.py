@@ -0,0 +1,203 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from ibkr_adapter.dispatch import CONNECTION_EVENTS
+from ibkr_adapter.tws_client import TWSClient
+from ibkr_adapter.supervisor import ConnectionSupervisor
+
+# Traffic classes
+ORDERS = "orders"              # order placement and cancels: kept away from bulk traffic
+HISTORY = "history"            # historical bars, scanners
+MARKET_DATA = "market_data"    # live ticks/bars, account, positions, contract details
+
+TRAFFIC_CLASSES = (ORDERS, HISTORY, MARKET_DATA)
+
+
+class PooledConnection:
+    """One `TWSClient` (one client ID, one reader thread) serving a traffic class."""
+
+    def __init__(self, client: TWSClient, client_id: int, traffic_class: str):
+        self.client = client
+        self.client_id = client_id
+        self.traffic_class = traffic_class
+        self.healthy = False
+        self.rtt: float | None = None
+        self.failures = 0
+        self.supervisor: ConnectionSupervisor | None = None
+
+    @property
+    def load(self) -> int:
+        return len(self.client.router)
+
+
+class ConnectionPool:
+    """
+    Opens several client IDs to the Gateway and routes each request to a
+    connection of its traffic class, so a large backfill cannot queue up
+    behind order traffic on the same socket and reader thread.
+
+    `sizes` gives the number of connections per class; client IDs are
+    assigned consecutively from `base_client_id`. Within a class the
+    connection with the fewest requests in flight wins. A background thread
+    pings every connection (reqCurrentTime) each `health_interval` seconds;
+    unhealthy connections are skipped, reconnected, and while a class has no
+    healthy connection its traffic fails over to the others.
+
+    Order ids are only unique per client ID, and the order book, bracket
+    submitter and exposure book key orders by id alone, so there is a single
+    ORDERS connection and order traffic never fails over: while it is down,
+    `client(ORDERS)` raises ConnectionError and the order fails.
+
+    With `supervisor_options` (a dict of `ConnectionSupervisor` arguments,
+    possibly empty) each connection gets its own supervisor, which handles
+    reconnects with backoff and paced resubscription; health checks then
+    only ping.
+    """
+
+    def __init__(self, host: str, port: int, base_client_id: int, sizes: dict | None = None,
+                 client_factory=TWSClient, health_interval: float = 10.0, ping_timeout: float = 2.0,
+                 supervisor_options: dict | None = None, connect_timeout: float = 10.0):
+        sizes = sizes or {ORDERS: 1, HISTORY: 1, MARKET_DATA: 1}
+        unknown = set(sizes) - set(TRAFFIC_CLASSES)
+        if unknown:
+            raise ValueError(f"Unknown traffic classes: {sorted(unknown)}")
+        if int(sizes.get(ORDERS, 0)) > 1:
+            raise ValueError("At most one orders connection: order ids are only unique per client ID")
+        self.host = host
+        self.port = port
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.supervisor_options = supervisor_options
+        self.connect_timeout = connect_timeout
+        self.connections: list[PooledConnection] = []
+        client_id = base_client_id
+        for traffic_class in TRAFFIC_CLASSES:
+            for _ in range(int(sizes.get(traffic_class, 0))):
+                conn = PooledConnection(client_factory(), client_id, traffic_class)
+                # Fail over as soon as a socket drops, not at the next health check
+                conn.client.router.subscribe(CONNECTION_EVENTS, lambda event, conn=conn: self._on_connection_event(conn, event))
+                self.connections.append(conn)
+                client_id += 1
+        if not self.connections:
+            raise ValueError("A connection pool needs at least one connection")
+        self.failovers = 0
+        self._stop = threading.Event()
+        self._health_thread: threading.Thread | None = None
+
+    def start(self):
+        """Connects every client in parallel and starts the health checks."""
+        if self.supervisor_options is not None:
+            for conn in self.connections:
+                conn.supervisor = ConnectionSupervisor(conn.client, self.host, self.port, conn.client_id,
+                                                       connect_timeout=self.connect_timeout, **self.supervisor_options)
+                conn.supervisor.start()
+            deadline = time.monotonic() + self.connect_timeout
+            for conn in self.connections:
+                conn.healthy = conn.supervisor.wait_connected(max(0.0, deadline - time.monotonic()))
+        else:
+            with ThreadPoolExecutor(max_workers=len(self.connections), thread_name_prefix="ib-connect") as pool:
+                list(pool.map(self._connect, self.connections))
+        if not any(conn.healthy for conn in self.connections):
+            raise ConnectionError("Could not connect to IBKR.")
+        if self.health_interval:
+            self._health_thread = threading.Thread(target=self._health_loop, name="ib-health", daemon=True)
+            self._health_thread.start()
+
+    def _on_connection_event(self, conn: PooledConnection, event: dict):
+        conn.healthy = event["state"] == "connected"
+
+    def _connect(self, conn: PooledConnection):
+        try:
+            conn.client.connect_and_run(self.host, self.port, conn.client_id, timeout=self.connect_timeout)
+            conn.healthy = True
+            logger.info(f"Connected client {conn.client_id} for {conn.traffic_class} traffic")
+        except Exception as e:
+            conn.healthy = False
+            conn.failures += 1
+            logger.error(f"Client {conn.client_id} ({conn.traffic_class}) failed to connect: {e}")
+
+    def stop(self):
+        self._stop.set()
+        for conn in self.connections:
+            if conn.supervisor is not None:
+                conn.supervisor.stop()
+            try:
+                conn.client.stop()
+            except Exception as e:
+                logger.warning(f"Error disconnecting client {conn.client_id}: {e}")
+
+    def client(self, traffic_class: str) -> TWSClient:
+        """
+        The least loaded healthy client for `traffic_class`, failing over to any
+        healthy one; ORDERS traffic never fails over.
+        """
+        candidates = [c for c in self.connections if c.traffic_class == traffic_class and c.healthy]
+        if not candidates:
+            if traffic_class == ORDERS:
+                raise ConnectionError("The orders connection is down; orders do not fail over to other client IDs.")
+            candidates = [c for c in self.connections if c.healthy]
+            if not candidates:
+                raise ConnectionError("No healthy IBKR connection available.")
+            self.failovers += 1
+        return min(candidates, key=lambda c: c.load).client
+
+    def clients(self) -> list[TWSClient]:
+        return [conn.client for conn in self.connections]
+
+    def subscribe(self, topic: str, callback):
+        """Subscribes `callback` on every connection's router; returns a function removing all of them."""
+        unsubscribers = [conn.client.router.subscribe(topic, callback) for conn in self.connections]
+
+        def unsubscribe():
+            for unsub in unsubscribers:
+                unsub()
+        return unsubscribe
+
+    def get_contract_details(self, contract, timeout: float = 5.0) -> list:
+        return self.client(MARKET_DATA).get_contract_details(contract, timeout=timeout)
+
+    def check_health(self):
+        """Pings every connection once, reconnecting the ones that dropped."""
+        for conn in self.connections:
+            if not conn.client.is_connected:
+                if conn.healthy:
+                    logger.warning(f"Client {conn.client_id} ({conn.traffic_class}) is disconnected")
+                conn.healthy = False
+                if conn.supervisor is None:
+                    self._connect(conn)
+                continue
+            try:
+                conn.rtt = conn.client.ping(self.ping_timeout)
+                if not conn.healthy:
+                    logger.info(f"Client {conn.client_id} ({conn.traffic_class}) is healthy again")
+                conn.healthy = True
+            except Exception as e:
+                conn.failures += 1
+                if conn.healthy:
+                    logger.warning(f"Client {conn.client_id} ({conn.traffic_class}) failed its health check: {e}")
+                conn.healthy = False
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.exception(f"Health check failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "failovers": self.failovers,
+            "connections": [
+                {
+                    "client_id": conn.client_id,
+                    "traffic_class": conn.traffic_class,
+                    "healthy": conn.healthy,
+                    "load": conn.load,
+                    "rtt_ms": None if conn.rtt is None else conn.rtt * 1000,
+                    "failures": conn.failures,
+                    "supervisor": conn.supervisor.stats() if conn.supervisor is not None else None,
+                }
+                for conn in self.connections
+            ],
+        }
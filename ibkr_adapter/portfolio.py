@@ -0,0 +1,360 @@
+import threading
+import time
+from typing import NamedTuple
+from loguru import logger
+from ibapi.common import UNSET_DOUBLE
+from ibapi.contract import Contract
+from ibkr_adapter.dispatch import POSITIONS, ACCOUNT_UPDATES, PNL, CONNECTION_EVENTS
+from ibkr_adapter.mapping import SEC_TYPE_EXCHANGES
+
+
+def _num(value) -> float | None:
+    return None if value is None or value == UNSET_DOUBLE else float(value)
+
+
+class PositionState(NamedTuple):
+    """One position. Immutable: updates replace it, so snapshots can share it."""
+    account: str
+    con_id: int
+    symbol: str
+    sec_type: str
+    currency: str
+    qty: float
+    avg_cost: float
+    market_price: float | None = None
+    market_value: float | None = None
+    unrealized_pnl: float | None = None
+    realized_pnl: float | None = None
+    multiplier: float = 1.0
+    exchange: str = ""
+
+    @property
+    def key(self) -> tuple:
+        """The position's key in `PortfolioCache` and its change events."""
+        return (self.account, self.con_id or f"{self.symbol}|{self.sec_type}")
+
+    @classmethod
+    def from_contract(cls, account: str, contract, qty, avg_cost) -> "PositionState":
+        return cls(account, contract.conId, contract.symbol, contract.secType, contract.currency,
+                   float(qty), float(avg_cost), multiplier=float(contract.multiplier or 1),
+                   exchange=contract.exchange or contract.primaryExchange)
+
+    def to_contract(self, contracts=None) -> Contract:
+        """
+        A contract to trade or stream the position with. Position callbacks
+        leave out the exchange, which futures need, so the qualified contract
+        from `contracts` (a `ContractResolver`) is preferred; otherwise the
+        exchange `resolve_contract` uses for the secType.
+        """
+        info = contracts.by_con_id(self.con_id) if contracts is not None and self.con_id else None
+        if info is not None:
+            return info.to_contract()
+        contract = Contract()
+        contract.conId = self.con_id
+        contract.symbol = self.symbol
+        contract.secType = self.sec_type
+        contract.currency = self.currency
+        contract.exchange = self.exchange or SEC_TYPE_EXCHANGES.get(self.sec_type, "SMART")
+        return contract
+
+    def to_row(self) -> dict:
+        """The row shape of `position_rows` (ibkr_adapter/tws_client.py)."""
+        return {
+            "symbol": self.symbol,
+            "asset_type": self.sec_type,
+            "qty": self.qty,
+            "avg_price": self.avg_cost,
+            "unrealized_pnl": self.unrealized_pnl,
+            "currency": self.currency,
+        }
+
+
+class PnLState(NamedTuple):
+    daily: float | None
+    unrealized: float | None
+    realized: float | None
+
+
+class PortfolioSnapshot(NamedTuple):
+    """
+    A consistent view of the portfolio. `version` increases with every
+    applied update; `complete` is False until the initial downloads finish
+    and again while the connection is down.
+    """
+    version: int
+    updated_at: float | None
+    complete: bool
+    positions: tuple
+    account_values: dict
+    pnl: PnLState | None
+
+    def value(self, tag: str, currency: str | None = None) -> float | str | None:
+        """An account value, e.g. value("NetLiquidation"); the first currency when none is given."""
+        by_currency = self.account_values.get(tag)
+        if not by_currency:
+            return None
+        if currency is not None:
+            return by_currency.get(currency)
+        return next(iter(by_currency.values()))
+
+    def age(self, now: float | None = None) -> float | None:
+        if self.updated_at is None:
+            return None
+        return (now if now is not None else time.time()) - self.updated_at
+
+
+class _Sink:
+    """Router sink calling `on_item` / `on_end` on the reader thread."""
+
+    def __init__(self, on_item, on_end=None):
+        self.on_item = on_item
+        self.on_end = on_end
+
+    def push(self, item):
+        self.on_item(item)
+
+    def end(self):
+        if self.on_end:
+            self.on_end()
+
+    def fail(self, exc: Exception):
+        # A dropped connection is handled by the CONNECTION_EVENTS resubscription
+        if not isinstance(exc, ConnectionError):
+            logger.warning(f"Portfolio subscription failed: {exc}")
+
+
+class PortfolioCache:
+    """
+    Long-lived positions, account values and PnL for one client.
+
+    Subscribes once to reqPositions, reqAccountUpdates(`account`) and, when
+    an account is given, reqPnL, and applies each callback under a lock. The
+    subscriptions are re-sent after every reconnect; positions missing from
+    the fresh download are dropped at positionEnd.
+
+    `snapshot()` returns an immutable `PortfolioSnapshot`, rebuilt only when
+    the version has changed since the last call, so reads cost a lock and a
+    comparison rather than an IB round trip.
+    """
+
+    def __init__(self, client, account: str = "", pnl: bool = True, clock=time.time):
+        self.client = client
+        self.account = account
+        self.pnl_enabled = pnl and bool(account)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._positions: dict[tuple, PositionState] = {}
+        self._seen: set[tuple] | None = None  # keys reported since the last reqPositions
+        self._account_values: dict[str, dict] = {}
+        self._pnl: PnLState | None = None
+        self._positions_done = False
+        self._account_done = False
+        self._positions_ready = threading.Event()  # set at positionEnd, cleared while the download is redone
+        self._version = 0
+        self._updated_at: float | None = None
+        self._snapshot: PortfolioSnapshot | None = None
+        self._pnl_req_id: int | None = None
+        self._unsubscribe = None
+        self._listeners: tuple = ()
+        self.resubscribes = 0
+
+    def start(self):
+        self._unsubscribe = self.client.router.subscribe(CONNECTION_EVENTS, self._on_connection_event)
+        if self.client.is_connected:
+            self._subscribe()
+
+    def stop(self):
+        if self._unsubscribe:
+            self._unsubscribe()
+        self.client.router.unregister(POSITIONS, 0)
+        self.client.router.unregister(ACCOUNT_UPDATES, 0)
+        if self._pnl_req_id is not None:
+            self.client.router.unregister(PNL, self._pnl_req_id)
+        if not self.client.is_connected:
+            return
+        try:
+            self.client.cancelPositions()
+            self.client.reqAccountUpdates(False, self.account)
+            if self._pnl_req_id is not None:
+                self.client.cancelPnL(self._pnl_req_id)
+        except Exception as e:
+            logger.warning(f"Error cancelling portfolio subscriptions: {e}")
+
+    def subscribe(self, callback):
+        """
+        Calls `callback(event)` on the reader thread after each change, with
+        {"kind": "position", "key", "position"} (None once closed),
+        {"kind": "account_value", "tag", "currency", "value"} or
+        {"kind": "pnl", "pnl"}. Returns a function that removes it.
+        """
+        self._listeners = self._listeners + (callback,)
+
+        def unsubscribe():
+            self._listeners = tuple(cb for cb in self._listeners if cb is not callback)
+        return unsubscribe
+
+    def _notify(self, event: dict):
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.exception(f"Portfolio listener failed: {e}")
+
+    def _subscribe(self):
+        router = self.client.router
+        with self._lock:
+            self._seen = set()
+            self._positions_done = self._account_done = False
+            self._positions_ready.clear()
+            self._touch()
+        router.register(POSITIONS, 0, _Sink(self._on_position, self._on_position_end), keep_after_end=True)
+        router.register(ACCOUNT_UPDATES, 0, _Sink(self._on_account_update, self._on_account_end), keep_after_end=True)
+        self.client.reqPositions()
+        self.client.reqAccountUpdates(True, self.account)
+        if self.pnl_enabled:
+            self._pnl_req_id = self.client._next_req_id()
+            router.register(PNL, self._pnl_req_id, _Sink(self._on_pnl), keep_after_end=True)
+            self.client.reqPnL(self._pnl_req_id, self.account, "")
+
+    def _on_connection_event(self, event: dict):
+        if event["state"] == "connected":
+            self.resubscribes += 1
+            self._subscribe()
+        else:
+            with self._lock:
+                self._positions_done = self._account_done = False
+                self._positions_ready.clear()
+                self._touch()
+
+    def _touch(self):
+        self._version += 1
+        self._updated_at = self._clock()
+
+    @staticmethod
+    def _key(account: str, contract) -> tuple:
+        return (account, contract.conId or f"{contract.symbol}|{contract.secType}")
+
+    # --- Callbacks (reader thread) ------------------------------------------
+
+    def _on_position(self, item):
+        account, contract, pos, avg_cost = item
+        key = self._key(account, contract)
+        with self._lock:
+            if self._seen is not None:
+                self._seen.add(key)
+            if not pos:
+                state = None
+                self._positions.pop(key, None)
+            else:
+                current = self._positions.get(key)
+                if current is None:
+                    state = PositionState.from_contract(account, contract, pos, avg_cost)
+                else:
+                    state = current._replace(qty=float(pos), avg_cost=float(avg_cost))
+                self._positions[key] = state
+            self._touch()
+        self._notify({"kind": "position", "key": key, "position": state})
+
+    def _on_position_end(self):
+        closed = []
+        with self._lock:
+            if self._seen is not None:
+                closed = [k for k in self._positions if k not in self._seen]
+                for key in closed:
+                    del self._positions[key]  # closed while we were not listening
+                self._seen = None
+            self._positions_done = True
+            self._positions_ready.set()
+            self._touch()
+        for key in closed:
+            self._notify({"kind": "position", "key": key, "position": None})
+
+    def _on_account_update(self, item: dict):
+        kind = item["kind"]
+        with self._lock:
+            if kind == "value":
+                try:
+                    value = float(item["value"])
+                except (TypeError, ValueError):
+                    value = item["value"]
+                self._account_values.setdefault(item["tag"], {})[item["currency"]] = value
+                event = {"kind": "account_value", "tag": item["tag"], "currency": item["currency"], "value": value}
+            elif kind == "portfolio":
+                contract = item["contract"]
+                key = self._key(item["account"], contract)
+                state = None
+                if not item["position"]:
+                    self._positions.pop(key, None)
+                else:
+                    current = self._positions.get(key) or PositionState.from_contract(
+                        item["account"], contract, item["position"], item["avg_cost"])
+                    state = self._positions[key] = current._replace(
+                        qty=float(item["position"]),
+                        avg_cost=float(item["avg_cost"]),
+                        market_price=_num(item["market_price"]),
+                        market_value=_num(item["market_value"]),
+                        unrealized_pnl=_num(item["unrealized_pnl"]),
+                        realized_pnl=_num(item["realized_pnl"]),
+                    )
+                event = {"kind": "position", "key": key, "position": state}
+            else:
+                return  # updateAccountTime carries no state of its own
+            self._touch()
+        self._notify(event)
+
+    def _on_account_end(self):
+        with self._lock:
+            self._account_done = True
+            self._touch()
+
+    def _on_pnl(self, item):
+        daily, unrealized, realized = item
+        with self._lock:
+            state = self._pnl = PnLState(_num(daily), _num(unrealized), _num(realized))
+            self._touch()
+        self._notify({"kind": "pnl", "pnl": state})
+
+    # --- Reads ----------------------------------------------------------------
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def wait_positions(self, timeout: float | None = None) -> bool:
+        """Blocks until the current positions download has finished; False on timeout."""
+        return self._positions_ready.wait(timeout)
+
+    def snapshot(self) -> PortfolioSnapshot:
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != self._version:
+                snapshot = self._snapshot = PortfolioSnapshot(
+                    version=self._version,
+                    updated_at=self._updated_at,
+                    complete=self._positions_done and self._account_done and self.client.is_connected,
+                    positions=tuple(self._positions.values()),
+                    account_values={tag: dict(values) for tag, values in self._account_values.items()},
+                    pnl=self._pnl,
+                )
+            return snapshot
+
+    def position_rows(self, pnl=None) -> list[dict]:
+        """Tool rows; with a `PnLEngine`, unrealized PnL is marked to the latest tick."""
+        positions = self.snapshot().positions
+        rows = [p.to_row() for p in positions]
+        if pnl is not None:
+            for position, row in zip(positions, rows):
+                marked = pnl.position_pnl(position.key, base=False)
+                if marked is not None:
+                    row["unrealized_pnl"] = marked
+        return rows
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot()
+        return {
+            "version": snapshot.version,
+            "complete": snapshot.complete,
+            "positions": len(snapshot.positions),
+            "age_sec": snapshot.age(self._clock()),
+            "resubscribes": self.resubscribes,
+        }
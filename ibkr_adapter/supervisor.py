@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from loguru import logger
+from ibkr_adapter.dispatch import CONNECTION_EVENTS, CONNECTION_STATE
+from ibkr_adapter.tws_client import RESUBSCRIBE_BATCH, RESUBSCRIBE_INTERVAL
+
+# Connection states
+DISCONNECTED = "disconnected"
+CONNECTING = "connecting"
+RESUBSCRIBING = "resubscribing"
+CONNECTED = "connected"
+STOPPED = "stopped"
+
+
+class ConnectionSupervisor:
+    """
+    Keeps one `TWSClient` connected.
+
+    A background thread connects (returning as soon as nextValidId arrives),
+    then sleeps until the client reports `connectionClosed` on the
+    CONNECTION_EVENTS topic and reconnects. Failed attempts back off
+    exponentially from `backoff_initial` up to `backoff_max` seconds with
+    equal jitter, so several clients restarting together do not reconnect in
+    lockstep. After each connect, subscriptions are replayed by priority in
+    batches of `resubscribe_batch` every `resubscribe_interval` seconds.
+
+    Every state change publishes `stats()` on the client router's
+    CONNECTION_STATE topic.
+    """
+
+    def __init__(self, client, host: str, port: int, client_id: int, connect_timeout: float = 10.0,
+                 backoff_initial: float = 0.5, backoff_max: float = 30.0,
+                 resubscribe_batch: int = RESUBSCRIBE_BATCH, resubscribe_interval: float = RESUBSCRIBE_INTERVAL,
+                 rng: random.Random | None = None):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.connect_timeout = connect_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.resubscribe_batch = resubscribe_batch
+        self.resubscribe_interval = resubscribe_interval
+        self._rng = rng or random.Random()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._up = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._unsubscribe = None
+
+        self.state = DISCONNECTED
+        self.attempts = 0
+        self.failures = 0  # consecutive failed attempts
+        self.connects = 0
+        self.disconnects = 0
+        self.resubscribed = 0
+        self.last_error: str | None = None
+        self.last_backoff: float | None = None
+        self.last_connect_sec: float | None = None
+        self.last_outage_sec: float | None = None
+        self._down_since: float | None = None
+
+    def backoff(self, failures: int) -> float:
+        """Delay before the next attempt: half the exponential step fixed, half random."""
+        step = min(self.backoff_max, self.backoff_initial * 2 ** max(0, failures - 1))
+        return step / 2 + self._rng.uniform(0, step / 2)
+
+    def start(self, wait: float | None = None) -> bool:
+        """Starts supervising; with `wait`, blocks until connected or `wait` seconds pass."""
+        self._unsubscribe = self.client.router.subscribe(CONNECTION_EVENTS, self._on_connection_event)
+        self._thread = threading.Thread(target=self._run, name=f"ib-supervisor-{self.client_id}", daemon=True)
+        self._thread.start()
+        return self._up.wait(wait) if wait is not None else self._up.is_set()
+
+    def wait_connected(self, timeout: float | None = None) -> bool:
+        return self._up.wait(timeout)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._unsubscribe:
+            self._unsubscribe()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._set_state(STOPPED)
+
+    def _on_connection_event(self, event: dict):
+        if event["state"] == "disconnected":
+            self._up.clear()
+            self.disconnects += 1
+            self._down_since = time.monotonic()
+            self._set_state(DISCONNECTED)
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.client.is_connected:
+                self._connect_once()
+                continue
+            self._wake.wait()
+            self._wake.clear()
+
+    def _connect_once(self):
+        self.attempts += 1
+        self._set_state(CONNECTING)
+        started = time.monotonic()
+        try:
+            self.client.connect_and_run(self.host, self.port, self.client_id,
+                                        timeout=self.connect_timeout, resubscribe=False)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self.last_backoff = self.backoff(self.failures)
+            if self._down_since is None:
+                self._down_since = started
+            self._set_state(DISCONNECTED)
+            logger.warning(f"Client {self.client_id}: connect attempt {self.failures} failed ({e}); "
+                           f"retrying in {self.last_backoff:.2f}s")
+            self._stop.wait(self.last_backoff)
+            return
+
+        now = time.monotonic()
+        self.connects += 1
+        self.failures = 0
+        self.last_error = None
+        self.last_connect_sec = now - started
+        if self._down_since is not None:
+            self.last_outage_sec = now - self._down_since
+            self._down_since = None
+        self._set_state(RESUBSCRIBING)
+        self.resubscribed += self.client._resubscribe_active(self.resubscribe_batch, self.resubscribe_interval,
+                                                             sleep=self._stop.wait)
+        if self.client.is_connected:
+            self._set_state(CONNECTED)
+            self._up.set()
+
+    def _set_state(self, state: str):
+        self.state = state
+        self.client.router.publish(CONNECTION_STATE, self.stats())
+
+    def stats(self) -> dict:
+        return {
+            "client_id": self.client_id,
+            "state": self.state,
+            "attempts": self.attempts,
+            "consecutive_failures": self.failures,
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "resubscribed": self.resubscribed,
+            "last_error": self.last_error,
+            "last_backoff_sec": self.last_backoff,
+            "last_connect_sec": self.last_connect_sec,
+            "last_outage_sec": self.last_outage_sec,
+        }
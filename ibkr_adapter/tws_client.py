@@ -1,9 +1,17 @@
 import threading
 import time
-from queue import Queue, Empty
+from ibapi import comm
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
 from loguru import logger
+from ibkr_adapter.pacing import HistPacer, contract_key
+from ibkr_adapter.bracket import BracketTemplate
+from ibkr_adapter.dispatch import (
+    EventRouter, FutureSink, StreamSink, wait_future,
+    HISTORICAL, ACCOUNT_SUMMARY, POSITIONS, POSITIONS_REQUEST, CONTRACT_DETAILS, MKTDATA, RTBARS, CURRENT_TIME,
+    ACCOUNT_UPDATES, PNL,
+    ORDER_EVENTS, CONNECTION_EVENTS,
+)
 
 class IBKRError(Exception):
     """Custom exception for IBKR errors."""
@@ -20,28 +28,50 @@ IBKR_ERROR_MAP = {
     321: "Pacing violation: Too many requests in a short period.",
 }
 
-_hist_lock = threading.Lock()
-_last_hist = 0.0
+# IB serves at most this many historical requests concurrently per session
+HIST_MAX_CONCURRENCY = 2
 
-def _pace_hist(min_gap=2.0):
-    global _last_hist
-    with _hist_lock:
-        now = time.time()
-        delay = _last_hist + min_gap - now
-        if delay > 0:
-            time.sleep(delay)
-        _last_hist = time.time()
+# Shared by all clients: IB applies historical pacing per session, not per socket
+hist_pacer = HistPacer()
+
+# Subscriptions replayed per batch after a reconnect, and the pause between
+# batches; IB accepts about 50 API messages per second.
+RESUBSCRIBE_BATCH = 40
+RESUBSCRIBE_INTERVAL = 1.0
+
+# Socket-level connect failures, reported with reqId -1 instead of an exception
+CONNECT_FAIL_CODES = (502, 504)
+
+def _is_warning(errorCode: int) -> bool:
+    """IB notices that do not terminate the request they refer to."""
+    return 2100 <= errorCode < 2200 or errorCode == 10167
+
+def position_rows(items) -> list[dict]:
+    """Converts (account, contract, pos, avgCost) position callbacks to tool rows."""
+    return [
+        {
+            "symbol": contract.symbol,
+            "asset_type": contract.secType,
+            "qty": pos,
+            "avg_price": avg_cost,
+            "unrealized_pnl": None,
+            "currency": contract.currency
+        }
+        for _account, contract, pos, avg_cost in items
+    ]
 
 class TWSClient(EWrapper, EClient):
     def __init__(self):
         EClient.__init__(self, self)
-        self.response_queues = {}
+        self.router = EventRouter()
         self.next_valid_id = None
         self.is_connected = False
+        # Set by nextValidId (handshake done) or by a socket-level connect failure
+        self._handshake = threading.Event()
         self._id_lock = threading.Lock()
         self._req_id = 900000
-        self._end_events = {}
-        self._events_lock = threading.Lock()
+        self._positions_lock = threading.Lock()
+        self._positions_sink: FutureSink | None = None
         self._lock_subs = threading.Lock()
         self._active_mktdata_req_ids: set[int] = set()
         self._active_rtb_req_ids: set[int] = set()
@@ -49,7 +79,16 @@ class TWSClient(EWrapper, EClient):
             "mktdata": {},
             "rtbars": {}
         }
-        self._hist_sem = threading.Semaphore(value=2)
+        # Replay order after a reconnect: lower first; live ticks before 5-second bars by default
+        self._sub_priority: dict[int, int] = {}
+        self._hist_sem = threading.Semaphore(value=HIST_MAX_CONCURRENCY)
+        self._hist_pacer = hist_pacer
+        # Per-thread frame buffer while send_orders batches a write
+        self._burst = threading.local()
+        # Per-thread connection a reader thread was started for; see disconnect()
+        self._reader = threading.local()
+        self._conn_lock = threading.RLock()
+        self._stopping = False
 
     def _next_req_id(self):
         with self._id_lock:
@@ -57,13 +96,42 @@ class TWSClient(EWrapper, EClient):
             return self._req_id
 
     def _next_order_id(self):
+        return self._next_order_ids(1)
+
+    def _next_order_ids(self, count: int) -> int:
+        """Reserves `count` consecutive order ids and returns the first."""
         with self._id_lock:
             if self.next_valid_id is None:
                 raise ConnectionError("Not connected: next_valid_id is not initialized.")
             oid = self.next_valid_id
-            self.next_valid_id += 1
+            self.next_valid_id += count
             return oid
 
+    def sendMsg(self, msg):
+        frames = getattr(self._burst, "frames", None)
+        if frames is None:
+            super().sendMsg(msg)
+        else:
+            frames.append(comm.make_msg(msg))
+
+    def place_orders(self, contract, orders: list):
+        """
+        Places `orders` on `contract` with a single socket write instead of one
+        per order, so a bracket's legs reach IB back to back.
+        """
+        self.send_orders([(contract, order) for order in orders])
+
+    def send_orders(self, pairs: list):
+        """Places each (contract, order) pair, all in a single socket write."""
+        self._burst.frames = frames = []
+        try:
+            for contract, order in pairs:
+                self.placeOrder(order.orderId, contract, order)
+        finally:
+            self._burst.frames = None
+        if frames:
+            self.conn.sendMsg(b"".join(frames))
+
     def reqMktData(self, reqId, contract, genericTickList, snapshot, regulatorySnapshot, mktDataOptions):
         super().reqMktData(reqId, contract, genericTickList, snapshot, regulatorySnapshot, mktDataOptions)
         with self._lock_subs:
@@ -82,6 +150,7 @@ class TWSClient(EWrapper, EClient):
                 self._active_mktdata_req_ids.remove(reqId)
             if reqId in self._active_subs["mktdata"]:
                 del self._active_subs["mktdata"][reqId]
+            self._sub_priority.pop(reqId, None)
 
     def reqRealTimeBars(self, reqId, contract, barSize, whatToShow, useRTH, realTimeBarsOptions):
         super().reqRealTimeBars(reqId, contract, barSize, whatToShow, useRTH, realTimeBarsOptions)
@@ -102,46 +171,116 @@ class TWSClient(EWrapper, EClient):
                 self._active_rtb_req_ids.remove(reqId)
             if reqId in self._active_subs["rtbars"]:
                 del self._active_subs["rtbars"][reqId]
+            self._sub_priority.pop(reqId, None)
+
+    def set_subscription_priority(self, reqId: int, priority: int):
+        """Replay priority of a market data or real-time bars subscription (lower replays first)."""
+        with self._lock_subs:
+            self._sub_priority[reqId] = priority
 
     def nextValidId(self, orderId: int):
         super().nextValidId(orderId)
         self.next_valid_id = orderId
-        self.is_connected = True
+        was_connected, self.is_connected = self.is_connected, True
+        self._handshake.set()
         logger.info(f"Connection successful. Next valid order ID: {orderId}")
+        if not was_connected:
+            self.router.publish(CONNECTION_EVENTS, {"state": "connected", "time": time.time()})
+
+    def currentTime(self, time_: int):
+        super().currentTime(time_)
+        self.router.dispatch(CURRENT_TIME, 0, time_)
+        self.router.end(CURRENT_TIME, 0)
+
+    def ping(self, timeout: float = 2.0) -> float:
+        """Round trip of a reqCurrentTime in seconds; raises TimeoutError if unanswered."""
+        sink = self.router.register(CURRENT_TIME, 0, FutureSink())
+        start = time.perf_counter()
+        self.reqCurrentTime()
+        try:
+            wait_future(sink.future, timeout, "current time")
+            return time.perf_counter() - start
+        finally:
+            self.router.unregister(CURRENT_TIME, 0)
 
     def error(self, reqId, errorCode, errorString):
         super().error(reqId, errorCode, errorString)
         friendly_message = IBKR_ERROR_MAP.get(errorCode, "Unknown IBKR error.")
         logger.error(f"IBKR Error. ReqId: {reqId}, Code: {errorCode}, Msg: {errorString}. Friendly: {friendly_message}")
+        if errorCode in CONNECT_FAIL_CODES and not self.is_connected:
+            self._handshake.set()  # wake connect_and_run instead of letting it time out
+        if reqId is not None and reqId >= 0 and not _is_warning(errorCode):
+            # Wake whoever waits on this request instead of letting it time out
+            self.router.fail(reqId, IBKRError(errorCode, friendly_message, errorString))
+            self.router.publish(ORDER_EVENTS, {"event": "error", "orderId": reqId, "code": errorCode, "message": errorString})
 
     def connectionClosed(self):
         super().connectionClosed()
-        self.is_connected = False
+        was_connected, self.is_connected = self.is_connected, False
         logger.warning("IBKR connection closed.")
-
-    def _resubscribe_active(self):
-        mktdata_resubscribed = 0
-        rtb_resubscribed = 0
+        pending = self.router.fail_all(ConnectionError("IBKR connection closed."))
+        if pending:
+            logger.warning(f"Failed {pending} pending requests after connection loss.")
+        if was_connected:
+            self.router.publish(CONNECTION_EVENTS, {"state": "disconnected", "time": time.time()})
+
+    def _resubscribe_active(self, batch_size: int = RESUBSCRIBE_BATCH, interval: float = RESUBSCRIBE_INTERVAL,
+                            sleep=time.sleep) -> int:
+        """
+        Replays the active subscriptions after a reconnect, lowest priority
+        value first, `batch_size` requests at a time with `interval` seconds
+        between batches so a large replay does not trip IB's message pacing.
+        Returns how many were replayed.
+        """
         with self._lock_subs:
-            mktdata_subs = list(self._active_subs["mktdata"].items())
-            rtbars_subs = list(self._active_subs["rtbars"].items())
-
-        for reqId, params in mktdata_subs:
+            pending = [("mktdata", reqId, params) for reqId, params in self._active_subs["mktdata"].items()]
+            pending += [("rtbars", reqId, params) for reqId, params in self._active_subs["rtbars"].items()]
+            default = {"mktdata": 0, "rtbars": 1}
+            pending.sort(key=lambda sub: (self._sub_priority.get(sub[1], default[sub[0]]), sub[1]))
+
+        counts = {"mktdata": 0, "rtbars": 0}
+        for i, (kind, reqId, params) in enumerate(pending):
+            if i and batch_size and i % batch_size == 0 and sleep(interval):
+                break  # a stop-aware sleep returned True: shutting down
             try:
-                self.reqMktData(reqId, params["contract"], params["genericTickList"], params["snapshot"], params["regulatorySnapshot"], [])
-                mktdata_resubscribed += 1
+                if kind == "mktdata":
+                    self.reqMktData(reqId, params["contract"], params["genericTickList"], params["snapshot"], params["regulatorySnapshot"], [])
+                else:
+                    self.reqRealTimeBars(reqId, params["contract"], params["barSize"], params["whatToShow"], params["useRTH"], params["realTimeBarsOptions"])
+                counts[kind] += 1
             except Exception as e:
-                logger.exception(f"Failed to resubscribe market data for reqId {reqId}: {e}")
+                logger.exception(f"Failed to resubscribe {kind} for reqId {reqId}: {e}")
+        logger.info(f"Resubscribed {counts['mktdata']} market data streams and {counts['rtbars']} real-time bars streams.")
+        return counts["mktdata"] + counts["rtbars"]
 
-        for reqId, params in rtbars_subs:
-            try:
-                self.reqRealTimeBars(reqId, params["contract"], params["barSize"], params["whatToShow"], params["useRTH"], params["realTimeBarsOptions"])
-                rtb_resubscribed += 1
-            except Exception as e:
-                logger.exception(f"Failed to resubscribe real-time bars for reqId {reqId}: {e}")
-        logger.info(f"Resubscribed {mktdata_resubscribed} market data streams and {rtb_resubscribed} real-time bars streams.")
+    def run(self):
+        self._reader.conn = self.conn
+        super().run()
+
+    def stop(self):
+        """Deliberate shutdown: cancels and untracks every subscription, then disconnects."""
+        self._stopping = True
+        self.disconnect()
 
     def disconnect(self):
+        """
+        Closes the connection. Subscriptions are cancelled and untracked only
+        after stop(); ibapi's own calls - the reader's teardown when the
+        socket drops, a failed connect - keep them for the replay after the
+        reconnect and send nothing. A reader thread whose connection has
+        already been replaced leaves the newer one alone.
+        """
+        reader_conn = getattr(self._reader, "conn", None)
+        with self._conn_lock:
+            if reader_conn is not None and reader_conn is not self.conn:
+                return
+            if not self._stopping:
+                EClient.disconnect(self)
+                return
+            self._cancel_active()
+            super().disconnect()
+
+    def _cancel_active(self):
         mktdata_cancelled = 0
         rtb_cancelled = 0
         
@@ -163,199 +302,296 @@ class TWSClient(EWrapper, EClient):
                 logger.exception(f"Error cancelling real-time bars subscription {reqId}: {e}")
 
         logger.info(f"Cancelled {mktdata_cancelled} market data subscriptions and {rtb_cancelled} real-time bars subscriptions on disconnect.")
-        super().disconnect()
 
-    def connect_and_run(self, host, port, clientId):
-        self.connect(host, port, clientId)
-        thread = threading.Thread(target=self.run)
+    def connect_and_run(self, host, port, clientId, timeout: float = 10.0, resubscribe: bool = True):
+        """
+        Connects, starts the reader thread and returns once nextValidId has
+        arrived. Raises ConnectionError when the socket is refused or the
+        handshake does not complete within `timeout` seconds.
+        """
+        self._handshake.clear()
+        self._stopping = False
+        try:
+            with self._conn_lock:
+                self.connect(host, port, clientId)
+        except Exception as e:
+            raise ConnectionError(f"Could not connect to IBKR: {e}") from e
+        thread = threading.Thread(target=self.run, name=f"ib-reader-{clientId}")
         thread.daemon = True
         thread.start()
-        
-        for i in range(20):
-            if self.is_connected:
-                break
-            time.sleep(0.5)
-        
+
+        self._handshake.wait(timeout)
         if not self.is_connected:
+            if self.conn is not None:
+                EClient.disconnect(self)  # drop the half-open socket; subscriptions stay tracked
             raise ConnectionError("Could not connect to IBKR.")
-        try:
-            self._resubscribe_active()
-        except Exception as e:
-            logger.exception("Failed to resubscribe active streams: %s", e)
+        if resubscribe:
+            try:
+                self._resubscribe_active()
+            except Exception as e:
+                logger.exception("Failed to resubscribe active streams: %s", e)
 
-    def get_response_queue(self, reqId):
-        if reqId not in self.response_queues:
-            self.response_queues[reqId] = Queue(maxsize=100)
-        return self.response_queues[reqId]
+    def tickPrice(self, reqId, tickType, price, attrib):
+        super().tickPrice(reqId, tickType, price, attrib)
+        self.router.dispatch(MKTDATA, reqId, ("price", tickType, price))
 
-    def wait_for_response(self, reqId, timeout=5):
-        q = self.get_response_queue(reqId)
-        try:
-            return q.get(timeout=timeout)
-        except Empty:
-            raise TimeoutError(f"Timeout waiting for response for reqId: {reqId}")
+    def tickSize(self, reqId, tickType, size):
+        super().tickSize(reqId, tickType, size)
+        self.router.dispatch(MKTDATA, reqId, ("size", tickType, size))
+
+    def realtimeBar(self, reqId, time, open_, high, low, close, volume, wap, count):
+        super().realtimeBar(reqId, time, open_, high, low, close, volume, wap, count)
+        self.router.dispatch(RTBARS, reqId, {
+            "time": time, "open": open_, "high": high, "low": low,
+            "close": close, "volume": volume, "wap": wap, "count": count,
+        })
 
     def historicalData(self, reqId, bar):
-        self.get_response_queue(reqId).put(bar)
+        self.router.dispatch(HISTORICAL, reqId, bar)
+
+    def historicalDataUpdate(self, reqId, bar):
+        # keepUpToDate=True: updates of the most recent bar after historicalDataEnd
+        self.router.dispatch(HISTORICAL, reqId, bar)
 
     def historicalDataEnd(self, reqId, start, end):
         super().historicalDataEnd(reqId, start, end)
-        self.get_response_queue(reqId)
-        with self._events_lock:
-            ev = self._end_events.get(reqId)
-        if ev: ev.set()
-
-    def get_historical_data(self, contract, endDateTime, durationStr, barSizeSetting,
-                        whatToShow="TRADES", useRTH: int = 1, timeout=15.0):
+        self.router.end(HISTORICAL, reqId)
+
+    def iter_historical_data(self, contract, endDateTime, durationStr, barSizeSetting,
+                             whatToShow="TRADES", useRTH: int = 1, timeout=15.0,
+                             keep_up_to_date: bool = False, batch_size: int | None = None,
+                             update_timeout: float | None = None):
+        """
+        Generator over historical bars, yielded as soon as they are received.
+
+        With `batch_size`, yields lists of up to that many bars, taking whatever
+        is already buffered instead of waiting for a batch to fill. `timeout`
+        bounds the backfill up to historicalDataEnd.
+
+        With `keep_up_to_date=True` (IB requires an empty `endDateTime`) the
+        request stays open after the backfill and keeps yielding
+        historicalDataUpdate bars; the latest bar is resent while it is still
+        forming. The stream ends when no update arrives within `update_timeout`
+        or the generator is closed, and the request is then cancelled.
+        """
         reqId = self._next_req_id()
-        q = self.get_response_queue(reqId)
-        bars = []
-        done = threading.Event()
-        with self._events_lock:
-            self._end_events[reqId] = done
-
-        acquired = self._hist_sem.acquire(timeout=timeout)
-        if not acquired:
-            raise TimeoutError("Historical semaphore acquire timeout")
+        # Unbounded: a backfill is bounded by the request itself and must not drop bars
+        sink = self.router.register(HISTORICAL, reqId, StreamSink(keep_after_end=keep_up_to_date),
+                                    keep_after_end=keep_up_to_date)
 
+        started = time.monotonic()
+        if not self._hist_sem.acquire(timeout=timeout):
+            self.router.unregister(HISTORICAL, reqId)
+            raise TimeoutError("Historical semaphore acquire timeout")
+        try:
+            # The slot is given up while IB's pacing rules hold the request back,
+            # so it does not stall requests for other contracts; both waits
+            # together are bounded by `timeout`.
+            self._hist_pacer.acquire(
+                (contract_key(contract), endDateTime, durationStr, barSizeSetting, whatToShow, useRTH),
+                (contract_key(contract), whatToShow),
+                timeout=max(0.0, timeout - (time.monotonic() - started)),
+                slot=self._hist_sem,
+            )
+        except BaseException:
+            self.router.unregister(HISTORICAL, reqId)
+            raise
+
+        holding_slot = True
+        finished = False
         try:
-            _pace_hist()
             self.reqHistoricalData(reqId, contract, endDateTime, durationStr,
-                                   barSizeSetting, whatToShow, useRTH, 1, False, [])
+                                   barSizeSetting, whatToShow, useRTH, 1, keep_up_to_date, [])
 
             start_time = time.time()
             while True:
-                if done.is_set(): break
-                remaining = timeout - (time.time() - start_time)
-                if remaining <= 0:
-                    self.cancelHistoricalData(reqId)
-                    raise TimeoutError(f"historicalData timeout for reqId={reqId}")
-                try:
-                    item = q.get(timeout=min(remaining, 0.25))
-                    bars.append(item)
-                except Empty:
-                    pass
+                if sink.error is not None:
+                    finished = True
+                    raise sink.error
+                if sink.ended:
+                    if holding_slot:
+                        # The backfill is complete; live updates don't occupy a concurrency slot
+                        self._hist_sem.release()
+                        holding_slot = False
+                    if not keep_up_to_date and not len(sink):
+                        finished = True
+                        return
+                    wait = update_timeout
+                else:
+                    wait = timeout - (time.time() - start_time)
+                    if wait <= 0:
+                        raise TimeoutError(f"historicalData timeout for reqId={reqId}")
+
+                backfilled = sink.ended
+                batch = sink.take(batch_size or 1, timeout=wait)
+                if not batch:
+                    if backfilled and sink.error is None and keep_up_to_date:
+                        return  # no update within update_timeout
+                    continue
+                if batch_size is None:
+                    yield from batch
+                else:
+                    yield batch
         finally:
-            self._hist_sem.release()
-            with self._events_lock:
-                if reqId in self._end_events:
-                    del self._end_events[reqId]
-            while not q.empty():
+            if holding_slot:
+                self._hist_sem.release()
+            if not finished:
                 try:
-                    q.get_nowait()
-                except Empty:
-                    break
+                    self.cancelHistoricalData(reqId)
+                except Exception as e:
+                    logger.warning(f"Failed to cancel historical data reqId={reqId}: {e}")
+            self.router.unregister(HISTORICAL, reqId)
+
+    def get_historical_data(self, contract, endDateTime, durationStr, barSizeSetting,
+                        whatToShow="TRADES", useRTH: int = 1, timeout=15.0, sink=None):
+        """
+        Requests historical bars and blocks until historicalDataEnd.
+        Bars are appended to `sink` (any object with `.append`, e.g. a BarBuffer)
+        as they are received; a plain list is used when no sink is given.
+        """
+        bars = [] if sink is None else sink
+        for bar in self.iter_historical_data(contract, endDateTime, durationStr, barSizeSetting,
+                                             whatToShow, useRTH, timeout):
+            bars.append(bar)
         return bars
 
+    def hist_pacing_stats(self) -> dict:
+        """Queue depth, admissions and wait-time histogram of the historical pacer."""
+        return self._hist_pacer.stats()
+
     def openOrder(self, orderId, contract, order, orderState):
         super().openOrder(orderId, contract, order, orderState)
-        self.get_response_queue(orderId).put(order)
+        self.router.publish(ORDER_EVENTS, {
+            "event": "openOrder",
+            "orderId": orderId,
+            "contract": contract,
+            "order": order,
+            "orderState": orderState,
+        })
 
     def orderStatus(self, orderId, status, filled, remaining, avgFillPrice, permId, parentId, lastFillPrice, clientId, whyHeld, mktCapPrice):
         super().orderStatus(orderId, status, filled, remaining, avgFillPrice, permId, parentId, lastFillPrice, clientId, whyHeld, mktCapPrice)
-        self.get_response_queue(orderId).put({
+        self.router.publish(ORDER_EVENTS, {
+            "event": "orderStatus",
+            "orderId": orderId,
             "status": status,
             "filled": filled,
             "remaining": remaining,
             "avgFillPrice": avgFillPrice,
             "permId": permId,
+            "parentId": parentId,
+            "lastFillPrice": lastFillPrice,
+        })
+
+    def execDetails(self, reqId, contract, execution):
+        super().execDetails(reqId, contract, execution)
+        self.router.publish(ORDER_EVENTS, {
+            "event": "execDetails",
+            "orderId": execution.orderId,
+            "contract": contract,
+            "execution": execution,
         })
 
     def make_bracket_order(self, parentId: int, action: str, quantity: int, limitPrice: float, takeProfitPrice: float, stopLossPrice: float):
-        from ibapi.order import Order
-        parent = Order()
-        parent.orderId = parentId
-        parent.action = action
-        parent.orderType = "LMT"
-        parent.totalQuantity = quantity
-        parent.lmtPrice = limitPrice
-        parent.transmit = False
-
-        takeProfit = Order()
-        takeProfit.orderId = parent.orderId + 1
-        takeProfit.action = "SELL" if action == "BUY" else "BUY"
-        takeProfit.orderType = "LMT"
-        takeProfit.totalQuantity = quantity
-        takeProfit.lmtPrice = takeProfitPrice
-        takeProfit.parentId = parentId
-        takeProfit.transmit = False
-
-        stopLoss = Order()
-        stopLoss.orderId = parent.orderId + 2
-        stopLoss.action = "SELL" if action == "BUY" else "BUY"
-        stopLoss.orderType = "STP"
-        stopLoss.auxPrice = stopLossPrice
-        stopLoss.totalQuantity = quantity
-        stopLoss.parentId = parentId
-        stopLoss.transmit = True
-
-        return [parent, takeProfit, stopLoss]
+        return BracketTemplate(None, action).build(parentId, quantity, limitPrice, takeProfitPrice, stopLossPrice)
 
     def position(self, account, contract, pos, avgCost):
         super().position(account, contract, pos, avgCost)
-        self.get_response_queue(self.next_valid_id).put({
-            "account": account,
-            "symbol": contract.symbol,
-            "secType": contract.secType,
-            "currency": contract.currency,
-            "position": pos,
-            "avgCost": avgCost,
-        })
+        item = (account, contract, pos, avgCost)
+        self.router.dispatch(POSITIONS, 0, item)
+        self.router.dispatch(POSITIONS_REQUEST, 0, item)
 
     def positionEnd(self):
         super().positionEnd()
-        self.get_response_queue(self.next_valid_id).put(None)
+        self.router.end(POSITIONS, 0)
+        self.router.end(POSITIONS_REQUEST, 0)
 
     def get_positions_blocking(self, timeout=5.0):
-        q = Queue()
-        end_marker = object()
+        # Concurrent callers share one in-flight reqPositions instead of racing on handlers
+        sink, owner = self._positions_request()
+        try:
+            if owner:
+                self.reqPositions()
+            items = wait_future(sink.future, timeout, "position data.")
+        finally:
+            if owner:
+                self._end_positions_request(sink)
+
+        return position_rows(items)
+
+    def _positions_request(self) -> tuple[FutureSink, bool]:
+        """The in-flight one-shot positions download and whether the caller owns (and sends) it."""
+        with self._positions_lock:
+            sink = self.router.get(POSITIONS_REQUEST, 0)
+            if sink is not None:
+                return sink, False
+            return self.router.register(POSITIONS_REQUEST, 0, FutureSink()), True
+
+    def _end_positions_request(self, sink: FutureSink):
+        # positionEnd may already have removed the sink and a newer request registered its own
+        with self._positions_lock:
+            if self.router.get(POSITIONS_REQUEST, 0) is sink:
+                self.router.unregister(POSITIONS_REQUEST, 0)
+            streaming = self.router.get(POSITIONS, 0) is not None
+        if not streaming:
+            self.cancelPositions()  # a PortfolioCache stream shares the subscription: leave it running
+
+    def updateAccountValue(self, key, val, currency, accountName):
+        super().updateAccountValue(key, val, currency, accountName)
+        self.router.dispatch(ACCOUNT_UPDATES, 0, {
+            "kind": "value",
+            "account": accountName,
+            "tag": key,
+            "value": val,
+            "currency": currency,
+        })
 
-        def position_handler(account, contract, pos, avgCost):
-            q.put((account, contract, pos, avgCost))
+    def updatePortfolio(self, contract, position, marketPrice, marketValue, averageCost, unrealizedPNL, realizedPNL, accountName):
+        super().updatePortfolio(contract, position, marketPrice, marketValue, averageCost, unrealizedPNL, realizedPNL, accountName)
+        self.router.dispatch(ACCOUNT_UPDATES, 0, {
+            "kind": "portfolio",
+            "account": accountName,
+            "contract": contract,
+            "position": position,
+            "market_price": marketPrice,
+            "market_value": marketValue,
+            "avg_cost": averageCost,
+            "unrealized_pnl": unrealizedPNL,
+            "realized_pnl": realizedPNL,
+        })
 
-        def position_end_handler():
-            q.put(end_marker)
+    def updateAccountTime(self, timeStamp):
+        super().updateAccountTime(timeStamp)
+        self.router.dispatch(ACCOUNT_UPDATES, 0, {"kind": "time", "time": timeStamp})
 
-        original_position_handler = self.position
-        original_position_end_handler = self.positionEnd
-        self.position = position_handler
-        self.positionEnd = position_end_handler
-        
-        positions = []
+    def accountDownloadEnd(self, accountName):
+        super().accountDownloadEnd(accountName)
+        self.router.end(ACCOUNT_UPDATES, 0)
+
+    def pnl(self, reqId, dailyPnL, unrealizedPnL, realizedPnL):
+        super().pnl(reqId, dailyPnL, unrealizedPnL, realizedPnL)
+        self.router.dispatch(PNL, reqId, (dailyPnL, unrealizedPnL, realizedPnL))
+
+    def contractDetails(self, reqId, contractDetails):
+        self.router.dispatch(CONTRACT_DETAILS, reqId, contractDetails)
+
+    def contractDetailsEnd(self, reqId):
+        super().contractDetailsEnd(reqId)
+        self.router.end(CONTRACT_DETAILS, reqId)
+
+    def get_contract_details(self, contract, timeout=5.0) -> list:
+        """All `ContractDetails` matching `contract`; raises IBKRError if IB knows none."""
+        reqId = self._next_req_id()
+        sink = self.router.register(CONTRACT_DETAILS, reqId, FutureSink())
+        self.reqContractDetails(reqId, contract)
         try:
-            self.reqPositions()
-            start_time = time.time()
-            while True:
-                remaining = timeout - (time.time() - start_time)
-                if remaining <= 0:
-                    raise TimeoutError("Timeout waiting for position data.")
-                
-                try:
-                    item = q.get(timeout=remaining)
-                except Empty:
-                    raise TimeoutError("Timeout waiting for position data.")
-
-                if item is end_marker:
-                    break
-                
-                _account, contract, pos, avg_cost = item
-                positions.append({
-                    "symbol": contract.symbol,
-                    "asset_type": contract.secType,
-                    "qty": pos,
-                    "avg_price": avg_cost,
-                    "unrealized_pnl": None,
-                    "currency": contract.currency
-                })
+            return wait_future(sink.future, timeout, "contract details")
         finally:
-            self.position = original_position_handler
-            self.positionEnd = original_position_end_handler
-            
-        return positions
+            self.router.unregister(CONTRACT_DETAILS, reqId)
 
     def accountSummary(self, reqId, account, tag, value, currency):
         super().accountSummary(reqId, account, tag, value, currency)
-        self.get_response_queue(reqId).put({
+        self.router.dispatch(ACCOUNT_SUMMARY, reqId, {
             "account": account,
             "tag": tag,
             "value": value,
@@ -364,19 +600,17 @@ class TWSClient(EWrapper, EClient):
 
     def accountSummaryEnd(self, reqId: int):
         super().accountSummaryEnd(reqId)
-        self.get_response_queue(reqId).put(None)
+        self.router.end(ACCOUNT_SUMMARY, reqId)
 
-    def get_account_summary(self, reqId, group, tags):
+    def get_account_summary(self, reqId, group, tags, timeout=5.0):
+        sink = self.router.register(ACCOUNT_SUMMARY, reqId, FutureSink())
         self.reqAccountSummary(reqId, group, tags)
-        
-        summary = []
-        while True:
-            try:
-                response = self.wait_for_response(reqId, timeout=5)
-                if response is None:
-                    break
-                summary.append(response)
-            except TimeoutError:
-                logger.error("Timeout waiting for account summary")
-                break
-        return summary
+        try:
+            return wait_future(sink.future, timeout, "account summary")
+        except TimeoutError:
+            logger.error("Timeout waiting for account summary")
+            return list(sink.items)
+        finally:
+            self.router.unregister(ACCOUNT_SUMMARY, reqId)
+            # reqAccountSummary is a subscription; stop the updates once answered
+            self.cancelAccountSummary(reqId)
@@ -1,23 +1,40 @@
 import time
 import uuid
-from fastapi import FastAPI, Request, Response, Depends, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response, Depends, HTTPException, WebSocketException
 from fastapi.security import APIKeyHeader
+from starlette.requests import HTTPConnection
 from starlette.responses import JSONResponse
-from mcp_server.tools import market_data, orders, portfolio, pdt_guard, risk
-from mcp_server.tools.utils import load_config
+from mcp_server.tools import market_data, orders, portfolio, pdt_guard, risk, stream
+from mcp_server.tools.utils import load_config, start_ibkr
 
 config = load_config()
 API_KEY = config.get("api_key")
 API_KEY_NAME = "X-API-Key"
 
-api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
+class ConnectionAPIKeyHeader(APIKeyHeader):
+    """APIKeyHeader that also works as a dependency of WebSocket routes."""
 
-async def get_api_key(api_key: str = Depends(api_key_header)):
+    async def __call__(self, connection: HTTPConnection) -> str | None:
+        return connection.headers.get(self.model.name)
+
+api_key_header = ConnectionAPIKeyHeader(name=API_KEY_NAME, auto_error=False)
+
+async def get_api_key(connection: HTTPConnection, api_key: str = Depends(api_key_header)):
     if API_KEY and api_key != API_KEY:
+        if connection.scope["type"] == "websocket":
+            raise WebSocketException(code=1008, reason="Invalid API Key")
         raise HTTPException(status_code=401, detail="Invalid API Key")
     return api_key
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The first tool call must not pay for connecting to the Gateway on the event loop
+    await start_ibkr()
+    yield
+
 app = FastAPI(
+    lifespan=lifespan,
     title="mcp-ibkr-trader",
     description="Autonomous trading system connecting a Master Control Program (MCP) server with Interactive Brokers Gateway.",
     version="0.1.0",
@@ -62,5 +79,6 @@ app.include_router(orders.router, tags=["Tools"])
 app.include_router(portfolio.router, tags=["Tools"])
 app.include_router(pdt_guard.router, tags=["Tools"])
 app.include_router(risk.router, tags=["Tools"])
+app.include_router(stream.router, tags=["Streaming"])
 
 start_time = time.time()
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from sqlalchemy import text
+from storage.db import make_engine
+from mcp_server.tools.utils import load_config
+
+
+class Claim(NamedTuple):
+    claimed: bool
+    # Stored response (JSON) of the earlier request; None while that request is still in flight
+    response: str | None = None
+
+
+class MemoryIdempotencyStore:
+    """
+    In-process LRU of plan_ids with a TTL. Every operation is O(1); at most
+    `max_entries` keys are kept, least recently used first out. Responses are
+    kept as JSON strings to keep the per-key footprint small.
+    """
+
+    def __init__(self, max_entries: int = 1_000_000, ttl: float = 86400.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, str | None]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _live(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[0] >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _set(self, key: str, created: float, response: str | None, now: float):
+        self._entries[key] = (created, response)
+        self._entries.move_to_end(key)
+        entries = self._entries
+        while entries:
+            oldest_key, (oldest_created, _) = next(iter(entries.items()))
+            if len(entries) > self.max_entries or now - oldest_created >= self.ttl:
+                del entries[oldest_key]
+            else:
+                break
+
+    def claim(self, key: str) -> Claim:
+        with self._lock:
+            now = self._clock()
+            entry = self._live(key, now)
+            if entry is not None:
+                return Claim(False, entry[1])
+            self._set(key, now, None, now)
+            return Claim(True)
+
+    def complete(self, key: str, response: str):
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(key)
+            self._set(key, entry[0] if entry else now, response, now)
+
+    def release(self, key: str):
+        """Drops an unfinished claim so the plan can be retried."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is None:
+                del self._entries[key]
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._live(key, self._clock())
+            return entry[1] if entry else None
+
+
+class SQLiteIdempotencyStore:
+    """
+    plan_id claims in a SQLite database (WAL) shared by every worker on the
+    host. `claim` is an atomic `INSERT OR IGNORE` on the primary key, so only
+    one request per plan_id can win, whichever worker it lands on.
+    """
+
+    def __init__(self, path: str = "./data/idempotency.db", ttl: float = 86400.0, clock=time.time):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self._clock = clock
+        self.engine = make_engine(f"sqlite:///{path}")
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS plan_ids ("
+                "plan_id TEXT PRIMARY KEY, created_at REAL NOT NULL, response TEXT"
+                ") WITHOUT ROWID"
+            ))
+
+    def claim(self, key: str) -> Claim:
+        now = self._clock()
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM plan_ids WHERE plan_id = :key AND created_at < :cutoff"),
+                         {"key": key, "cutoff": now - self.ttl})
+            inserted = conn.execute(text("INSERT OR IGNORE INTO plan_ids (plan_id, created_at) VALUES (:key, :now)"),
+                                    {"key": key, "now": now}).rowcount
+            if inserted:
+                return Claim(True)
+            row = conn.execute(text("SELECT response FROM plan_ids WHERE plan_id = :key"), {"key": key}).first()
+            return Claim(False, row[0] if row else None)
+
+    def complete(self, key: str, response: str):
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE plan_ids SET response = :response WHERE plan_id = :key"),
+                         {"key": key, "response": response})
+
+    def release(self, key: str):
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM plan_ids WHERE plan_id = :key AND response IS NULL"), {"key": key})
+
+    def get(self, key: str) -> str | None:
+        with self.engine.connect() as conn:
+            row = conn.execute(text("SELECT response FROM plan_ids WHERE plan_id = :key AND created_at >= :cutoff"),
+                               {"key": key, "cutoff": self._clock() - self.ttl}).first()
+        return row[0] if row else None
+
+    def purge_expired(self) -> int:
+        with self.engine.begin() as conn:
+            return conn.execute(text("DELETE FROM plan_ids WHERE created_at < :cutoff"),
+                                {"cutoff": self._clock() - self.ttl}).rowcount
+
+
+class TieredIdempotencyStore:
+    """
+    Memory tier in front of a shared durable tier. Completed responses are
+    answered from memory; claims always go to the durable tier, which is the
+    one that decides between workers.
+    """
+
+    def __init__(self, memory: MemoryIdempotencyStore, durable: SQLiteIdempotencyStore):
+        self.memory = memory
+        self.durable = durable
+
+    def claim(self, key: str) -> Claim:
+        cached = self.memory.get(key)
+        if cached is not None:
+            return Claim(False, cached)
+        claim = self.durable.claim(key)
+        if claim.response is not None:
+            self.memory.complete(key, claim.response)
+        return claim
+
+    def complete(self, key: str, response: str):
+        self.durable.complete(key, response)
+        self.memory.complete(key, response)
+
+    def release(self, key: str):
+        self.durable.release(key)
+
+    def get(self, key: str) -> str | None:
+        return self.memory.get(key) or self.durable.get(key)
+
+
+def make_idempotency_store(config: dict):
+    """Builds the backend selected by the `idempotency` config section (memory, sqlite or tiered)."""
+    cfg = config.get("idempotency", {}) or {}
+    backend = cfg.get("backend", "memory")
+    ttl = float(cfg.get("ttl_sec", 86400))
+    if backend == "memory":
+        return MemoryIdempotencyStore(int(cfg.get("max_entries", 1_000_000)), ttl)
+    path = cfg.get("path", "./data/idempotency.db")
+    if backend == "sqlite":
+        return SQLiteIdempotencyStore(path, ttl)
+    if backend == "tiered":
+        return TieredIdempotencyStore(MemoryIdempotencyStore(int(cfg.get("max_entries", 1_000_000)), ttl),
+                                      SQLiteIdempotencyStore(path, ttl))
+    raise ValueError(f"Unknown idempotency backend: {backend}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_idempotency_store():
+    """Process-wide store for orders.place_bracket, created from config on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = make_idempotency_store(load_config())
+        return _store
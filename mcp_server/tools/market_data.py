@@ -1,10 +1,21 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header
 from pydantic import BaseModel, Field
 from datetime import datetime, timedelta
 from enum import Enum
-import random
-from storage.db import engine, realtime_market_data
-from sqlalchemy import insert
+import asyncio
+import hashlib
+import io
+import json
+import numpy as np
+import pandas as pd
+from starlette.responses import Response, StreamingResponse
+from loguru import logger
+try:
+    import pyarrow as pa
+except ImportError:  # optional: only needed for Arrow IPC responses
+    pa = None
+from storage.writer import get_tick_writer
+from mcp_server.tools.utils import get_ibkr
 
 router = APIRouter()
 
@@ -64,51 +75,296 @@ def get_timeframe_delta(tf: TimeframeEnum):
     elif tf == TimeframeEnum.day1:
         return timedelta(days=1)
 
-def store_realtime_market_data(data: RealtimeMarketData):
-    with engine.connect() as connection:
-        stmt = insert(realtime_market_data).values(
-            symbol=data.symbol,
-            price=data.price,
-            timestamp=data.timestamp,
-            order_id=data.order_id
+def store_realtime_market_data(data: RealtimeMarketData) -> bool:
+    """Queues a tick for the batched background writer; returns False if it was dropped."""
+    return get_tick_writer().put({
+        "symbol": data.symbol,
+        "price": data.price,
+        "timestamp": data.timestamp,
+        "order_id": data.order_id,
+    })
+
+def _mock_seed(seed: str) -> int:
+    return int.from_bytes(hashlib.sha256(seed.encode()).digest()[:8], "little")
+
+def generate_mock_bars(seed: str, start: datetime, end: datetime, time_delta: timedelta) -> pd.DataFrame:
+    """
+    Deterministic OHLCV bars for [start, end) built as whole NumPy arrays: a
+    geometric random walk for closes, each bar opening at the previous close.
+    The same `seed` always yields the same bars. `t` is naive wall-clock time.
+    """
+    step_us = time_delta // timedelta(microseconds=1)
+    n = max(0, -(-((end - start) // timedelta(microseconds=1)) // step_us))
+    rng = np.random.default_rng(_mock_seed(seed))
+
+    # Per-bar volatility scales with the square root of the bar length (~0.05% for 1m)
+    sigma = 0.0005 * np.sqrt(step_us / 60e6)
+    first = rng.uniform(1.0, 100.0)
+    close = first * np.exp(np.cumsum(rng.normal(0.0, sigma, n)))
+    open_ = np.empty(n)
+    open_[:1] = first
+    open_[1:] = close[:-1]
+    wick = np.abs(rng.normal(0.0, sigma / 2, (2, n)))
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+
+    base = np.datetime64(start.replace(tzinfo=None), "us")
+    return pd.DataFrame({
+        "t": base + np.arange(n) * np.timedelta64(step_us, "us"),
+        "o": open_,
+        "h": high,
+        "l": low,
+        "c": close,
+        "v": rng.integers(100, 1001, n),
+    })
+
+def _iso_times(t: np.ndarray, tzinfo) -> np.ndarray:
+    """Formats naive datetime64 values the way pydantic serializes datetimes carrying `tzinfo`."""
+    t = t.astype("datetime64[us]")
+    unit = "s" if not (t.astype("int64") % 1_000_000).any() else "us"
+    out = np.datetime_as_string(t, unit=unit).astype(object)
+    offset = tzinfo.utcoffset(None) if tzinfo is not None else None
+    if offset is None:
+        return out
+    if not offset:
+        return out + "Z"
+    minutes = int(offset.total_seconds()) // 60
+    return out + f"{'+' if minutes >= 0 else '-'}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}"
+
+# Media types accepted by market_data.get_bars
+JSON_ROWS = "application/json"
+JSON_COLUMNAR = "application/vnd.mcp.bars.columnar+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+NUMPY_NPY = "application/x-npy"
+BAR_MEDIA_TYPES = (JSON_ROWS, JSON_COLUMNAR, ARROW_STREAM, NUMPY_NPY)
+
+def negotiate_bars_format(accept: str | None) -> str:
+    """
+    Picks the response format from an Accept header, honouring q-values.
+    Wildcards and a missing header select row JSON; raises 406 when no
+    acceptable format can be produced.
+    """
+    if not accept:
+        return JSON_ROWS
+    best, best_q = None, 0.0
+    for i, part in enumerate(accept.split(",")):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media in ("*/*", "application/*"):
+            media = JSON_ROWS
+        if media not in BAR_MEDIA_TYPES or q <= best_q:
+            continue
+        if media == ARROW_STREAM and pa is None:
+            continue
+        best, best_q = media, q
+    if best is None:
+        detail = f"Supported formats: {', '.join(BAR_MEDIA_TYPES)}"
+        if ARROW_STREAM in accept and pa is None:
+            detail = "Arrow IPC responses need pyarrow installed on the server. " + detail
+        raise HTTPException(status_code=406, detail=detail)
+    return best
+
+def _utc_micros(t: np.ndarray, tzinfo) -> np.ndarray:
+    """Naive wall-clock datetime64 values as datetime64[us], shifted to UTC when `tzinfo` has an offset."""
+    t = t.astype("datetime64[us]")
+    offset = tzinfo.utcoffset(None) if tzinfo is not None else None
+    if offset:
+        t = t - np.timedelta64(offset // timedelta(microseconds=1), "us")
+    return t
+
+def _rows_json(bars: pd.DataFrame, tzinfo) -> str:
+    """Bars as a JSON array of {t, o, h, l, c, v} objects."""
+    if not len(bars):
+        return "[]"
+    return bars.assign(t=_iso_times(bars["t"].to_numpy(), tzinfo)).to_json(orient="records", double_precision=15)
+
+def _bars_response(symbol: str, tf: TimeframeEnum, bars: pd.DataFrame, tzinfo, meta: dict,
+                   media_type: str = JSON_ROWS) -> Response:
+    """
+    Serializes bars straight from column arrays, without per-bar models.
+
+    * JSON_ROWS: the MarketDataResponse layout (`bars` as a list of objects).
+    * JSON_COLUMNAR: `columns` holds parallel t/o/h/l/c/v arrays.
+    * ARROW_STREAM: one Arrow IPC record batch; symbol, tf and meta are schema metadata.
+    * NUMPY_NPY: a `.npy` structured array (`np.load`) with fields t (datetime64[us]),
+      o/h/l/c (float64) and v (int64); symbol, tf and meta are in the `X-Bars-Meta` header.
+
+    In the binary formats `t` is UTC when the request times carried a zone.
+    """
+    head = json.dumps({"symbol": symbol, "tf": tf.value})[:-1]
+    if media_type == JSON_ROWS:
+        body = f'{head}, "bars": {_rows_json(bars, tzinfo)}, "meta": {json.dumps(meta)}}}'
+        return Response(content=body, media_type=JSON_ROWS)
+
+    if media_type == JSON_COLUMNAR:
+        columns = {"t": pd.Series(_iso_times(bars["t"].to_numpy(), tzinfo), dtype=object)}
+        columns.update({name: bars[name] for name in "ohlcv"})
+        encoded = ", ".join(
+            f'"{name}": {col.to_json(orient="values", double_precision=15) if len(col) else "[]"}'
+            for name, col in columns.items()
+        )
+        body = f'{head}, "columns": {{{encoded}}}, "meta": {json.dumps(meta)}}}'
+        return Response(content=body, media_type=JSON_COLUMNAR)
+
+    t = _utc_micros(bars["t"].to_numpy(), tzinfo)
+    header_meta = {"symbol": symbol, "tf": tf.value, "meta": meta}
+    if media_type == ARROW_STREAM:
+        tz = "UTC" if tzinfo is not None and tzinfo.utcoffset(None) is not None else None
+        table = pa.table(
+            {
+                "t": pa.array(t.astype("int64"), type=pa.timestamp("us", tz=tz)),
+                **{name: pa.array(bars[name].to_numpy()) for name in "ohlcv"},
+            },
+            metadata={key: json.dumps(value) for key, value in header_meta.items()},
         )
-        connection.execute(stmt)
-        connection.commit()
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM)
 
-@router.post("/tool/market_data.get_bars", response_model=MarketDataResponse)
-async def get_bars(request: MarketDataRequest):
-    # Mock implementation
+    out = np.empty(len(bars), dtype=[("t", "<M8[us]"), ("o", "<f8"), ("h", "<f8"), ("l", "<f8"),
+                                     ("c", "<f8"), ("v", "<i8")])
+    out["t"] = t
+    for name in "ohlcv":
+        out[name] = bars[name].to_numpy()
+    buf = io.BytesIO()
+    np.save(buf, out, allow_pickle=False)
+    return Response(content=buf.getvalue(), media_type=NUMPY_NPY,
+                    headers={"X-Bars-Meta": json.dumps(header_meta)})
+
+@router.post(
+    "/tool/market_data.get_bars",
+    response_model=MarketDataResponse,
+    responses={200: {"content": {m: {} for m in BAR_MEDIA_TYPES[1:]}}},
+)
+async def get_bars(request: MarketDataRequest, accept: str | None = Header(default=None)):
     if request.start >= request.end:
         raise HTTPException(status_code=400, detail="start must be before end")
+    media_type = negotiate_bars_format(accept)
+
+    bars, tzinfo, source = await _load_bars(get_ibkr(), request, request.start, request.end)
+    meta = {"what_to_show": request.what_to_show.value, "source": source, "count": len(bars)}
+    return _bars_response(request.symbol, request.tf, bars, tzinfo, meta, media_type)
 
-    bars = []
-    current_time = request.start
-    time_delta = get_timeframe_delta(request.tf)
-    
-    # Seed the random number generator for deterministic results
+async def _load_bars(ibkr, request: MarketDataRequest, start: datetime, end: datetime):
+    """
+    Bars for `request` over [start, end) as a t/o/h/l/c/v frame with naive
+    wall-clock `t`, plus the zone those times are in and the data source.
+    """
+    if ibkr is not None:
+        df = await ibkr.get_bars(request.symbol, request.tf.value, start.isoformat(), end.isoformat(),
+                                 what_to_show=request.what_to_show.value, asset_type=request.asset_type.value)
+        bars = pd.DataFrame({
+            "t": df["ts"].to_numpy(), "o": df["open"], "h": df["high"], "l": df["low"], "c": df["close"],
+            "v": df["volume"].fillna(0).astype("int64"),
+        })
+        return bars, None, "IBKR"
+
+    # Mock implementation, seeded for deterministic results
     seed = f"{request.symbol}-{request.tf}-{request.start}"
-    rng = random.Random(seed)
-
-    while current_time < request.end:
-        open_price = rng.uniform(1.0, 100.0)
-        close_price = open_price + rng.uniform(-0.5, 0.5)
-        high_price = max(open_price, close_price) + rng.uniform(0.0, 0.2)
-        low_price = min(open_price, close_price) - rng.uniform(0.0, 0.2)
-        volume = rng.randint(100, 1000)
-        
-        bars.append(Bar(
-            t=current_time,
-            o=open_price,
-            h=high_price,
-            l=low_price,
-            c=close_price,
-            v=volume
-        ))
-        current_time += time_delta
-
-    return MarketDataResponse(
-        symbol=request.symbol,
-        tf=request.tf,
-        bars=bars,
-        meta={"what_to_show": request.what_to_show, "source": "MOCK", "count": len(bars)},
-    )
\ No newline at end of file
+    return generate_mock_bars(seed, start, end, get_timeframe_delta(request.tf)), start.tzinfo, "MOCK"
+
+class MarketDataBatchRequest(BaseModel):
+    items: list[MarketDataRequest] = Field(..., min_length=1, max_length=1000)
+
+NDJSON = "application/x-ndjson"
+
+def plan_bars_batch(items: list[MarketDataRequest], merge: bool) -> tuple[list, dict]:
+    """
+    Groups batch items into fetches. Items for the same symbol, asset type,
+    timeframe, what_to_show and zone share one fetch; with `merge`, overlapping
+    or touching ranges are combined into one window. Without it only identical
+    ranges are shared (mock bars depend on the requested start).
+
+    Returns ([(request, start, end, [item indices])], {index: error}) where
+    invalid items only appear in the error map.
+    """
+    errors = {}
+    groups: dict[tuple, list] = {}
+    for i, item in enumerate(items):
+        if item.start >= item.end:
+            errors[i] = "start must be before end"
+            continue
+        key = (item.symbol, item.asset_type, item.tf, item.what_to_show, item.start.utcoffset())
+        if not merge:
+            key += (item.start, item.end)
+        groups.setdefault(key, []).append(i)
+
+    fetches = []
+    for indices in groups.values():
+        indices.sort(key=lambda i: items[i].start)
+        window = None
+        for i in indices:
+            item = items[i]
+            if window is not None and item.start <= window[2]:
+                window[2] = max(window[2], item.end)
+                window[3].append(i)
+            else:
+                window = [item, item.start, item.end, [i]]
+                fetches.append(window)
+    return [tuple(f) for f in fetches], errors
+
+def _batch_line(index: int, item: MarketDataRequest, **fields) -> str:
+    return json.dumps({"index": index, "symbol": item.symbol, "tf": item.tf.value, **fields})
+
+@router.post("/tool/market_data.get_bars_batch", response_class=StreamingResponse,
+             responses={200: {"content": {NDJSON: {}}}})
+async def get_bars_batch(request: MarketDataBatchRequest):
+    """
+    Streams one NDJSON line per item as soon as its data is ready:
+    `{"index", "symbol", "tf", "status": "ok", "bars", "meta"}` or
+    `{"index", "symbol", "tf", "status": "error", "error": {"code", "message"}}`,
+    followed by a `{"done": true, "ok": n, "failed": m}` summary line.
+
+    Overlapping requests are fetched once, and all fetches run concurrently
+    through the historical semaphore and pacing gate of the IB client.
+    """
+    items = request.items
+    ibkr = get_ibkr()
+    fetches, invalid = plan_bars_batch(items, merge=ibkr is not None)
+
+    async def fetch(fetch_item, start, end, indices):
+        try:
+            return indices, await _load_bars(ibkr, fetch_item, start, end), None
+        except Exception as e:
+            logger.warning(f"Batch fetch for {fetch_item.symbol} {fetch_item.tf.value} failed: {e}")
+            return indices, None, e
+
+    async def lines():
+        ok = failed = 0
+        for i, message in invalid.items():
+            failed += 1
+            yield _batch_line(i, items[i], status="error", error={"code": "INVALID_RANGE", "message": message}) + "\n"
+
+        tasks = [asyncio.ensure_future(fetch(*f)) for f in fetches]
+        try:
+            for done in asyncio.as_completed(tasks):
+                indices, loaded, error = await done
+                if error is not None:
+                    for i in indices:
+                        failed += 1
+                        yield _batch_line(i, items[i], status="error",
+                                          error={"code": type(error).__name__, "message": str(error)}) + "\n"
+                    continue
+                bars, tzinfo, source = loaded
+                ts = bars["t"]
+                for i in indices:
+                    item = items[i]
+                    part = bars[(ts >= np.datetime64(item.start.replace(tzinfo=None)))
+                                & (ts < np.datetime64(item.end.replace(tzinfo=None)))]
+                    meta = {"what_to_show": item.what_to_show.value, "source": source, "count": len(part)}
+                    ok += 1
+                    head = _batch_line(i, item, status="ok")[:-1]
+                    yield f'{head}, "bars": {_rows_json(part, tzinfo)}, "meta": {json.dumps(meta)}}}\n'
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield json.dumps({"done": True, "ok": ok, "failed": failed}) + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON)
@@ -1,14 +1,14 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from enum import Enum
 from typing import Optional
-from mcp_server.tools.utils import deterministic_id
+from mcp_server.tools.utils import deterministic_id, get_ibkr
+from mcp_server.tools.idempotency import get_idempotency_store
+from risk.kill_switch import KillSwitchTripped
 
 router = APIRouter()
 
-# In-memory store for idempotency
-idempotency_store = {}
-
 class AssetTypeEnum(str, Enum):
     stk = "STK"
     fx = "FX"
@@ -68,12 +68,10 @@ class PlaceBracketResponse(BaseModel):
 
 @router.post("/tool/orders.place_bracket", response_model=PlaceBracketResponse)
 async def place_bracket(request: PlaceBracketRequest):
-    if request.plan_id in idempotency_store:
-        idempotency_store[request.plan_id].status = "DUPLICATE"
-        return idempotency_store[request.plan_id]
-
     if request.qty <= 0:
         raise HTTPException(status_code=422, detail="qty must be positive")
+    if request.entry.type == OrderTypeEntryEnum.lmt and request.entry.price is None:
+        raise HTTPException(status_code=422, detail="entry.price is required for LMT entries")
     if request.side == SideEnum.buy:
         if request.entry.price and request.stop.stop_price >= request.entry.price:
             raise HTTPException(status_code=400, detail="stop_price must be below entry.price for BUY orders")
@@ -87,12 +85,49 @@ async def place_bracket(request: PlaceBracketRequest):
     if request.requires_approval:
         raise HTTPException(status_code=409, detail="requires_approval is not supported in this module")
 
+    # Only the request that wins the claim may reach the broker. The store is
+    # SQLite with a busy timeout, so its calls run off the event loop.
+    store = get_idempotency_store()
+    claim = await asyncio.to_thread(store.claim, request.plan_id)
+    if not claim.claimed:
+        if claim.response is None:
+            raise HTTPException(status_code=409, detail="plan_id is already being processed")
+        return PlaceBracketResponse.model_validate_json(claim.response).model_copy(update={"status": "DUPLICATE"})
+
+    try:
+        response = await _submit_bracket(request)
+    except BaseException:
+        await asyncio.shield(asyncio.to_thread(store.release, request.plan_id))
+        raise
+    await asyncio.to_thread(store.complete, request.plan_id, response.model_dump_json())
+    return response
+
+async def _submit_bracket(request: PlaceBracketRequest) -> PlaceBracketResponse:
+    ibkr = get_ibkr()
+    if ibkr is not None:
+        try:
+            placed = await ibkr.place_bracket_order(request.symbol, request.asset_type.value, request.qty,
+                                                    request.side.value, request.entry.price, request.stop.stop_price,
+                                                    request.take.price, request.tif.value, plan_id=request.plan_id,
+                                                    entry_type=request.entry.type.value)
+        except KillSwitchTripped as e:
+            raise HTTPException(status_code=423, detail=str(e))
+        except ConnectionError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return PlaceBracketResponse(
+            plan_id=request.plan_id,
+            parent_id=str(placed["parent_id"]),
+            children_ids=[str(i) for i in placed["children_ids"]],
+            status="ACCEPTED",
+            dry_run=False,
+        )
+
     # Mock implementation
     parent_id = deterministic_id(request.plan_id, "SIM-ORD")
     tp_id = deterministic_id(request.plan_id, "SIM-TP")
     sl_id = deterministic_id(request.plan_id, "SIM-SL")
     
-    response = PlaceBracketResponse(
+    return PlaceBracketResponse(
         plan_id=request.plan_id,
         parent_id=parent_id,
         children_ids=[tp_id, sl_id],
@@ -100,6 +135,38 @@ async def place_bracket(request: PlaceBracketRequest):
         dry_run=True,
     )
 
-    idempotency_store[request.plan_id] = response
-    
-    return response
\ No newline at end of file
+class OrderStatusRequest(BaseModel):
+    plan_id: str
+
+class OrderState(BaseModel):
+    order_id: int
+    parent_id: Optional[int] = None
+    symbol: Optional[str] = None
+    side: Optional[str] = None
+    qty: float
+    order_type: Optional[str] = None
+    state: str
+    filled: float
+    remaining: Optional[float] = None
+    avg_fill_price: Optional[float] = None
+    last_error: Optional[str] = None
+
+class OrderStatusResponse(BaseModel):
+    plan_id: str
+    orders: list[OrderState]
+    dry_run: bool
+
+@router.post("/tool/orders.status", response_model=OrderStatusResponse)
+async def order_status(request: OrderStatusRequest):
+    ibkr = get_ibkr()
+    if ibkr is None:
+        return OrderStatusResponse(plan_id=request.plan_id, orders=[], dry_run=True)
+    # Answered from the order book kept current by IB's order callbacks
+    records = ibkr.orders.by_plan(request.plan_id)
+    if not records:
+        raise HTTPException(status_code=404, detail="No orders found for plan_id")
+    return OrderStatusResponse(
+        plan_id=request.plan_id,
+        orders=[OrderState(**{name: getattr(r, name) for name in OrderState.model_fields}) for r in records],
+        dry_run=False,
+    )
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from enum import Enum
+from mcp_server.tools.utils import get_ibkr
 
 router = APIRouter()
 
@@ -23,15 +24,21 @@ class PdtGuardRequest(BaseModel):
 
 class PdtGuardResponse(BaseModel):
     ok: bool
-    remaining_intraday_trades: int
+    # None when the day-trade limit does not apply (not a stock or option, not intraday, or equity >= $25k)
+    remaining_intraday_trades: int | None
     note: str
 
 @router.post("/tool/pdt_guard.validate", response_model=PdtGuardResponse)
 async def pdt_guard_validate(request: PdtGuardRequest):
+    ibkr = get_ibkr()
+    if ibkr is not None:
+        decision = ibkr.pdt_validate(request.symbol, request.asset_type.value, request.side.value, request.is_intraday)
+        return PdtGuardResponse(ok=decision.ok, remaining_intraday_trades=decision.remaining, note=decision.note)
+
     # Mock implementation
     remaining_trades = 3
-    if request.asset_type != AssetTypeEnum.stk or not request.is_intraday:
-        remaining_trades = float("inf")
+    if request.asset_type not in (AssetTypeEnum.stk, AssetTypeEnum.opt) or not request.is_intraday:
+        remaining_trades = None
 
     return PdtGuardResponse(
         ok=True,
@@ -3,6 +3,8 @@ from pydantic import BaseModel
 from datetime import datetime
 from enum import Enum
 import random
+import asyncio
+from mcp_server.tools.utils import get_ibkr
 
 router = APIRouter()
 
@@ -13,12 +15,15 @@ class AssetTypeEnum(str, Enum):
     crypto = "CRYPTO"
     opt = "OPT"
 
+# IB secTypes that differ from the tool's asset types
+_SEC_TYPE_TO_ASSET = {"CASH": "FX"}
+
 class Position(BaseModel):
     symbol: str
     asset_type: AssetTypeEnum
     qty: float
     avg_price: float
-    unrealized_pnl: float
+    unrealized_pnl: float | None
     currency: str
 
 class PortfolioResponse(BaseModel):
@@ -26,9 +31,47 @@ class PortfolioResponse(BaseModel):
     equity: float
     timestamp: datetime
     source: str
+    version: int | None = None
+
+def _to_position(row: dict) -> Position:
+    return Position(**{**row, "asset_type": _SEC_TYPE_TO_ASSET.get(row["asset_type"], row["asset_type"])})
 
 @router.post("/tool/portfolio.get_positions", response_model=PortfolioResponse)
 async def get_positions(account: str = "DU1234567"):
+    ibkr = get_ibkr()
+    if ibkr is not None and ibkr.portfolio is not None and ibkr.portfolio.account in ("", account):
+        snapshot = ibkr.portfolio.snapshot()
+        if snapshot.complete:
+            # Served from the streaming cache; timestamp is when it last changed.
+            # Equity and PnL follow the latest ticks when the PnL engine runs.
+            equity = ibkr.pnl.equity() if ibkr.pnl is not None else None
+            if equity is None:
+                equity = float(snapshot.value("NetLiquidation") or 0.0)
+            return PortfolioResponse(
+                positions=[_to_position(row) for row in ibkr.portfolio.position_rows(ibkr.pnl)],
+                equity=equity,
+                timestamp=datetime.fromtimestamp(snapshot.updated_at),
+                source="IBKR",
+                version=snapshot.version,
+            )
+    if ibkr is not None:
+        # Both requests are in flight at once; neither blocks the event loop
+        rows, summary = await asyncio.gather(
+            ibkr.get_positions(),
+            ibkr.get_account_summary(tags="NetLiquidation"),
+        )
+        equity = next(
+            (float(item["value"]) for item in summary
+             if item["tag"] == "NetLiquidation" and item["account"] == account),
+            0.0,
+        )
+        return PortfolioResponse(
+            positions=[_to_position(row) for row in rows],
+            equity=equity,
+            timestamp=datetime.now(),
+            source="IBKR",
+        )
+
     # Mock implementation
     seed = f"{account}"
     rng = random.Random(seed)
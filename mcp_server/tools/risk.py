@@ -1,6 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from enum import Enum
+from datetime import datetime
+from mcp_server.tools.utils import get_ibkr, load_config
+from risk.limits import RiskLimits
 
 router = APIRouter()
 
@@ -39,18 +42,78 @@ class PreTradeCheckResponse(BaseModel):
     policy: dict
     dry_run: bool
 
+class KillSwitchActionEnum(str, Enum):
+    status = "status"
+    trip = "trip"
+    reset = "reset"
+
+class KillSwitchRequest(BaseModel):
+    action: KillSwitchActionEnum = KillSwitchActionEnum.status
+    reason: str = "manual"
+
+class KillSwitchResponse(BaseModel):
+    tripped: bool
+    reason: str | None = None
+    tripped_at: datetime | None = None
+    last_run: dict | None = None
+    dry_run: bool
+
+def _price(leg: dict, field: str) -> float | None:
+    value = leg.get(field)
+    return float(value) if value is not None else None
+
 @router.post("/tool/risk.pre_trade_check", response_model=PreTradeCheckResponse)
 async def pre_trade_check(request: PreTradeCheckRequest):
     if request.qty <= 0:
         raise HTTPException(status_code=422, detail="qty must be positive")
+    entry = _price(request.plan.entry, "price")
+    stop = _price(request.plan.stop, "stop_price")
+    take = _price(request.plan.take, "price")
+    if stop is None:
+        raise HTTPException(status_code=422, detail="plan.stop.stop_price is required")
+
+    ibkr = get_ibkr()
+    if ibkr is not None:
+        # The stop sits below the entry (or the target) for a long, above it for a short
+        reference = entry if entry is not None else take
+        if reference is None:
+            raise HTTPException(status_code=422, detail="plan.entry.price or plan.take.price is required")
+        side = "BUY" if stop < reference else "SELL"
+        result = await ibkr.pre_trade_check(request.symbol, request.asset_type.value, side, request.qty, entry, stop)
+        return PreTradeCheckResponse(
+            ok=result.ok,
+            reasons=result.reasons,
+            allowed_qty=result.allowed_qty,
+            policy=ibkr.risk.limits.policy() if ibkr.risk is not None else {},
+            dry_run=False,
+        )
+
     # Mock implementation
     return PreTradeCheckResponse(
         ok=True,
         reasons=[],
         allowed_qty=request.qty,
-        policy={
-            "risk_per_trade_pct": 0.01,
-            "max_daily_loss_pct": 0.05,
-        },
+        policy=RiskLimits.from_config(load_config().get("risk_limits")).policy(),
         dry_run=True,
     )
+
+@router.post("/tool/risk.kill_switch", response_model=KillSwitchResponse)
+async def kill_switch(request: KillSwitchRequest):
+    ibkr = get_ibkr()
+    if ibkr is None:
+        # Mock implementation
+        return KillSwitchResponse(tripped=False, dry_run=True)
+    switch = ibkr.kill_switch
+    if switch is None:
+        raise HTTPException(status_code=503, detail="Kill switch is disabled (risk_limits.kill_switch.enabled)")
+    if request.action == KillSwitchActionEnum.trip:
+        switch.trip(request.reason)
+    elif request.action == KillSwitchActionEnum.reset:
+        switch.reset()
+    return KillSwitchResponse(
+        tripped=switch.tripped,
+        reason=switch.reason,
+        tripped_at=datetime.fromtimestamp(switch.tripped_at) if switch.tripped_at else None,
+        last_run=switch.last_run,
+        dry_run=False,
+    )
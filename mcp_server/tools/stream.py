@@ -0,0 +1,105 @@
+import asyncio
+import json
+import threading
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from starlette.responses import StreamingResponse
+from ibkr_adapter.fanout import StreamHub, TICKS, BARS
+from ibkr_adapter.pool import MARKET_DATA
+from mcp_server.tools.utils import get_ibkr
+
+router = APIRouter()
+
+SSE_HEARTBEAT_SEC = 15.0
+
+_hub = None
+_hub_lock = threading.Lock()
+
+def get_stream_hub() -> StreamHub:
+    """Shared hub over the live IB client; streaming is not available in dry-run mode."""
+    global _hub
+    ibkr = get_ibkr()
+    if ibkr is None:
+        raise HTTPException(status_code=503, detail="Live streaming requires an IB connection (dry_run is enabled)")
+    with _hub_lock:
+        if _hub is None:
+            _hub = StreamHub(ibkr.adapter.client_for(MARKET_DATA), resolve=ibkr.adapter.contract)
+        return _hub
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@router.get("/stream/market_data.sse")
+async def stream_sse(symbol: str, asset_type: str = "STK", kind: str = Query(BARS, pattern=f"^({TICKS}|{BARS})$")):
+    """
+    Server-sent events for one symbol: `tick` events (kind=ticks) or 5-second
+    `bar` events (kind=bars), plus `status`/`error` notices.
+    """
+    hub = get_stream_hub()
+    # Qualifying the contract may be an IB round trip; keep it off the loop
+    contract = await asyncio.to_thread(hub.resolve, symbol, asset_type)
+    queue = hub.new_client()
+    key = hub.subscribe(kind, symbol, asset_type, queue, contract)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await queue.get(timeout=SSE_HEARTBEAT_SEC)
+                except EOFError as e:
+                    yield _sse({"type": "end", "reason": str(e)})
+                    return
+                yield ": keep-alive\n\n" if event is None else _sse(event)
+        finally:
+            hub.unsubscribe(key, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/stream/market_data.ws")
+async def stream_ws(websocket: WebSocket):
+    """
+    WebSocket stream. Clients send `{"action": "subscribe" | "unsubscribe",
+    "symbol": ..., "asset_type": "STK", "kind": "ticks" | "bars"}` messages and
+    receive the same events as the SSE endpoint, as JSON text frames.
+    """
+    await websocket.accept()
+    try:
+        hub = get_stream_hub()
+    except HTTPException as e:
+        await websocket.close(code=1013, reason=e.detail)
+        return
+    queue = hub.new_client()
+
+    async def pump():
+        while True:
+            try:
+                event = await queue.get()
+            except EOFError as e:
+                await websocket.close(code=1008 if str(e) == "slow consumer" else 1011, reason=str(e))
+                return
+            await websocket.send_text(json.dumps(event))
+
+    sender = asyncio.create_task(pump())
+    try:
+        while True:
+            message = await websocket.receive_json()
+            action = message.get("action")
+            # Replies go through the client's queue so the pump is the only writer
+            try:
+                key = (message.get("kind", BARS), message["symbol"], message.get("asset_type", "STK"))
+                if action == "subscribe":
+                    contract = await asyncio.to_thread(hub.resolve, key[1], key[2])
+                    hub.subscribe(*key, queue, contract)
+                elif action == "unsubscribe":
+                    hub.unsubscribe(key, queue)
+                else:
+                    raise ValueError(f"Unknown action: {action}")
+            except Exception as e:  # bad message, unknown contract or no connection
+                queue.put({"type": "error", "message": str(e)})
+                continue
+            queue.put({"type": "ack", "action": action, "kind": key[0], "symbol": key[1], "asset_type": key[2]})
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # client went away, or the pump closed the socket
+    finally:
+        sender.cancel()
+        hub.unsubscribe_all(queue)
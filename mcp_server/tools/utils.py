@@ -1,5 +1,7 @@
+import asyncio
 import yaml
 import os
+import threading
 
 def load_config():
     config_path = os.path.join(os.path.dirname(__file__), "..", "..", "config.example.yaml")
@@ -22,3 +24,28 @@ def deterministic_id(seed: str, prefix: str) -> str:
 
     hex = hashlib.sha1(seed.encode()).hexdigest()[:6]
     return f"{prefix}-{hex}"
+
+_ibkr = None
+_ibkr_lock = threading.Lock()
+
+def get_ibkr():
+    """
+    Shared `AsyncTWSAdapter` for the tools. The app creates it at startup
+    (`start_ibkr`); outside the app it is created on first use. Returns None
+    in dry-run mode, in which case the tools answer with their mock data.
+    """
+    ibkr = _ibkr if _ibkr is not None else _create_ibkr()
+    return None if ibkr.dry_run else ibkr
+
+def _create_ibkr():
+    global _ibkr
+    with _ibkr_lock:
+        if _ibkr is None:
+            # Imported here: the adapter itself imports the tool modules
+            from ibkr_adapter.async_adapter import AsyncTWSAdapter
+            _ibkr = AsyncTWSAdapter()
+    return _ibkr
+
+async def start_ibkr():
+    """Creates the shared adapter on a worker thread: connecting blocks for up to the connect timeout."""
+    await asyncio.to_thread(_create_ibkr)
@@ -0,0 +1,274 @@
+import threading
+import time
+from collections import deque
+from typing import Callable
+from loguru import logger
+from ibapi.order import Order
+from ibkr_adapter.order_book import REJECTION_CODES
+
+# Connectivity errors: requests failing while the connection is down, not order trouble
+CONNECTION_CODES = frozenset({502, 504, 1100, 1101, 1102, 1300})
+
+
+class KillSwitchTripped(RuntimeError):
+    """Raised for new orders while the kill switch is tripped."""
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(f"Kill switch tripped: {reason}")
+
+
+class _Window:
+    """Events in the last `window` seconds."""
+
+    def __init__(self, window: float, clock):
+        self.window = window
+        self._clock = clock
+        self._times: deque = deque()
+
+    def add(self) -> int:
+        now = self._clock()
+        self._times.append(now)
+        return self.count(now)
+
+    def count(self, now: float | None = None) -> int:
+        cutoff = (self._clock() if now is None else now) - self.window
+        while self._times and self._times[0] <= cutoff:
+            self._times.popleft()
+        return len(self._times)
+
+    def clear(self):
+        self._times.clear()
+
+
+def _flatten_order(order_id: int, qty: float) -> Order:
+    order = Order()
+    order.orderId = order_id
+    order.action = "SELL" if qty > 0 else "BUY"
+    order.orderType = "MKT"
+    order.totalQuantity = abs(qty)
+    order.transmit = True
+    return order
+
+
+class KillSwitch:
+    """
+    Cancels every order, flattens every position and refuses new orders.
+
+    Trips on a drawdown of `max_drawdown_pct` from the equity high-water
+    mark, `max_errors` errors or `max_rejections` order rejections within
+    `window` seconds (ORDER_EVENTS "error", i.e. `TWSClient.error`), a
+    connection down for `disconnect_grace` seconds, or a call to `trip`.
+    Only errors on ids `is_order(id)` accepts are counted, so market data
+    and historical requests sharing the topic do not; connectivity errors
+    (CONNECTION_CODES) never are.
+    Equity and the connection are polled every `interval` seconds; errors
+    are counted as they arrive.
+
+    A trip sends reqGlobalCancel, then one market order per position in a
+    single socket write. Contracts are built as positions change, so the
+    trip itself only reserves ids and encodes orders; the time from trip to
+    the write is kept in `last_run`. While disconnected the pipeline waits:
+    the cancel goes out on reconnect, the flatten once the portfolio has
+    been downloaded again. Orders stay refused until `reset`.
+
+    `client_for()` returns the client that places orders; `portfolio` is a
+    `PortfolioCache` (flattening needs it); `equity()` returns current
+    equity or None; `contracts` (a `ContractResolver`) supplies the exchange
+    of qualified contracts, which position callbacks leave out.
+    """
+
+    def __init__(self, client_for: Callable, portfolio=None, equity: Callable | None = None,
+                 max_drawdown_pct: float | None = None, max_errors: int | None = None,
+                 max_rejections: int | None = None, window: float = 60.0,
+                 disconnect_grace: float | None = None, flatten: bool = True, interval: float = 0.25,
+                 is_order: Callable[[int], bool] | None = None, contracts=None,
+                 clock=time.perf_counter, wall_clock=time.time):
+        self.client_for = client_for
+        self.is_order = is_order
+        self.contracts = contracts
+        self.portfolio = portfolio
+        self.equity = equity
+        self.max_drawdown_pct = max_drawdown_pct
+        self.max_errors = max_errors
+        self.max_rejections = max_rejections
+        self.disconnect_grace = disconnect_grace
+        self.flatten = flatten
+        self.interval = interval
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._lock = threading.Lock()
+        self._errors = _Window(window, clock)
+        self._rejections = _Window(window, clock)
+        self._positions: dict[tuple, tuple] = {}  # key -> (contract, qty)
+        self._down_since: float | None = None
+        self._pending_cancel = False
+        self._pending_flatten = False
+        self._unsubscribe = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.peak_equity: float | None = None
+        self.reason: str | None = None
+        self.tripped_at: float | None = None
+        self.last_run: dict | None = None
+
+    @property
+    def tripped(self) -> bool:
+        return self.reason is not None
+
+    def start(self):
+        """Starts the watcher; call before `PortfolioCache.start` so every position is seen."""
+        if self.portfolio is not None:
+            self._unsubscribe = self.portfolio.subscribe(self.on_portfolio_event)
+            for position in self.portfolio.snapshot().positions:
+                self._positions[position.key] = (position.to_contract(self.contracts), position.qty)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kill-switch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._unsubscribe:
+            self._unsubscribe()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+
+    def check(self):
+        """Raises KillSwitchTripped while tripped; the gate in front of every new order."""
+        reason = self.reason
+        if reason is not None:
+            raise KillSwitchTripped(reason)
+
+    # --- Triggers ----------------------------------------------------------------
+
+    def on_portfolio_event(self, event: dict):
+        if event["kind"] != "position":
+            return
+        key, position = event["key"], event["position"]
+        with self._lock:
+            if position is None:
+                self._positions.pop(key, None)
+            else:
+                # Rebuilt every time: a later updatePortfolio may carry the exchange the first event lacked
+                self._positions[key] = (position.to_contract(self.contracts), position.qty)
+
+    def on_order_event(self, event: dict):
+        """ORDER_EVENTS subscriber; runs on the reader thread."""
+        if event["event"] != "error" or self.tripped:
+            return
+        code = event["code"]
+        if code in CONNECTION_CODES or (self.is_order is not None and not self.is_order(event["orderId"])):
+            return
+        if self.max_rejections is not None and code in REJECTION_CODES:
+            if self._rejections.add() >= self.max_rejections:
+                self.trip(f"{self.max_rejections} order rejections within {self._rejections.window:g}s")
+                return
+        if self.max_errors is not None and self._errors.add() >= self.max_errors:
+            self.trip(f"{self.max_errors} errors within {self._errors.window:g}s")
+
+    def on_connection_event(self, event: dict):
+        """CONNECTION_EVENTS subscriber for the order client."""
+        if event["state"] == "connected":
+            self._down_since = None
+            if self._pending_cancel:
+                # Positions may have changed while down: flatten after the fresh download (see `poll`)
+                self._execute(flatten=False)
+        else:
+            self._down_since = self._clock()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.exception(f"Kill switch watcher failed: {e}")
+
+    def poll(self):
+        """One watcher pass: drawdown, connectivity and any flatten waiting for a fresh portfolio."""
+        if self.tripped:
+            if self._pending_flatten and not self._pending_cancel and self.portfolio.snapshot().complete:
+                self._execute()
+            return
+        down_since = self._down_since
+        if self.disconnect_grace is not None and down_since is not None:
+            if self._clock() - down_since >= self.disconnect_grace:
+                self.trip(f"connection down for {self.disconnect_grace:g}s")
+                return
+        equity = self.equity() if self.equity is not None else None
+        if equity is None or self.max_drawdown_pct is None:
+            return
+        if self.peak_equity is None or equity > self.peak_equity:
+            self.peak_equity = equity
+        drawdown = 1 - equity / self.peak_equity if self.peak_equity > 0 else 0.0
+        if drawdown >= self.max_drawdown_pct:
+            self.trip(f"drawdown {drawdown:.2%} from peak equity {self.peak_equity:,.2f}")
+
+    # --- Trip pipeline ---------------------------------------------------------------
+
+    def trip(self, reason: str) -> bool:
+        """Trips the switch; False if it already was."""
+        started = self._clock()
+        with self._lock:
+            if self.reason is not None:
+                return False
+            self.reason = reason
+            self.tripped_at = self._wall_clock()
+            self._pending_cancel = True
+            self._pending_flatten = self.flatten and self.portfolio is not None
+        logger.critical(f"Kill switch tripped: {reason}")
+        self._execute(started)
+        return True
+
+    def _execute(self, started: float | None = None, flatten: bool = True):
+        started = self._clock() if started is None else started
+        try:
+            client = self.client_for()
+        except ConnectionError:
+            client = None  # no healthy pooled connection
+        if client is None or not client.is_connected:
+            logger.warning("Kill switch: not connected; cancelling and flattening once reconnected.")
+            return
+        run = {"reason": self.reason, "positions": 0}
+        try:
+            if self._pending_cancel:
+                client.reqGlobalCancel()
+                self._pending_cancel = False
+                run["cancel_ms"] = (self._clock() - started) * 1000
+            if flatten and self._pending_flatten:
+                with self._lock:
+                    targets = [(contract, qty) for contract, qty in self._positions.values() if qty]
+                if targets:
+                    first_id = client._next_order_ids(len(targets))
+                    client.send_orders([(contract, _flatten_order(first_id + i, qty))
+                                        for i, (contract, qty) in enumerate(targets)])
+                self._pending_flatten = False
+                run["positions"] = len(targets)
+        except Exception as e:
+            logger.exception(f"Kill switch could not cancel or flatten: {e}")
+            return
+        run["trip_to_wire_ms"] = (self._clock() - started) * 1000
+        self.last_run = run
+        logger.critical(f"Kill switch: global cancel sent, {run['positions']} positions flattened "
+                        f"in {run['trip_to_wire_ms']:.2f}ms")
+
+    def reset(self):
+        """Re-arms the switch and lets orders through again; the drawdown peak restarts from here."""
+        with self._lock:
+            self.reason = None
+            self.tripped_at = None
+            self._pending_cancel = self._pending_flatten = False
+        self.peak_equity = None
+        self._errors.clear()
+        self._rejections.clear()
+        logger.warning("Kill switch reset.")
+
+    def stats(self) -> dict:
+        return {
+            "tripped": self.tripped,
+            "reason": self.reason,
+            "tripped_at": self.tripped_at,
+            "peak_equity": self.peak_equity,
+            "errors_in_window": self._errors.count(),
+            "rejections_in_window": self._rejections.count(),
+            "pending": self._pending_cancel or self._pending_flatten,
+            "last_run": self.last_run,
+        }
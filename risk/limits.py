@@ -0,0 +1,68 @@
+import time
+from collections import deque
+from typing import NamedTuple
+
+
+class RiskLimits(NamedTuple):
+    """
+    The `risk_limits` section of the config. Percentages are fractions of
+    equity; a limit left as None is not enforced.
+    """
+    risk_per_trade_pct: float = 0.01
+    max_daily_loss_pct: float = 0.05
+    max_symbol_exposure_pct: float | None = None
+    max_asset_class_exposure_pct: dict = {}  # e.g. {"STK": 1.0, "FUT": 3.0}
+    max_gross_exposure_pct: float | None = None
+    max_orders_per_minute: int | None = None
+    max_orders_per_symbol_per_minute: int | None = None
+
+    @classmethod
+    def from_config(cls, config: dict | None) -> "RiskLimits":
+        config = config or {}
+        return cls(**{field: config[field] for field in cls._fields if config.get(field) is not None})
+
+    def policy(self) -> dict:
+        """The enforced limits, as reported by risk.pre_trade_check."""
+        return {field: value for field, value in self._asdict().items() if value not in (None, {})}
+
+
+class OrderRateLimiter:
+    """
+    Orders placed in the last `window` seconds, overall and per symbol.
+    Each deque holds submission times, so `record` and `exceeded` cost
+    O(1) amortized: expired times are dropped from the left as they age out.
+    """
+
+    def __init__(self, max_orders: int | None, max_per_symbol: int | None, window: float = 60.0,
+                 clock=time.monotonic):
+        self.max_orders = max_orders
+        self.max_per_symbol = max_per_symbol
+        self.window = window
+        self._clock = clock
+        self._all: deque = deque()
+        self._by_symbol: dict[str, deque] = {}
+
+    def _expire(self, times: deque, now: float) -> int:
+        cutoff = now - self.window
+        while times and times[0] <= cutoff:
+            times.popleft()
+        return len(times)
+
+    def record(self, symbol: str):
+        now = self._clock()
+        self._all.append(now)
+        self._by_symbol.setdefault(symbol, deque()).append(now)
+
+    def exceeded(self, symbol: str) -> str | None:
+        """The reason another order for `symbol` would break a limit, else None."""
+        now = self._clock()
+        if self.max_orders is not None and self._expire(self._all, now) >= self.max_orders:
+            return f"order rate limit: {self.max_orders} orders per {self.window:g}s"
+        times = self._by_symbol.get(symbol)
+        if self.max_per_symbol is not None and times is not None and self._expire(times, now) >= self.max_per_symbol:
+            return f"order rate limit: {self.max_per_symbol} {symbol} orders per {self.window:g}s"
+        return None
+
+    def stats(self) -> dict:
+        now = self._clock()
+        return {"orders_in_window": self._expire(self._all, now)}
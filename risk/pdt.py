@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+import numpy as np
+from loguru import logger
+
+# Asset types FINRA's pattern day trader rule applies to
+PDT_ASSET_TYPES = ("STK", "OPT")
+_EPOCH = np.datetime64("2000-01-03")  # a Monday
+_BUY_SIDES = ("BOT", "BUY")
+STATE_VERSION = 1
+
+
+class PdtDecision(NamedTuple):
+    ok: bool
+    remaining: int | None  # None when the limit does not apply
+    note: str
+
+
+class _SymbolDay:
+    """A symbol's running position and what was opened on its last trading day."""
+    __slots__ = ("day", "position", "opened", "uncounted")
+
+    def __init__(self, day: int, position: float = 0.0, opened: float = 0.0, uncounted: bool = False):
+        self.day = day
+        self.position = position
+        self.opened = opened  # quantity opened on `day` and not yet closed
+        self.uncounted = uncounted  # an opening on `day` not yet matched by a close
+
+
+class PDTTracker:
+    """
+    Round-trip day trades over a rolling window of business days.
+
+    `on_fill` takes execution records (`OrderBook.subscribe_fills`, the same
+    records the order journal stores). Per symbol it keeps the running
+    position and the quantity opened that day: a fill that reduces a
+    position opened the same day completes a day trade, counted once per
+    opening sequence (buy, buy, sell is one; buy, sell, buy, sell is two).
+    Positions come from fills alone, so a symbol held from before the first
+    recorded fill starts flat; that can only over-count.
+
+    Day trades are kept per business-day index (numpy busday, with
+    `holidays`) in a deque of at most `window_days` entries with a running
+    total, so a fill and a validation cost O(1). The state is written to
+    `state_path` after each fill and loaded on start, so a restart does not
+    replay the journal; `replay_journal` rebuilds it when there is none.
+    """
+
+    def __init__(self, state_path: str | None = None, max_day_trades: int = 3, window_days: int = 5,
+                 min_equity: float = 25_000.0, holidays=(), tz: str = "America/New_York", clock=time.time):
+        self.state_path = state_path
+        self.max_day_trades = max_day_trades
+        self.window_days = window_days
+        self.min_equity = min_equity
+        self._holidays = np.array(sorted(holidays), dtype="datetime64[D]")
+        self._tz = ZoneInfo(tz)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._days: deque = deque()  # [day index, day trades], oldest first
+        self._total = 0
+        self._symbols: dict[str, _SymbolDay] = {}
+        self._today_date: date | None = None
+        self._today_index = 0
+        self.fills = 0
+        self.loaded = bool(state_path) and os.path.exists(state_path) and self._load()
+
+    # --- Business days ---------------------------------------------------------
+
+    def day_index(self, day: date) -> int:
+        """Business days from a fixed epoch to `day`; a weekend or holiday shares the next session's index."""
+        return int(np.busday_count(_EPOCH, np.datetime64(day, "D"), holidays=self._holidays))
+
+    def _today(self) -> int:
+        today = datetime.fromtimestamp(self._clock(), self._tz).date()
+        if today != self._today_date:
+            self._today_date, self._today_index = today, self.day_index(today)
+        return self._today_index
+
+    def _fill_day(self, record: dict) -> int:
+        # Execution.time starts with the trade date: "20250819  09:31:05 US/Eastern"
+        stamp = record.get("time") or ""
+        if len(stamp) >= 8 and stamp[:8].isdigit():
+            return self.day_index(date(int(stamp[:4]), int(stamp[4:6]), int(stamp[6:8])))
+        return self.day_index(datetime.fromtimestamp(record.get("ts") or self._clock(), self._tz).date())
+
+    # --- Fills -----------------------------------------------------------------
+
+    def on_fill(self, record: dict):
+        if self._apply(record):
+            with self._lock:
+                self._save()
+
+    def _apply(self, record: dict) -> bool:
+        if record.get("asset_type") not in PDT_ASSET_TYPES or not record.get("shares"):
+            return False
+        day = self._fill_day(record)
+        shares = float(record["shares"])
+        signed = shares if record["side"] in _BUY_SIDES else -shares
+        with self._lock:
+            self.fills += 1
+            state = self._symbols.get(record["symbol"])
+            if state is None:
+                state = self._symbols[record["symbol"]] = _SymbolDay(day)
+            elif state.day != day:
+                state.day, state.opened, state.uncounted = day, 0.0, False
+            position = state.position
+            if position == 0 or (position > 0) == (signed > 0):
+                state.opened += shares
+                state.uncounted = True
+            else:
+                closing = min(shares, abs(position))
+                if state.opened > 0 and state.uncounted:
+                    self._add_day_trade(day)
+                    state.uncounted = False
+                state.opened = max(0.0, state.opened - closing)
+                if shares > closing:  # reversed through flat: the rest opens a new position
+                    state.opened += shares - closing
+                    state.uncounted = True
+            state.position = position + signed
+            if state.position == 0 and state.opened == 0:
+                state.uncounted = False
+        return True
+
+    def _add_day_trade(self, day: int):
+        days = self._days
+        # Fills arrive in order, so this stops at the newest entry; the deque holds at most window_days
+        i = len(days)
+        while i and days[i - 1][0] > day:
+            i -= 1
+        if i and days[i - 1][0] == day:
+            days[i - 1][1] += 1
+        else:
+            days.insert(i, [day, 1])
+        self._total += 1
+        self._expire(days[-1][0])
+
+    def _expire(self, today: int):
+        days = self._days
+        while days and days[0][0] <= today - self.window_days:
+            self._total -= days.popleft()[1]
+
+    # --- Reads -----------------------------------------------------------------
+
+    def day_trades(self) -> int:
+        """Day trades in the current business day and the `window_days - 1` before it."""
+        with self._lock:
+            self._expire(self._today())
+            return self._total
+
+    def validate(self, symbol: str, asset_type: str, side: str, is_intraday: bool,
+                 equity: float | None = None) -> PdtDecision:
+        """Whether an order may go ahead; from memory, never from IB."""
+        if asset_type not in PDT_ASSET_TYPES:
+            return PdtDecision(True, None, f"PDT rule does not apply to {asset_type}")
+        if equity is not None and equity >= self.min_equity:
+            return PdtDecision(True, None, f"equity {equity:,.2f} >= {self.min_equity:,.0f}: no day-trade limit")
+        remaining = max(0, self.max_day_trades - self.day_trades())
+        with self._lock:
+            state = self._symbols.get(symbol)
+            closes_today = (state is not None and state.day == self._today() and state.opened > 0
+                            and state.position != 0 and (state.position > 0) != (side in _BUY_SIDES))
+        if not (is_intraday or closes_today):
+            return PdtDecision(True, remaining, f"{remaining} day trades left in {self.window_days} business days")
+        if remaining <= 0:
+            return PdtDecision(False, 0, f"{self.max_day_trades} day trades in {self.window_days} business days; "
+                                         f"another would flag the account as a pattern day trader")
+        what = "closes a position opened today" if closes_today else "is intraday"
+        return PdtDecision(True, remaining, f"order {what}: {remaining} day trades left in "
+                                            f"{self.window_days} business days")
+
+    def stats(self) -> dict:
+        return {"day_trades": self.day_trades(), "fills": self.fills, "symbols": len(self._symbols),
+                "loaded": self.loaded}
+
+    # --- Persistence ------------------------------------------------------------
+
+    def _save(self):
+        if not self.state_path:
+            return
+        state = {
+            "version": STATE_VERSION,
+            "window_days": self.window_days,
+            "days": list(self._days),
+            "symbols": {sym: [s.day, s.position, s.opened, s.uncounted] for sym, s in self._symbols.items()},
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)  # never leaves a half-written state behind
+
+    def _load(self) -> bool:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable PDT state {self.state_path}: {e}")
+            return False
+        if state.get("version") != STATE_VERSION:
+            logger.warning(f"Ignoring PDT state {self.state_path} with version {state.get('version')}")
+            return False
+        self._days = deque([day, count] for day, count in state["days"])
+        self._total = sum(count for _, count in self._days)
+        self._symbols = {sym: _SymbolDay(*values) for sym, values in state["symbols"].items()}
+        return True
+
+    def replay_journal(self, journal_path: str) -> int:
+        """Rebuilds the state from an order journal's execution records; returns the fills applied."""
+        if not os.path.exists(journal_path):
+            return 0
+        seen = set()
+        applied = self.fills
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("type") != "exec" or "side" not in record or record["exec_id"] in seen:
+                    continue
+                seen.add(record["exec_id"])
+                self._apply(record)
+        with self._lock:
+            self._save()
+        logger.info(f"Rebuilt PDT state from {self.fills - applied} fills in {journal_path}")
+        return self.fills - applied
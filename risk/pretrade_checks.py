@@ -0,0 +1,303 @@
+import math
+import threading
+from typing import NamedTuple
+from risk.limits import RiskLimits, OrderRateLimiter
+
+# Statuses after which an entry order adds no more exposure
+_DONE_STATUSES = ("Filled", "Cancelled", "ApiCancelled", "Inactive")
+# IB secType -> the tools' asset_type
+_ASSET_CLASS = {"CASH": "FX"}
+
+
+def asset_class(sec_type: str) -> str:
+    return _ASSET_CLASS.get(sec_type, sec_type)
+
+
+class CheckResult(NamedTuple):
+    ok: bool
+    reasons: list
+    allowed_qty: int
+
+
+class _OpenOrder:
+    __slots__ = ("symbol", "asset_class", "unit", "remaining", "acked")
+
+    def __init__(self, symbol: str, asset_class: str, unit: float, remaining: float):
+        self.symbol = symbol
+        self.asset_class = asset_class
+        self.unit = unit  # signed base-currency notional per unit
+        self.remaining = remaining
+        self.acked = False
+
+
+def _add(totals: dict, key: str, delta: float):
+    totals[key] = totals.get(key, 0.0) + delta
+
+
+class ExposureBook:
+    """
+    Running exposure aggregates for pre-trade checks.
+
+    `on_portfolio_event` (a `PortfolioCache` listener) and `on_order_event`
+    (an ORDER_EVENTS subscriber) apply each change as a delta to net
+    position notional per symbol, gross notional per asset class and
+    overall, open entry-order notional, realized PnL and daily PnL, so a
+    check reads a handful of floats however many positions are held.
+
+    Notional is in the base currency, converted at the ExchangeRate known
+    when the position or order last changed. Only parent orders count as
+    open exposure: bracket exits can only reduce it.
+
+    `marks` (a `PnLEngine`) supplies equity marked to the latest ticks;
+    without it, or before its anchor arrives, equity is IB's NetLiquidation.
+    """
+
+    def __init__(self, base_currency: str = "USD", marks=None):
+        self.base_currency = base_currency
+        self.marks = marks
+        self._lock = threading.Lock()
+        self._fx: dict[str, float] = {base_currency: 1.0}
+        self._positions: dict[tuple, tuple] = {}  # key -> (symbol, asset_class, notional, realized)
+        self._orders: dict[int, _OpenOrder] = {}
+        self._instruments: dict[str, tuple] = {}  # symbol -> (multiplier, currency, market_price)
+        self.symbol_net: dict[str, float] = {}
+        self.symbol_open: dict[str, float] = {}
+        self.class_gross: dict[str, float] = {}
+        self.class_open: dict[str, float] = {}
+        self.gross = 0.0
+        self.net = 0.0
+        self.open_notional = 0.0
+        self.realized = 0.0
+        self.daily_pnl: float | None = None
+        self.net_liquidation: float | None = None
+
+    # --- Portfolio -------------------------------------------------------------
+
+    def on_portfolio_event(self, event: dict):
+        kind = event["kind"]
+        with self._lock:
+            if kind == "position":
+                self._set_position(event["key"], event["position"])
+            elif kind == "account_value":
+                self._on_account_value(event["tag"], event["currency"], event["value"])
+            elif kind == "pnl":
+                self.daily_pnl = event["pnl"].daily
+
+    def _on_account_value(self, tag: str, currency: str, value):
+        if not isinstance(value, float):
+            return
+        if tag == "NetLiquidation" and currency == self.base_currency:
+            self.net_liquidation = value
+        elif tag == "ExchangeRate" and currency and value > 0:
+            self._fx[currency] = value
+
+    def _set_position(self, key, position):
+        old = self._positions.pop(key, None)
+        if old is not None:
+            symbol, cls, notional, realized = old
+            _add(self.symbol_net, symbol, -notional)
+            _add(self.class_gross, cls, -abs(notional))
+            self.gross -= abs(notional)
+            self.net -= notional
+            self.realized -= realized
+        if position is None:
+            return
+        rate = self._fx.get(position.currency, 1.0)
+        if position.market_price is not None:
+            notional = position.qty * position.market_price * position.multiplier * rate
+        else:
+            notional = position.qty * position.avg_cost * rate  # avgCost includes the multiplier
+        realized = (position.realized_pnl or 0.0) * rate
+        cls = asset_class(position.sec_type)
+        self._positions[key] = (position.symbol, cls, notional, realized)
+        _add(self.symbol_net, position.symbol, notional)
+        _add(self.class_gross, cls, abs(notional))
+        self.gross += abs(notional)
+        self.net += notional
+        self.realized += realized
+        self._instruments[position.symbol] = (position.multiplier, position.currency, position.market_price)
+
+    # --- Orders ------------------------------------------------------------------
+
+    def track_order(self, order_id: int, symbol: str, asset_type: str, side: str, qty: float, price: float,
+                    multiplier: float = 1.0, currency: str | None = None):
+        """Counts an entry order from the moment it is sent, before IB echoes it back."""
+        with self._lock:
+            self._track(order_id, symbol, asset_class(asset_type), side, qty, price, multiplier, currency)
+
+    def _track(self, order_id, symbol, cls, side, qty, price, multiplier, currency):
+        if order_id in self._orders:
+            return
+        rate = self._fx.get(currency, 1.0) if currency else 1.0
+        unit = (1 if side == "BUY" else -1) * price * multiplier * rate
+        order = self._orders[order_id] = _OpenOrder(symbol, cls, unit, float(qty))
+        self._open_delta(order, order.remaining)
+
+    def _open_delta(self, order: _OpenOrder, qty: float):
+        """Applies a change of `qty` (negative when filled or cancelled) in the order's remaining quantity."""
+        _add(self.symbol_open, order.symbol, order.unit * qty)
+        _add(self.class_open, order.asset_class, abs(order.unit) * qty)
+        self.open_notional += abs(order.unit) * qty
+
+    def on_order_event(self, event: dict):
+        """ORDER_EVENTS subscriber; runs on the reader thread."""
+        kind = event["event"]
+        order_id = event["orderId"]
+        with self._lock:
+            if kind == "openOrder":
+                ib_order, contract = event["order"], event["contract"]
+                if ib_order.parentId or event["orderState"].status in _DONE_STATUSES:
+                    return
+                price = ib_order.lmtPrice if ib_order.orderType == "LMT" else ib_order.auxPrice
+                if price and price < 1e300:  # MKT orders carry no price until they fill
+                    self._track(order_id, contract.symbol, asset_class(contract.secType), ib_order.action,
+                                float(ib_order.totalQuantity), price, float(contract.multiplier or 1),
+                                contract.currency)
+                if order_id in self._orders:
+                    self._orders[order_id].acked = True
+            elif kind == "orderStatus":
+                order = self._orders.get(order_id)
+                if order is None:
+                    return
+                order.acked = True
+                remaining = float(event["remaining"])
+                if event["status"] in _DONE_STATUSES or remaining <= 0:
+                    remaining = 0.0
+                self._open_delta(order, remaining - order.remaining)
+                order.remaining = remaining
+                if not remaining:
+                    del self._orders[order_id]
+            elif kind == "error":
+                # Rejected before IB acknowledged it: it will never be working
+                order = self._orders.get(order_id)
+                if order is not None and not order.acked:
+                    self._open_delta(order, -order.remaining)
+                    del self._orders[order_id]
+
+    # --- Reads -------------------------------------------------------------------
+
+    def equity(self) -> float | None:
+        marked = self.marks.equity() if self.marks is not None else None
+        return marked if marked is not None else self.net_liquidation
+
+    def fx_rate(self, currency: str | None) -> float:
+        return self._fx.get(currency, 1.0) if currency else 1.0
+
+    def instrument(self, symbol: str) -> tuple | None:
+        """(multiplier, currency, market_price) from the last position update for `symbol`."""
+        return self._instruments.get(symbol)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "gross": self.gross,
+                "net": self.net,
+                "open_notional": self.open_notional,
+                "open_orders": len(self._orders),
+                "realized": self.realized,
+                "daily_pnl": self.daily_pnl,
+                "equity": self.equity(),
+            }
+
+
+class PreTradeChecker:
+    """
+    Pre-trade checks against `RiskLimits`, read from an `ExposureBook`.
+
+    `check` caps the quantity by risk per trade (entry-to-stop distance
+    against `risk_per_trade_pct` of equity) and by symbol, asset class and
+    gross exposure including open entry orders, and blocks every order once
+    the daily loss limit or an order rate limit is reached. It fails closed
+    while equity is unknown. Each check is a fixed number of dict lookups
+    and float operations under one lock.
+
+    `on_submit` records a bracket as it is sent, for the rate limits and
+    open-order exposure.
+    """
+
+    def __init__(self, limits: RiskLimits, exposure: ExposureBook, rate: OrderRateLimiter | None = None):
+        self.limits = limits
+        self.exposure = exposure
+        self.rate = rate or OrderRateLimiter(limits.max_orders_per_minute, limits.max_orders_per_symbol_per_minute)
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.rejected = 0
+
+    def check(self, symbol: str, asset_type: str, side: str, qty: int, entry: float, stop: float,
+              multiplier: float = 1.0, currency: str | None = None) -> CheckResult:
+        limits, x = self.limits, self.exposure
+        reasons = []
+        with x._lock:
+            equity = x.equity()
+            if equity is None or equity <= 0:
+                return self._result(qty, ["equity unknown: no NetLiquidation received yet"], 0)
+            if not entry or entry <= 0:
+                return self._result(qty, ["entry price required"], 0)
+            sign = 1 if side == "BUY" else -1
+            rate = x.fx_rate(currency)
+            unit = entry * multiplier * rate
+            allowed = qty
+
+            daily = x.daily_pnl if x.daily_pnl is not None else x.realized
+            if daily <= -limits.max_daily_loss_pct * equity:
+                reasons.append(f"daily loss limit reached: {daily:.2f} <= -{limits.max_daily_loss_pct:.2%} of equity")
+                allowed = 0
+
+            risk_per_unit = abs(entry - stop) * multiplier * rate
+            if risk_per_unit <= 0:
+                reasons.append("stop must differ from entry")
+                allowed = 0
+            else:
+                allowed = self._cap(reasons, allowed, qty, "risk_per_trade_pct",
+                                    limits.risk_per_trade_pct * equity / risk_per_unit)
+
+            current = x.symbol_net.get(symbol, 0.0) + x.symbol_open.get(symbol, 0.0)
+            if limits.max_symbol_exposure_pct is not None:
+                allowed = self._cap(reasons, allowed, qty, "max_symbol_exposure_pct",
+                                    (limits.max_symbol_exposure_pct * equity - sign * current) / unit)
+            if sign * current >= 0:  # orders that only reduce a position cannot breach gross limits
+                cls = asset_class(asset_type)
+                class_limit = limits.max_asset_class_exposure_pct.get(cls)
+                if class_limit is not None:
+                    used = x.class_gross.get(cls, 0.0) + x.class_open.get(cls, 0.0)
+                    allowed = self._cap(reasons, allowed, qty, f"max_asset_class_exposure_pct[{cls}]",
+                                        (class_limit * equity - used) / unit)
+                if limits.max_gross_exposure_pct is not None:
+                    allowed = self._cap(reasons, allowed, qty, "max_gross_exposure_pct",
+                                        (limits.max_gross_exposure_pct * equity - x.gross - x.open_notional) / unit)
+
+        with self._lock:
+            limited = self.rate.exceeded(symbol)
+        if limited:
+            reasons.append(limited)
+            allowed = 0
+        return self._result(qty, reasons, allowed)
+
+    @staticmethod
+    def _cap(reasons: list, allowed: int, qty: int, limit: str, max_qty: float) -> int:
+        max_qty = max(0, math.floor(max_qty))
+        if max_qty < qty:
+            reasons.append(f"qty {qty} exceeds {limit}: max {max_qty}")
+        return min(allowed, max_qty)
+
+    def _result(self, qty: int, reasons: list, allowed: int) -> CheckResult:
+        self.checks += 1
+        if reasons:
+            self.rejected += 1
+        return CheckResult(not reasons, reasons, max(0, min(allowed, qty)))
+
+    def on_submit(self, orders: list, symbol: str, asset_type: str, contract=None):
+        """Records a bracket's parent order as it is sent (the `before_send` hook of bracket submission)."""
+        parent = orders[0]
+        with self._lock:
+            self.rate.record(symbol)
+        if parent.orderType != "LMT" or not parent.lmtPrice:
+            return  # a market entry has no price to value it at
+        multiplier = float(getattr(contract, "multiplier", "") or 1)
+        self.exposure.track_order(parent.orderId, symbol, asset_type, parent.action, float(parent.totalQuantity),
+                                  parent.lmtPrice, multiplier, getattr(contract, "currency", None))
+
+    def stats(self) -> dict:
+        with self._lock:
+            rate = self.rate.stats()
+        return {"checks": self.checks, "rejected": self.rejected, **rate, **self.exposure.stats()}
@@ -1,19 +1,193 @@
+import threading
+from typing import Callable
+from datetime import datetime, timedelta
 import sqlalchemy
-from sqlalchemy import Column, Integer, String, Float, DateTime, Table
+from sqlalchemy import Column, Integer, String, Float, DateTime, Table, Index, event, insert, select, text
 
 DB_URL = "sqlite:///./trader.db"
-engine = sqlalchemy.create_engine(DB_URL)
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# tick writer, synchronous=NORMAL only fsyncs at checkpoints (safe in WAL mode),
+# and mmap/cache keep hot index pages out of read() calls.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # KiB
+    "busy_timeout": 5000,
+}
+
+def make_engine(url: str = DB_URL, pragmas: dict | None = None):
+    """Creates an engine that applies `SQLITE_PRAGMAS` on connect. Does not touch the database."""
+    engine = sqlalchemy.create_engine(url)
+    if engine.dialect.name == "sqlite":
+        settings = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_conn, _record):
+            cursor = dbapi_conn.cursor()
+            for name, value in settings.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    return engine
+
+engine = make_engine()
 metadata = sqlalchemy.MetaData()
 
+
+class PartitionedTable:
+    """
+    A logical table stored as one physical table per day or month
+    (`<name>_YYYYMMDD` / `<name>_YYYYMM`), each with a covering index on
+    (symbol, timestamp, ...) for range scans.
+
+    Partitions are created on first write, so nothing touches the database at
+    import time. Dropping a period is a `DROP TABLE` instead of a large DELETE,
+    and a one-day query for one symbol only searches the index of the partition
+    it falls in, so its cost does not grow with the total row count.
+    """
+
+    def __init__(self, name: str, columns: Callable[[], list[Column]], period: str = "day",
+                 time_column: str = "timestamp", key_column: str = "symbol"):
+        if period not in ("day", "month"):
+            raise ValueError("period must be 'day' or 'month'")
+        self.name = name
+        self.period = period
+        self.time_column = time_column
+        self.key_column = key_column
+        self._columns = columns
+        self._metadata = sqlalchemy.MetaData()
+        self._tables: dict[str, Table] = {}
+        self._created: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def _suffix(self, ts: datetime) -> str:
+        return ts.strftime("%Y%m%d" if self.period == "day" else "%Y%m")
+
+    def _period_start(self, suffix: str) -> datetime:
+        return datetime.strptime(suffix, "%Y%m%d" if self.period == "day" else "%Y%m")
+
+    def _next_period(self, start: datetime) -> datetime:
+        if self.period == "day":
+            return start + timedelta(days=1)
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    def partition_name(self, ts: datetime) -> str:
+        return f"{self.name}_{self._suffix(ts)}"
+
+    def partition(self, table_name: str) -> Table:
+        with self._lock:
+            table = self._tables.get(table_name)
+            if table is None:
+                table = Table(table_name, self._metadata, *self._columns())
+                covering = [self.key_column, self.time_column] + [
+                    c.name for c in table.columns
+                    if c.name not in (self.key_column, self.time_column) and not c.primary_key
+                ]
+                Index(f"ix_{table_name}_{self.key_column}_{self.time_column}", *[table.c[n] for n in covering])
+                self._tables[table_name] = table
+            return table
+
+    def ensure(self, conn, table_name: str) -> Table:
+        table = self.partition(table_name)
+        key = (str(conn.engine.url), table_name)
+        if key not in self._created:
+            table.create(conn, checkfirst=True)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+            self._created.add(key)
+        return table
+
+    def partitions(self, conn) -> list[str]:
+        """Existing partition table names, oldest first."""
+        rows = conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE :pattern ORDER BY name"),
+            {"pattern": f"{self.name}_%"},
+        )
+        width = 8 if self.period == "day" else 6
+        prefix = len(self.name) + 1
+        return [r[0] for r in rows if len(r[0]) == prefix + width and r[0][prefix:].isdigit()]
+
+    def insert(self, conn, rows: list[dict]):
+        """
+        Inserts rows with one executemany per partition touched. Parameters are
+        bound at the driver level, with the time column in the same text format
+        SQLAlchemy's SQLite DateTime uses, to keep per-row overhead low.
+        """
+        names: dict = {}
+        by_partition: dict[str, list] = {}
+        for row in rows:
+            ts = row[self.time_column]
+            day = ts.date()
+            table_name = names.get(day)
+            if table_name is None:
+                table_name = names[day] = self.partition_name(ts)
+            by_partition.setdefault(table_name, []).append(row)
+
+        for table_name, part in by_partition.items():
+            table = self.ensure(conn, table_name)
+            cols = [c.name for c in table.columns if not c.primary_key]
+            sql = f'INSERT INTO "{table_name}" ({", ".join(cols)}) VALUES ({", ".join("?" * len(cols))})'
+            t = cols.index(self.time_column)
+            params = []
+            for row in part:
+                values = [row.get(c) for c in cols]
+                ts = values[t]
+                if ts.tzinfo is not None:
+                    ts = ts.replace(tzinfo=None)
+                values[t] = ts.isoformat(" ", "microseconds")
+                params.append(tuple(values))
+            conn.exec_driver_sql(sql, params)
+
+    def select_range(self, conn, key, start: datetime, end: datetime, columns: list[str] | None = None) -> list:
+        """Rows for `key` with start <= time < end, in time order, served from the covering index."""
+        existing = set(self.partitions(conn))
+        out = []
+        period = self._period_start(self._suffix(start))
+        while period < end:
+            table_name = f"{self.name}_{self._suffix(period)}"
+            period = self._next_period(period)
+            if table_name not in existing:
+                continue
+            table = self.partition(table_name)
+            # By default select the indexed columns after the key, so the scan never touches the table
+            names = columns or [c.name for c in next(iter(table.indexes)).columns][1:]
+            stmt = (
+                select(*[table.c[n] for n in names])
+                .where(table.c[self.key_column] == key)
+                .where(table.c[self.time_column] >= start)
+                .where(table.c[self.time_column] < end)
+                .order_by(table.c[self.time_column])
+            )
+            out.extend(conn.execute(stmt).all())
+        return out
+
+    def drop_before(self, conn, cutoff: datetime) -> list[str]:
+        """Drops every partition whose whole period ends on or before `cutoff`; returns their names."""
+        dropped = []
+        for table_name in self.partitions(conn):
+            start = self._period_start(table_name[len(self.name) + 1:])
+            if self._next_period(start) <= cutoff:
+                conn.execute(text(f'DROP TABLE IF EXISTS "{table_name}"'))
+                self._created.discard((str(conn.engine.url), table_name))
+                dropped.append(table_name)
+        return dropped
+
+
 # Define tables here as per Module 11
-realtime_market_data = Table(
+realtime_market_data = PartitionedTable(
     "realtime_market_data",
-    metadata,
-    Column("id", Integer, primary_key=True),
-    Column("symbol", String, nullable=False),
-    Column("price", Float, nullable=False),
-    Column("timestamp", DateTime, nullable=False),
-    Column("order_id", Integer, nullable=True)
+    lambda: [
+        Column("id", Integer, primary_key=True),
+        Column("symbol", String, nullable=False),
+        Column("price", Float, nullable=False),
+        Column("timestamp", DateTime, nullable=False),
+        Column("order_id", Integer, nullable=True),
+    ],
+    period="day",
 )
 
-metadata.create_all(engine)
+def init_db(bind=None):
+    """Creates the non-partitioned tables. Partitions are created on first write."""
+    metadata.create_all(bind or engine)
@@ -0,0 +1,157 @@
+import atexit
+import threading
+from collections import deque
+from loguru import logger
+from sqlalchemy import Table, insert
+
+
+class BatchWriter:
+    """
+    Background writer that buffers rows in memory and inserts them with one
+    `executemany` per transaction, flushing when `batch_size` rows are queued
+    or `flush_interval` seconds after the oldest unflushed row.
+
+    The buffer holds at most `max_buffer` rows. When it is full, `put` either
+    blocks until the writer catches up (`overflow="block"`, bounded by
+    `put_timeout`) or drops the row (`overflow="drop"`); both are counted in
+    `stats()`. `close()` flushes everything still buffered.
+    """
+
+    def __init__(self, engine, table, batch_size: int = 5000, flush_interval: float = 0.25,
+                 max_buffer: int = 100_000, overflow: str = "block", put_timeout: float | None = 1.0):
+        if overflow not in ("block", "drop"):
+            raise ValueError("overflow must be 'block' or 'drop'")
+        self.engine = engine
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self.put_timeout = put_timeout
+        self._buf = deque()
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._in_flight = 0
+        self._closed = False
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._blocked = 0
+        self._batches = 0
+        self._errors = 0
+        self._max_depth = 0
+        self._thread = threading.Thread(target=self._run, name=f"{table.name}-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, row: dict) -> bool:
+        """Queues one row; returns False if it was dropped."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Writer is closed")
+            if len(self._buf) >= self.max_buffer:
+                if self.overflow == "drop":
+                    self._dropped += 1
+                    return False
+                self._blocked += 1
+                self._cond.notify_all()
+                if not self._cond.wait_for(lambda: len(self._buf) < self.max_buffer or self._closed,
+                                           self.put_timeout):
+                    self._dropped += 1
+                    logger.warning(f"{self.table.name} writer buffer full, row dropped")
+                    return False
+            self._buf.append(row)
+            self._enqueued += 1
+            depth = len(self._buf)
+            if depth > self._max_depth:
+                self._max_depth = depth
+            if depth == 1 or depth >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Writes everything queued so far; returns False if that did not finish within `timeout`."""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._buf and not self._in_flight, timeout)
+
+    def close(self, timeout: float | None = 10.0):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"{self.table.name} writer did not drain within {timeout}s")
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            # Sleep until the first row arrives, then give the batch up to flush_interval to fill
+            self._cond.wait_for(lambda: self._buf or self._closed or self._flush_requested)
+            self._cond.wait_for(
+                lambda: len(self._buf) >= self.batch_size or self._closed or self._flush_requested,
+                self.flush_interval,
+            )
+            n = min(self.batch_size, len(self._buf))
+            batch = [self._buf.popleft() for _ in range(n)]
+            self._in_flight = n
+            if not self._buf:
+                self._flush_requested = False
+            self._cond.notify_all()  # wake producers blocked on a full buffer
+            return batch
+
+    def _write(self, batch: list):
+        try:
+            with self.engine.begin() as conn:
+                if isinstance(self.table, Table):
+                    conn.execute(insert(self.table), batch)
+                else:
+                    self.table.insert(conn, batch)  # e.g. a PartitionedTable
+            written, errors = len(batch), 0
+        except Exception as e:
+            logger.exception(f"Failed to write {len(batch)} rows to {self.table.name}: {e}")
+            written, errors = 0, 1
+        with self._cond:
+            self._written += written
+            self._errors += errors
+            self._batches += 1
+            self._in_flight = 0
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+            elif self._closed:
+                with self._cond:
+                    if not self._buf:
+                        return
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "enqueued": self._enqueued,
+                "written": self._written,
+                "dropped": self._dropped,
+                "blocked": self._blocked,
+                "batches": self._batches,
+                "errors": self._errors,
+                "buffer_depth": len(self._buf),
+                "max_buffer_depth": self._max_depth,
+            }
+
+
+_tick_writer = None
+_tick_writer_lock = threading.Lock()
+
+def get_tick_writer() -> BatchWriter:
+    """Process-wide writer for `realtime_market_data`, flushed at interpreter exit."""
+    global _tick_writer
+    with _tick_writer_lock:
+        if _tick_writer is None:
+            from storage.db import engine, realtime_market_data
+            _tick_writer = BatchWriter(engine, realtime_market_data)
+            atexit.register(_tick_writer.close)
+        return _tick_writer
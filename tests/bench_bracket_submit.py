@@ -0,0 +1,70 @@
+"""
+Benchmark: bracket submission against a fake socket, previous path vs. the
+BracketSubmitter hot path (cached contract and Order templates, one write).
+
+Run with: python -m tests.bench_bracket_submit [n_brackets]
+"""
+import sys
+import time
+import numpy as np
+from ibapi.order import Order
+from ibkr_adapter.bracket import BracketSubmitter
+from ibkr_adapter.dispatch import ORDER_EVENTS
+from ibkr_adapter.mapping import resolve_contract
+from tests.test_bracket import socket_client
+
+def legacy_bracket(parent_id, action, quantity, limit_price, take_profit_price, stop_loss_price):
+    """The previous make_bracket_order: three Orders built field by field."""
+    exit_action = "SELL" if action == "BUY" else "BUY"
+    parent = Order()
+    parent.orderId, parent.action, parent.orderType = parent_id, action, "LMT"
+    parent.totalQuantity, parent.lmtPrice, parent.transmit = quantity, limit_price, False
+    take_profit = Order()
+    take_profit.orderId, take_profit.action, take_profit.orderType = parent_id + 1, exit_action, "LMT"
+    take_profit.totalQuantity, take_profit.lmtPrice = quantity, take_profit_price
+    take_profit.parentId, take_profit.transmit = parent_id, False
+    stop_loss = Order()
+    stop_loss.orderId, stop_loss.action, stop_loss.orderType = parent_id + 2, exit_action, "STP"
+    stop_loss.totalQuantity, stop_loss.auxPrice = quantity, stop_loss_price
+    stop_loss.parentId, stop_loss.transmit = parent_id, True
+    return [parent, take_profit, stop_loss]
+
+def legacy_submit(client, i):
+    contract = resolve_contract("ES", "FUT")
+    orders = legacy_bracket(client._next_order_ids(3), "BUY", 1, 5000.0 + i % 4, 5010.0, 4990.0)
+    for order in orders:
+        client.placeOrder(order.orderId, contract, order)
+
+def percentiles_us(samples) -> str:
+    p50, p99 = np.percentile(np.array(samples) * 1e6, [50, 99])
+    return f"p50 {p50:7.1f}us  p99 {p99:7.1f}us"
+
+def bench(n: int):
+    client = socket_client()
+    samples = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        legacy_submit(client, i)
+        samples.append(time.perf_counter() - t0)
+    writes = len(client.conn.socket.writes) / n
+    print(f"legacy      {percentiles_us(samples)}  {writes:.0f} socket writes per bracket")
+
+    client = socket_client()
+    submitter = BracketSubmitter(lambda symbol, asset_type: (resolve_contract(symbol, asset_type), float("inf")),
+                                 lambda: client)
+    client.router.subscribe(ORDER_EVENTS, submitter.on_event)
+    submitter.prepare("ES", "FUT")
+    samples = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        parent = submitter.submit("ES", "FUT", 1, "BUY", 5000.0 + i % 4, 4990.0, 5010.0)[0]
+        samples.append(time.perf_counter() - t0)
+        # Acknowledge in-process: measures the instrumentation, not the Gateway
+        client.orderStatus(parent.orderId, "Submitted", 0, 1, 0, 0, 0, 0, 0, "", 0)
+    writes = len(client.conn.socket.writes) / n
+    print(f"templates   {percentiles_us(samples)}  {writes:.0f} socket write per bracket")
+    ack = submitter.stats()["submit_to_ack"]
+    print(f"submit-to-ack histogram over {ack['count']} brackets: {ack['histogram']}")
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
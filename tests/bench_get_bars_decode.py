@@ -0,0 +1,70 @@
+"""
+Benchmark: legacy per-bar get_bars decoding vs. the columnar BarBuffer path.
+
+Run with: python -m tests.bench_get_bars_decode [n_bars ...]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from ibapi.common import BarData
+from ibkr_adapter.bars import BarBuffer
+
+def make_bars(n: int) -> list:
+    base = pd.Timestamp("2025-01-02 09:30:00")
+    dates = (base + pd.to_timedelta(np.arange(n), unit="min")).strftime("%Y%m%d  %H:%M:%S")
+    rng = np.random.default_rng(0)
+    closes = 100 + rng.standard_normal(n).cumsum() * 0.05
+    bars = []
+    for date, close in zip(dates, closes):
+        b = BarData()
+        b.date, b.open, b.high, b.low, b.close, b.volume = date, close, close + 0.1, close - 0.1, close, 1000
+        bars.append(b)
+    return bars
+
+def legacy_decode(bars) -> pd.DataFrame:
+    rows = []
+    for b in bars:
+        ts = pd.to_datetime(b.date, format="%Y%m%d  %H:%M:%S", errors="coerce")
+        if pd.isna(ts):
+            ts = pd.to_datetime(b.date, format="%Y%m%d", errors="coerce")
+        rows.append({"ts": ts, "open": b.open, "high": b.high, "low": b.low, "close": b.close,
+                     "volume": getattr(b, "volume", 0)})
+    df = pd.DataFrame(rows).dropna(subset=["ts"]).sort_values("ts").reset_index(drop=True)
+    for col in ["open", "high", "low", "close"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["volume"] = pd.to_numeric(df["volume"], errors="coerce").astype("Int64")
+    df["ts"] = pd.to_datetime(df["ts"]).dt.tz_localize(None).astype("datetime64[ns]")
+    return df
+
+def columnar_decode(bars) -> pd.DataFrame:
+    buffer = BarBuffer(len(bars))
+    for b in bars:  # mirrors the per-callback append done while bars arrive
+        buffer.append(b)
+    return buffer.to_frame()
+
+def bench(n: int, legacy_limit: int = 100_000):
+    bars = make_bars(n)
+    t0 = time.perf_counter()
+    new_df = columnar_decode(bars)
+    t_new = time.perf_counter() - t0
+
+    if n <= legacy_limit:
+        t0 = time.perf_counter()
+        old_df = legacy_decode(bars)
+        t_old = time.perf_counter() - t0
+        pd.testing.assert_frame_equal(old_df, new_df)
+        print(f"{n:>9} bars  legacy {t_old:8.3f}s  columnar {t_new:7.3f}s  speedup {t_old / t_new:6.1f}x")
+    else:
+        # The legacy loop costs ~2 pd.to_datetime calls per bar; extrapolate
+        # from the 10k sample instead of waiting minutes.
+        sample = bars[:10_000]
+        t0 = time.perf_counter()
+        legacy_decode(sample)
+        t_old = (time.perf_counter() - t0) * n / len(sample)
+        print(f"{n:>9} bars  legacy ~{t_old:7.3f}s  columnar {t_new:7.3f}s  speedup ~{t_old / t_new:5.1f}x (legacy extrapolated)")
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for n in sizes:
+        bench(n)
@@ -0,0 +1,51 @@
+"""
+Benchmark: payload size and server time of the market_data.get_bars response
+formats, against the previous per-bar pydantic MarketDataResponse.
+
+Run with: python -m tests.bench_get_bars_formats [n_bars]
+"""
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from mcp_server.tools.market_data import (
+    Bar, MarketDataResponse, TimeframeEnum, generate_mock_bars, _bars_response,
+    JSON_ROWS, JSON_COLUMNAR, ARROW_STREAM, NUMPY_NPY, pa,
+)
+
+def pydantic_rows(bars, tzinfo) -> bytes:
+    """The pre-negotiation path: one Bar model per row, then model serialization."""
+    models = [
+        Bar(t=t.to_pydatetime().replace(tzinfo=tzinfo), o=o, h=h, l=l, c=c, v=v)
+        for t, o, h, l, c, v in zip(bars["t"], bars["o"], bars["h"], bars["l"], bars["c"], bars["v"])
+    ]
+    response = MarketDataResponse(symbol="ES", tf=TimeframeEnum.min1, bars=models,
+                                  meta={"what_to_show": "TRADES", "source": "MOCK", "count": len(models)})
+    return response.model_dump_json().encode()
+
+def timed(fn, repeat: int = 3):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def bench(n: int):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    end = start + timedelta(minutes=n)
+    meta = {"what_to_show": "TRADES", "source": "MOCK", "count": n}
+    gen_time, bars = timed(lambda: generate_mock_bars("bench", start, end, timedelta(minutes=1)))
+    print(f"{n} bars (generation {gen_time * 1000:.1f} ms, not included below)")
+
+    t, body = timed(lambda: pydantic_rows(bars, timezone.utc), repeat=1)
+    print(f"  {'pydantic rows (previous)':<42} {t * 1000:9.1f} ms  {len(body) / 1e6:8.2f} MB")
+
+    formats = [JSON_ROWS, JSON_COLUMNAR, NUMPY_NPY] + ([ARROW_STREAM] if pa is not None else [])
+    for media_type in formats:
+        t, response = timed(lambda: _bars_response("ES", TimeframeEnum.min1, bars, timezone.utc, meta, media_type))
+        print(f"  {media_type:<42} {t * 1000:9.1f} ms  {len(response.body) / 1e6:8.2f} MB")
+    if pa is None:
+        print(f"  {ARROW_STREAM:<42} skipped (pyarrow not installed)")
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,59 @@
+"""
+Benchmark: risk.pre_trade_check latency, scanning every position per check
+vs. the ExposureBook aggregates, as the number of positions grows.
+
+Run with: python -m tests.bench_pretrade_check [n_checks]
+"""
+import math
+import sys
+import time
+import numpy as np
+from ibkr_adapter.portfolio import PositionState
+from risk.limits import RiskLimits
+from risk.pretrade_checks import ExposureBook, PreTradeChecker
+
+LIMITS = RiskLimits(max_symbol_exposure_pct=0.1, max_asset_class_exposure_pct={"STK": 2.0},
+                    max_gross_exposure_pct=4.0, max_orders_per_minute=1_000_000)
+
+def positions(n: int) -> list[PositionState]:
+    return [PositionState("DU1", i, f"S{i}", "STK", "USD", 100.0, 50.0, market_price=51.0) for i in range(n)]
+
+def scan_check(held: list, equity: float, symbol: str, qty: int, entry: float, stop: float) -> int:
+    """The same limits, summed from the positions on every call."""
+    symbol_net = sum(p.qty * p.market_price for p in held if p.symbol == symbol)
+    gross = sum(abs(p.qty * p.market_price) for p in held)
+    allowed = min(qty, math.floor(LIMITS.risk_per_trade_pct * equity / abs(entry - stop)))
+    allowed = min(allowed, math.floor((LIMITS.max_symbol_exposure_pct * equity - symbol_net) / entry))
+    allowed = min(allowed, math.floor((LIMITS.max_asset_class_exposure_pct["STK"] * equity - gross) / entry))
+    return min(allowed, math.floor((LIMITS.max_gross_exposure_pct * equity - gross) / entry))
+
+def percentiles_us(samples) -> str:
+    p50, p99 = np.percentile(np.array(samples) * 1e6, [50, 99])
+    return f"p50 {p50:8.1f}us  p99 {p99:8.1f}us  {len(samples) / sum(samples):>10,.0f} checks/s"
+
+def bench(n_checks: int):
+    equity = 1e9
+    for n in (100, 1_000, 10_000):
+        held = positions(n)
+        samples = []
+        for i in range(min(n_checks, 2_000_000 // n)):
+            t0 = time.perf_counter()
+            scan_check(held, equity, f"S{i % n}", 100, 51.0, 50.0)
+            samples.append(time.perf_counter() - t0)
+        print(f"{n:>6} positions  scan        {percentiles_us(samples)}")
+
+        exposure = ExposureBook("USD")
+        exposure.on_portfolio_event({"kind": "account_value", "tag": "NetLiquidation", "currency": "USD",
+                                     "value": equity})
+        for p in held:
+            exposure.on_portfolio_event({"kind": "position", "key": p.key, "position": p})
+        checker = PreTradeChecker(LIMITS, exposure)
+        samples = []
+        for i in range(n_checks):
+            t0 = time.perf_counter()
+            checker.check(f"S{i % n}", "STK", "BUY", 100, 51.0, 50.0)
+            samples.append(time.perf_counter() - t0)
+        print(f"{n:>6} positions  aggregates  {percentiles_us(samples)}")
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,29 @@
+"""
+Benchmark: sustained BatchWriter throughput into a SQLite tick table.
+
+Run with: python -m tests.bench_tick_writer [n_ticks]
+"""
+import sys
+import tempfile
+import time
+from storage.db import make_engine, realtime_market_data
+from storage.writer import BatchWriter
+from tests.test_tick_writer import row_count, tick
+
+def bench(n: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{tmp}/ticks.db")
+        writer = BatchWriter(engine, realtime_market_data)
+        rows = [tick(i) for i in range(n)]
+        start = time.perf_counter()
+        for row in rows:
+            writer.put(row)
+        writer.flush(timeout=60)
+        elapsed = time.perf_counter() - start
+        writer.close()
+        print(f"tick writer: {n / elapsed:,.0f} ticks/s ({writer.stats()['batches']} batches, "
+              f"{row_count(engine):,} rows)")
+        engine.dispose()
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+import pandas as pd
+import pytest
+from ibapi.contract import Contract
+from ibkr_adapter.adapter import TWSAdapter
+from ibkr_adapter.async_adapter import AsyncTWSAdapter
+from ibkr_adapter.dispatch import POSITIONS
+from ibkr_adapter.portfolio import PortfolioCache
+from ibkr_adapter.tws_client import IBKRError
+from fastapi.testclient import TestClient
+from mcp_server.main import app
+from mcp_server.tools import utils
+from tests.test_bar_store import FakeHistClient
+
+class SlowFakeClient(FakeHistClient):
+    """FakeHistClient whose replies (bars, positions, account summary) arrive after `latency`."""
+    def __init__(self, latency=0.2):
+        super().__init__()
+        self.latency = latency
+        self.position_requests = 0
+        self.position_cancels = 0
+
+    def _emit(self, reqId, start, end):
+        time.sleep(self.latency)
+        super()._emit(reqId, start, end)
+
+    def reqPositions(self):
+        self.position_requests += 1
+        def reply():
+            time.sleep(self.latency)
+            contract = Contract()
+            contract.symbol, contract.secType, contract.currency = "AAPL", "STK", "USD"
+            self.position("DU1", contract, 10, 150.0)
+            self.positionEnd()
+        threading.Thread(target=reply, daemon=True).start()
+
+    def cancelPositions(self):
+        self.position_cancels += 1
+
+    def reqAccountSummary(self, reqId, group, tags):
+        def reply():
+            time.sleep(self.latency)
+            self.accountSummary(reqId, "DU1", "NetLiquidation", "1000", "USD")
+            self.accountSummaryEnd(reqId)
+        threading.Thread(target=reply, daemon=True).start()
+
+    def cancelAccountSummary(self, reqId):
+        pass
+
+def make_async_adapter(latency=0.2):
+    adapter = TWSAdapter()
+    adapter.dry_run = False
+    adapter.client = SlowFakeClient(latency)
+    return AsyncTWSAdapter(adapter)
+
+def test_async_get_bars_matches_sync_path():
+    ib = make_async_adapter(latency=0.0)
+    df = asyncio.run(ib.get_bars("AAPL", "1m", "2025-01-02T10:00:00Z", "2025-01-02T10:30:00Z"))
+    expected = ib.adapter.get_bars("AAPL", "1m", "2025-01-02T10:00:00Z", "2025-01-02T10:30:00Z")
+    pd.testing.assert_frame_equal(df, expected)
+    assert len(df) == 30
+
+def test_event_loop_stays_responsive_while_requests_are_in_flight():
+    ib = make_async_adapter(latency=0.3)
+
+    async def main():
+        ticks = 0
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        hb = asyncio.create_task(heartbeat())
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(ib.get_account_summary() for _ in range(50)),
+            ib.get_bars("AAPL", "1m", "2025-01-02T10:00:00Z", "2025-01-02T10:05:00Z"),
+        )
+        elapsed = time.perf_counter() - start
+        hb.cancel()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(main())
+    assert all(r[0]["tag"] == "NetLiquidation" for r in results[:50])
+    assert len(results[50]) == 5
+    # 50 concurrent summaries overlap instead of queueing 50 * 0.3s
+    assert elapsed < 2.0
+    # The loop kept ticking the whole time
+    assert ticks >= elapsed / 0.01 * 0.5
+
+def test_async_positions_coalesce_with_sync_callers():
+    ib = make_async_adapter(latency=0.3)
+
+    async def main():
+        sync_result = asyncio.to_thread(ib.client.get_positions_blocking)
+        return await asyncio.gather(ib.get_positions(), ib.get_positions(), sync_result)
+
+    results = asyncio.run(main())
+    assert ib.client.position_requests == 1
+    assert all(r == [{"symbol": "AAPL", "asset_type": "STK", "qty": 10, "avg_price": 150.0,
+                      "unrealized_pnl": None, "currency": "USD"}] for r in results)
+
+def test_positions_wait_for_the_portfolio_stream_without_touching_it():
+    ib = make_async_adapter(latency=0.3)
+    client = ib.adapter.client
+    client.is_connected = True
+    ib.adapter.portfolio = PortfolioCache(client, pnl=False)
+    ib.adapter.portfolio.start()  # its positions download is still in flight
+
+    async def main():
+        return await asyncio.gather(ib.get_positions(), asyncio.to_thread(ib.adapter.get_positions),
+                                    asyncio.to_thread(client.get_positions_blocking))
+
+    results = asyncio.run(main())
+    assert all([row["symbol"] for row in r] == ["AAPL"] for r in results)
+    assert client.position_cancels == 0 and client.router.get(POSITIONS, 0) is not None
+
+def test_async_account_summary_returns_partial_on_timeout():
+    ib = make_async_adapter(latency=1.0)
+    assert asyncio.run(ib.get_account_summary(timeout=0.1)) == []
+    assert ib.client.router.stats()["sinks"] == 0
+
+def test_queued_chunks_do_not_time_out():
+    ib = make_async_adapter(latency=0.2)
+    ib.adapter.hist_timeout = 0.5
+    # Ten one-day chunks, two at a time: about 1s in total, twice the per-request timeout
+    df = asyncio.run(ib.get_bars("AAPL", "1m", "2025-01-01T00:00:00", "2025-01-11T00:00:00"))
+    assert len(df) == 10 * 24 * 60
+    assert ib.client._hist_sem.acquire(blocking=False) and ib.client._hist_sem.acquire(blocking=False)
+
+def test_a_failed_chunk_cancels_the_others():
+    ib = make_async_adapter(latency=5.0)
+    client = ib.adapter.client
+    cancelled = []
+    client.cancelHistoricalData = cancelled.append
+    send = client.reqHistoricalData
+
+    def req_historical_data(reqId, *args):
+        if not client.requests:
+            client.requests.append(None)
+            threading.Thread(target=client.error, args=(reqId, 321, "Error validating request"), daemon=True).start()
+        else:
+            send(reqId, *args)
+    client.reqHistoricalData = req_historical_data
+
+    async def main():
+        with pytest.raises(IBKRError):
+            await ib.get_bars("AAPL", "1m", "2025-01-01T00:00:00", "2025-01-11T00:00:00")
+        # Checked before asyncio.run tears down whatever tasks are left
+        return len(cancelled), client.router.stats()["sinks"]
+
+    start = time.monotonic()
+    cancels, sinks = asyncio.run(main())
+    assert time.monotonic() - start < 2.0
+    # Every chunk sent besides the failed one was cancelled; most never went out
+    assert cancels == len(client.requests) - 1 < 9
+    assert sinks == 0
+    assert client._hist_sem.acquire(blocking=False) and client._hist_sem.acquire(blocking=False)
+
+def test_the_app_creates_the_adapter_off_the_event_loop(monkeypatch):
+    on_loop = []
+
+    class Adapter:
+        dry_run = True
+        def __init__(self):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+    monkeypatch.setattr(utils, "_ibkr", None)
+    monkeypatch.setattr("ibkr_adapter.async_adapter.AsyncTWSAdapter", Adapter)
+    with TestClient(app):
+        assert on_loop == [False] and isinstance(utils._ibkr, Adapter)
+        assert utils.get_ibkr() is None and on_loop == [False]  # created once, at startup
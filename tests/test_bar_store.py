@@ -0,0 +1,98 @@
+import pytest
+import threading
+import pandas as pd
+from ibapi.common import BarData
+from ibkr_adapter.tws_client import TWSClient
+from ibkr_adapter.adapter import TWSAdapter
+from ibkr_adapter.bar_store import BarStore
+from ibkr_adapter.pacing import HistPacer
+
+class FakeHistClient(TWSClient):
+    """
+    Answers reqHistoricalData with one 1m bar per minute of the requested window,
+    delivered from a separate thread as the ibapi reader thread would.
+    """
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+        self._hist_pacer = HistPacer(identical_window=0.0, contract_max=1000)
+
+    def reqHistoricalData(self, reqId, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH, formatDate, keepUpToDate, chartOptions):
+        end = pd.Timestamp(endDateTime)
+        amount, unit = durationStr.split()
+        start = end - pd.Timedelta(seconds=int(amount) * {"S": 1, "D": 86400}[unit])
+        self.requests.append((start, end))
+        threading.Thread(target=self._emit, args=(reqId, start, end), daemon=True).start()
+
+    def _emit(self, reqId, start, end):
+        for ts in pd.date_range(start, end, freq="1min", inclusive="left"):
+            bar = BarData()
+            bar.date = ts.strftime("%Y%m%d  %H:%M:%S")
+            bar.open = bar.high = bar.low = bar.close = 100.0 + ts.minute
+            bar.volume = 10
+            self.historicalData(reqId, bar)
+        self.historicalDataEnd(reqId, "", "")
+
+    def cancelHistoricalData(self, reqId):
+        pass
+
+@pytest.fixture
+def cached_adapter(tmp_path):
+    adapter = TWSAdapter()
+    adapter.dry_run = False
+    adapter.client = FakeHistClient()
+    adapter.bar_store = BarStore(str(tmp_path))
+    return adapter
+
+def test_bar_cache_serves_hits_and_fills_gaps(cached_adapter):
+    adapter = cached_adapter
+
+    df1 = adapter.get_bars("AAPL", "1m", "2025-01-02T10:00:00Z", "2025-01-02T10:30:00Z")
+    assert len(df1) == 30
+    assert adapter.client.requests == [(pd.Timestamp("2025-01-02 10:00"), pd.Timestamp("2025-01-02 10:30"))]
+
+    # Same window again: served entirely from the store
+    df2 = adapter.get_bars("AAPL", "1m", "2025-01-02T10:00:00Z", "2025-01-02T10:30:00Z")
+    pd.testing.assert_frame_equal(df1, df2)
+    assert len(adapter.client.requests) == 1
+
+    # Overlapping, wider window: only the uncovered tail goes to IB
+    df3 = adapter.get_bars("AAPL", "1m", "2025-01-02T10:15:00Z", "2025-01-02T11:00:00Z")
+    assert len(df3) == 45
+    assert adapter.client.requests[-1] == (pd.Timestamp("2025-01-02 10:30"), pd.Timestamp("2025-01-02 11:00"))
+    assert df3["ts"].is_monotonic_increasing
+    assert str(df3["volume"].dtype) == "Int64"
+    assert df3["ts"].dtype == "datetime64[ns]"
+
+    assert adapter.bar_store.stats() == {"hits": 1, "partial_hits": 1, "misses": 1, "gap_fills": 2}
+
+def test_bar_cache_keys_are_isolated(cached_adapter):
+    adapter = cached_adapter
+    adapter.get_bars("AAPL", "1m", "2025-01-02T10:00:00Z", "2025-01-02T10:10:00Z")
+    adapter.get_bars("AAPL", "1m", "2025-01-02T10:00:00Z", "2025-01-02T10:10:00Z", what_to_show="MIDPOINT")
+    adapter.get_bars("AAPL", "1m", "2025-01-02T10:00:00Z", "2025-01-02T10:10:00Z", use_rth=0)
+    assert len(adapter.client.requests) == 3
+
+def test_bar_store_persists_across_instances(tmp_path):
+    key = ("MSFT", "STK", "1m", "TRADES", 1)
+    df = pd.DataFrame({
+        "ts": pd.to_datetime(["2025-01-02 23:59:00", "2025-01-03 00:00:00"]).astype("datetime64[ns]"),
+        "open": [1.0, 2.0], "high": [1.0, 2.0], "low": [1.0, 2.0], "close": [1.0, 2.0],
+        "volume": pd.array([5, None], dtype="Int64"),
+    })
+    BarStore(str(tmp_path)).write(key, df, "2025-01-02 23:59:00", "2025-01-03 00:01:00")
+
+    store = BarStore(str(tmp_path))
+    assert store.missing(key, "2025-01-02 23:59:00", "2025-01-03 00:01:00") == []
+    out = store.read(key, "2025-01-02 23:00:00", "2025-01-03 01:00:00")
+    pd.testing.assert_frame_equal(out, df)
+
+def test_recent_bars_are_final_by_the_tws_clock(cached_adapter):
+    # TWS runs 14h ahead of this host: its last few minutes are still in this host's future
+    cached_adapter.ib_tz = "Pacific/Kiritimati"
+    end = cached_adapter.ib_now().floor("min") - pd.Timedelta(minutes=5)
+    start, end = (end - pd.Timedelta(minutes=30)).isoformat(), end.isoformat()
+
+    assert len(cached_adapter.get_bars("AAPL", "1m", start, end)) == 30
+    assert len(cached_adapter.get_bars("AAPL", "1m", start, end)) == 30
+    assert len(cached_adapter.client.requests) == 1
@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from mcp_server.main import app
+from mcp_server.tools import market_data
+from ibkr_adapter.adapter import TWSAdapter
+from ibkr_adapter.async_adapter import AsyncTWSAdapter
+from tests.test_bar_store import FakeHistClient
+
+client = TestClient(app)
+headers = {"X-API-Key": "your-secret-api-key"}
+
+def item(symbol, start, end, tf="1m"):
+    return {"symbol": symbol, "asset_type": "STK", "tf": tf, "start": start, "end": end}
+
+def post_batch(items):
+    response = client.post("/tool/market_data.get_bars_batch", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return {line["index"]: line for line in lines[:-1]}, lines[-1]
+
+def test_batch_dry_run_matches_single_requests_and_reports_bad_items():
+    items = [
+        item("AAPL", "2025-01-02T10:00:00Z", "2025-01-02T10:30:00Z"),
+        item("MSFT", "2025-01-02T10:00:00Z", "2025-01-02T10:10:00Z", tf="5m"),
+        item("AAPL", "2025-01-02T10:00:00Z", "2025-01-02T10:30:00Z"),
+        item("BAD", "2025-01-02T11:00:00Z", "2025-01-02T10:00:00Z"),
+    ]
+    results, summary = post_batch(items)
+    assert summary == {"done": True, "ok": 3, "failed": 1}
+    assert results[3]["status"] == "error" and results[3]["error"]["code"] == "INVALID_RANGE"
+
+    single = client.post("/tool/market_data.get_bars", json=items[0], headers=headers).json()
+    assert results[0]["bars"] == results[2]["bars"] == single["bars"]
+    assert results[1]["meta"]["count"] == 2
+
+class FailingSymbolClient(FakeHistClient):
+    """FakeHistClient that rejects requests for the BAD symbol the way IB does."""
+    latency = 0.0
+
+    def _emit(self, reqId, start, end):
+        time.sleep(self.latency)
+        super()._emit(reqId, start, end)
+
+    def reqHistoricalData(self, reqId, contract, endDateTime, durationStr, *args):
+        if contract.symbol == "BAD":
+            threading.Thread(target=self.error, args=(reqId, 200, "No security definition has been found for the request"),
+                             daemon=True).start()
+            return
+        super().reqHistoricalData(reqId, contract, endDateTime, durationStr, *args)
+
+@pytest.fixture
+def live_ibkr(monkeypatch):
+    adapter = TWSAdapter()
+    adapter.dry_run = False
+    adapter.client = FailingSymbolClient()
+    ibkr = AsyncTWSAdapter(adapter)
+    monkeypatch.setattr(market_data, "get_ibkr", lambda: ibkr)
+    return ibkr
+
+def test_batch_merges_overlapping_ranges_into_one_fetch(live_ibkr):
+    items = [
+        item("AAPL", "2025-01-02T10:00:00", "2025-01-02T10:30:00"),
+        item("AAPL", "2025-01-02T10:20:00", "2025-01-02T11:00:00"),
+        item("AAPL", "2025-01-02T11:00:00", "2025-01-02T11:10:00"),  # touching
+        item("AAPL", "2025-01-02T13:00:00", "2025-01-02T13:05:00"),  # separate window
+        item("MSFT", "2025-01-02T10:00:00", "2025-01-02T10:05:00"),
+        item("BAD", "2025-01-02T10:00:00", "2025-01-02T10:05:00"),
+    ]
+    results, summary = post_batch(items)
+    assert summary == {"done": True, "ok": 5, "failed": 1}
+    assert sorted(live_ibkr.client.requests) == sorted([
+        (market_data.pd.Timestamp("2025-01-02 10:00"), market_data.pd.Timestamp("2025-01-02 11:10")),
+        (market_data.pd.Timestamp("2025-01-02 13:00"), market_data.pd.Timestamp("2025-01-02 13:05")),
+        (market_data.pd.Timestamp("2025-01-02 10:00"), market_data.pd.Timestamp("2025-01-02 10:05")),
+    ])
+    assert [results[i]["meta"]["count"] for i in range(5)] == [30, 40, 10, 5, 5]
+    assert results[1]["bars"][0]["t"] == "2025-01-02T10:20:00"
+    assert results[1]["bars"][-1]["t"] == "2025-01-02T10:59:00"
+    assert results[5]["status"] == "error"
+    assert results[5]["error"]["code"] == "IBKRError"
+
+def test_plan_keeps_mock_ranges_separate():
+    req = market_data.MarketDataBatchRequest(items=[
+        item("AAPL", "2025-01-02T10:00:00Z", "2025-01-02T10:30:00Z"),
+        item("AAPL", "2025-01-02T10:15:00Z", "2025-01-02T10:45:00Z"),
+    ])
+    assert len(market_data.plan_bars_batch(req.items, merge=False)[0]) == 2
+    assert len(market_data.plan_bars_batch(req.items, merge=True)[0]) == 1
+
+def test_large_batch_outlasts_the_request_timeout(live_ibkr):
+    live_ibkr.adapter.hist_timeout = 0.3
+    live_ibkr.client.latency = 0.1
+    items = [item(symbol, "2025-01-01T00:00:00", "2025-01-04T00:00:00") for symbol in ("AAPL", "MSFT", "NVDA", "AMD")]
+    results, summary = post_batch(items)
+    # Twelve chunks of 0.1s each, two at a time, take twice the per-request timeout
+    assert summary == {"done": True, "ok": 4, "failed": 0}
+    assert all(results[i]["meta"]["count"] == 3 * 24 * 60 for i in range(4))
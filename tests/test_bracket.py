@@ -0,0 +1,107 @@
+from ibapi import comm
+from ibapi.client import EClient
+from ibapi.common import UNSET_DOUBLE
+from ibapi.connection import Connection
+from ibapi.server_versions import MAX_CLIENT_VER
+from ibkr_adapter.bracket import BracketSubmitter
+from ibkr_adapter.dispatch import ORDER_EVENTS
+from ibkr_adapter.mapping import resolve_contract
+from ibkr_adapter.tws_client import TWSClient
+
+class FakeSocket:
+    """Records each socket write instead of sending it."""
+    def __init__(self):
+        self.writes = []
+
+    def send(self, data):
+        self.writes.append(data)
+        return len(data)
+
+def socket_client() -> TWSClient:
+    """A TWSClient whose real ibapi Connection writes to a FakeSocket."""
+    client = TWSClient()
+    client.conn = Connection("127.0.0.1", 0)
+    client.conn.socket = FakeSocket()
+    client.connState = EClient.CONNECTED
+    client.serverVersion_ = MAX_CLIENT_VER
+    client.next_valid_id = 100
+    return client
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+    def __call__(self):
+        return self.now
+
+def make_submitter(client, wall_clock=None):
+    qualified = []
+    def contract_for(symbol, asset_type):
+        qualified.append(symbol)
+        return resolve_contract(symbol, asset_type), 1000.0
+    submitter = BracketSubmitter(contract_for, lambda: client, wall_clock=wall_clock or Clock())
+    client.router.subscribe(ORDER_EVENTS, submitter.on_event)
+    return submitter, qualified
+
+def test_legs_are_sent_in_one_write_with_reserved_ids():
+    client = socket_client()
+    submitter, _ = make_submitter(client)
+    first = submitter.submit("AAPL", "STK", 10, "BUY", 180.0, 175.0, 190.0, "GTC")
+    second = submitter.submit("AAPL", "STK", 5, "BUY", 181.0, 176.0, 191.0, "GTC")
+
+    assert [o.orderId for o in first] == [100, 101, 102] and [o.orderId for o in second] == [103, 104, 105]
+    assert len(client.conn.socket.writes) == 2  # one write per bracket, not per leg
+    parent, take_profit, stop_loss = second
+    assert (parent.action, parent.orderType, parent.lmtPrice, parent.totalQuantity) == ("BUY", "LMT", 181.0, 5)
+    assert (take_profit.action, take_profit.lmtPrice, take_profit.parentId) == ("SELL", 191.0, 103)
+    assert (stop_loss.orderType, stop_loss.auxPrice, stop_loss.parentId) == ("STP", 176.0, 103)
+    assert [o.transmit for o in second] == [False, False, True]
+    assert {o.tif for o in second} == {"GTC"}
+    assert first[0].lmtPrice == 180.0  # templates are copied, never mutated
+
+    # Other requests on the same thread go out unbuffered again
+    client.reqCurrentTime()
+    assert len(client.conn.socket.writes) == 3
+
+def test_market_entry_sends_a_market_parent():
+    client = socket_client()
+    submitter, _ = make_submitter(client)
+    submitter.submit("AAPL", "STK", 10, "BUY", 180.0, 175.0, 190.0)
+    parent, take_profit, stop_loss = submitter.submit("AAPL", "STK", 10, "BUY", None, 175.0, 190.0, entry_type="MKT")
+
+    assert (parent.orderType, parent.lmtPrice) == ("MKT", UNSET_DOUBLE)
+    assert (take_profit.orderType, take_profit.lmtPrice, stop_loss.auxPrice) == ("LMT", 190.0, 175.0)
+    assert submitter.stats()["templates"] == 2  # keyed by entry type
+    fields = comm.read_fields(comm.read_msg(client.conn.socket.writes[-1])[1])
+    assert b"MKT" in fields and b"None" not in fields
+
+def test_templates_are_reused_until_the_contract_expires():
+    client = socket_client()
+    wall_clock = Clock(0.0)
+    submitter, qualified = make_submitter(client, wall_clock)
+    submitter.prepare("ES", "FUT")
+    assert qualified == ["ES", "ES"] and submitter.stats()["templates"] == 2
+
+    submitter.submit("ES", "FUT", 1, "SELL", 5000.0, 5010.0, 4990.0)
+    assert len(qualified) == 2
+    wall_clock.now = 1000.0  # roll date
+    submitter.submit("ES", "FUT", 1, "SELL", 5000.0, 5010.0, 4990.0)
+    assert len(qualified) == 3
+
+def test_records_submit_to_ack_and_fill_latency():
+    client = socket_client()
+    submitter, _ = make_submitter(client)
+    filled = submitter.submit("AAPL", "STK", 10, "BUY", 180.0, 175.0, 190.0)
+    cancelled = submitter.submit("AAPL", "STK", 10, "BUY", 170.0, 165.0, 180.0)
+    rejected = submitter.submit("AAPL", "STK", 10, "BUY", 160.0, 155.0, 170.0)
+
+    client.orderStatus(filled[0].orderId, "Submitted", 0, 10, 0, 1, 0, 0, 1, "", 0)
+    client.orderStatus(filled[0].orderId, "Filled", 10, 0, 180.0, 1, 0, 180.0, 1, "", 0)
+    client.orderStatus(cancelled[0].orderId, "Submitted", 0, 10, 0, 2, 0, 0, 1, "", 0)
+    client.orderStatus(cancelled[0].orderId, "Cancelled", 0, 10, 0, 2, 0, 0, 1, "", 0)
+    client.error(rejected[0].orderId, 201, "Order rejected")
+
+    stats = submitter.stats()
+    assert stats["submitted"] == 3
+    assert stats["submit_to_ack"]["count"] == 2 and stats["submit_to_fill"]["count"] == 1
+    assert sum(stats["submit_to_fill"]["histogram"].values()) == 1
+    assert stats["awaiting_ack"] == 0 and stats["awaiting_fill"] == 0
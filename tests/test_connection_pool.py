@@ -0,0 +1,117 @@
+import threading
+import time
+import pytest
+from ibkr_adapter.adapter import TWSAdapter
+from ibkr_adapter.dispatch import FutureSink, HISTORICAL, ORDER_EVENTS
+from ibkr_adapter.pool import ConnectionPool, ORDERS, HISTORY, MARKET_DATA
+from tests.test_async_adapter import SlowFakeClient
+
+class FakePoolClient(SlowFakeClient):
+    """Slow historical replies plus connect, reqCurrentTime and placeOrder without a socket."""
+    def __init__(self):
+        super().__init__(latency=0.05)
+        self.connect_ok = True
+        self.answer_pings = True
+        self.placed = []
+
+    def connect_and_run(self, host, port, clientId, **kwargs):
+        if not self.connect_ok:
+            raise ConnectionError("Could not connect to IBKR.")
+        self.client_id = clientId
+        self.nextValidId(1)
+
+    def reqCurrentTime(self):
+        if self.answer_pings:
+            threading.Thread(target=self.currentTime, args=(int(time.time()),), daemon=True).start()
+
+    def placeOrder(self, orderId, contract, order):
+        self.placed.append(orderId)
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool("127.0.0.1", 4002, 10, sizes={ORDERS: 1, HISTORY: 2, MARKET_DATA: 1},
+                          client_factory=FakePoolClient, health_interval=0, ping_timeout=0.2)
+    pool.start()
+    return pool
+
+def test_routes_by_class_and_balances_load(pool):
+    assert [(c.client_id, c.traffic_class) for c in pool.connections] == [
+        (10, ORDERS), (11, HISTORY), (12, HISTORY), (13, MARKET_DATA)]
+    assert pool.client(ORDERS).client_id == 10
+    assert pool.client(MARKET_DATA).client_id == 13
+
+    busy = pool.client(HISTORY)
+    busy.router.register(HISTORICAL, 1, FutureSink())
+    assert pool.client(HISTORY) is not busy
+    assert pool.client(HISTORY).client_id in (11, 12)
+
+    events = []
+    unsubscribe = pool.subscribe(ORDER_EVENTS, events.append)
+    for client in pool.clients():
+        client.router.publish(ORDER_EVENTS, {"client": client.client_id})
+    assert len(events) == 4
+    unsubscribe()
+    pool.client(ORDERS).router.publish(ORDER_EVENTS, {})
+    assert len(events) == 4
+
+def test_health_checks_fail_over_and_recover(pool):
+    market_data = pool.client(MARKET_DATA)
+    market_data.answer_pings = False
+    pool.check_health()
+    assert pool.client(MARKET_DATA) is not market_data
+    assert pool.stats()["failovers"] == 1
+
+    market_data.answer_pings = True
+    pool.check_health()
+    assert pool.client(MARKET_DATA) is market_data
+    assert pool.stats()["connections"][3]["rtt_ms"] is not None
+
+    # Order ids are per client ID, so orders fail instead of moving to another connection
+    orders = pool.client(ORDERS)
+    orders.answer_pings = False
+    pool.check_health()
+    with pytest.raises(ConnectionError, match="do not fail over"):
+        pool.client(ORDERS)
+    assert pool.stats()["failovers"] == 1
+    orders.answer_pings = True
+    pool.check_health()
+
+    # A dropped connection is reconnected by the next health check
+    orders.connect_ok = False
+    orders.connectionClosed()
+    pool.check_health()
+    assert not pool.connections[0].healthy
+    orders.connect_ok = True
+    pool.check_health()
+    assert pool.connections[0].healthy and pool.client(ORDERS) is orders
+
+    for conn in pool.connections:
+        conn.healthy = False
+    with pytest.raises(ConnectionError):
+        pool.client(ORDERS)
+
+def test_only_one_orders_connection():
+    with pytest.raises(ValueError, match="orders connection"):
+        ConnectionPool("127.0.0.1", 4002, 10, sizes={ORDERS: 2}, client_factory=FakePoolClient)
+
+def test_orders_stay_fast_during_a_backfill(pool):
+    adapter = TWSAdapter()
+    adapter.dry_run = False
+    adapter.pool = pool
+    adapter.client = pool.client(MARKET_DATA)
+
+    backfill = threading.Thread(target=adapter.get_bars,
+                                args=("AAPL", "1m", "2025-01-01T00:00:00", "2025-01-09T00:00:00"))
+    backfill.start()
+    time.sleep(0.02)
+    latencies = []
+    for _ in range(20):
+        start = time.perf_counter()
+        adapter.place_bracket_order("MSFT", "STK", 1, "BUY", 100.0, 99.0, 102.0, "DAY")
+        latencies.append(time.perf_counter() - start)
+    backfill.join()
+
+    orders, history = pool.connections[0].client, [c.client for c in pool.connections[1:3]]
+    assert len(orders.placed) == 60 and orders.requests == []
+    assert all(client.requests for client in history)  # chunks spread over both history connections
+    assert max(latencies) < 0.05
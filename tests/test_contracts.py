@@ -0,0 +1,111 @@
+import threading
+import time
+import pytest
+from ibapi.contract import ContractDetails
+from ibkr_adapter.contracts import ContractIndex, ContractResolver
+from ibkr_adapter.mapping import resolve_contract
+from ibkr_adapter.tws_client import TWSClient, IBKRError
+
+DAY = 86400
+NOW = 1735776000.0  # 2025-01-02 00:00 UTC
+
+def details(symbol, sec_type, con_id, last_trade="", multiplier="", min_tick=0.01):
+    d = ContractDetails()
+    c = d.contract
+    c.conId, c.symbol, c.secType, c.exchange, c.currency = con_id, symbol, sec_type, "CME" if sec_type == "FUT" else "SMART", "USD"
+    c.lastTradeDateOrContractMonth, c.multiplier = last_trade, multiplier
+    d.minTick, d.timeZoneId, d.tradingHours = min_tick, "US/Central", "20250102:1700-20250103:1600"
+    return d
+
+class FakeContractsClient(TWSClient):
+    """Answers reqContractDetails from a table, on a separate thread, and counts the requests."""
+    CONTRACTS = {
+        ("AAPL", "STK"): [details("AAPL", "STK", 265598)],
+        ("ES", "FUT"): [
+            details("ES", "FUT", 3, "20250620", "50", 0.25),
+            details("ES", "FUT", 1, "20250103", "50", 0.25),
+            details("ES", "FUT", 2, "20250321", "50", 0.25),
+        ],
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def reqContractDetails(self, reqId, contract):
+        self.requests.append((contract.symbol, contract.secType, contract.lastTradeDateOrContractMonth))
+        def reply():
+            time.sleep(0.05)
+            matches = [d for d in self.CONTRACTS.get((contract.symbol, contract.secType), [])
+                       if d.contract.lastTradeDateOrContractMonth.startswith(contract.lastTradeDateOrContractMonth)]
+            if not matches:
+                self.error(reqId, 200, "No security definition has been found for the request")
+                return
+            for d in matches:
+                self.contractDetails(reqId, d)
+            self.contractDetailsEnd(reqId)
+        threading.Thread(target=reply, daemon=True).start()
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+    def __call__(self):
+        return self.now
+
+def test_resolve_contract_returns_independent_copies():
+    a = resolve_contract("AAPL", "STK")
+    a.exchange = "ISLAND"
+    b = resolve_contract("AAPL", "STK")
+    assert b is not a and b.exchange == "SMART"
+
+def test_qualifies_once_and_persists_the_index(tmp_path):
+    path = str(tmp_path / "contracts.json")
+    client = FakeContractsClient()
+    resolver = ContractResolver(client, ContractIndex(path), clock=Clock(NOW))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resolver.resolve("AAPL", "STK"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert client.requests == [("AAPL", "STK", "")]
+    assert {c.conId for c in results} == {265598}
+    assert len({id(c) for c in results}) == 5  # every caller gets its own Contract
+
+    info = resolver.qualify("AAPL", "STK")
+    assert info.min_tick == 0.01 and info.time_zone == "US/Central" and info.multiplier == 1.0
+    with pytest.raises(AttributeError):
+        info.con_id = 1
+
+    # A new process reads the index from disk and needs no round trip
+    reloaded = ContractResolver(FakeContractsClient(), ContractIndex(path), clock=Clock(NOW))
+    assert reloaded.resolve("AAPL", "STK").conId == 265598
+    assert reloaded.client.requests == []
+    assert reloaded.by_con_id(265598).symbol == "AAPL"
+
+def test_futures_use_the_front_month_and_roll(tmp_path):
+    clock = Clock(NOW)
+    client = FakeContractsClient()
+    resolver = ContractResolver(client, ContractIndex(str(tmp_path / "c.json")), roll_days=5, clock=clock)
+
+    # March is the front month: January rolls within 5 days
+    es = resolver.qualify("ES", "FUT")
+    assert (es.con_id, es.last_trade_date, es.multiplier, es.min_tick) == (2, "20250321", 50.0, 0.25)
+    assert resolver.resolve("ES", "FUT").multiplier == "50"
+    assert client.requests == [("ES", "FUT", "")]
+
+    clock.now = NOW + 75 * DAY  # 2025-03-18: past the March roll date (03-16)
+    assert resolver.qualify("ES", "FUT").con_id == 3
+    assert len(client.requests) == 2
+
+    assert resolver.qualify("ES", "FUT", "20250620").con_id == 3
+
+def test_unknown_contract_raises_without_caching():
+    client = FakeContractsClient()
+    resolver = ContractResolver(client, clock=Clock(NOW))
+    with pytest.raises(IBKRError):
+        resolver.qualify("NOPE", "STK")
+    with pytest.raises(IBKRError):
+        resolver.qualify("NOPE", "STK")
+    assert len(client.requests) == 2
@@ -0,0 +1,151 @@
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from ibkr_adapter.tws_client import TWSClient, IBKRError
+from ibkr_adapter.dispatch import EventRouter, StreamSink, FutureSink, ORDER_EVENTS
+from ibkr_adapter.pacing import HistPacer
+
+class RouterTestClient(TWSClient):
+    def __init__(self):
+        super().__init__()
+        self._hist_pacer = HistPacer(identical_window=0.0)
+        self.sent = []
+
+    def reqHistoricalData(self, reqId, *args):
+        self.sent.append(("reqHistoricalData", reqId))
+
+    def cancelHistoricalData(self, reqId):
+        self.sent.append(("cancelHistoricalData", reqId))
+
+    def reqPositions(self):
+        self.sent.append(("reqPositions",))
+
+    def cancelPositions(self):
+        self.sent.append(("cancelPositions",))
+
+    def reqAccountSummary(self, reqId, group, tags):
+        self.sent.append(("reqAccountSummary", reqId))
+
+    def cancelAccountSummary(self, reqId):
+        self.sent.append(("cancelAccountSummary", reqId))
+
+def test_reader_thread_never_blocks_on_large_history():
+    client = RouterTestClient()
+    received = []
+
+    def slow_consumer():
+        for bar in client.iter_historical_data(MagicMock(), "20250102 16:00:00", "1 D", "1 min"):
+            received.append(bar)
+            time.sleep(0.0001)
+
+    consumer = threading.Thread(target=slow_consumer)
+    consumer.start()
+    while not client.sent:
+        time.sleep(0.01)
+    req_id = client.sent[0][1]
+
+    # Previously the reader thread blocked once 100 bars were queued
+    bars = [SimpleNamespace(date=str(i)) for i in range(5000)]
+    t0 = time.perf_counter()
+    for bar in bars:
+        client.historicalData(req_id, bar)
+    client.historicalDataEnd(req_id, "", "")
+    assert time.perf_counter() - t0 < 0.5
+
+    consumer.join(timeout=10)
+    assert len(received) == 5000
+    assert client.router.stats()["sinks"] == 0
+
+def test_ring_buffer_drops_oldest():
+    sink = StreamSink(maxlen=3)
+    for i in range(5):
+        sink.push(i)
+    assert sink.dropped == 2
+    assert sink.take(10) == [2, 3, 4]
+
+def test_unrouted_callbacks_are_discarded():
+    client = RouterTestClient()
+    client.historicalData(123, MagicMock())
+    client.accountSummary(456, "DU1", "NetLiquidation", "1000", "USD")
+    assert client.router.stats()["unrouted"] == 2
+    assert client.router.stats()["sinks"] == 0
+
+def test_order_events_are_published():
+    client = RouterTestClient()
+    events = []
+    unsubscribe = client.router.subscribe(ORDER_EVENTS, events.append)
+
+    client.orderStatus(7, "Submitted", 0, 10, 0.0, 555, 0, 0.0, 1, "", 0.0)
+    client.orderStatus(8, "Filled", 10, 0, 101.0, 556, 7, 101.0, 1, "", 0.0)
+    unsubscribe()
+    client.orderStatus(9, "Submitted", 0, 10, 0.0, 557, 0, 0.0, 1, "", 0.0)
+
+    assert [(e["orderId"], e["status"]) for e in events] == [(7, "Submitted"), (8, "Filled")]
+    assert events[1]["parentId"] == 7
+
+def test_concurrent_position_requests_share_one_reply():
+    client = RouterTestClient()
+    results = []
+
+    def caller():
+        results.append(client.get_positions_blocking(timeout=2.0))
+
+    threads = [threading.Thread(target=caller) for _ in range(3)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+
+    contract = MagicMock(symbol="AAPL", secType="STK", currency="USD")
+    client.position("DU1", contract, 10, 150.0)
+    client.positionEnd()
+    for t in threads:
+        t.join()
+
+    assert client.sent.count(("reqPositions",)) == 1
+    assert client.sent.count(("cancelPositions",)) == 1
+    assert len(results) == 3
+    assert all(r == [{"symbol": "AAPL", "asset_type": "STK", "qty": 10, "avg_price": 150.0,
+                      "unrealized_pnl": None, "currency": "USD"}] for r in results)
+
+def test_account_summary_is_cancelled_after_end():
+    client = RouterTestClient()
+
+    def reply():
+        time.sleep(0.05)
+        client.accountSummary(42, "DU1", "NetLiquidation", "1000", "USD")
+        client.accountSummaryEnd(42)
+
+    threading.Thread(target=reply).start()
+    summary = client.get_account_summary(42, "All", "NetLiquidation")
+
+    assert summary == [{"account": "DU1", "tag": "NetLiquidation", "value": "1000", "currency": "USD"}]
+    assert ("cancelAccountSummary", 42) in client.sent
+    assert client.router.stats()["sinks"] == 0
+
+def test_request_error_fails_waiter_immediately():
+    client = RouterTestClient()
+    stream = client.iter_historical_data(MagicMock(), "20250102 16:00:00", "1 D", "1 min", timeout=10)
+
+    def fail():
+        # The generator sends nothing until it is first iterated
+        while not client.sent:
+            time.sleep(0.01)
+        client.error(client.sent[0][1], 162, "Historical Market Data Service error message")
+
+    threading.Thread(target=fail).start()
+    t0 = time.perf_counter()
+    with pytest.raises(IBKRError) as exc:
+        list(stream)
+    assert time.perf_counter() - t0 < 1.0
+    assert exc.value.code == 162
+
+def test_future_sink_resolves_on_end():
+    router = EventRouter()
+    sink = router.register("contract_details", 1, FutureSink())
+    router.dispatch("contract_details", 1, "a")
+    router.dispatch("contract_details", 1, "b")
+    router.end("contract_details", 1)
+    assert sink.future.result(timeout=0) == ["a", "b"]
+    assert router.get("contract_details", 1) is None
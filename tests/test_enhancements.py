@@ -2,8 +2,9 @@ import pytest
 import time
 from datetime import datetime, timedelta
 import pandas as pd
-from ibkr_adapter.tws_client import TWSClient, _pace_hist
-from ibkr_adapter.adapter import _ib_duration_from_range, ib_hist_params, TWSAdapter
+from ibkr_adapter.tws_client import TWSClient
+from ibkr_adapter.pacing import HistPacer
+from ibkr_adapter.adapter import TWSAdapter
 from ibkr_adapter.mapping import resolve_contract
 from ibapi.order import Order
 from unittest.mock import MagicMock, patch
@@ -64,9 +65,8 @@ def tws_adapter(mock_tws_client):
     return adapter
 
 def test_pacing_hist_calls_queue(mock_tws_client):
-    # Reset _last_hist for a clean test
-    global _last_hist
-    _last_hist = 0.0
+    # Fresh pacer with a short identical-request window for a quick test
+    mock_tws_client._hist_pacer = HistPacer(identical_window=1.0)
 
     contract = MagicMock()
     contract.symbol = "AAPL"
@@ -78,37 +78,20 @@ def test_pacing_hist_calls_queue(mock_tws_client):
     end_time_1 = time.time()
     assert (end_time_1 - start_time_1) < 0.1 # Should be almost immediate
 
-    # Second call should be delayed by at least 2 seconds
+    # An identical request must wait out the identical-request window
     start_time_2 = time.time()
     mock_tws_client.get_historical_data(contract, end_time, "1 D", "1 day")
     end_time_2 = time.time()
-    assert (end_time_2 - start_time_2) >= 1.9
-
-def test_duration_from_range():
-    # Test seconds
-    start = "2025-01-01T09:00:00Z"
-    end = "2025-01-01T09:00:30Z"
-    assert _ib_duration_from_range(start, end) == "30 S"
-
-    # Test days
-    start = "2025-01-01T09:00:00Z"
-    end = "2025-01-03T09:00:00Z" # 2 days
-    assert _ib_duration_from_range(start, end) == "2 D"
-
-    # Test weeks
-    start = "2025-01-01T09:00:00Z"
-    end = "2025-01-15T09:00:00Z" # 2 weeks
-    assert _ib_duration_from_range(start, end) == "2 W"
-
-    # Test months
-    start = "2025-01-01T09:00:00Z"
-    end = "2025-03-01T09:00:00Z" # 2 months
-    assert _ib_duration_from_range(start, end) == "1 M" # Expect 1 M due to 30-day approximation
-
-    # Test edge case: less than a second
-    start = "2025-01-01T09:00:00Z"
-    end = "2025-01-01T09:00:00Z"
-    assert _ib_duration_from_range(start, end) == "0 S"
+    assert (end_time_2 - start_time_2) >= 0.9
+
+    # A different request is admitted immediately
+    start_time_3 = time.time()
+    mock_tws_client.get_historical_data(contract, end_time, "2 D", "1 day")
+    assert (time.time() - start_time_3) < 0.1
+
+    stats = mock_tws_client.hist_pacing_stats()
+    assert stats["admitted"] == 3
+    assert stats["delayed"] == 1
 
 def test_fx_contract_mapping():
     contract = resolve_contract("EUR.USD", "FX")
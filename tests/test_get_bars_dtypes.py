@@ -38,3 +38,57 @@ def test_get_bars_dtypes(adapter):
 
     # Check for NaN values in critical columns (optional, but good practice)
     assert not df[["open", "high", "low", "close", "volume", "ts"]].isnull().any().any()
+
+def _bar(date, o, h, l, c, v):
+    from ibapi.common import BarData
+    b = BarData()
+    b.date, b.open, b.high, b.low, b.close, b.volume = date, o, h, l, c, v
+    return b
+
+def test_get_bars_live_decode_dtypes(adapter):
+    from unittest.mock import MagicMock
+
+    bars = [
+        _bar("20250101  09:01:00", 101.0, 102.0, 100.0, 101.5, 1200),
+        _bar("20250101  09:00:00", 100.0, 101.0, 99.0, 100.5, 1000),
+        _bar("garbage", 1.0, 1.0, 1.0, 1.0, 1),
+    ]
+
+    def fake_get_historical_data(**kwargs):
+        sink = kwargs["sink"]
+        for b in bars:
+            sink.append(b)
+        return sink
+
+    live = TWSAdapter()
+    live.dry_run = False
+    live.client = MagicMock()
+    live.client.get_historical_data.side_effect = fake_get_historical_data
+
+    df = live.get_bars("AAPL", "1m", "2025-01-01T09:00:00Z", "2025-01-01T09:05:00Z")
+
+    assert list(df.columns) == ["ts", "open", "high", "low", "close", "volume"]
+    assert df["ts"].dtype == "datetime64[ns]"
+    assert df["open"].dtype == np.float64
+    assert str(df["volume"].dtype) == "Int64"
+    # Unparseable dates are dropped and rows come back sorted by ts
+    assert list(df["ts"]) == [pd.Timestamp("2025-01-01 09:00:00"), pd.Timestamp("2025-01-01 09:01:00")]
+    assert list(df["volume"]) == [1000, 1200]
+
+def test_parse_ib_dates_formats():
+    from ibkr_adapter.bars import parse_ib_dates
+
+    raw = np.array([
+        b"20250101  09:30:00",
+        b"20250101 16:00:05",
+        b"20250228",
+        b"20250230",
+        b"20250101  25:00:00",
+        b"",
+    ], dtype="S18")
+    ts = parse_ib_dates(raw)
+
+    assert ts[0] == np.datetime64("2025-01-01T09:30:00")
+    assert ts[1] == np.datetime64("2025-01-01T16:00:05")
+    assert ts[2] == np.datetime64("2025-02-28T00:00:00")
+    assert np.isnat(ts[3:]).all()
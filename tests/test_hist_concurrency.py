@@ -3,6 +3,7 @@ from unittest.mock import MagicMock, patch
 import threading
 import time
 from ibkr_adapter.tws_client import TWSClient
+from ibkr_adapter.pacing import HistPacer
 from ibapi.contract import Contract
 from loguru import logger
 from queue import Queue
@@ -19,16 +20,17 @@ def mock_tws_client_for_hist_concurrency():
         client.run = MagicMock()
         client.next_valid_id = 1000
         client.is_connected = True
+        # Both threads send the same request; only the semaphore is under test here
+        client._hist_pacer = HistPacer(identical_window=0.0)
 
         # Mock reqHistoricalData to simulate work and allow signaling completion
         def mock_reqHistoricalData(reqId, *args, **kwargs):
-            # Simulate putting some data into the queue
-            client.get_response_queue(reqId).put(MagicMock(date="20250101  09:00:00", open=100, high=101, low=99, close=100.5, volume=1000))
-            client.get_response_queue(reqId).put(MagicMock(date="20250101  09:01:00", open=100.5, high=101.5, low=99.5, close=101, volume=1100))
-            # Simulate historicalDataEnd
-            with client._events_lock:
-                ev = client._end_events.get(reqId)
-            if ev: ev.set()
+            # Simulate IB latency so the request keeps its semaphore slot for a while
+            time.sleep(0.5)
+            # Simulate the bar callbacks and historicalDataEnd
+            client.historicalData(reqId, MagicMock(date="20250101  09:00:00", open=100, high=101, low=99, close=100.5, volume=1000))
+            client.historicalData(reqId, MagicMock(date="20250101  09:01:00", open=100.5, high=101.5, low=99.5, close=101, volume=1100))
+            client.historicalDataEnd(reqId, "", "")
 
         client.reqHistoricalData = MagicMock(side_effect=mock_reqHistoricalData)
         client.cancelHistoricalData = MagicMock()
@@ -109,4 +111,31 @@ def test_historical_concurrency_limit(mock_tws_client_for_hist_concurrency):
     # Clean up threads (they might still be running if they didn't timeout)
     for thread in threads:
         thread.join()
-    time.sleep(0.1) # Give some time for queue puts to complete
\ No newline at end of file
+    time.sleep(0.1) # Give some time for queue puts to complete
+
+
+def test_paced_request_does_not_hold_a_slot():
+    from tests.test_enhancements import MockTWSClient
+    client = MockTWSClient()
+    client._hist_sem = threading.Semaphore(value=1)
+    client._hist_pacer = HistPacer(identical_window=1.0)
+    aapl, msft = Contract(), Contract()
+    aapl.symbol, msft.symbol = "AAPL", "MSFT"
+    client.get_historical_data(aapl, "20250101 16:00:00", "1 D", "1 min")
+
+    paced = threading.Thread(target=client.get_historical_data, args=(aapl, "20250101 16:00:00", "1 D", "1 min"))
+    paced.start()
+    time.sleep(0.1)
+    t0 = time.perf_counter()
+    client.get_historical_data(msft, "20250101 16:00:00", "1 D", "1 min", timeout=0.5)
+    assert time.perf_counter() - t0 < 0.2  # the only slot was free while AAPL waited
+    paced.join()
+    assert [call["contract"].symbol for call in client.reqHistoricalData_calls] == ["AAPL", "MSFT", "AAPL"]
+
+    # A pacing wait longer than the request timeout fails fast instead of stalling
+    client._hist_pacer = HistPacer(identical_window=15.0)
+    client.get_historical_data(aapl, "20250102 16:00:00", "1 D", "1 min")
+    t0 = time.perf_counter()
+    with pytest.raises(TimeoutError, match="pacing"):
+        client.get_historical_data(aapl, "20250102 16:00:00", "1 D", "1 min", timeout=2.0)
+    assert time.perf_counter() - t0 < 0.5 and client._hist_sem.acquire(blocking=False)
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+import pandas as pd
+from ibkr_adapter.adapter import TWSAdapter, plan_hist_chunks, HIST_CHUNK_LIMITS, _ib_duration_covering
+from ibkr_adapter.async_adapter import AsyncTWSAdapter
+from tests.test_bar_store import FakeHistClient
+
+def test_plan_one_year_5m_backfill():
+    start, end = pd.Timestamp("2024-01-01"), pd.Timestamp("2025-01-01")
+    chunks = plan_hist_chunks("5m", start, end)
+
+    assert len(chunks) == 53
+    assert chunks[0][1] == end and chunks[-1][0] == start
+    assert all(e - s <= HIST_CHUNK_LIMITS["5m"] for s, e in chunks)
+    # Chunks tile the range exactly, newest first
+    assert all(a[0] == b[1] for a, b in zip(chunks, chunks[1:]))
+
+def test_plan_short_range_is_single_chunk():
+    chunks = plan_hist_chunks("1m", "2025-01-02 09:30", "2025-01-02 16:00")
+    assert chunks == [(pd.Timestamp("2025-01-02 09:30"), pd.Timestamp("2025-01-02 16:00"))]
+
+def test_duration_covering_uses_days_for_daily_bars():
+    assert _ib_duration_covering("2025-01-02 09:30", "2025-01-02 16:00", "1 min") == "23400 S"
+    assert _ib_duration_covering("2025-01-02 09:30", "2025-01-02 16:00", "1 day") == "1 D"
+    assert _ib_duration_covering("2025-01-02", "2025-01-02", "1 day") == "1 D"
+    assert _ib_duration_covering("2025-01-01", "2025-01-03 12:00", "1 day") == "3 D"
+
+class SlowHistClient(FakeHistClient):
+    """Fake IB that takes `latency` seconds to answer and tracks in-flight requests."""
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def reqHistoricalData(self, *args):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        super().reqHistoricalData(*args)
+
+def test_long_range_fans_out_and_stitches():
+    adapter = TWSAdapter()
+    adapter.dry_run = False
+    adapter.client = SlowHistClient(latency=0.3)
+    progress = []
+
+    t0 = time.perf_counter()
+    df = adapter.get_bars("AAPL", "1m", "2025-01-01T00:00:00Z", "2025-01-07T00:00:00Z",
+                          progress=lambda done, total: progress.append((done, total)))
+    elapsed = time.perf_counter() - t0
+
+    assert len(adapter.client.requests) == 6
+    assert adapter.client.max_in_flight == 2
+    # Two chunks in flight at a time instead of six serial round trips
+    assert elapsed < 6 * 0.3 * 0.75
+    assert progress == [(i, 6) for i in range(1, 7)]
+
+    assert len(df) == 6 * 24 * 60
+    assert df["ts"].is_monotonic_increasing
+    assert df["ts"].is_unique
+    assert df["ts"].iloc[0] == pd.Timestamp("2025-01-01 00:00")
+    assert df["ts"].iloc[-1] == pd.Timestamp("2025-01-06 23:59")
+
+class WeekendHistClient(FakeHistClient):
+    """Answers windows starting on a weekend with IB's 162 "no data" error."""
+    def reqHistoricalData(self, reqId, contract, endDateTime, durationStr, *args):
+        amount, unit = durationStr.split()
+        start = pd.Timestamp(endDateTime) - pd.Timedelta(seconds=int(amount) * {"S": 1, "D": 86400}[unit])
+        if start.weekday() >= 5:
+            self.requests.append(start)
+            threading.Thread(target=self.error, args=(reqId, 162, "HMDS query returned no data"), daemon=True).start()
+            return
+        super().reqHistoricalData(reqId, contract, endDateTime, durationStr, *args)
+
+def test_chunks_without_data_are_empty_and_results_are_trimmed():
+    adapter = TWSAdapter()
+    adapter.dry_run = False
+    adapter.client = WeekendHistClient()
+
+    df = adapter.get_bars("AAPL", "1m", "2025-01-03T00:00:00", "2025-01-06T00:00:00")  # Friday to Monday
+    assert len(adapter.client.requests) == 3
+    assert len(df) == 24 * 60 and df["ts"].dt.dayofweek.unique().tolist() == [4]
+    df = asyncio.run(AsyncTWSAdapter(adapter).get_bars("AAPL", "1m", "2025-01-03T00:00:00", "2025-01-06T00:00:00"))
+    assert len(df) == 24 * 60
+
+    # 30 hours of 5m bars are requested as "2 D", which reaches back past the start
+    df = adapter.get_bars("AAPL", "5m", "2025-01-02T12:00:00", "2025-01-03T18:00:00")
+    assert df["ts"].iloc[0] == pd.Timestamp("2025-01-02 12:00")
+    assert df["ts"].iloc[-1] == pd.Timestamp("2025-01-03 17:59")
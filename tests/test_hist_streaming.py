@@ -0,0 +1,110 @@
+import threading
+import time
+import pandas as pd
+from ibapi.common import BarData
+from ibkr_adapter.tws_client import TWSClient
+from ibkr_adapter.adapter import TWSAdapter
+from ibkr_adapter.pacing import HistPacer
+
+def _bar(date, close):
+    b = BarData()
+    b.date, b.open, b.high, b.low, b.close, b.volume = date, close, close, close, close, 100
+    return b
+
+class StreamingHistClient(TWSClient):
+    """Fake IB that sends the backfill, historicalDataEnd, then live updates on demand."""
+    def __init__(self, backfill):
+        super().__init__()
+        self._hist_pacer = HistPacer(identical_window=0.0)
+        self.backfill = backfill
+        self.requests = []
+        self.cancelled = []
+        self.first_batch_seen = threading.Event()
+
+    def reqHistoricalData(self, reqId, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH, formatDate, keepUpToDate, chartOptions):
+        self.requests.append({"reqId": reqId, "endDateTime": endDateTime, "keepUpToDate": keepUpToDate})
+        threading.Thread(target=self._emit, args=(reqId,), daemon=True).start()
+
+    def _emit(self, reqId):
+        half = len(self.backfill) // 2
+        for bar in self.backfill[:half]:
+            self.historicalData(reqId, bar)
+        # The consumer must see the first half before the rest is sent
+        self.first_batch_seen.wait(timeout=5)
+        for bar in self.backfill[half:]:
+            self.historicalData(reqId, bar)
+        self.historicalDataEnd(reqId, "", "")
+
+    def cancelHistoricalData(self, reqId):
+        self.cancelled.append(reqId)
+
+def test_iter_historical_yields_before_end():
+    bars = [_bar(f"20250102  10:0{i}:00", 100.0 + i) for i in range(6)]
+    client = StreamingHistClient(bars)
+
+    received = []
+    for batch in client.iter_historical_data(object(), "20250102 10:06:00", "360 S", "1 min", batch_size=10):
+        received.append(batch)
+        client.first_batch_seen.set()
+
+    assert sum(len(b) for b in received) == 6
+    assert len(received) >= 2
+    assert [b.date for b in received[0]] == [b.date for b in bars[:len(received[0])]]
+    # Completed normally: nothing to cancel and no per-request state left behind
+    assert client.cancelled == []
+    assert client.router.stats()["sinks"] == 0
+
+def test_keep_up_to_date_stream_through_adapter():
+    bars = [_bar(f"20250102  10:0{i}:00", 100.0 + i) for i in range(4)]
+    client = StreamingHistClient(bars)
+    client.first_batch_seen.set()
+
+    adapter = TWSAdapter()
+    adapter.dry_run = False
+    adapter.client = client
+
+    stream = adapter.stream_bars("AAPL", "1m", "2025-01-02T10:00:00Z", keep_up_to_date=True, batch_size=100)
+    frames = []
+    for df in stream:
+        frames.append(df)
+        if sum(len(f) for f in frames) == 4:
+            break
+    assert client.requests[0]["keepUpToDate"] is True
+    assert client.requests[0]["endDateTime"] == ""
+    # The backfill released its concurrency slot even though the request is still open
+    assert client._hist_sem.acquire(blocking=False)
+    client._hist_sem.release()
+
+    req_id = client.requests[0]["reqId"]
+    client.historicalDataUpdate(req_id, _bar("20250102  10:03:00", 103.5))
+    client.historicalDataUpdate(req_id, _bar("20250102  10:04:00", 104.0))
+    update = next(stream)
+    assert list(update["close"]) == [103.5, 104.0]
+    assert update["ts"].dtype == "datetime64[ns]"
+
+    stream.close()
+    assert client.cancelled == [req_id]
+    assert client.router.get("historical", req_id) is None
+
+    merged = pd.concat(frames + [update]).drop_duplicates("ts", keep="last")
+    assert list(merged["close"]) == [100.0, 101.0, 102.0, 103.5, 104.0]
+
+def test_keep_up_to_date_stream_waits_for_updates():
+    bars = [_bar(f"20250102  10:0{i}:00", 100.0 + i) for i in range(4)]
+    client = StreamingHistClient(bars)
+    client.first_batch_seen.set()
+    stream = client.iter_historical_data(object(), "", "240 S", "1 min", keep_up_to_date=True, update_timeout=2.0)
+    assert [next(stream).close for _ in range(4)] == [100.0, 101.0, 102.0, 103.0]
+
+    # The update arrives while the consumer is already waiting past the backfill
+    req_id = client.requests[0]["reqId"]
+    timer = threading.Timer(0.3, client.historicalDataUpdate, args=(req_id, _bar("20250102  10:04:00", 104.0)))
+    timer.start()
+    t0 = time.perf_counter()
+    assert next(stream).close == 104.0
+    assert 0.2 < time.perf_counter() - t0 < 1.5
+
+    t0 = time.perf_counter()
+    assert list(stream) == []  # ends once no update arrives within update_timeout
+    assert time.perf_counter() - t0 >= 1.9
+    assert client.cancelled == [req_id]
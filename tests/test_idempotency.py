@@ -0,0 +1,141 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from mcp_server.tools import orders
+from mcp_server.tools.idempotency import (
+    MemoryIdempotencyStore, SQLiteIdempotencyStore, TieredIdempotencyStore, make_idempotency_store,
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def test_memory_store_is_bounded_lru_with_ttl():
+    clock = FakeClock()
+    store = MemoryIdempotencyStore(max_entries=3, ttl=60, clock=clock)
+    for key in "abc":
+        assert store.claim(key).claimed
+        store.complete(key, f'"{key}"')
+    assert store.claim("a") == (False, '"a"')  # touches "a"
+    assert store.claim("d").claimed
+    assert len(store) == 3
+    assert store.get("b") is None  # least recently used went first
+    assert store.get("a") == '"a"'
+
+    clock.now += 61
+    assert store.claim("a").claimed  # expired, may be placed again
+
+def test_release_only_drops_unfinished_claims():
+    store = MemoryIdempotencyStore()
+    assert store.claim("p1").claimed
+    assert store.claim("p1") == (False, None)  # in flight
+    store.release("p1")
+    assert store.claim("p1").claimed
+    store.complete("p1", "{}")
+    store.release("p1")
+    assert store.claim("p1") == (False, "{}")
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "tiered"])
+def test_concurrent_claims_have_one_winner(tmp_path, backend):
+    store = make_idempotency_store({"idempotency": {"backend": backend, "path": str(tmp_path / "idem.db")}})
+    barrier = threading.Barrier(16)
+
+    def claim(_):
+        barrier.wait()
+        return store.claim("same-plan").claimed
+
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(claim, range(16)))
+    assert results.count(True) == 1
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "idem.db")
+    worker1, worker2 = SQLiteIdempotencyStore(path), SQLiteIdempotencyStore(path)
+    assert worker1.claim("p1").claimed
+    assert worker2.claim("p1") == (False, None)
+    worker1.complete("p1", '{"ok": 1}')
+    assert worker2.claim("p1") == (False, '{"ok": 1}')
+
+    clock = FakeClock()
+    expiring = SQLiteIdempotencyStore(path, ttl=10, clock=clock)
+    assert expiring.claim("p2").claimed
+    clock.now += 11
+    assert expiring.purge_expired() >= 1
+    assert expiring.claim("p2").claimed
+
+def test_tiered_store_answers_duplicates_from_memory(tmp_path):
+    durable = SQLiteIdempotencyStore(str(tmp_path / "idem.db"))
+    store = TieredIdempotencyStore(MemoryIdempotencyStore(), durable)
+    assert store.claim("p1").claimed
+    store.complete("p1", "{}")
+    durable.engine.dispose()
+    durable.engine = None  # any durable access would now fail
+    assert store.claim("p1") == (False, "{}")
+
+def test_concurrent_duplicate_requests_reach_the_broker_once(monkeypatch):
+    store = MemoryIdempotencyStore()
+    monkeypatch.setattr(orders, "get_idempotency_store", lambda: store)
+    calls = []
+
+    async def slow_submit(request):
+        calls.append(request.plan_id)
+        await asyncio.sleep(0.05)
+        return orders.PlaceBracketResponse(plan_id=request.plan_id, parent_id="P", children_ids=["T", "S"],
+                                           status="ACCEPTED", dry_run=True)
+    monkeypatch.setattr(orders, "_submit_bracket", slow_submit)
+
+    request = orders.PlaceBracketRequest(
+        plan_id="race", account="DU1", symbol="MES", asset_type="FUT", qty=1, side="BUY",
+        entry={"type": "LMT", "price": 100.0}, stop={"type": "STP", "stop_price": 99.0},
+        take={"type": "LMT", "price": 101.0}, tif="DAY",
+    )
+
+    async def main():
+        return await asyncio.gather(*(orders.place_bracket(request) for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert calls == ["race"]
+    accepted = [r for r in results if isinstance(r, orders.PlaceBracketResponse)]
+    assert [r.status for r in accepted] == ["ACCEPTED"]
+    assert all(getattr(r, "status_code", None) == 409 for r in results if r not in accepted)
+
+    # Once placed, duplicates get a copy; the stored response is never mutated
+    dup = asyncio.run(orders.place_bracket(request))
+    assert dup.status == "DUPLICATE"
+    assert asyncio.run(orders.place_bracket(request)).status == "DUPLICATE"
+    assert '"ACCEPTED"' in store.get("race")
+
+def test_store_calls_do_not_block_the_event_loop(monkeypatch):
+    class SlowStore(MemoryIdempotencyStore):
+        """A store whose writes wait like SQLite under write contention."""
+        def claim(self, key):
+            threading.Event().wait(0.2)
+            return super().claim(key)
+
+        def complete(self, key, response):
+            threading.Event().wait(0.2)
+            super().complete(key, response)
+    monkeypatch.setattr(orders, "get_idempotency_store", lambda: SlowStore())
+    request = orders.PlaceBracketRequest(
+        plan_id="slow-store", account="DU1", symbol="MES", asset_type="FUT", qty=1, side="BUY",
+        entry={"type": "LMT", "price": 100.0}, stop={"type": "STP", "stop_price": 99.0},
+        take={"type": "LMT", "price": 101.0}, tif="DAY",
+    )
+
+    async def main():
+        ticks = 0
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        hb = asyncio.create_task(heartbeat())
+        response = await orders.place_bracket(request)
+        hb.cancel()
+        return response, ticks
+
+    response, ticks = asyncio.run(main())
+    assert response.status == "ACCEPTED" and ticks >= 20  # the loop kept ticking through 0.4s of store writes
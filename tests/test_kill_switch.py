@@ -0,0 +1,202 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from ibapi import comm
+from ibapi.message import OUT
+from ibkr_adapter.contracts import ContractIndex, ContractInfo, ContractResolver
+from ibkr_adapter.dispatch import ORDER_EVENTS
+from ibkr_adapter.order_book import OrderBook
+from ibkr_adapter.portfolio import PortfolioCache, PositionState
+from mcp_server.tools import orders as orders_tool, risk as risk_tool
+from risk.kill_switch import KillSwitch, KillSwitchTripped
+from tests.test_bracket import socket_client, Clock
+from tests.test_portfolio_cache import contract
+
+def sent_messages(write: bytes) -> list[list[str]]:
+    """Splits one socket write into its framed messages' fields."""
+    messages = []
+    while write:
+        size, msg, write = comm.read_msg(write)
+        messages.append([field.decode() for field in comm.read_fields(msg)])
+    return messages
+
+def connected_client():
+    client = socket_client()
+    client.is_connected = True
+    return client
+
+def test_trip_cancels_and_flattens_every_position_in_well_under_a_second():
+    client = connected_client()
+    cache = PortfolioCache(client)
+    switch = KillSwitch(lambda: client, cache)
+    switch.start()
+    cache.start()
+    for i in range(60):
+        client.position("DU1", contract(f"S{i}", "STK", 1000 + i), 100 if i % 2 else -50, 10.0)
+    client.positionEnd()
+    writes = len(client.conn.socket.writes)
+
+    started = time.perf_counter()
+    assert switch.trip("manual")
+    elapsed = time.perf_counter() - started
+    assert not switch.trip("again")
+    switch.stop()
+
+    cancel, burst = client.conn.socket.writes[writes:]
+    assert sent_messages(cancel)[0][0] == str(OUT.REQ_GLOBAL_CANCEL)
+    orders = sent_messages(burst)
+    assert len(orders) == 60 and {m[0] for m in orders} == {str(OUT.PLACE_ORDER)}
+    assert switch.last_run["positions"] == 60 and switch.last_run["trip_to_wire_ms"] < 1000 and elapsed < 1.0
+    first = orders[0]  # S0 is short 50: bought back at market
+    assert first[1:4] == ["100", "1000", "S0"] and "BUY" in first and "50.0" in first and "MKT" in first
+    assert client.next_valid_id == 100 + 60
+
+def test_new_orders_are_refused_until_reset():
+    switch = KillSwitch(lambda: connected_client())
+    switch.check()
+    switch.trip("manual")
+    with pytest.raises(KillSwitchTripped, match="manual"):
+        switch.check()
+    switch.reset()
+    switch.check()
+    assert not switch.tripped and switch.last_run["positions"] == 0
+
+def test_error_and_rejection_spikes_trip_it():
+    clock = Clock()
+    switch = KillSwitch(lambda: connected_client(), max_errors=3, max_rejections=2, window=60.0, clock=clock)
+    error = lambda code: switch.on_order_event({"event": "error", "orderId": 1, "code": code, "message": ""})
+    error(201)
+    clock.now = 61.0  # the first rejection has aged out
+    error(202)  # a confirmed cancel is an error, not a rejection
+    error(201)
+    assert not switch.tripped
+    error(162)
+    assert switch.reason == "3 errors within 60s"
+
+    switch.reset()
+    error(201)
+    error(110)
+    assert switch.reason == "2 order rejections within 60s"
+
+def test_only_order_errors_count_and_a_disconnect_does_not_trip_it():
+    client = connected_client()
+    book = OrderBook()
+    switch = KillSwitch(lambda: client, max_errors=3, is_order=lambda order_id: book.get(order_id) is not None)
+    client.router.subscribe(ORDER_EVENTS, book.on_event)
+    client.router.subscribe(ORDER_EVENTS, switch.on_order_event)
+    for req_id in range(1, 61):
+        client.reqMktData(req_id, contract(f"S{req_id}", "STK", req_id), "", False, False, [])
+        client.error(req_id, 354, "Requested market data is not subscribed.")
+    client.conn.socket = None  # the Gateway went away
+    client.stop()  # every cancel fails with 504 Not connected
+    assert not switch.tripped
+
+    book.track_bracket(client.make_bracket_order(100, "BUY", 1, 5000.0, 5010.0, 4990.0), "ES", "FUT")
+    for order_id in (100, 101, 102):
+        client.error(order_id, 399, "Order Message: Warning")
+    assert switch.reason == "3 errors within 60s"
+
+def test_drawdown_from_the_high_water_mark_trips_it():
+    equity = [100_000.0]
+    switch = KillSwitch(lambda: connected_client(), equity=lambda: equity[0], max_drawdown_pct=0.1)
+    for value in (100_000.0, 120_000.0, 109_000.0):
+        equity[0] = value
+        switch.poll()
+    assert not switch.tripped and switch.peak_equity == 120_000.0
+    equity[0] = 107_000.0
+    switch.poll()
+    assert switch.reason == "drawdown 10.83% from peak equity 120,000.00"
+
+class FakePortfolio:
+    def __init__(self, positions):
+        self.positions = positions
+        self.complete = True
+
+    def subscribe(self, callback):
+        return lambda: None
+
+    def snapshot(self):
+        return self
+
+def test_connection_loss_trips_it_and_the_pipeline_waits_for_a_fresh_portfolio():
+    client = connected_client()
+    portfolio = FakePortfolio([PositionState("DU1", 7, "ES", "FUT", "USD", -2.0, 250000.0, exchange="CME")])
+    clock = Clock()
+    switch = KillSwitch(lambda: client, portfolio, disconnect_grace=30.0, clock=clock)
+    switch.start()
+
+    client.is_connected = False
+    switch.on_connection_event({"state": "disconnected"})
+    clock.now = 29.0
+    switch.poll()
+    assert not switch.tripped
+    clock.now = 30.0
+    switch.poll()
+    assert switch.tripped and client.conn.socket.writes == []  # nothing can be sent yet
+
+    portfolio.complete = False  # the reconnect's download is still running
+    client.is_connected = True
+    switch.on_connection_event({"state": "connected"})
+    assert [sent_messages(w)[0][0] for w in client.conn.socket.writes] == [str(OUT.REQ_GLOBAL_CANCEL)]
+    switch.poll()
+    assert len(client.conn.socket.writes) == 1
+    portfolio.complete = True
+    switch.poll()
+    switch.stop()
+    flatten = sent_messages(client.conn.socket.writes[1])
+    assert len(flatten) == 1 and "CME" in flatten[0] and "BUY" in flatten[0]
+    assert switch.stats()["pending"] is False
+
+def test_flatten_takes_the_exchange_from_the_qualified_contract():
+    client = connected_client()
+    contracts = ContractResolver(client, ContractIndex())
+    contracts.index.put("ES|FUT|", ContractInfo(495512563, "ES", "FUT", "CME", "", "USD", "ESZ5", "ES", "20251219",
+                                               50.0, 0.25, "US/Central", "", "", float("inf")))
+    es = contract("ES", "FUT", 495512563)  # as reqPositions sends it: no exchange
+    portfolio = FakePortfolio([PositionState.from_contract("DU1", es, -2, 250000.0)])
+    switch = KillSwitch(lambda: client, portfolio, contracts=contracts)
+    switch.start()
+    switch.on_portfolio_event({"kind": "position", "key": ("DU1", es.conId),
+                               "position": PositionState.from_contract("DU1", es, -3, 250000.0)})
+    switch.trip("manual")
+    switch.stop()
+    flatten = sent_messages(client.conn.socket.writes[-1])
+    assert len(flatten) == 1 and "CME" in flatten[0] and "SMART" not in flatten[0] and "3.0" in flatten[0]
+
+def test_unqualified_positions_fall_back_to_the_sec_type_exchange():
+    client = connected_client()
+    eur = contract("EUR", "CASH", 12087792)
+    portfolio = FakePortfolio([PositionState.from_contract("DU1", eur, 10000, 1.1),
+                               PositionState.from_contract("DU1", contract("AAPL", "STK", 265598), 5, 150.0)])
+    switch = KillSwitch(lambda: client, portfolio)
+    switch.start()
+    switch.trip("manual")
+    switch.stop()
+    flatten = sent_messages(client.conn.socket.writes[-1])
+    assert "IDEALPRO" in flatten[0] and "SMART" in flatten[1]
+
+def test_tools_report_and_block(monkeypatch):
+    client = connected_client()
+    switch = KillSwitch(lambda: client)
+
+    class Ibkr:
+        kill_switch = switch
+
+        async def place_bracket_order(self, *args, **kwargs):
+            switch.check()
+    monkeypatch.setattr(risk_tool, "get_ibkr", lambda: Ibkr())
+    monkeypatch.setattr(orders_tool, "get_ibkr", lambda: Ibkr())
+
+    response = asyncio.run(risk_tool.kill_switch(risk_tool.KillSwitchRequest(action="trip", reason="desk")))
+    assert response.tripped and response.reason == "desk" and response.tripped_at is not None
+    request = orders_tool.PlaceBracketRequest(
+        plan_id="kill-switch-blocked", account="DU1", symbol="MES", asset_type="FUT", qty=1, side="BUY",
+        entry={"type": "LMT", "price": 5550.25}, stop={"type": "STP", "stop_price": 5538.25},
+        take={"type": "LMT", "price": 5563.25}, tif="DAY")
+    with pytest.raises(HTTPException) as blocked:
+        asyncio.run(orders_tool.place_bracket(request))
+    assert blocked.value.status_code == 423 and "desk" in blocked.value.detail
+
+    response = asyncio.run(risk_tool.kill_switch(risk_tool.KillSwitchRequest(action="reset")))
+    assert not response.tripped and not response.dry_run
@@ -0,0 +1,115 @@
+import asyncio
+import pandas as pd
+import pytest
+from ibkr_adapter.adapter import TWSAdapter
+from ibkr_adapter.aggregator import BarAggregator, BarRing
+from ibkr_adapter.async_adapter import AsyncTWSAdapter
+from ibkr_adapter.dispatch import LIVE_BARS
+from tests.test_bar_store import FakeHistClient
+
+T0 = int(pd.Timestamp("2025-01-02 10:00", tz="UTC").timestamp())
+KEY = ("ES", "FUT", "TRADES", 0)
+
+def rt_bar(t, price, volume=1):
+    return {"time": t, "open": price, "high": price + 0.5, "low": price - 0.5, "close": price,
+            "volume": volume, "wap": price, "count": 1}
+
+def feed(agg, start, n, key=KEY):
+    for i in range(n):
+        agg.on_bar(key, rt_bar(start + 5 * i, 100.0 + i))
+
+def test_bars_close_on_their_last_five_second_bar():
+    closed = []
+    agg = BarAggregator(on_close=closed.append)
+    feed(agg, T0, 12)  # exactly one minute
+    assert [(e["tf"], e["time"]) for e in closed] == [("1m", T0)]
+    bar = closed[0]
+    assert (bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"]) == (100.0, 111.5, 99.5, 111.0, 12)
+
+    feed(agg, T0 + 60, 12 * 14)  # up to 10:15
+    assert [e["time"] for e in closed if e["tf"] == "5m"] == [T0, T0 + 300, T0 + 600]
+    assert [e["time"] for e in closed if e["tf"] == "15m"] == [T0]
+    assert agg.stats()["bars_closed"] == 15 + 3 + 1
+
+def test_window_covers_only_continuous_data():
+    agg = BarAggregator()
+    feed(agg, T0 + 30, 6 + 12 * 10 + 3)  # joins mid-minute, ends 15s into 10:11
+    df = agg.window(KEY, "1m", "2025-01-02 10:01", "2025-01-02 10:11:15")
+    assert list(df["ts"]) == list(pd.date_range("2025-01-02 10:01", "2025-01-02 10:11", freq="1min"))
+    assert str(df["ts"].dtype) == "datetime64[ns]" and str(df["volume"].dtype) == "Int64"
+    assert df["volume"].iloc[-1] == 3  # the forming bar
+
+    assert agg.window(KEY, "1m", "2025-01-02 10:00", "2025-01-02 10:05") is None  # partial first minute
+    assert agg.window(KEY, "1m", "2025-01-02 10:05", "2025-01-02 10:30") is None  # not there yet
+    assert agg.window(KEY, "1d", "2025-01-02 10:05", "2025-01-02 10:06") is None
+    assert agg.window(("NQ", "FUT", "TRADES", 0), "1m", "2025-01-02 10:05", "2025-01-02 10:06") is None
+
+    # Aware bounds are converted; wall-clock times are in the aggregator's zone
+    ny = BarAggregator(tz="America/New_York")
+    feed(ny, T0, 24)
+    df = ny.window(KEY, "1m", pd.Timestamp("2025-01-02 10:00", tz="UTC"), pd.Timestamp("2025-01-02 10:02", tz="UTC"))
+    assert list(df["ts"]) == [pd.Timestamp("2025-01-02 05:00"), pd.Timestamp("2025-01-02 05:01")]
+
+    agg.reset(KEY)
+    feed(agg, T0 + 3600, 12)
+    assert agg.window(KEY, "1m", "2025-01-02 10:05", "2025-01-02 11:01") is None
+    assert len(agg.window(KEY, "1m", "2025-01-02 11:00", "2025-01-02 11:01")) == 1
+
+def test_ring_keeps_the_newest_bars_in_order():
+    ring = BarRing(4)
+    for t in range(10):
+        ring.append(t, t, t, t, t, t)
+    assert len(ring) == 4 and ring.oldest == 6
+    times, rows = ring.window(7, 100)
+    assert list(times) == [7, 8, 9] and list(rows[:, 3]) == [7, 8, 9]
+
+    agg = BarAggregator(timeframes=("1m",), capacity=5)
+    feed(agg, T0, 12 * 10)
+    assert agg.window(KEY, "1m", "2025-01-02 10:04", "2025-01-02 10:10") is None
+    assert len(agg.window(KEY, "1m", "2025-01-02 10:05", "2025-01-02 10:10")) == 5
+
+def test_unsupported_timeframe_is_rejected():
+    with pytest.raises(ValueError):
+        BarAggregator(timeframes=("1m", "1d"))
+
+@pytest.fixture
+def live_adapter():
+    adapter = TWSAdapter()
+    adapter.dry_run = False
+    adapter.client = FakeHistClient()
+    adapter.live_bars = BarAggregator(on_close=adapter._publish_live_bar)
+    return adapter
+
+def test_get_bars_answers_recent_windows_from_memory(live_adapter):
+    adapter = live_adapter
+    closed = []
+    adapter.client.router.subscribe(LIVE_BARS, closed.append)
+    key = adapter.track_live_bars("ES", "FUT", use_rth=0)
+    assert key == KEY
+    req_id = adapter._live_req_ids[key]
+
+    for i in range(12 * 20):
+        adapter.client.realtimeBar(req_id, T0 + 5 * i, 100.0, 101.0, 99.0, 100.5, 2, 100.2, 1)
+    assert len([e for e in closed if e["tf"] == "5m"]) == 4
+
+    resolved, resolve = [], adapter.contract
+    adapter.contract = lambda *args: resolved.append(args) or resolve(*args)
+    df = adapter.get_bars("ES", "5m", "2025-01-02T10:00:00", "2025-01-02T10:20:00", use_rth=0, asset_type="FUT")
+    assert len(df) == 4 and df["volume"].tolist() == [120] * 4
+    ibkr = AsyncTWSAdapter(adapter)
+    df = asyncio.run(ibkr.get_bars("ES", "1m", "2025-01-02T10:10:00", "2025-01-02T10:20:00", use_rth=0, asset_type="FUT"))
+    assert len(df) == 10
+    assert adapter.client.requests == [] and resolved == []  # no contract lookup either
+
+    # Older than the feed: goes to IB as before
+    df = adapter.get_bars("ES", "1m", "2025-01-02T09:50:00", "2025-01-02T10:00:00", use_rth=0, asset_type="FUT")
+    assert len(df) == 10 and len(adapter.client.requests) == 1
+
+    # A disconnect keeps the stream registered but restarts coverage
+    adapter.client.connectionClosed()
+    adapter.client.realtimeBar(req_id, T0 + 5 * 12 * 21, 100.0, 101.0, 99.0, 100.5, 2, 100.2, 1)
+    assert adapter.live_window("ES", "FUT", "1m", "TRADES", 0, pd.Timestamp("2025-01-02 10:10"),
+                               pd.Timestamp("2025-01-02 10:21")) is None
+
+    adapter.client.error(req_id, 420, "Invalid real-time query")
+    assert key not in adapter._live_req_ids
@@ -1,6 +1,13 @@
 from fastapi.testclient import TestClient
 from mcp_server.main import app
 from datetime import datetime, timedelta
+import io
+import json
+import time
+import numpy as np
+import pytest
+from mcp_server.tools import market_data
+from mcp_server.tools.market_data import MarketDataResponse
 
 client = TestClient(app)
 api_key = "your-secret-api-key"
@@ -56,3 +63,95 @@ def test_get_bars_invalid_date_range():
         headers=headers,
     )
     assert response.status_code == 400
+
+def test_get_bars_mock_is_deterministic_random_walk():
+    payload = {
+        "symbol": "EUR.USD",
+        "asset_type": "FX",
+        "tf": "5m",
+        "start": "2025-08-01T07:00:00Z",
+        "end": "2025-08-01T09:00:00Z",
+    }
+    first = client.post("/tool/market_data.get_bars", json=payload, headers=headers).json()
+    second = client.post("/tool/market_data.get_bars", json=payload, headers=headers).json()
+    assert first == second
+    MarketDataResponse.model_validate(first)
+
+    bars = first["bars"]
+    assert len(bars) == 24 == first["meta"]["count"]
+    assert bars[0]["t"] == "2025-08-01T07:00:00Z" and bars[-1]["t"] == "2025-08-01T08:55:00Z"
+    for prev, bar in zip(bars, bars[1:]):
+        assert bar["o"] == prev["c"]
+    for bar in bars:
+        assert bar["l"] <= min(bar["o"], bar["c"]) <= max(bar["o"], bar["c"]) <= bar["h"]
+        assert 100 <= bar["v"] <= 1000
+
+def test_get_bars_mock_handles_multi_week_requests_quickly():
+    start = time.perf_counter()
+    response = client.post(
+        "/tool/market_data.get_bars",
+        json={
+            "symbol": "ES",
+            "asset_type": "FUT",
+            "tf": "1m",
+            "start": "2025-06-01T00:00:00Z",
+            "end": "2025-06-29T00:00:00Z",
+        },
+        headers=headers,
+    )
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    assert len(response.json()["bars"]) == 28 * 24 * 60
+    assert elapsed < 2.0
+
+BARS_PAYLOAD = {
+    "symbol": "ES",
+    "asset_type": "FUT",
+    "tf": "1m",
+    "start": "2025-08-01T07:00:00+02:00",
+    "end": "2025-08-01T08:00:00+02:00",
+}
+
+def test_get_bars_columnar_matches_rows():
+    rows = client.post("/tool/market_data.get_bars", json=BARS_PAYLOAD, headers=headers).json()
+    response = client.post("/tool/market_data.get_bars", json=BARS_PAYLOAD,
+                           headers={**headers, "Accept": market_data.JSON_COLUMNAR})
+    assert response.headers["content-type"] == market_data.JSON_COLUMNAR
+    data = response.json()
+    assert data["meta"] == rows["meta"]
+    for name in "tohlcv":
+        assert data["columns"][name] == [bar[name] for bar in rows["bars"]]
+
+def test_get_bars_numpy_buffer_round_trips():
+    rows = client.post("/tool/market_data.get_bars", json=BARS_PAYLOAD, headers=headers).json()
+    response = client.post("/tool/market_data.get_bars", json=BARS_PAYLOAD,
+                           headers={**headers, "Accept": market_data.NUMPY_NPY})
+    arr = np.load(io.BytesIO(response.content), allow_pickle=False)
+    assert json.loads(response.headers["X-Bars-Meta"])["meta"]["count"] == len(arr) == 60
+    # Binary formats carry UTC times
+    assert arr["t"][0] == np.datetime64("2025-08-01T05:00:00")
+    assert arr["c"].tolist() == [bar["c"] for bar in rows["bars"]]
+    assert arr["v"].dtype == np.int64
+
+def test_get_bars_arrow_stream():
+    pa = pytest.importorskip("pyarrow")
+    response = client.post("/tool/market_data.get_bars", json=BARS_PAYLOAD,
+                           headers={**headers, "Accept": market_data.ARROW_STREAM})
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 60
+    assert table.schema.field("t").type == pa.timestamp("us", tz="UTC")
+    assert json.loads(table.schema.metadata[b"symbol"]) == "ES"
+
+def test_get_bars_accept_negotiation(monkeypatch):
+    assert market_data.negotiate_bars_format(None) == market_data.JSON_ROWS
+    assert market_data.negotiate_bars_format("text/html, */*;q=0.8") == market_data.JSON_ROWS
+    assert market_data.negotiate_bars_format(
+        f"{market_data.NUMPY_NPY};q=0.5, {market_data.JSON_COLUMNAR};q=0.9") == market_data.JSON_COLUMNAR
+
+    monkeypatch.setattr(market_data, "pa", None)
+    response = client.post("/tool/market_data.get_bars", json=BARS_PAYLOAD,
+                           headers={**headers, "Accept": market_data.ARROW_STREAM})
+    assert response.status_code == 406
+    assert "pyarrow" in response.json()["error"]["message"]
+    assert market_data.negotiate_bars_format(
+        f"{market_data.ARROW_STREAM}, {market_data.NUMPY_NPY};q=0.5") == market_data.NUMPY_NPY
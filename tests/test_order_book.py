@@ -0,0 +1,121 @@
+from ibapi.contract import Contract
+from ibapi.execution import Execution
+from ibapi.order_state import OrderState
+from ibkr_adapter.dispatch import ORDER_EVENTS
+from ibkr_adapter.order_book import (
+    OrderBook, NEW, SUBMITTED, PARTIALLY_FILLED, FILLED, CANCELLED, REJECTED,
+)
+from ibkr_adapter.tws_client import TWSClient
+
+def book_with_client(journal_path=None):
+    client = TWSClient()
+    book = OrderBook(journal_path)
+    client.router.subscribe(ORDER_EVENTS, book.on_event)
+    return client, book
+
+def place_bracket(client, book, parent_id=10, plan_id="plan-1", symbol="ES"):
+    orders = client.make_bracket_order(parent_id, "BUY", 2, 5000.0, 5010.0, 4990.0)
+    book.track_bracket(orders, symbol, "FUT", plan_id)
+    return orders
+
+def status(client, order_id, status, filled=0.0, remaining=2.0, avg=0.0, perm_id=0, parent_id=0):
+    client.orderStatus(order_id, status, filled, remaining, avg, perm_id, parent_id, avg, 1, "", 0.0)
+
+def test_bracket_legs_are_linked_and_indexed():
+    client, book = book_with_client()
+    place_bracket(client, book)
+
+    parent = book.get(10)
+    assert parent.state == NEW and parent.children == [11, 12]
+    assert book.get(11).parent_id == 10 and book.get(12).stop_price == 4990.0
+    assert book.get(10).limit_price == 5000.0 and book.get(12).limit_price is None
+    assert [o.order_id for o in book.by_plan("plan-1")] == [10, 11, 12]
+    assert [o.order_id for o in book.bracket(12)] == [10, 11, 12]
+    assert {o.order_id for o in book.open_orders("ES")} == {10, 11, 12}
+    assert book.open_orders("NQ") == []
+
+def test_status_callbacks_drive_the_state_machine():
+    client, book = book_with_client()
+    place_bracket(client, book)
+
+    status(client, 10, "Submitted", perm_id=555)
+    assert book.get(10).state == SUBMITTED and book.by_perm_id(555) is book.get(10)
+    status(client, 10, "Submitted", filled=1, remaining=1, avg=5000.0, perm_id=555)
+    assert book.get(10).state == PARTIALLY_FILLED
+    status(client, 10, "Filled", filled=2, remaining=0, avg=5000.5, perm_id=555)
+    status(client, 10, "Submitted", filled=1, remaining=1, avg=5000.0, perm_id=555)  # late duplicate
+
+    parent = book.get(10)
+    assert parent.state == FILLED and parent.filled == 2 and parent.avg_fill_price == 5000.5
+    assert book.stats()["stale"] == 1
+
+    status(client, 11, "Cancelled", parent_id=10)
+    status(client, 11, "Submitted", parent_id=10)  # terminal states are final
+    assert book.get(11).state == CANCELLED
+    assert [o.order_id for o in book.open_orders()] == [12]
+
+def test_open_orders_and_executions_from_other_sessions():
+    client, book = book_with_client()
+    contract = Contract()
+    contract.symbol, contract.secType = "AAPL", "STK"
+    order = client.make_bracket_order(40, "SELL", 5, 190.0, 180.0, 195.0)[0]
+    order.permId = 777
+    state = OrderState()
+    state.status = "Submitted"
+    client.openOrder(40, contract, order, state)
+
+    record = book.by_perm_id(777)
+    assert record.order_id == 40 and record.symbol == "AAPL" and record.state == SUBMITTED
+
+    execution = Execution()
+    execution.orderId, execution.execId, execution.permId = 40, "e1", 777
+    execution.shares, execution.cumQty, execution.price, execution.avgPrice = 5, 5, 190.0, 190.0
+    client.execDetails(-1, contract, execution)
+    client.execDetails(-1, contract, execution)  # redelivered
+    assert record.state == FILLED and record.filled == 5 and record.remaining == 0
+
+def test_errors_reject_unacknowledged_orders_only():
+    client, book = book_with_client()
+    place_bracket(client, book)
+    status(client, 11, "PreSubmitted", parent_id=10)
+
+    client.error(10, 201, "Order rejected - reason: margin")
+    client.error(11, 404, "Shares for this order are not immediately available")
+    client.error(900001, 162, "Historical market data Service error")  # not an order
+
+    assert book.get(10).state == REJECTED and "margin" in book.get(10).last_error
+    assert book.get(11).state != REJECTED and book.get(11).last_error.startswith("404")
+    assert book.get(900001) is None and len(book) == 3
+
+def test_only_rejection_codes_reject_and_ib_statuses_overrule_them():
+    client, book = book_with_client()
+    place_bracket(client, book)
+    client.error(10, 399, "Order Message: Warning: your order will not be placed at the exchange until ...")
+    status(client, 10, "Submitted")
+    status(client, 10, "Filled", filled=2, remaining=0, avg=5000.0)
+    assert book.get(10).state == FILLED and book.stale == 0
+
+    client.error(11, 201, "Order rejected - reason: margin")
+    assert book.get(11).state == REJECTED and 11 not in [o.order_id for o in book.open_orders()]
+    status(client, 11, "Submitted", parent_id=10)  # IB accepted it after all
+    assert book.get(11).state == SUBMITTED and 11 in [o.order_id for o in book.open_orders()]
+    client.error(12, 201, "Order rejected - reason: margin")
+    status(client, 12, "Cancelled", parent_id=10)
+    assert book.get(12).state == REJECTED
+
+def test_journal_replays_into_a_new_book(tmp_path):
+    path = str(tmp_path / "orders.jsonl")
+    client, book = book_with_client(path)
+    place_bracket(client, book)
+    status(client, 10, "Filled", filled=2, remaining=0, avg=5000.0, perm_id=555)
+    status(client, 11, "Submitted", parent_id=10)
+    book.close()
+    with open(path, "a") as f:
+        f.write('{"type": "status", "order_id"')  # torn final write
+
+    recovered = OrderBook(path)
+    assert recovered.get(10).state == FILLED and recovered.by_perm_id(555).order_id == 10
+    assert [o.order_id for o in recovered.by_plan("plan-1")] == [10, 11, 12]
+    assert {o.order_id for o in recovered.open_orders("ES")} == {11, 12}
+    assert recovered.get(10).children == [11, 12]
+    recovered.close()
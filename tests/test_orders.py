@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
 from mcp_server.main import app
+from mcp_server.tools import orders as orders_tool
 
 client = TestClient(app)
 api_key = "your-secret-api-key"
@@ -53,6 +54,32 @@ def test_place_bracket_idempotency():
     assert data1["parent_id"] == data2["parent_id"]
 
 
+def market_entry(plan_id, price=None):
+    return {
+        "plan_id": plan_id, "account": "DU12345", "symbol": "MES", "asset_type": "FUT", "qty": 1, "side": "BUY",
+        "entry": {"type": "MKT", "price": price}, "stop": {"type": "STP", "stop_price": 5538.25},
+        "take": {"type": "LMT", "price": 5563.25}, "tif": "DAY",
+    }
+
+def test_place_bracket_market_entry(monkeypatch):
+    placed = []
+
+    class Ibkr:
+        async def place_bracket_order(self, *args, **kwargs):
+            placed.append((args, kwargs))
+            return {"parent_id": 1, "children_ids": [2, 3]}
+    monkeypatch.setattr(orders_tool, "get_ibkr", lambda: Ibkr())
+    response = client.post("/tool/orders.place_bracket", json=market_entry("test-plan-mkt"), headers=headers)
+    assert response.status_code == 200 and response.json()["status"] == "ACCEPTED"
+    (args, kwargs), = placed
+    assert args[4] is None and kwargs["entry_type"] == "MKT"
+
+def test_place_bracket_limit_entry_needs_a_price():
+    payload = market_entry("test-plan-lmt-no-price")
+    payload["entry"] = {"type": "LMT"}
+    response = client.post("/tool/orders.place_bracket", json=payload, headers=headers)
+    assert response.status_code == 422
+
 def test_place_bracket_invalid_qty():
     response = client.post(
         "/tool/orders.place_bracket",
@@ -110,3 +137,8 @@ def test_place_bracket_requires_approval():
         headers=headers,
     )
     assert response.status_code == 409
+
+def test_order_status_dry_run():
+    response = client.post("/tool/orders.status", json={"plan_id": "test-plan-1"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"plan_id": "test-plan-1", "orders": [], "dry_run": True}
@@ -0,0 +1,108 @@
+import threading
+import time
+import pytest
+from ibkr_adapter.pacing import HistPacer
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_identical_request_window():
+    clock = FakeClock()
+    pacer = HistPacer(clock=clock)
+
+    assert pacer.try_acquire("req-A", "AAPL") == 0.0
+    assert pacer.try_acquire("req-A", "AAPL") == pytest.approx(15.0)
+    # A different request for the same contract is fine
+    assert pacer.try_acquire("req-B", "AAPL") == 0.0
+
+    clock.now += 15.0
+    assert pacer.try_acquire("req-A", "AAPL") == 0.0
+
+def test_same_contract_burst_limit():
+    clock = FakeClock()
+    pacer = HistPacer(clock=clock)
+
+    for i in range(5):
+        assert pacer.try_acquire(f"req-{i}", "AAPL") == 0.0
+        clock.now += 0.1
+    # A sixth request for the same contract within 2 seconds must wait
+    assert pacer.try_acquire("req-5", "AAPL") == pytest.approx(1.5)
+    # Other contracts are unaffected
+    assert pacer.try_acquire("req-5", "MSFT") == 0.0
+
+def test_global_window_limit():
+    clock = FakeClock()
+    pacer = HistPacer(clock=clock)
+
+    for i in range(60):
+        assert pacer.try_acquire(f"req-{i}", f"SYM{i}") == 0.0
+        clock.now += 1.0
+    assert pacer.try_acquire("req-60", "SYM60") == pytest.approx(540.0)
+    clock.now += 540.0
+    assert pacer.try_acquire("req-60", "SYM60") == 0.0
+
+def test_waiting_request_does_not_block_other_contracts():
+    pacer = HistPacer(identical_window=0.5)
+    pacer.acquire("req-A", "AAPL")
+
+    waited = {}
+    def worker(name, req, contract):
+        t0 = time.perf_counter()
+        pacer.acquire(req, contract)
+        waited[name] = time.perf_counter() - t0
+
+    blocked = threading.Thread(target=worker, args=("blocked", "req-A", "AAPL"))
+    blocked.start()
+    time.sleep(0.05)
+    assert pacer.stats()["queue_depth"] == 1
+
+    free = threading.Thread(target=worker, args=("free", "req-B", "MSFT"))
+    free.start()
+    free.join()
+    blocked.join()
+
+    assert waited["free"] < 0.1
+    assert waited["blocked"] >= 0.4
+
+    stats = pacer.stats()
+    assert stats["admitted"] == 3
+    assert stats["delayed"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["max_queue_depth"] == 1
+    assert sum(stats["wait_histogram"].values()) == 3
+    assert stats["wait_histogram"]["0.5"] + stats["wait_histogram"]["1"] == 1
+
+def test_acquire_timeout():
+    clock = FakeClock()
+    pacer = HistPacer(clock=clock, sleep=lambda s: None)
+    pacer.acquire("req-A", "AAPL")
+    with pytest.raises(TimeoutError):
+        pacer.acquire("req-A", "AAPL", timeout=5.0)
+    assert pacer.stats()["queue_depth"] == 0
+
+def test_slot_is_released_while_paced():
+    clock = FakeClock()
+    slot = threading.Semaphore(1)
+    free_while_waiting = []
+
+    def sleep(delay):
+        free_while_waiting.append(slot.acquire(blocking=False))
+        slot.release()
+        clock.now += delay
+    pacer = HistPacer(clock=clock, sleep=sleep)
+    pacer.acquire("req-A", "AAPL")
+
+    slot.acquire()
+    assert pacer.acquire("req-A", "AAPL", slot=slot) == pytest.approx(15.0)
+    assert free_while_waiting == [True]
+    assert not slot.acquire(blocking=False)  # held again once admitted
+    slot.release()
+
+    slot.acquire()
+    with pytest.raises(TimeoutError):
+        pacer.acquire("req-A", "AAPL", timeout=5.0, slot=slot)
+    assert slot.acquire(blocking=False)  # not held after an error
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from ibapi.contract import Contract
+from ibapi.execution import Execution
+from mcp_server.tools import pdt_guard
+from risk.pdt import PDTTracker, PdtDecision
+from tests.test_order_book import book_with_client
+
+NY = ZoneInfo("America/New_York")
+
+def at(day: str) -> float:
+    """Epoch seconds at 10:00 New York time on a YYYY-MM-DD date."""
+    return datetime.fromisoformat(f"{day}T10:00").replace(tzinfo=NY).timestamp()
+
+class Clock:
+    def __init__(self, day: str):
+        self.now = at(day)
+    def __call__(self):
+        return self.now
+
+fill_ids = iter(range(1, 1_000_000))
+
+def fill(tracker, day: str, side: str, shares: float, symbol: str = "AAPL", asset_type: str = "STK"):
+    tracker.on_fill({"exec_id": f"e{next(fill_ids)}", "symbol": symbol, "asset_type": asset_type,
+                     "side": side, "shares": shares, "time": f"{day.replace('-', '')}  10:00:00 US/Eastern"})
+
+def test_round_trips_are_counted_once_per_opening_sequence():
+    tracker = PDTTracker(clock=Clock("2025-08-19"))
+    fill(tracker, "2025-08-19", "BOT", 100)
+    fill(tracker, "2025-08-19", "BOT", 100)
+    fill(tracker, "2025-08-19", "SLD", 200)  # buy, buy, sell: one
+    assert tracker.day_trades() == 1
+    fill(tracker, "2025-08-19", "SLD", 50, "MSFT")  # short opened today ...
+    fill(tracker, "2025-08-19", "BOT", 20, "MSFT")  # ... partly covered: two
+    fill(tracker, "2025-08-19", "BOT", 30, "MSFT")  # the rest of the same sequence
+    assert tracker.day_trades() == 2
+    fill(tracker, "2025-08-19", "BOT", 100, "TSLA")
+    fill(tracker, "2025-08-19", "SLD", 150, "TSLA")  # closes and reverses to short 50: three
+    fill(tracker, "2025-08-19", "BOT", 50, "TSLA")  # covering today's short: four
+    assert tracker.day_trades() == 4
+    fill(tracker, "2025-08-19", "BOT", 1, "ES", "FUT")  # futures are outside the rule
+    fill(tracker, "2025-08-19", "SLD", 1, "ES", "FUT")
+    assert tracker.day_trades() == 4
+
+def test_positions_held_overnight_are_not_day_trades():
+    tracker = PDTTracker(clock=Clock("2025-08-20"))
+    fill(tracker, "2025-08-19", "BOT", 100)
+    fill(tracker, "2025-08-20", "SLD", 100)
+    assert tracker.day_trades() == 0
+    fill(tracker, "2025-08-20", "BOT", 100)
+    fill(tracker, "2025-08-20", "SLD", 40)
+    assert tracker.day_trades() == 1
+
+def test_the_window_rolls_over_business_days_and_holidays():
+    clock = Clock("2025-08-15")  # Friday
+    tracker = PDTTracker(clock=clock, holidays=["2025-08-20"])
+    for day in ("2025-08-13", "2025-08-14", "2025-08-15"):
+        fill(tracker, day, "BOT", 10)
+        fill(tracker, day, "SLD", 10)
+    assert tracker.day_trades() == 3
+
+    clock.now = at("2025-08-19")  # Tuesday: Wed 13th is the fifth business day back
+    assert tracker.day_trades() == 3
+    clock.now = at("2025-08-21")  # the 20th is a holiday: only the 13th has dropped out
+    assert tracker.day_trades() == 2
+    clock.now = at("2025-08-22")
+    assert tracker.day_trades() == 1
+    clock.now = at("2025-08-25")
+    assert tracker.day_trades() == 0
+
+def test_validation_from_memory():
+    tracker = PDTTracker(clock=Clock("2025-08-19"))
+    assert tracker.validate("AAPL", "STK", "BUY", True) == (True, 3, "order is intraday: 3 day trades left in 5 business days")
+    assert tracker.validate("ES", "FUT", "BUY", True).remaining is None
+    assert tracker.validate("AAPL", "STK", "BUY", True, equity=30_000.0).remaining is None
+    for _ in range(3):
+        fill(tracker, "2025-08-19", "BOT", 10)
+        fill(tracker, "2025-08-19", "SLD", 10)
+    fill(tracker, "2025-08-19", "BOT", 10, "MSFT")
+
+    decision = tracker.validate("AAPL", "STK", "BUY", True)
+    assert not decision.ok and decision.remaining == 0 and "pattern day trader" in decision.note
+    assert tracker.validate("AAPL", "STK", "BUY", False).ok  # held overnight: not a day trade
+    assert not tracker.validate("MSFT", "STK", "SELL", False).ok  # would close today's opening
+    assert tracker.validate("MSFT", "STK", "BUY", False).ok
+
+def test_state_survives_a_restart_without_the_journal(tmp_path):
+    path = str(tmp_path / "pdt.json")
+    tracker = PDTTracker(path, clock=Clock("2025-08-19"))
+    fill(tracker, "2025-08-18", "BOT", 10)
+    fill(tracker, "2025-08-18", "SLD", 10)
+    fill(tracker, "2025-08-19", "SLD", 5, "MSFT")
+
+    restarted = PDTTracker(path, clock=Clock("2025-08-19"))
+    assert restarted.loaded and restarted.day_trades() == 1
+    fill(restarted, "2025-08-19", "BOT", 5, "MSFT")  # closes the short opened before the restart
+    assert restarted.day_trades() == 2
+
+def test_rebuilds_from_the_order_journal(tmp_path):
+    journal = str(tmp_path / "orders.jsonl")
+    client, book = book_with_client(journal)
+    live = PDTTracker(clock=Clock("2025-08-19"))
+    book.subscribe_fills(live.on_fill)
+    contract = Contract()
+    contract.symbol, contract.secType = "AAPL", "STK"
+    for order_id, side in ((1, "BOT"), (2, "SLD")):
+        execution = Execution()
+        execution.orderId, execution.execId, execution.side = order_id, f"x{order_id}", side
+        execution.shares = execution.cumQty = 10
+        execution.time = "20250819  09:45:00 US/Eastern"
+        client.execDetails(-1, contract, execution)
+        client.execDetails(-1, contract, execution)  # redelivered: not a second fill
+    book.close()
+    assert live.fills == 2 and live.day_trades() == 1
+
+    rebuilt = PDTTracker(str(tmp_path / "pdt.json"), clock=Clock("2025-08-19"))
+    assert not rebuilt.loaded and rebuilt.replay_journal(journal) == 2 and rebuilt.day_trades() == 1
+
+def test_pdt_guard_tool(monkeypatch):
+    request = pdt_guard.PdtGuardRequest(symbol="ES", asset_type="FUT", side="BUY", is_intraday=True)
+    monkeypatch.setattr(pdt_guard, "get_ibkr", lambda: None)
+    response = asyncio.run(pdt_guard.pdt_guard_validate(request))
+    assert response.ok and response.remaining_intraday_trades is None
+
+    class Ibkr:
+        def pdt_validate(self, symbol, asset_type, side, is_intraday):
+            return PdtDecision(False, 0, "3 day trades in 5 business days")
+    monkeypatch.setattr(pdt_guard, "get_ibkr", lambda: Ibkr())
+    response = asyncio.run(pdt_guard.pdt_guard_validate(request))
+    assert not response.ok and response.remaining_intraday_trades == 0
@@ -0,0 +1,165 @@
+import math
+import random
+import time
+from ibapi.common import TickAttrib
+from ibapi.ticktype import TickTypeEnum
+from ibkr_adapter.contracts import ContractIndex, ContractInfo, ContractResolver
+from ibkr_adapter.pnl import PnLEngine, PnLFeed, fx_pair
+from ibkr_adapter.portfolio import PortfolioCache
+from tests.test_portfolio_cache import FakePortfolioClient, contract, AAPL, ES
+
+BID, ASK, LAST = TickTypeEnum.BID, TickTypeEnum.ASK, TickTypeEnum.LAST
+
+def test_futures_use_the_multiplier_and_totals_follow_ticks():
+    engine = PnLEngine("USD")
+    engine.set_position("es", 1, "USD", 2, 250_000.0, multiplier=50)  # avgCost includes the multiplier
+    engine.set_position("aapl", 2, "USD", 100, 150.0, mark=150.0)
+    assert engine.unrealized() == 0.0 and engine.stats()["unmarked"] == 1
+
+    engine.on_price(1, BID, 5009.0)
+    engine.on_price(1, ASK, 5011.0)
+    engine.on_price(2, LAST, 155.0)
+    assert engine.position_pnl("es") == 2 * (5010.0 * 50 - 250_000.0) == 1000.0
+    assert engine.unrealized() == 1500.0 == engine.recompute()
+
+    engine.on_price(2, BID, -1.0)  # empty book side: ignored
+    engine.remove_position("aapl")
+    assert engine.unrealized() == 1000.0 and engine.instruments() == {1}
+
+def test_foreign_positions_convert_to_base_currency():
+    engine = PnLEngine("USD")
+    engine.set_position("sap", 7, "EUR", 10, 100.0, mark=110.0)
+    assert engine.unrealized() == 0.0 and engine.stats()["missing_fx"] == ["EUR"]
+    assert engine.position_pnl("sap") is None and engine.position_pnl("sap", base=False) == 100.0
+
+    engine.set_fx_rate("EUR", 1.1)
+    assert math.isclose(engine.unrealized(), 110.0)
+    engine.set_fx_rate("EUR", 1.2)
+    engine.on_price(7, LAST, 120.0)
+    assert math.isclose(engine.unrealized(), 240.0) and math.isclose(engine.recompute(), 240.0)
+
+def test_equity_moves_with_marks_from_the_net_liquidation_anchor():
+    engine = PnLEngine("USD")
+    engine.set_position("aapl", 2, "USD", 100, 150.0, mark=155.0)
+    assert engine.equity() is None
+    engine.set_net_liquidation(100_000.0)
+    engine.on_price(2, LAST, 160.0)
+    assert engine.equity() == 100_500.0
+
+def test_fx_pairs_follow_idealpro_quoting():
+    assert fx_pair("EUR", "USD") == ("EUR.USD", False)
+    assert fx_pair("JPY", "USD") == ("USD.JPY", True)
+    assert fx_pair("USD", "EUR") == ("EUR.USD", True)
+    assert fx_pair("HKD", "USD") == ("USD.HKD", True)
+
+def test_tick_cost_does_not_grow_with_the_portfolio():
+    rng = random.Random(1)
+
+    def mean_tick_seconds(n_positions):
+        engine = PnLEngine("USD")
+        for i in range(n_positions):
+            engine.set_position(i, i, "USD", rng.choice([-1, 1]) * 10, 100.0, mark=100.0)
+        ticks = [(rng.randrange(n_positions), 100 + rng.random()) for _ in range(20_000)]
+        started = time.perf_counter()
+        for con_id, price in ticks:
+            engine.on_price(con_id, LAST, price)
+        elapsed = (time.perf_counter() - started) / len(ticks)
+        assert math.isclose(engine.unrealized(), engine.recompute(), abs_tol=1e-6)
+        return elapsed
+
+    small, large = mean_tick_seconds(10), mean_tick_seconds(1000)
+    assert large < 50e-6 and large < small * 3
+
+class FakeMarketDataClient(FakePortfolioClient):
+    """Portfolio subscriptions plus recorded reqMktData/cancelMktData."""
+    def __init__(self):
+        super().__init__()
+        self.holdings[7] = (contract("SAP", "STK", 7), 10, 100.0)
+        self.holdings[7][0].currency = "EUR"
+        self.streams = {}
+        self.cancelled = []
+
+    def reqAccountUpdates(self, subscribe, acctCode):
+        if subscribe:
+            self.updateAccountValue("ExchangeRate", "1.10", "EUR", "DU1")
+        super().reqAccountUpdates(subscribe, acctCode)
+
+    def reqMktData(self, reqId, contract, genericTickList, snapshot, regulatorySnapshot, mktDataOptions):
+        self.streams[reqId] = contract
+
+    def cancelMktData(self, reqId):
+        self.cancelled.append(reqId)
+
+    def stream_for(self, con_id=None, symbol=None):
+        return next(r for r, c in self.streams.items() if (con_id and c.conId == con_id) or c.symbol == symbol)
+
+def test_feed_streams_marks_and_fx_for_held_instruments():
+    client = FakeMarketDataClient()
+    cache = PortfolioCache(client, account="DU1")
+    engine = PnLEngine("USD")
+    feed = PnLFeed(engine, cache, client)
+    feed.start()
+    cache.start()
+
+    assert feed.stats()["mark_streams"] == 3 and feed.stats()["fx_streams"] == 1
+    assert client.streams[client.stream_for(symbol="EUR")].currency == "USD"  # EUR.USD on IDEALPRO
+
+    attrib = TickAttrib()
+    client.tickPrice(client.stream_for(AAPL.conId), LAST, 160.0, attrib)
+    client.tickPrice(client.stream_for(7), LAST, 110.0, attrib)
+    assert math.isclose(engine.unrealized(), 1000.0 + 110.0)  # AAPL 100 x +10, SAP 100 EUR at 1.10
+    client.tickPrice(client.stream_for(symbol="EUR"), BID, 1.19, attrib)
+    client.tickPrice(client.stream_for(symbol="EUR"), ASK, 1.21, attrib)
+    assert math.isclose(engine.unrealized(), 1000.0 + 120.0)
+    rows = {row["symbol"]: row["unrealized_pnl"] for row in cache.position_rows(engine)}
+    assert rows["AAPL"] == 1000.0 and rows["SAP"] == 100.0  # contract currency
+    # NetLiquidation already valued AAPL at 155 and SAP at its first tick: only later moves count
+    assert math.isclose(engine.equity(), 125000.5 + (1000.0 - 500.0) + (120.0 - 110.0))
+
+    sap_stream, fx_stream = client.stream_for(7), client.stream_for(symbol="EUR")
+    client.position("DU1", client.holdings[7][0], 0, 0.0)
+    assert sap_stream in client.cancelled and fx_stream in client.cancelled
+    feed.stop()
+    assert len(client.cancelled) == 4
+
+def test_feed_ignores_account_pnl_events():
+    client = FakeMarketDataClient()
+    cache = PortfolioCache(client, account="DU1", pnl=True)
+    engine = PnLEngine("USD")
+    feed = PnLFeed(engine, cache, client)
+    feed.start()
+    cache.start()  # reqPnL answers at once with a "pnl" event
+    assert cache.snapshot().pnl.daily == 120.0
+    feed._on_portfolio_event({"kind": "pnl", "pnl": cache.snapshot().pnl})
+    assert feed.stats()["mark_streams"] == 3
+
+def test_futures_marks_use_the_qualified_exchange():
+    client = FakeMarketDataClient()
+    contracts = ContractResolver(client, ContractIndex())
+    contracts.index.put("ES|FUT|", ContractInfo(ES.conId, "ES", "FUT", "CME", "", "USD", "ESZ5", "ES", "20251219",
+                                               50.0, 0.25, "US/Central", "", "", float("inf")))
+    cache = PortfolioCache(client, account="DU1")
+    feed = PnLFeed(PnLEngine("USD"), cache, client, contracts=contracts)
+    feed.start()
+    cache.start()  # reqPositions sends ES without an exchange
+    assert client.streams[client.stream_for(ES.conId)].exchange == "CME"
+
+def test_failed_mark_streams_are_retried_and_portfolio_prices_mark_meanwhile():
+    client = FakeMarketDataClient()
+    cache = PortfolioCache(client, account="DU1")
+    engine = PnLEngine("USD")
+    feed = PnLFeed(engine, cache, client)
+    feed.start()
+    cache.start()
+    key = ("DU1", AAPL.conId)
+    client.tickPrice(client.stream_for(AAPL.conId), LAST, 160.0, TickAttrib())
+    client.updatePortfolio(AAPL, 100, 170.0, 17000.0, 150.0, 2000.0, 0.0, "DU1")
+    assert engine.position_pnl(key) == 1000.0  # the live tick wins
+
+    failed = client.stream_for(AAPL.conId)
+    client.error(failed, 354, "Requested market data is not subscribed.")
+    assert feed.stats()["mark_streams"] == 2
+    client.updatePortfolio(AAPL, 100, 170.0, 17000.0, 150.0, 2000.0, 0.0, "DU1")
+    assert engine.position_pnl(key) == 2000.0  # no stream: IB's price marks it
+    assert feed.stats()["mark_streams"] == 3
+    assert max(r for r, c in client.streams.items() if c.conId == AAPL.conId) != failed  # requested again
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from ibapi.contract import Contract
+from ibkr_adapter.portfolio import PortfolioCache
+from ibkr_adapter.tws_client import TWSClient
+from mcp_server.tools import portfolio as portfolio_tool
+
+def contract(symbol, sec_type, con_id):
+    c = Contract()
+    c.symbol, c.secType, c.conId, c.currency = symbol, sec_type, con_id, "USD"
+    return c
+
+AAPL = contract("AAPL", "STK", 265598)
+ES = contract("ES", "FUT", 495512563)
+
+class FakePortfolioClient(TWSClient):
+    """Answers the portfolio subscriptions synchronously from `holdings` and records the requests."""
+    def __init__(self):
+        super().__init__()
+        self.is_connected = True
+        self.holdings = {AAPL.conId: (AAPL, 100, 150.0), ES.conId: (ES, -2, 250000.0)}
+        self.requests = []
+
+    def reqPositions(self):
+        self.requests.append("positions")
+        for c, pos, cost in self.holdings.values():
+            self.position("DU1", c, pos, cost)
+        self.positionEnd()
+
+    def reqAccountUpdates(self, subscribe, acctCode):
+        self.requests.append(("account", subscribe))
+        if not subscribe:
+            return
+        self.updateAccountValue("NetLiquidation", "125000.50", "USD", "DU1")
+        self.updateAccountValue("AccountType", "INDIVIDUAL", "", "DU1")
+        self.updatePortfolio(AAPL, 100, 155.0, 15500.0, 150.0, 500.0, 0.0, "DU1")
+        self.updateAccountTime("09:30")
+        self.accountDownloadEnd("DU1")
+
+    def reqPnL(self, reqId, account, modelCode):
+        self.requests.append("pnl")
+        self.pnl(reqId, 120.0, 500.0, 1.7976931348623157e308)
+
+    def cancelPositions(self):
+        self.requests.append("cancel positions")
+
+    def cancelPnL(self, reqId):
+        self.requests.append("cancel pnl")
+
+def started_cache():
+    client = FakePortfolioClient()
+    cache = PortfolioCache(client, account="DU1")
+    cache.start()
+    return client, cache
+
+def test_snapshot_merges_positions_account_values_and_pnl():
+    _, cache = started_cache()
+    snapshot = cache.snapshot()
+    assert snapshot.complete
+    by_symbol = {p.symbol: p for p in snapshot.positions}
+    assert by_symbol["AAPL"].qty == 100 and by_symbol["AAPL"].market_price == 155.0
+    assert by_symbol["AAPL"].unrealized_pnl == 500.0 and by_symbol["ES"].unrealized_pnl is None
+    assert snapshot.value("NetLiquidation") == 125000.5 and snapshot.value("AccountType") == "INDIVIDUAL"
+    assert snapshot.pnl.daily == 120.0 and snapshot.pnl.realized is None
+    assert {row["symbol"]: row["qty"] for row in cache.position_rows()} == {"AAPL": 100, "ES": -2}
+
+def test_reads_are_served_from_memory_and_versioned():
+    client, cache = started_cache()
+    before = cache.snapshot()
+    assert cache.snapshot() is before  # nothing changed: no rebuild
+    started = time.perf_counter()
+    for _ in range(10_000):
+        cache.snapshot()
+    assert (time.perf_counter() - started) / 10_000 < 50e-6
+    assert client.requests.count("positions") == 1
+
+    client.position("DU1", AAPL, 150, 151.0)
+    client.position("DU1", ES, 0, 0.0)
+    after = cache.snapshot()
+    assert after.version > before.version
+    assert {p.symbol: p.qty for p in after.positions} == {"AAPL": 150}
+    assert {p.symbol: p.qty for p in before.positions} == {"AAPL": 100, "ES": -2}  # old snapshot unchanged
+
+def test_resubscribes_after_reconnect_and_drops_closed_positions():
+    client, cache = started_cache()
+    client.connectionClosed()
+    assert not cache.snapshot().complete
+
+    del client.holdings[ES.conId]  # closed during the outage
+    client.nextValidId(1)  # reconnected
+    snapshot = cache.snapshot()
+    assert snapshot.complete and [p.symbol for p in snapshot.positions] == ["AAPL"]
+    assert client.requests.count("positions") == 2 and cache.stats()["resubscribes"] == 1
+
+    cache.stop()
+    assert ("account", False) in client.requests and "cancel pnl" in client.requests
+
+def test_get_positions_tool_reads_the_cache(monkeypatch):
+    _, cache = started_cache()
+    cache.account = ""
+
+    class Ibkr:
+        portfolio = cache
+        pnl = None
+    monkeypatch.setattr(portfolio_tool, "get_ibkr", lambda: Ibkr())
+    response = asyncio.run(portfolio_tool.get_positions())
+    assert response.source == "IBKR" and response.version == cache.version
+    assert response.equity == 125000.5
+    assert {p.symbol: p.asset_type.value for p in response.positions} == {"AAPL": "STK", "ES": "FUT"}
@@ -31,8 +31,8 @@ def test_teardown_on_disconnect(mock_tws_client):
     assert 1001 in client._active_mktdata_req_ids
     assert 2001 in client._active_rtb_req_ids
 
-    # Disconnect and verify teardown calls
-    client.disconnect()
+    # Stop and verify teardown calls
+    client.stop()
 
     # Assert that the cancel methods on the EClient mock were called
     client.instance_mock.cancelMktData.assert_called_with(1001)
@@ -0,0 +1,128 @@
+import asyncio
+import sys
+from ibkr_adapter.dispatch import ORDER_EVENTS
+from ibkr_adapter.portfolio import PortfolioCache, PositionState, PnLState
+from mcp_server.tools import risk as risk_tool
+from risk.limits import RiskLimits, OrderRateLimiter
+from risk.pretrade_checks import ExposureBook, PreTradeChecker
+from tests.test_portfolio_cache import FakePortfolioClient
+
+def checker_with_equity(equity=100_000.0, **limits):
+    exposure = ExposureBook("USD")
+    exposure.on_portfolio_event({"kind": "account_value", "tag": "NetLiquidation", "currency": "USD", "value": equity})
+    return PreTradeChecker(RiskLimits(**limits), exposure)
+
+def test_risk_per_trade_caps_the_quantity():
+    checker = checker_with_equity()
+    result = checker.check("MSFT", "STK", "BUY", 600, 100.0, 98.0)  # $2 risk per share, $1,000 budget
+    assert not result.ok and result.allowed_qty == 500
+    assert result.reasons == ["qty 600 exceeds risk_per_trade_pct: max 500"]
+    assert checker.check("MSFT", "STK", "BUY", 500, 100.0, 98.0).ok
+    assert checker.check("ES", "FUT", "SELL", 10, 5000.0, 5004.0, multiplier=50).allowed_qty == 5
+
+def test_fails_closed_without_equity_and_after_the_daily_loss_limit():
+    checker = PreTradeChecker(RiskLimits(), ExposureBook("USD"))
+    assert checker.check("MSFT", "STK", "BUY", 1, 100.0, 98.0) == (False, ["equity unknown: no NetLiquidation received yet"], 0)
+
+    checker = checker_with_equity()
+    checker.exposure.on_portfolio_event({"kind": "pnl", "pnl": PnLState(-5_000.0, -3_000.0, -2_000.0)})
+    result = checker.check("MSFT", "STK", "BUY", 1, 100.0, 98.0)
+    assert not result.ok and result.allowed_qty == 0 and result.reasons[0].startswith("daily loss limit reached")
+
+def test_exposure_follows_positions_and_working_orders():
+    client = FakePortfolioClient()
+    cache = PortfolioCache(client, account="DU1")
+    exposure = ExposureBook("USD")
+    cache.subscribe(exposure.on_portfolio_event)
+    client.router.subscribe(ORDER_EVENTS, exposure.on_order_event)
+    cache.start()
+    checker = PreTradeChecker(RiskLimits(max_symbol_exposure_pct=0.5, max_asset_class_exposure_pct={"FUT": 4.0}),
+                              exposure)
+
+    # AAPL 100 @ 155 and ES -2 at an avgCost of 250,000 per contract
+    assert exposure.gross == 15_500.0 + 500_000.0 and exposure.net == 15_500.0 - 500_000.0
+    assert exposure.daily_pnl == 120.0 and exposure.equity() == 125_000.5
+    assert checker.check("AAPL", "STK", "BUY", 400, 150.0, 149.0).allowed_qty == 313  # (62,500.25 - 15,500) / 150
+
+    orders = client.make_bracket_order(10, "BUY", 300, 150.0, 160.0, 149.0)
+    checker.on_submit(orders, "AAPL", "STK")
+    assert exposure.symbol_open["AAPL"] == 45_000.0
+    assert checker.check("AAPL", "STK", "BUY", 400, 150.0, 149.0).allowed_qty == 13
+    assert checker.check("AAPL", "STK", "SELL", 400, 150.0, 151.0).allowed_qty == 400  # nets against the order
+
+    client.orderStatus(10, "Submitted", 100, 200, 150.0, 0, 0, 150.0, 1, "", 0.0)
+    assert exposure.symbol_open["AAPL"] == 30_000.0 and exposure.open_notional == 30_000.0
+    client.orderStatus(10, "Cancelled", 100, 200, 150.0, 0, 0, 150.0, 1, "", 0.0)
+    assert exposure.open_notional == 0.0 and exposure.stats()["open_orders"] == 0
+
+    # FUT gross is at 4x equity already: only orders that reduce the short pass
+    assert checker.check("ES", "FUT", "SELL", 1, 5000.0, 5010.0, multiplier=50).allowed_qty == 0
+    assert checker.check("ES", "FUT", "BUY", 1, 5000.0, 4990.0, multiplier=50).ok
+
+    client.position("DU1", client.holdings[265598][0], 0, 0.0)
+    assert exposure.gross == 500_000.0 and exposure.symbol_net["AAPL"] == 0.0
+
+def test_order_rate_limits_over_a_sliding_window():
+    now = [0.0]
+    rate = OrderRateLimiter(max_orders=3, max_per_symbol=2, window=60.0, clock=lambda: now[0])
+    rate.record("ES")
+    rate.record("ES")
+    assert rate.exceeded("ES") == "order rate limit: 2 ES orders per 60s" and rate.exceeded("NQ") is None
+    rate.record("NQ")
+    assert rate.exceeded("NQ") == "order rate limit: 3 orders per 60s"
+    now[0] = 60.0
+    assert rate.exceeded("ES") is None and rate.stats()["orders_in_window"] == 0
+
+def test_limits_from_config_ignore_unknown_and_empty_keys():
+    limits = RiskLimits.from_config({"risk_per_trade_pct": 0.02, "max_gross_exposure_pct": None, "other": 1})
+    assert limits.risk_per_trade_pct == 0.02 and limits.max_gross_exposure_pct is None
+    assert limits.policy() == {"risk_per_trade_pct": 0.02, "max_daily_loss_pct": 0.05}
+
+def traced_lines(fn, *args) -> int:
+    """Python lines executed by `fn(*args)`, a clock-free measure of its work."""
+    count = [0]
+    def tracer(frame, event, arg):
+        if event == "line":
+            count[0] += 1
+        return tracer
+    sys.settrace(tracer)
+    try:
+        fn(*args)
+    finally:
+        sys.settrace(None)
+    return count[0]
+
+def test_check_work_does_not_depend_on_the_number_of_positions():
+    # Latency itself is measured by tests/bench_pretrade_check.py
+    lines = []
+    for n in (10, 5000):
+        checker = checker_with_equity(1e9, max_symbol_exposure_pct=0.1, max_gross_exposure_pct=4.0,
+                                      max_asset_class_exposure_pct={"STK": 2.0}, max_orders_per_minute=10_000)
+        for i in range(n):
+            checker.exposure.on_portfolio_event({"kind": "position", "key": ("DU1", i), "position": PositionState(
+                "DU1", i, f"S{i}", "STK", "USD", 100.0, 50.0, market_price=51.0)})
+        lines.append(traced_lines(checker.check, "S7", "STK", "BUY", 100, 51.0, 50.0))
+    assert lines[0] == lines[1]
+
+def test_pre_trade_check_tool(monkeypatch):
+    request = risk_tool.PreTradeCheckRequest(symbol="MSFT", asset_type="STK", qty=600, plan={
+        "entry": {"type": "LMT", "price": 100.0}, "stop": {"type": "STP", "stop_price": 98.0},
+        "take": {"type": "LMT", "price": 106.0}})
+
+    monkeypatch.setattr(risk_tool, "get_ibkr", lambda: None)
+    response = asyncio.run(risk_tool.pre_trade_check(request))
+    assert response.ok and response.dry_run and response.policy["max_orders_per_minute"] == 30
+
+    checker = checker_with_equity()
+    calls = []
+
+    class Ibkr:
+        risk = checker
+
+        async def pre_trade_check(self, symbol, asset_type, side, qty, entry, stop):
+            calls.append(side)
+            return checker.check(symbol, asset_type, side, qty, entry, stop)
+    monkeypatch.setattr(risk_tool, "get_ibkr", lambda: Ibkr())
+    response = asyncio.run(risk_tool.pre_trade_check(request))
+    assert calls == ["BUY"] and not response.ok and response.allowed_qty == 500 and not response.dry_run
+    assert response.policy == {"risk_per_trade_pct": 0.01, "max_daily_loss_pct": 0.05}
@@ -0,0 +1,83 @@
+import os
+import time
+from datetime import datetime, timedelta
+import sqlalchemy
+import pytest
+from storage.db import make_engine, realtime_market_data, PartitionedTable
+
+@pytest.fixture
+def engine(tmp_path):
+    return make_engine(f"sqlite:///{tmp_path}/trader.db")
+
+def test_engine_is_lazy_and_sets_pragmas(tmp_path, engine):
+    assert not os.path.exists(tmp_path / "trader.db")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA mmap_size").scalar() > 0
+        # No schema until the first write
+        assert realtime_market_data.partitions(conn) == []
+
+def test_rows_are_partitioned_by_day_and_queried_across_partitions(engine):
+    rows = [
+        {"symbol": sym, "price": float(i), "timestamp": datetime(2025, 1, 1, 23, 0) + timedelta(minutes=30 * i), "order_id": None}
+        for i in range(6) for sym in ("AAPL", "MSFT")
+    ]
+    with engine.begin() as conn:
+        realtime_market_data.insert(conn, rows)
+        assert realtime_market_data.partitions(conn) == [
+            "realtime_market_data_20250101", "realtime_market_data_20250102",
+        ]
+        out = realtime_market_data.select_range(conn, "AAPL", datetime(2025, 1, 1, 23, 30), datetime(2025, 1, 2, 1, 0))
+    assert [(r.timestamp.hour, r.timestamp.minute, r.price) for r in out] == [(23, 30, 1.0), (0, 0, 2.0), (0, 30, 3.0)]
+
+def test_drop_before_removes_whole_periods_only(engine):
+    rows = [{"symbol": "AAPL", "price": 1.0, "timestamp": datetime(2025, 1, d, 12), "order_id": None} for d in (1, 2, 3)]
+    with engine.begin() as conn:
+        realtime_market_data.insert(conn, rows)
+        assert realtime_market_data.drop_before(conn, datetime(2025, 1, 2, 12)) == ["realtime_market_data_20250101"]
+        assert realtime_market_data.partitions(conn) == ["realtime_market_data_20250102", "realtime_market_data_20250103"]
+        # Writing to a dropped period recreates it
+        realtime_market_data.insert(conn, rows[:1])
+        assert len(realtime_market_data.partitions(conn)) == 3
+
+def test_monthly_partitions(engine):
+    table = PartitionedTable("ticks", lambda: [
+        sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+        sqlalchemy.Column("symbol", sqlalchemy.String),
+        sqlalchemy.Column("price", sqlalchemy.Float),
+        sqlalchemy.Column("timestamp", sqlalchemy.DateTime),
+    ], period="month")
+    with engine.begin() as conn:
+        table.insert(conn, [{"symbol": "X", "price": 1.0, "timestamp": datetime(2024, m, 15)} for m in (11, 12)])
+        table.insert(conn, [{"symbol": "X", "price": 1.0, "timestamp": datetime(2025, 1, 15)}])
+        assert table.partitions(conn) == ["ticks_202411", "ticks_202412", "ticks_202501"]
+        assert len(table.select_range(conn, "X", datetime(2024, 12, 1), datetime(2025, 2, 1))) == 2
+        assert table.drop_before(conn, datetime(2025, 1, 1)) == ["ticks_202411", "ticks_202412"]
+
+def test_symbol_day_range_uses_covering_index(engine):
+    start = datetime(2025, 1, 6)
+    symbols = [f"SYM{i}" for i in range(50)]
+    with engine.begin() as conn:
+        for day in range(5):
+            rows = [
+                {"symbol": sym, "price": 1.0, "timestamp": start + timedelta(days=day, seconds=5 * i), "order_id": None}
+                for i in range(2_000) for sym in symbols
+            ]
+            realtime_market_data.insert(conn, rows)
+
+    with engine.connect() as conn:
+        plan = " ".join(
+            str(r[-1]) for r in conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT timestamp, price, order_id FROM realtime_market_data_20250108 "
+                "WHERE symbol = 'SYM7' AND timestamp >= '2025-01-08' AND timestamp < '2025-01-09' ORDER BY timestamp"
+            )
+        )
+        assert "COVERING INDEX" in plan
+        assert "TEMP B-TREE" not in plan
+
+        t0 = time.perf_counter()
+        out = realtime_market_data.select_range(conn, "SYM7", start + timedelta(days=2), start + timedelta(days=3))
+        elapsed = time.perf_counter() - t0
+    assert len(out) == 2_000
+    assert elapsed < 0.5
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from ibkr_adapter.tws_client import TWSClient
+from ibkr_adapter.fanout import StreamHub, ClientQueue, TICKS, BARS
+from ibkr_adapter.mapping import resolve_contract
+from mcp_server.main import app
+from mcp_server.tools import stream
+
+headers = {"X-API-Key": "your-secret-api-key"}
+
+class FakeStreamClient(TWSClient):
+    """Records market data requests instead of sending them; tests emit callbacks directly."""
+    def __init__(self):
+        super().__init__()
+        self.mktdata_reqs, self.rtbar_reqs, self.cancelled = [], [], []
+
+    def reqMktData(self, reqId, contract, genericTickList, snapshot, regulatorySnapshot, mktDataOptions):
+        self.mktdata_reqs.append((reqId, contract.symbol))
+
+    def cancelMktData(self, reqId):
+        self.cancelled.append(reqId)
+
+    def reqRealTimeBars(self, reqId, contract, barSize, whatToShow, useRTH, realTimeBarsOptions):
+        self.rtbar_reqs.append((reqId, contract.symbol, barSize))
+
+    def cancelRealTimeBars(self, reqId):
+        self.cancelled.append(reqId)
+
+    def emit_ticks(self, reqId, prices):
+        for price in prices:
+            self.tickPrice(reqId, 4, price, None)
+
+async def drain(queue, n, timeout=1.0):
+    return [await asyncio.wait_for(queue.get(), timeout) for _ in range(n)]
+
+def test_clients_share_one_reference_counted_ib_line():
+    async def main():
+        client = FakeStreamClient()
+        hub = StreamHub(client)
+        a, b = hub.new_client(), hub.new_client()
+        key = hub.subscribe(TICKS, "AAPL", "STK", a)
+        hub.subscribe(TICKS, "AAPL", "STK", b)
+        assert len(client.mktdata_reqs) == 1
+        req_id = client.mktdata_reqs[0][0]
+
+        threading.Thread(target=client.emit_ticks, args=(req_id, [1.0, 2.0])).start()
+        for queue in (a, b):
+            events = await drain(queue, 2)
+            assert [e["value"] for e in events] == [1.0, 2.0]
+            assert events[0]["tick"] == "LAST" and events[0]["symbol"] == "AAPL"
+
+        hub.unsubscribe(key, a)
+        assert client.cancelled == []
+        hub.unsubscribe(key, b)
+        assert client.cancelled == [req_id]
+        assert hub.stats()["ib_lines"] == 0
+    asyncio.run(main())
+
+def test_slow_consumer_drops_oldest_then_disconnects():
+    async def main():
+        queue = ClientQueue(maxsize=10)
+        for i in range(100):
+            queue.put({"i": i})
+        assert queue.dropped == 90
+        assert [(await queue.get())["i"] for _ in range(10)] == list(range(90, 100))
+
+        strict = ClientQueue(maxsize=5, max_dropped=3)
+        for i in range(9):
+            strict.put({"i": i})
+        assert strict.closed and strict.close_reason == "slow consumer"
+        assert len(await drain(strict, 5)) == 5
+        with pytest.raises(EOFError):
+            await strict.get()
+    asyncio.run(main())
+
+def test_streams_survive_disconnect_and_end_on_ib_errors():
+    async def main():
+        client = FakeStreamClient()
+        hub = StreamHub(client)
+        queue = hub.new_client()
+        hub.subscribe(BARS, "ES", "FUT", queue)
+        hub.subscribe(TICKS, "ES", "FUT", queue)
+        bars_req = client.rtbar_reqs[0][0]
+        ticks_req = client.mktdata_reqs[0][0]
+        assert client.rtbar_reqs[0][2] == 5
+
+        client.connectionClosed()
+        statuses = await drain(queue, 2)
+        assert {e["type"] for e in statuses} == {"status"}
+        client.realtimeBar(bars_req, 1700000000, 1.0, 2.0, 0.5, 1.5, 10, 1.2, 3)
+        (bar,) = await drain(queue, 1)
+        assert bar["type"] == "bar" and bar["close"] == 1.5
+
+        client.error(ticks_req, 354, "Requested market data is not subscribed")
+        (error,) = await drain(queue, 1)
+        assert error["type"] == "error"
+        await asyncio.sleep(0.01)
+        assert ticks_req in client.cancelled
+        assert not queue.closed  # the bars stream is still live
+        assert list(hub.stats()["subscriptions"]) == ["bars:ES:FUT"]
+    asyncio.run(main())
+
+@pytest.fixture
+def hub(monkeypatch):
+    hub = StreamHub(FakeStreamClient())
+    monkeypatch.setattr(stream, "get_stream_hub", lambda: hub)
+    return hub
+
+def test_websocket_endpoint_fans_out_ticks(hub):
+    client = TestClient(app)
+    with client.websocket_connect("/stream/market_data.ws", headers=headers) as ws1, \
+            client.websocket_connect("/stream/market_data.ws", headers=headers) as ws2:
+        for ws in (ws1, ws2):
+            ws.send_json({"action": "subscribe", "symbol": "AAPL", "kind": "ticks"})
+            assert ws.receive_json()["type"] == "ack"
+        assert len(hub.client.mktdata_reqs) == 1
+        hub.client.emit_ticks(hub.client.mktdata_reqs[0][0], [10.0])
+        assert ws1.receive_json()["value"] == 10.0
+        assert ws2.receive_json()["value"] == 10.0
+        ws1.send_json({"action": "bogus", "symbol": "AAPL"})
+        assert ws1.receive_json()["type"] == "error"
+    time.sleep(0.05)
+    assert hub.stats()["ib_lines"] == 0
+
+def test_sse_endpoint_streams_bars(hub):
+    # TestClient buffers whole bodies, so read the open-ended stream from the response directly
+    async def main():
+        response = await stream.stream_sse(symbol="MSFT", asset_type="STK", kind=BARS)
+        assert response.media_type == "text/event-stream"
+        req_id = hub.client.rtbar_reqs[0][0]
+        threading.Thread(target=hub.client.realtimeBar,
+                         args=(req_id, 1700000000, 1.0, 2.0, 0.5, 1.5, 10, 1.2, 3)).start()
+        chunk = await asyncio.wait_for(response.body_iterator.__anext__(), 1.0)
+        event, data = chunk.strip().split("\n")
+        assert event == "event: bar"
+        assert json.loads(data[len("data: "):])["close"] == 1.5
+        await response.body_iterator.aclose()
+        assert hub.stats()["ib_lines"] == 0
+    asyncio.run(main())
+
+def test_streaming_unavailable_in_dry_run():
+    response = TestClient(app).get("/stream/market_data.sse", params={"symbol": "AAPL"}, headers=headers)
+    assert response.status_code == 503
+
+def test_websocket_requires_api_key(hub):
+    from starlette.websockets import WebSocketDisconnect
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with TestClient(app).websocket_connect("/stream/market_data.ws", headers={"X-API-Key": "wrong"}):
+            pass
+    assert exc.value.code == 1008
+
+def test_failed_subscription_leaves_nothing_behind(hub):
+    on_loop = []
+    def resolve(symbol, asset_type):
+        try:
+            on_loop.append(asyncio.get_running_loop() is not None)
+        except RuntimeError:
+            on_loop.append(False)
+        if symbol == "NOPE":
+            raise LookupError("No contract for NOPE")
+        return resolve_contract(symbol, asset_type)
+    hub.resolve = resolve
+    def refuse(*args):
+        raise ConnectionError("Not connected")
+    hub.client.reqRealTimeBars = refuse
+
+    client = TestClient(app)
+    with client.websocket_connect("/stream/market_data.ws", headers=headers) as ws:
+        ws.send_json({"action": "subscribe", "symbol": "NOPE", "kind": "ticks"})
+        assert ws.receive_json() == {"type": "error", "message": "No contract for NOPE"}
+        ws.send_json({"action": "subscribe", "symbol": "AAPL", "kind": "bars"})
+        assert ws.receive_json() == {"type": "error", "message": "Not connected"}
+        assert hub.stats()["ib_lines"] == 0 and hub.client.router.stats()["sinks"] == 0
+        ws.send_json({"action": "subscribe", "symbol": "AAPL", "kind": "ticks"})
+        assert ws.receive_json()["type"] == "ack"
+    assert on_loop == [False, False, False]  # resolved in a worker thread
@@ -0,0 +1,208 @@
+import random
+import socket
+import struct
+import threading
+import time
+from ibapi.client import EClient
+from ibapi.comm import make_field, make_msg
+from ibapi.message import OUT
+from ibapi.contract import Contract
+from ibkr_adapter.dispatch import CONNECTION_STATE
+from ibkr_adapter.supervisor import ConnectionSupervisor, CONNECTED
+from ibkr_adapter.tws_client import TWSClient
+
+class FakeGateway(EClient):
+    """
+    Stands in for the socket side of EClient: `connect` completes the handshake
+    from another thread while `up`, or reports error 502 like ibapi does, and
+    subscription requests are recorded with their send time.
+    """
+    up = True
+    handshake_delay = 0.02
+
+    def connect(self, host, port, clientId):
+        if not self.up:
+            self.wrapper.error(-1, 502, "Couldn't connect to TWS.")
+            return
+        threading.Timer(self.handshake_delay, self.wrapper.nextValidId, args=(1,)).start()
+
+    def run(self):
+        pass
+
+    def reqMktData(self, reqId, contract, genericTickList, snapshot, regulatorySnapshot, mktDataOptions):
+        self.sent.append((time.monotonic(), "mktdata", reqId))
+
+    def reqRealTimeBars(self, reqId, contract, barSize, whatToShow, useRTH, realTimeBarsOptions):
+        self.sent.append((time.monotonic(), "rtbars", reqId))
+
+# TWSClient's super() calls land on FakeGateway, which sits before EClient in the MRO
+class GatewayClient(TWSClient, FakeGateway):
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+class FakeTWS:
+    """
+    A TWS socket on localhost: answers the handshake and startApi with
+    nextValidId, records the id of every other message and can drop the
+    live connection.
+    """
+    def __init__(self):
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        self.received = []
+        self.sockets = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            self.sockets.append(sock)
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _read(self, sock, size):
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def _fields(self, sock):
+        size = struct.unpack("!I", self._read(sock, 4))[0]
+        return self._read(sock, size).split(b"\0")[:-1]
+
+    def _serve(self, sock):
+        try:
+            self._read(sock, 4)  # "API\0"
+            self._fields(sock)  # supported client versions
+            sock.sendall(make_msg(make_field(157) + make_field("20250819 10:00:00 EST")))
+            while True:
+                msg_id = int(self._fields(sock)[0])
+                if msg_id == OUT.START_API:
+                    sock.sendall(make_msg(make_field(9) + make_field(1) + make_field(1)))  # nextValidId
+                else:
+                    self.received.append(msg_id)
+        except (ConnectionError, OSError):
+            pass
+
+    def drop(self):
+        sock = self.sockets[-1]
+        sock.shutdown(socket.SHUT_RDWR)
+        sock.close()
+
+    def close(self):
+        self.server.close()
+        for sock in self.sockets:
+            sock.close()
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def make_supervisor(client, **kwargs):
+    options = dict(connect_timeout=1.0, backoff_initial=0.02, backoff_max=0.1, rng=random.Random(7))
+    options.update(kwargs)
+    return ConnectionSupervisor(client, "127.0.0.1", 4002, 1, **options)
+
+def test_connects_on_next_valid_id_without_polling():
+    client = GatewayClient()
+    supervisor = make_supervisor(client)
+    started = time.monotonic()
+    assert supervisor.start(wait=2.0)
+    assert time.monotonic() - started < 0.3  # the old loop slept in 0.5s steps
+    assert supervisor.stats()["state"] == CONNECTED
+    assert supervisor.stats()["last_connect_sec"] < 0.3
+    supervisor.stop()
+
+def test_backoff_grows_with_jitter_and_is_capped():
+    supervisor = make_supervisor(GatewayClient(), backoff_initial=0.5, backoff_max=30.0)
+    delays = [supervisor.backoff(n) for n in range(1, 10)]
+    steps = [min(30.0, 0.5 * 2 ** (n - 1)) for n in range(1, 10)]
+    assert all(step / 2 <= d <= step for d, step in zip(delays, steps))
+    assert delays[-1] <= 30.0 and delays[3] > delays[0]
+    assert len({round(supervisor.backoff(4), 6) for _ in range(5)}) > 1
+
+def test_refused_connects_retry_until_the_gateway_is_back():
+    client = GatewayClient()
+    client.up = False
+    supervisor = make_supervisor(client)
+    supervisor.start()
+    time.sleep(0.2)
+    failed = supervisor.stats()["attempts"]
+    assert failed >= 3 and supervisor.stats()["consecutive_failures"] == failed
+    assert supervisor.stats()["last_error"]
+
+    client.up = True
+    assert supervisor.wait_connected(2.0)
+    assert supervisor.stats()["consecutive_failures"] == 0
+    supervisor.stop()
+
+def test_reconnects_and_replays_subscriptions_in_paced_priority_batches():
+    client = GatewayClient()
+    states = []
+    client.router.subscribe(CONNECTION_STATE, lambda stats: states.append(stats["state"]))
+    supervisor = make_supervisor(client, resubscribe_batch=2, resubscribe_interval=0.05)
+    assert supervisor.start(wait=2.0)
+
+    contract = Contract()
+    for req_id in (1, 2, 3):
+        client.reqMktData(req_id, contract, "", False, False, [])
+    for req_id in (11, 12):
+        client.reqRealTimeBars(req_id, contract, 5, "TRADES", 0, [])
+    client.set_subscription_priority(12, -1)
+    client.sent.clear()
+
+    client.up = False
+    client.connectionClosed()  # Gateway restart
+    time.sleep(0.1)
+    client.up = True
+    deadline = time.monotonic() + 2.0
+    while len(client.sent) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert [req_id for _, _, req_id in client.sent] == [12, 1, 2, 3, 11]
+    times = [t for t, _, _ in client.sent]
+    assert times[2] - times[1] >= 0.04 and times[4] - times[3] >= 0.04  # one pause per batch of two
+    assert times[1] - times[0] < 0.04
+
+    stats = supervisor.stats()
+    assert stats["connects"] == 2 and stats["disconnects"] == 1 and stats["resubscribed"] == 5
+    assert stats["last_outage_sec"] >= 0.1
+    assert states[-3:] == ["connecting", "resubscribing", "connected"]
+    assert "disconnected" in states
+    supervisor.stop()
+
+def test_a_dropped_socket_keeps_subscriptions_for_the_replay():
+    # Through the real EClient.run: its teardown calls disconnect() from the reader thread
+    gateway = FakeTWS()
+    client = TWSClient()
+    supervisor = ConnectionSupervisor(client, "127.0.0.1", gateway.port, 1, connect_timeout=2.0,
+                                      backoff_initial=0.02, backoff_max=0.05, rng=random.Random(7))
+    assert supervisor.start(wait=3.0)
+    contract = Contract()
+    contract.symbol, contract.secType, contract.exchange, contract.currency = "AAPL", "STK", "SMART", "USD"
+    for req_id in (1, 2, 3):
+        client.reqMktData(req_id, contract, "", False, False, [])
+    assert wait_until(lambda: gateway.received.count(OUT.REQ_MKT_DATA) == 3)
+
+    gateway.drop()
+    assert wait_until(lambda: gateway.received.count(OUT.REQ_MKT_DATA) == 6)
+    time.sleep(0.5)  # the old reader thread has finished its teardown by now
+    assert OUT.CANCEL_MKT_DATA not in gateway.received
+    assert sorted(client._active_subs["mktdata"]) == [1, 2, 3]
+    stats = supervisor.stats()
+    assert stats["connects"] == 2 and stats["resubscribed"] == 3
+    assert client.isConnected() and len(gateway.sockets) == 2  # the teardown left the new connection alone
+
+    supervisor.stop()
+    client.stop()
+    assert wait_until(lambda: gateway.received.count(OUT.CANCEL_MKT_DATA) == 3)
+    assert not client._active_subs["mktdata"]
+    gateway.close()
@@ -0,0 +1,67 @@
+import time
+import threading
+from datetime import datetime
+import sqlalchemy
+import pytest
+from storage.db import make_engine, realtime_market_data
+from storage.writer import BatchWriter
+
+@pytest.fixture
+def engine(tmp_path):
+    return make_engine(f"sqlite:///{tmp_path}/ticks.db")
+
+def tick(i):
+    return {"symbol": "AAPL", "price": 100.0 + i, "timestamp": datetime(2025, 1, 2, 10, 0), "order_id": None}
+
+def row_count(engine):
+    with engine.connect() as conn:
+        return sum(
+            conn.execute(sqlalchemy.text(f'SELECT COUNT(*) FROM "{name}"')).scalar()
+            for name in realtime_market_data.partitions(conn)
+        )
+
+def test_flushes_by_size_and_by_time(engine):
+    writer = BatchWriter(engine, realtime_market_data, batch_size=100, flush_interval=0.2)
+    for i in range(250):
+        writer.put(tick(i))
+    time.sleep(0.05)
+    # Two full batches went out without waiting for the interval
+    assert row_count(engine) == 200
+    time.sleep(0.3)
+    assert row_count(engine) == 250
+    assert writer.stats()["batches"] == 3
+    writer.close()
+
+def test_close_flushes_remaining_rows(engine):
+    writer = BatchWriter(engine, realtime_market_data, batch_size=10_000, flush_interval=60)
+    for i in range(123):
+        writer.put(tick(i))
+    writer.close()
+    assert row_count(engine) == 123
+    with pytest.raises(RuntimeError):
+        writer.put(tick(0))
+
+def test_drop_mode_counts_dropped_rows(engine):
+    gate = threading.Event()
+    writer = BatchWriter(engine, realtime_market_data, batch_size=5, flush_interval=60,
+                         max_buffer=10, overflow="drop")
+    # Stall the writer inside a batch so the buffer fills up
+    original = writer._write
+    writer._write = lambda batch: (gate.wait(), original(batch))
+    results = [writer.put(tick(i)) for i in range(20)]
+    time.sleep(0.05)
+    assert results.count(False) > 0
+    assert writer.stats()["dropped"] == results.count(False)
+    gate.set()
+    writer.close()
+    assert row_count(engine) == results.count(True)
+
+def test_block_mode_applies_backpressure(engine):
+    writer = BatchWriter(engine, realtime_market_data, batch_size=50, flush_interval=0.01,
+                         max_buffer=100, overflow="block", put_timeout=5.0)
+    assert all(writer.put(tick(i)) for i in range(5_000))
+    writer.close()
+    stats = writer.stats()
+    assert stats["dropped"] == 0
+    assert stats["max_buffer_depth"] <= 100
+    assert row_count(engine) == 5_000